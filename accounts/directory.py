@@ -0,0 +1,179 @@
+"""
+دليل الموظفين المشترك لاختيار المستقبلين
+يحتفظ بلقطة مضغوطة واحدة لكل الموظفين النشطين في الـ cache مع رقم إصدار،
+وفهرس بادئات مرتب في ذاكرة كل عملية للبحث السريع
+"""
+import json
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+DIRECTORY_VERSION_KEY = 'staff_directory_version'
+DIRECTORY_SNAPSHOT_KEY = 'staff_directory_{version}'
+DIRECTORY_TIMEOUT = 60 * 60  # ساعة واحدة، ويُبطل عند أي تغيير عبر الإصدار
+
+# ترتيب الأعمدة في اللقطة المضغوطة
+FIELDS = ('id', 'arabic_name', 'employee_id', 'department', 'position', 'english_name')
+
+_ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_ARABIC_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+})
+_TOKEN_SPLIT = re.compile(r'[\s\-_.,()/]+')
+
+_index_lock = threading.Lock()
+_index = None  # (version, rows, keys, tokens) يُستبدل كاملاً عند إعادة البناء
+
+
+def normalize(text):
+    """
+    توحيد النص للمطابقة: إزالة التشكيل والتطويل، توحيد الألف والياء والتاء المربوطة،
+    وتحويل الحروف اللاتينية إلى صغيرة بدون علامات
+    """
+    if not text:
+        return ''
+    text = _ARABIC_DIACRITICS.sub('', str(text)).translate(_ARABIC_LETTERS)
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    """تقسيم النص الموحد إلى كلمات"""
+    return [token for token in _TOKEN_SPLIT.split(normalize(text)) if token]
+
+
+def get_directory_version():
+    """رقم إصدار الدليل الحالي"""
+    version = cache.get(DIRECTORY_VERSION_KEY)
+    if version is None:
+        # البدء من الوقت الحالي حتى لا يتطابق إصدار جديد مع فهرس قديم بعد فقدان المفتاح
+        cache.add(DIRECTORY_VERSION_KEY, int(time.time()), None)
+        version = cache.get(DIRECTORY_VERSION_KEY)
+    return version
+
+
+def bump_directory_version():
+    """إبطال اللقطة الحالية عند تعديل الموظفين أو الأقسام أو المناصب"""
+    try:
+        cache.incr(DIRECTORY_VERSION_KEY)
+    except ValueError:
+        cache.set(DIRECTORY_VERSION_KEY, int(time.time()), None)
+
+
+def build_snapshot():
+    """بناء اللقطة من قاعدة البيانات في استعلام واحد"""
+    from .models import User
+
+    rows = User.objects.filter(is_active=True).values_list(
+        'id', 'arabic_name', 'employee_id', 'department__name', 'position__title',
+        'first_name', 'last_name',
+    ).order_by('arabic_name', 'id')
+
+    return [
+        [user_id, arabic_name, employee_id, department or '', position or '',
+         f'{first_name} {last_name}'.strip()]
+        for user_id, arabic_name, employee_id, department, position, first_name, last_name in rows
+    ]
+
+
+def get_directory_snapshot():
+    """
+    الحصول على لقطة الدليل المشتركة
+
+    Returns:
+        tuple: (version, rows) حيث كل صف قائمة بترتيب FIELDS
+    """
+    version = get_directory_version()
+    key = DIRECTORY_SNAPSHOT_KEY.format(version=version)
+    payload = cache.get(key)
+    if payload is None:
+        rows = build_snapshot()
+        payload = json.dumps(rows, ensure_ascii=False, separators=(',', ':'))
+        cache.set(key, payload, DIRECTORY_TIMEOUT)
+        return version, rows
+    return version, json.loads(payload)
+
+
+def _build_index(rows):
+    """فهرس مرتب من (الكلمة الموحدة، رقم الصف)"""
+    keys = []
+    tokens = []
+    for position, row in enumerate(rows):
+        row_tokens = set()
+        for value in (row[1], row[2], row[5]):
+            for token in tokenize(value):
+                row_tokens.add(token)
+                # "الزهراء" يجب أن يطابق البحث بـ "زهراء" أيضاً
+                if token.startswith('ال') and len(token) > 3:
+                    row_tokens.add(token[2:])
+        tokens.append(row_tokens)
+        keys.extend((token, position) for token in row_tokens)
+    keys.sort()
+    return keys, tokens
+
+
+def get_directory_index():
+    """الفهرس المحلي للعملية، يُعاد بناؤه فقط عند تغير إصدار الدليل"""
+    global _index
+    version = get_directory_version()
+    index = _index
+    if index is None or index[0] != version:
+        with _index_lock:
+            index = _index
+            if index is None or index[0] != version:
+                version, rows = get_directory_snapshot()
+                keys, tokens = _build_index(rows)
+                index = _index = (version, rows, keys, tokens)
+    return index
+
+
+def search_directory(query, limit=20, exclude_ids=()):
+    """
+    البحث بالبادئة في دليل الموظفين
+
+    Args:
+        query (str): نص البحث (عربي أو لاتيني أو رقم موظف)
+        limit (int): الحد الأقصى للنتائج
+        exclude_ids (iterable): معرفات مستخدمين يتم استبعادهم
+
+    Returns:
+        list: قواميس بحقول FIELDS
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    _, rows, keys, row_tokens = get_directory_index()
+    excluded = set(exclude_ids)
+    first, rest = terms[0], terms[1:]
+
+    matches = []
+    seen = set()
+    position = bisect_left(keys, (first, -1))
+    while position < len(keys) and len(matches) < limit:
+        token, row_position = keys[position]
+        if not token.startswith(first):
+            break
+        position += 1
+        if row_position in seen:
+            continue
+        seen.add(row_position)
+        row = rows[row_position]
+        if row[0] in excluded:
+            continue
+        if rest and not all(
+            any(candidate.startswith(term) for candidate in row_tokens[row_position])
+            for term in rest
+        ):
+            continue
+        matches.append(row_position)
+
+    matches.sort()
+    return [dict(zip(FIELDS, rows[row_position])) for row_position in matches]
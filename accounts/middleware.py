@@ -0,0 +1,45 @@
+"""
+Middleware نبضات الحضور
+يرسل نبضة إلى فهرس الحضور (accounts.presence) مرة كل PRESENCE_HEARTBEAT_INTERVAL ثانية على الأكثر
+لكل مستخدم من كل عملية، والتحقق من الفاصل في ذاكرة العملية فلا تكلف الطلبات الأخرى شيئاً.
+"""
+import threading
+import time
+
+from django.contrib.auth import SESSION_KEY
+
+from . import presence
+
+# الحد الأعلى لعدد المستخدمين في ذاكرة الفواصل قبل حذف القديم منها
+MAX_TRACKED_USERS = 10000
+
+
+class PresenceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.interval = presence.get_heartbeat_interval()
+        self._last_heartbeat = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        session = getattr(request, 'session', None)
+        # معرف المستخدم من الجلسة حتى لا يُحمّل المستخدم إلا عند إرسال النبضة
+        user_id = session.get(SESSION_KEY) if session is not None and session.session_key else None
+        if user_id and self._due(int(user_id)):
+            user = request.user
+            if user.is_authenticated:
+                presence.heartbeat(user.pk, user.department_id)
+        return response
+
+    def _due(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_heartbeat.get(user_id, float('-inf')) < self.interval:
+                return False
+            if len(self._last_heartbeat) >= MAX_TRACKED_USERS:
+                self._last_heartbeat = {
+                    key: value for key, value in self._last_heartbeat.items() if now - value < self.interval
+                }
+            self._last_heartbeat[user_id] = now
+            return True
@@ -126,16 +126,19 @@ class User(AbstractUser):
         return self.position.permissions_level
     
     def get_unread_messages_count(self):
-        """الحصول على عدد الرسائل غير المقروءة"""
+        """الحصول على عدد الرسائل غير المقروءة (يُحسب مرة واحدة لكل نسخة، فالقالب الأساسي يستدعيه عدة مرات)"""
+        if hasattr(self, '_unread_messages_count'):
+            return self._unread_messages_count
         try:
             from messaging.models import MessageRecipient
-            return MessageRecipient.objects.filter(
+            self._unread_messages_count = MessageRecipient.objects.filter(
                 recipient=self,
                 read_at__isnull=True,
                 is_deleted=False
             ).count()
         except:
             return 0
+        return self._unread_messages_count
 
 class UserGroup(models.Model):
     """نموذج لمجموعات المستخدمين"""
@@ -0,0 +1,183 @@
+"""
+فهرس حضور المستخدمين (من المتصل الآن)
+مجموعة مرتبة لكل المستخدمين وأخرى لكل قسم: العضو معرف المستخدم والدرجة وقت آخر نبضة،
+فعدد المتصلين خلال النافذة ZCOUNT واحد (O(log n)) بدلاً من عد سجلات الجلسات في كل طلب.
+مع Redis (django_redis) تُستخدم ZSET مشتركة بين العمليات، ومع غيره (locmem) مجموعة مرتبة
+مكافئة في ذاكرة العملية مثل الـ cache نفسه. النبضات يرسلها PresenceMiddleware مرة كل فاصل لكل مستخدم.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+PRESENCE_KEY = 'presence:users'
+PRESENCE_DEPARTMENT_KEY = 'presence:department:{department_id}'
+
+
+def get_online_window():
+    """المدة بالثواني التي يبقى فيها المستخدم متصلاً بعد آخر نبضة"""
+    return getattr(settings, 'PRESENCE_ONLINE_WINDOW', 300)
+
+
+def get_heartbeat_interval():
+    """أقل فاصل بالثواني بين نبضتين لنفس المستخدم من نفس العملية"""
+    return getattr(settings, 'PRESENCE_HEARTBEAT_INTERVAL', 60)
+
+
+class _SortedSet:
+    """مجموعة مرتبة بالدرجة (مكافئ ZSET): قاموس للدرجات وقائمة مرتبة (الدرجة، العضو)"""
+
+    def __init__(self):
+        self.scores = {}
+        self.entries = []
+
+    def add(self, member, score):
+        old = self.scores.get(member)
+        if old is not None:
+            del self.entries[bisect_left(self.entries, (old, member))]
+        self.scores[member] = score
+        insort(self.entries, (score, member))
+
+    def remove(self, member):
+        score = self.scores.pop(member, None)
+        if score is not None:
+            del self.entries[bisect_left(self.entries, (score, member))]
+
+    def count(self, since):
+        return len(self.entries) - bisect_left(self.entries, (since,))
+
+    def members(self, since):
+        return [member for _, member in self.entries[bisect_left(self.entries, (since,)):]]
+
+    def prune(self, before):
+        end = bisect_left(self.entries, (before,))
+        for _, member in self.entries[:end]:
+            del self.scores[member]
+        del self.entries[:end]
+
+
+class LocalPresenceIndex:
+    """الفهرس في ذاكرة العملية (للتطوير والاختبارات مع LocMemCache)"""
+
+    def __init__(self):
+        self._sets = {}
+        self._lock = threading.Lock()
+
+    def touch(self, keys, member, score, prune_before):
+        with self._lock:
+            for key in keys:
+                sorted_set = self._sets.setdefault(key, _SortedSet())
+                sorted_set.add(member, score)
+                sorted_set.prune(prune_before)
+
+    def remove(self, keys, member):
+        with self._lock:
+            for key in keys:
+                if key in self._sets:
+                    self._sets[key].remove(member)
+
+    def counts(self, keys, since):
+        with self._lock:
+            return [self._sets[key].count(since) if key in self._sets else 0 for key in keys]
+
+    def members(self, key, since):
+        with self._lock:
+            return self._sets[key].members(since) if key in self._sets else []
+
+    def clear(self):
+        with self._lock:
+            self._sets.clear()
+
+
+class RedisPresenceIndex:
+    """الفهرس في Redis (ZSET) عبر اتصال django_redis، بالبادئة نفسها لمفاتيح الـ cache"""
+
+    def __init__(self, alias='default'):
+        from django_redis import get_redis_connection
+
+        self.connection = get_redis_connection(alias)
+
+    def touch(self, keys, member, score, prune_before):
+        pipe = self.connection.pipeline(transaction=False)
+        for key in keys:
+            key = cache.make_key(key)
+            pipe.zadd(key, {member: score})
+            pipe.zremrangebyscore(key, '-inf', f'({prune_before}')
+        pipe.execute()
+
+    def remove(self, keys, member):
+        pipe = self.connection.pipeline(transaction=False)
+        for key in keys:
+            pipe.zrem(cache.make_key(key), member)
+        pipe.execute()
+
+    def counts(self, keys, since):
+        pipe = self.connection.pipeline(transaction=False)
+        for key in keys:
+            pipe.zcount(cache.make_key(key), since, '+inf')
+        return pipe.execute()
+
+    def members(self, key, since):
+        return [int(member) for member in self.connection.zrangebyscore(cache.make_key(key), since, '+inf')]
+
+
+@lru_cache(maxsize=1)
+def get_presence_index():
+    """فهرس Redis إذا كان الـ cache الافتراضي django_redis، وإلا الفهرس في ذاكرة العملية"""
+    try:
+        from django_redis.cache import RedisCache
+    except ImportError:
+        return LocalPresenceIndex()
+    if isinstance(caches['default'], RedisCache):
+        return RedisPresenceIndex()
+    return LocalPresenceIndex()
+
+
+def _keys(department_id):
+    keys = [PRESENCE_KEY]
+    if department_id:
+        keys.append(PRESENCE_DEPARTMENT_KEY.format(department_id=department_id))
+    return keys
+
+
+def heartbeat(user_id, department_id=None, now=None):
+    """
+    تسجيل نبضة حضور للمستخدم (في المجموعة العامة ومجموعة قسمه)
+    النبضات الأقدم من نافذة الاتصال تُحذف في نفس العملية فلا تكبر المجموعات.
+    """
+    now = now or time.time()
+    get_presence_index().touch(_keys(department_id), user_id, now, now - get_online_window())
+
+
+def leave(user_id, department_id=None):
+    """إزالة المستخدم من الفهرس عند تسجيل الخروج"""
+    get_presence_index().remove(_keys(department_id), user_id)
+
+
+def online_count(now=None):
+    """عدد المستخدمين المتصلين خلال نافذة الاتصال"""
+    since = (now or time.time()) - get_online_window()
+    return get_presence_index().counts([PRESENCE_KEY], since)[0]
+
+
+def online_user_ids(department_id=None, now=None):
+    """معرفات المستخدمين المتصلين (كلهم أو في قسم)"""
+    since = (now or time.time()) - get_online_window()
+    key = PRESENCE_DEPARTMENT_KEY.format(department_id=department_id) if department_id else PRESENCE_KEY
+    return get_presence_index().members(key, since)
+
+
+def department_presence(department_ids, now=None):
+    """
+    عدد المتصلين في كل قسم (جولة واحدة إلى Redis لكل الأقسام)
+
+    Returns:
+        dict: {معرف القسم: عدد المتصلين}
+    """
+    department_ids = list(department_ids)
+    since = (now or time.time()) - get_online_window()
+    keys = [PRESENCE_DEPARTMENT_KEY.format(department_id=department_id) for department_id in department_ids]
+    return dict(zip(department_ids, get_presence_index().counts(keys, since)))
@@ -0,0 +1,32 @@
+"""
+إشارات تطبيق الحسابات
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .directory import bump_directory_version
+from .models import Department, Position, User
+
+# الحقول التي تظهر في دليل الموظفين؛ حفظ غيرها (مثل last_login) لا يبطل الدليل
+DIRECTORY_USER_FIELDS = {
+    'is_active', 'arabic_name', 'employee_id', 'department', 'position',
+    'first_name', 'last_name',
+}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    """إبطال دليل الموظفين عند تعديل بيانات الموظف الظاهرة فيه"""
+    if update_fields is not None and not DIRECTORY_USER_FIELDS.intersection(update_fields):
+        return
+    bump_directory_version()
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=Position)
+@receiver(post_delete, sender=Position)
+def directory_changed(sender, **kwargs):
+    """إبطال دليل الموظفين عند تغير الأقسام أو المناصب أو حذف موظف"""
+    bump_directory_version()
@@ -1,3 +1,143 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from myproject.perf_fixtures import TEST_STORAGES
+
+from . import directory, presence
+from .models import Department, Position, User
+
+
+class PresenceIndexTests(TestCase):
+    """فهرس الحضور: عد المتصلين خلال النافذة إجمالاً ولكل قسم"""
+
+    def setUp(self):
+        presence.get_presence_index().clear()
+        self.now = time.time()
+
+    def test_online_counts(self):
+        presence.heartbeat(1, department_id=10, now=self.now - 10)
+        presence.heartbeat(2, department_id=10, now=self.now - 20)
+        presence.heartbeat(3, department_id=20, now=self.now - presence.get_online_window() - 1)
+        self.assertEqual(presence.online_count(now=self.now), 2)
+        self.assertEqual(presence.department_presence([10, 20, 30], now=self.now), {10: 2, 20: 0, 30: 0})
+        self.assertEqual(sorted(presence.online_user_ids(department_id=10, now=self.now)), [1, 2])
+
+        # نبضة جديدة تحدث درجة العضو دون تكراره
+        presence.heartbeat(3, department_id=20, now=self.now)
+        presence.heartbeat(1, department_id=10, now=self.now)
+        self.assertEqual(presence.online_count(now=self.now), 3)
+        self.assertEqual(sorted(presence.online_user_ids(now=self.now)), [1, 2, 3])
+
+        presence.leave(2, department_id=10)
+        self.assertEqual(presence.department_presence([10, 20], now=self.now), {10: 1, 20: 1})
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class PresenceMiddlewareTests(TestCase):
+    """نبضات الحضور من الطلبات مرة كل فاصل، وعرضها في لوحتي التحكم"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='الخزينة', code='TRS')
+        position = Position.objects.create(title='مدير', level=5, department=cls.department)
+        cls.admin = User.objects.create_user(
+            username='treasury', password='pass', arabic_name='مدير الخزينة', employee_id='5001', phone='501',
+            department=cls.department, position=position, is_staff=True,
+        )
+
+    def setUp(self):
+        presence.get_presence_index().clear()
+
+    def test_heartbeat_is_throttled(self):
+        self.client.force_login(self.admin)
+        with mock.patch('accounts.presence.heartbeat', wraps=presence.heartbeat) as heartbeat:
+            self.client.get(reverse('accounts:profile'))
+            self.client.get(reverse('accounts:profile'))
+        heartbeat.assert_called_once_with(self.admin.pk, self.department.pk)
+
+        response = self.client.get(reverse('accounts:admin_dashboard'))
+        self.assertEqual(response.context['online_users'], 1)
+        self.assertEqual(
+            response.context['department_presence'], [{'id': self.department.pk, 'name': 'الخزينة', 'online': 1}]
+        )
+
+        self.client.get(reverse('accounts:logout'))
+        self.assertEqual(presence.online_count(), 0)
+
+
+class DirectorySearchTests(TestCase):
+    """دليل الموظفين: توحيد النص العربي والبحث بالبادئات وإعادة بناء اللقطة عند التغيير"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='الخزينة', code='TRS')
+        cls.position = Position.objects.create(title='محاسب', level=1, department=cls.department)
+        cls.users = {
+            key: User.objects.create_user(
+                username=key, password='pass', arabic_name=arabic_name, first_name=first_name, last_name=last_name,
+                employee_id=employee_id, phone=employee_id, department=cls.department, position=cls.position,
+            )
+            for key, arabic_name, first_name, last_name, employee_id in (
+                ('ahmad', 'أَحْمَد الزهراني', 'Ahmad', 'Zahrani', 'E1001'),
+                ('fatima', 'فاطمة الزهراء', 'Fátima', 'Zahra', 'E1002'),
+                ('ahmad2', 'أحمد سليم', 'Ahmad', 'Salim', 'E1003'),
+                ('mona', 'منى يحيى', 'Mona', 'Yahya', 'E2001'),
+            )
+        }
+
+    def _ids(self, query, **kwargs):
+        return {row['id'] for row in directory.search_directory(query, **kwargs)}
+
+    def test_normalize(self):
+        self.assertEqual(directory.normalize('أَحْمَـد'), 'احمد')
+        self.assertEqual(directory.normalize('إسلام آمنة مى مسؤول'), 'اسلام امنه مي مسوول')
+        self.assertEqual(directory.normalize('Fátima'), 'fatima')
+        self.assertEqual(directory.tokenize('عبد-الله (E1001)'), ['عبد', 'الله', 'e1001'])
+
+    def test_prefix_search(self):
+        ahmad, fatima, ahmad2, mona = self.users.values()
+        self.assertEqual(self._ids('احم'), {ahmad.pk, ahmad2.pk})
+        self.assertEqual(self._ids('إحمد'), {ahmad.pk, ahmad2.pk})
+        # كل الكلمات يجب أن تطابق بادئة كلمة في الصف، و"الزهراء" تطابق "زهراء"
+        self.assertEqual(self._ids('احمد زهر'), {ahmad.pk})
+        self.assertEqual(self._ids('زهراء'), {fatima.pk})
+        self.assertEqual(self._ids('fatima'), {fatima.pk})
+        self.assertEqual(self._ids('e10'), {ahmad.pk, fatima.pk, ahmad2.pk})
+        self.assertEqual(self._ids('منى يوسف'), set())
+        self.assertEqual(self._ids('  '), set())
+
+        row = directory.search_directory('يحيى')[0]
+        self.assertEqual(row, {
+            'id': mona.pk, 'arabic_name': 'منى يحيى', 'employee_id': 'E2001',
+            'department': 'الخزينة', 'position': 'محاسب', 'english_name': 'Mona Yahya',
+        })
+
+    def test_exclude_and_limit(self):
+        ahmad, _, ahmad2, _ = self.users.values()
+        self.assertEqual(self._ids('احمد', exclude_ids=[ahmad.pk]), {ahmad2.pk})
+        self.assertEqual(len(directory.search_directory('e', limit=2)), 2)
+
+    def test_snapshot_is_rebuilt_after_changes(self):
+        ahmad = self.users['ahmad']
+        version = directory.get_directory_index()[0]
+
+        # حفظ حقول لا تظهر في الدليل لا يبطله
+        ahmad.save(update_fields=['last_login'])
+        self.assertEqual(directory.get_directory_version(), version)
+
+        ahmad.arabic_name = 'خالد الزهراني'
+        ahmad.save(update_fields=['arabic_name'])
+        self.assertNotEqual(directory.get_directory_version(), version)
+        self.assertEqual(self._ids('خالد'), {ahmad.pk})
+        self.assertNotIn(ahmad.pk, self._ids('احمد'))
+
+        self.department.name = 'الخزينة المركزية'
+        self.department.save()
+        self.assertEqual(directory.search_directory('خالد')[0]['department'], 'الخزينة المركزية')
+
+        User.objects.filter(pk=ahmad.pk).update(is_active=False)
+        directory.bump_directory_version()
+        self.assertEqual(self._ids('خالد'), set())
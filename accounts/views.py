@@ -9,9 +9,11 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
 from django.utils import timezone
 
+from . import presence
 from .models import Department, Position, UserGroup
 from .forms import UserRegistrationForm, DepartmentForm
 from security.models import AuditLog, UserSession, LoginAttempt
+from security.sessions import record_login, record_logout
 from django.http import JsonResponse
 from django.db import transaction
 
@@ -117,18 +119,8 @@ def login_view(request):
         if user is not None and user.is_active:
             login(request, user)
             
-            # Ensure session is created and saved before accessing session_key
-            if not request.session.session_key:
-                request.session.create()
-            request.session.save()
-            
-            # Create user session
-            UserSession.objects.create(
-                user=user,
-                session_key=request.session.session_key,
-                ip_address=get_client_ip(request),
-                user_agent=request.META.get('HTTP_USER_AGENT', '')
-            )
+            # سجل الجلسة يُنشأ في الخلفية من نشاطها المسجل في الـ cache
+            record_login(request, user)
             
             # Log successful login
             AuditLog.objects.create(
@@ -148,6 +140,13 @@ def login_view(request):
             # الموظفين العاديين يذهبون للوحة التحكم العادية
             return redirect('dashboard')
         else:
+            # سجل الفشل يستهلكه كاشف الشذوذ (محاولات متعددة من نفس العنوان)
+            AuditLog.objects.create(
+                action_type='FAILED_LOGIN',
+                description=f'فشل تسجيل الدخول باسم المستخدم {username}',
+                user_ip=get_client_ip(request),
+                is_successful=False
+            )
             messages.error(request, 'اسم المستخدم أو كلمة المرور غير صحيحة.')
     
     return render(request, 'accounts/login.html')
@@ -167,6 +166,8 @@ def logout_view(request):
         is_successful=True
     )
     
+    record_logout(request)
+    presence.leave(user.pk, user.department_id)
     logout(request)
     messages.success(request, 'تم تسجيل الخروج بنجاح.')
     
@@ -457,9 +458,18 @@ def end_delegation(request, delegation_id):
 def admin_dashboard(request):
     users_count = User.objects.count()
     active_users = User.objects.filter(is_active=True).count()
+    
+    # الحضور لكل قسم من فهرس الحضور (جولة واحدة لكل الأقسام)
+    departments = list(Department.objects.filter(is_active=True).order_by('name').values('id', 'name'))
+    online = presence.department_presence([department['id'] for department in departments])
+    for department in departments:
+        department['online'] = online[department['id']]
+    
     return render(request, 'accounts/admin_dashboard.html', {
         'users_count': users_count,
         'active_users': active_users,
+        'online_users': presence.online_count(),
+        'department_presence': departments,
     })
 
 @login_required
@@ -507,7 +517,7 @@ def admin_user_activity(request, user_id):
     user = get_object_or_404(User, id=user_id)
     logs = AuditLog.objects.filter(user=user).order_by('-timestamp')[:50]
     last_login = UserSession.objects.filter(user=user, is_active=False).order_by('-login_time').first()
-    last_logout = UserSession.objects.filter(user=user, is_active=False).order_by('-last_activity').first()
+    last_logout = UserSession.objects.filter(user=user, logout_time__isnull=False).order_by('-logout_time').first()
     return render(request, 'accounts/admin_user_activity.html', {
         'profile_user': user,
         'logs': logs,
@@ -555,18 +565,8 @@ def admin_login_view(request):
             
             login(request, user)
             
-            # Ensure session is created and saved before accessing session_key
-            if not request.session.session_key:
-                request.session.create()
-            request.session.save()
-            
-            # Create user session
-            UserSession.objects.create(
-                user=user,
-                session_key=request.session.session_key,
-                ip_address=get_client_ip(request),
-                user_agent=request.META.get('HTTP_USER_AGENT', '')
-            )
+            # سجل الجلسة يُنشأ في الخلفية من نشاطها المسجل في الـ cache
+            record_login(request, user)
             
             # Update login attempt to successful
             attempt = LoginAttempt.objects.filter(
@@ -589,6 +589,12 @@ def admin_login_view(request):
             messages.success(request, f'مرحباً أيها المدير {user.arabic_name or user.username}!')
             return redirect('accounts:admin_dashboard')
         else:
+            AuditLog.objects.create(
+                action_type='FAILED_LOGIN',
+                description=f'فشل تسجيل دخول المدير باسم المستخدم {username}',
+                user_ip=get_client_ip(request),
+                is_successful=False
+            )
             messages.error(request, 'اسم المستخدم أو كلمة المرور غير صحيحة.')
     
     return render(request, 'accounts/admin_login.html')
\ No newline at end of file
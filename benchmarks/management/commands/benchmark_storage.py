@@ -0,0 +1,68 @@
+"""
+أمر Django لقياس إنتاجية تخزين المرفقات المشفر مقارنة بـ FileSystemStorage
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmarks.storage import MEGABYTE, run_storage_benchmark
+from messaging.encryption import DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'قياس سرعة كتابة وقراءة المرفقات في التخزين المشفر مقارنة بـ FileSystemStorage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size-mb',
+            type=float,
+            default=32,
+            help='حجم الملف المقاس بالميجابايت (افتراضي: 32)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=3,
+            help='عدد مرات الكتابة والقراءة (افتراضي: 3)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'حجم الجزء المشفر بالبايت (افتراضي: {DEFAULT_CHUNK_SIZE})'
+        )
+        parser.add_argument(
+            '--range-size',
+            type=int,
+            default=64 * 1024,
+            help='حجم النطاق المقروء في قياس Range بالبايت (افتراضي: 65536)'
+        )
+        parser.add_argument(
+            '--ranges',
+            type=int,
+            default=200,
+            help='عدد النطاقات العشوائية في كل تكرار (افتراضي: 200)'
+        )
+        parser.add_argument('--output', help='حفظ النتيجة في ملف JSON')
+
+    def handle(self, *args, **options):
+        results = run_storage_benchmark(
+            int(options['size_mb'] * MEGABYTE), options['iterations'], options['chunk_size'],
+            options['range_size'], options['ranges'],
+        )
+
+        self.stdout.write(f'{"التخزين":<12}{"كتابة MB/s":>14}{"قراءة MB/s":>14}{"Range p50 ms":>15}{"Range p95 ms":>15}')
+        for name, row in results.items():
+            self.stdout.write(
+                f'{name:<12}{row["write_mb_s"]:>14}{row["read_mb_s"]:>14}'
+                f'{row["range_p50_ms"]:>15}{row["range_p95_ms"]:>15}'
+            )
+        plain, encrypted = results['filesystem'], results['encrypted']
+        for key, label in (('write_mb_s', 'الكتابة'), ('read_mb_s', 'القراءة')):
+            if encrypted[key]:
+                self.stdout.write(f'{label}: التخزين المشفر أبطأ بمعامل {round(plain[key] / encrypted[key], 2)}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'تم حفظ النتيجة في {options["output"]}')
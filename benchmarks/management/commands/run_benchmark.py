@@ -0,0 +1,193 @@
+"""
+أمر Django لقياس أداء مسارات المراسلات الرئيسية
+يقيس معدل الطلبات في الثانية وزمن الاستجابة (p50/p95/p99) وعدد الاستعلامات لكل طلب
+ويحفظ النتيجة بصيغة JSON لمقارنة التشغيلات
+"""
+import json
+import platform
+import secrets
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from benchmarks.runners import run_client, run_http
+from benchmarks.scenarios import SCENARIOS, prepare_context
+from benchmarks.stats import compare, summarize
+
+# المستخدم المحوري في بيانات القياس (myproject.perf_fixtures.seed_dataset)
+SEED_USERNAME = 'perf_focus'
+
+
+class Command(BaseCommand):
+    help = 'قياس أداء مسارات المراسلات (الدخول، الوارد، القراءة، الرد، التحويل)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario',
+            choices=sorted(SCENARIOS),
+            default='mailbox',
+            help='السيناريو المقاس (افتراضي: mailbox)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='عدد تكرارات السيناريو (لكل عملية في وضع HTTP) (افتراضي: 20)'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=1,
+            help='تكرارات تمهيدية غير محسوبة في وضع test client (افتراضي: 1)'
+        )
+        parser.add_argument('--username', help='المستخدم الذي ينفذ السيناريو')
+        parser.add_argument('--password', help='كلمة مرور المستخدم')
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='إنشاء بيانات اختبار الأداء واستخدام مستخدمها المحوري'
+        )
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='معامل حجم البيانات مع --seed (افتراضي: 1)'
+        )
+        parser.add_argument(
+            '--keep-data',
+            action='store_true',
+            help='الاحتفاظ بالبيانات المنشأة في وضع test client بدلاً من التراجع عنها'
+        )
+        parser.add_argument(
+            '--http',
+            metavar='URL',
+            help='القياس عبر HTTP على خادم يعمل مثل http://127.0.0.1:8000'
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=4,
+            help='عدد العمليات المتوازية في وضع HTTP (افتراضي: 4)'
+        )
+        parser.add_argument('--output', help='حفظ النتيجة في ملف JSON')
+        parser.add_argument('--compare', help='مقارنة النتيجة بملف JSON سابق')
+
+    def handle(self, *args, **options):
+        if not options['seed'] and not (options['username'] and options['password']):
+            raise CommandError('يجب تحديد --username و --password أو استخدام --seed')
+
+        password = None
+        if options['http']:
+            if options['seed']:
+                # الخادم لا يرى إلا البيانات المثبتة
+                password = self._seed(options['scale'], persistent=True)
+            samples, elapsed = run_http(
+                options['http'], options['scenario'], self._context(options, password),
+                options['iterations'], options['processes'],
+            )
+        else:
+            with transaction.atomic():
+                if options['seed']:
+                    password = self._seed(options['scale'], persistent=options['keep_data'])
+                context = self._context(options, password)
+                samples, elapsed = self._run_client(options, context)
+                if not options['keep_data']:
+                    transaction.set_rollback(True)
+
+        result = {
+            'scenario': options['scenario'],
+            'mode': 'http' if options['http'] else 'client',
+            'iterations': options['iterations'],
+            'processes': options['processes'] if options['http'] else 1,
+            'started_at': timezone.now().isoformat(),
+            'duration_seconds': round(elapsed, 3),
+            'environment': {
+                'python': platform.python_version(),
+                'database': settings.DATABASES['default']['ENGINE'],
+                'debug': settings.DEBUG,
+            },
+            **summarize(samples, elapsed),
+        }
+
+        self._print_result(result)
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                self._print_comparison(result, json.load(f))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'تم حفظ النتيجة في {options["output"]}')
+
+    def _seed(self, scale, persistent):
+        """
+        إنشاء بيانات القياس (أو إعادة استخدامها إن وُجدت) بكلمة مرور عشوائية
+
+        Args:
+            persistent: البيانات تُثبت في قاعدة البيانات (وضع HTTP أو --keep-data)
+
+        Returns:
+            str: كلمة مرور المستخدم المحوري
+        """
+        from accounts.models import User
+        from myproject import perf_fixtures
+
+        if persistent and not settings.DEBUG:
+            raise CommandError(
+                'إنشاء بيانات القياس الدائمة (--seed مع --http أو --keep-data) مسموح فقط عند تفعيل DEBUG '
+                'على قاعدة بيانات تطوير أو اختبار'
+            )
+        password = secrets.token_urlsafe(16)
+        focus = User.objects.filter(username=SEED_USERNAME).first()
+        if focus is not None:
+            # التشغيل المتكرر يعيد استخدام البيانات بدلاً من تكرار المستخدمين
+            self.stdout.write('بيانات القياس موجودة مسبقاً، سيتم إعادة استخدامها')
+            focus.set_password(password)
+            focus.save(update_fields=['password'])
+        else:
+            self.stdout.write('جاري إنشاء بيانات القياس...')
+            perf_fixtures.seed_dataset(password=password, scale=scale)
+        if persistent:
+            self.stdout.write(f'كلمة مرور المستخدم {SEED_USERNAME}: {password}')
+        return password
+
+    def _context(self, options, seed_password=None):
+        username, password = options['username'], options['password']
+        if options['seed']:
+            username, password = SEED_USERNAME, seed_password
+        try:
+            return prepare_context(username, password)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+    def _run_client(self, options, context):
+        from myproject.perf_fixtures import TEST_STORAGES
+
+        # test client يستخدم المضيف testserver ولا يتطلب collectstatic
+        with override_settings(
+            STORAGES=TEST_STORAGES,
+            ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver'],
+        ):
+            return run_client(options['scenario'], context, options['iterations'], options['warmup'])
+
+    def _print_result(self, result):
+        header = f'{"الخطوة":<12}{"طلبات":>8}{"أخطاء":>8}{"rps":>10}{"p50":>10}{"p95":>10}{"p99":>10}{"استعلامات":>12}'
+        self.stdout.write(header)
+        rows = list(result['steps'].items()) + [('المجموع', result['totals'])]
+        for name, row in rows:
+            queries = '-' if row['queries_per_request'] is None else row['queries_per_request']
+            line = (
+                f'{name:<12}{row["requests"]:>8}{row["errors"]:>8}{row["rps"]:>10}'
+                f'{row["p50_ms"]:>10}{row["p95_ms"]:>10}{row["p99_ms"]:>10}{queries:>12}'
+            )
+            if row['errors']:
+                self.stdout.write(self.style.WARNING(line))
+            else:
+                self.stdout.write(line)
+
+    def _print_comparison(self, result, baseline):
+        self.stdout.write('\nالمقارنة مع التشغيل السابق (نسبة التغير %):')
+        for name, rps_change, p95_change in compare(result, baseline):
+            self.stdout.write(f'{name:<12} rps: {rps_change}%  p95: {p95_change}%')
@@ -0,0 +1,122 @@
+"""
+مشغلات السيناريوهات
+- run_client: داخل العملية عبر Django test client مع عد الاستعلامات لكل طلب
+- run_http: عدة عمليات ترسل طلبات HTTP حقيقية إلى خادم محلي (مثل gunicorn)
+"""
+import http.cookiejar
+import multiprocessing
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .scenarios import SCENARIOS
+
+
+def run_client(scenario, context, iterations, warmup=1):
+    """
+    تشغيل السيناريو بالتتابع عبر test client
+
+    Args:
+        scenario (str): اسم السيناريو في SCENARIOS
+        context (dict): سياق prepare_context
+        iterations (int): عدد التكرارات المقاسة
+        warmup (int): تكرارات تمهيدية غير محسوبة
+
+    Returns:
+        tuple: (العينات، الزمن الكلي بالثواني)
+    """
+    steps = SCENARIOS[scenario]
+    samples = []
+    started = None
+    for iteration in range(warmup + iterations):
+        if iteration == warmup:
+            samples, started = [], time.perf_counter()
+        client = Client()
+        for name, method, path, data in steps(context, iteration):
+            with CaptureQueriesContext(connection) as queries:
+                request_started = time.perf_counter()
+                if method == 'POST':
+                    response = client.post(path, data)
+                else:
+                    response = client.get(path)
+                seconds = time.perf_counter() - request_started
+            samples.append({
+                'step': name,
+                'seconds': seconds,
+                'queries': len(queries),
+                'ok': response.status_code < 400,
+            })
+    return samples, time.perf_counter() - started
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """قياس الطلب نفسه دون متابعة التوجيه"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def _http_worker(args):
+    base_url, scenario, context, first_iteration, iterations = args
+    steps = SCENARIOS[scenario]
+    samples = []
+    for iteration in range(first_iteration, first_iteration + iterations):
+        cookies = http.cookiejar.CookieJar()
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cookies), _NoRedirect)
+        for name, method, path, data in steps(context, iteration):
+            url = base_url + path
+            body = None
+            headers = {'Referer': url}
+            if method == 'POST':
+                csrf_token = next((cookie.value for cookie in cookies if cookie.name == 'csrftoken'), '')
+                body = urllib.parse.urlencode(dict(data, csrfmiddlewaretoken=csrf_token), doseq=True).encode()
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            request = urllib.request.Request(url, data=body, headers=headers, method=method)
+            request_started = time.perf_counter()
+            try:
+                with opener.open(request, timeout=30) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except OSError:
+                status = 599
+            samples.append({
+                'step': name,
+                'seconds': time.perf_counter() - request_started,
+                'queries': None,
+                'ok': status < 400,
+            })
+    return samples
+
+
+def run_http(base_url, scenario, context, iterations, processes=4):
+    """
+    تشغيل السيناريو بالتوازي على خادم HTTP
+
+    عدد الاستعلامات غير متاح في هذا الوضع لأن الطلبات تُنفذ في عملية الخادم.
+
+    Args:
+        base_url (str): عنوان الخادم مثل http://127.0.0.1:8000
+        iterations (int): عدد التكرارات لكل عملية
+
+    Returns:
+        tuple: (العينات، الزمن الكلي بالثواني)
+    """
+    base_url = base_url.rstrip('/')
+    jobs = [
+        (base_url, scenario, context, worker * iterations, iterations)
+        for worker in range(processes)
+    ]
+    # الاتصالات المفتوحة لا تُورث بشكل آمن للعمليات الفرعية
+    connection.close()
+    started = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(_http_worker, jobs)
+    elapsed = time.perf_counter() - started
+    return [sample for worker_samples in results for sample in worker_samples], elapsed
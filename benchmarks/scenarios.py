@@ -0,0 +1,72 @@
+"""
+سيناريوهات قياس الأداء
+كل سيناريو دالة تعيد خطوات تكرار واحد بالشكل (الاسم، الطريقة، المسار، البيانات)
+وتعتمد على سياق مُعد مسبقاً لا يحتوي إلا على قيم بسيطة حتى يُمرر للعمليات الفرعية
+"""
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from messaging.models import MessageRecipient
+
+
+def prepare_context(username, password, message_limit=50):
+    """
+    تجهيز بيانات السيناريو: الرسائل الواردة للمستخدم ومستقبل للتحويل
+
+    Returns:
+        dict: {'username', 'password', 'message_ids', 'forward_to'}
+
+    Raises:
+        ValueError: إذا لم يوجد المستخدم أو لم تكن لديه رسائل واردة قابلة للتحويل
+    """
+    User = get_user_model()
+    user = User.objects.filter(username=username, is_active=True).first()
+    if user is None:
+        raise ValueError(f'المستخدم {username} غير موجود أو غير نشط')
+
+    message_ids = [
+        str(message_id) for message_id in MessageRecipient.objects.filter(
+            recipient=user, is_deleted=False, message__prevent_forwarding=False
+        ).order_by('-message__created_at').values_list('message__message_id', flat=True)[:message_limit]
+    ]
+    if not message_ids:
+        raise ValueError(f'لا توجد رسائل واردة قابلة للتحويل للمستخدم {username}')
+
+    forward_to = User.objects.filter(is_active=True).exclude(pk=user.pk).values_list('pk', flat=True).first()
+    return {
+        'username': username,
+        'password': password,
+        'message_ids': message_ids,
+        'forward_to': forward_to,
+    }
+
+
+def browse_steps(context, iteration):
+    """تسجيل الدخول ثم صندوق الوارد ثم قراءة رسالة (بدون كتابة رسائل)"""
+    message_id = context['message_ids'][iteration % len(context['message_ids'])]
+    login_url = reverse('accounts:login')
+    yield 'login_page', 'GET', login_url, None
+    yield 'login', 'POST', login_url, {'username': context['username'], 'password': context['password']}
+    yield 'inbox', 'GET', reverse('messaging:inbox'), None
+    yield 'read', 'GET', reverse('messaging:message_detail', args=[message_id]), None
+
+
+def mailbox_steps(context, iteration):
+    """المسار الكامل: الدخول، الوارد، القراءة، الرد، التحويل"""
+    yield from browse_steps(context, iteration)
+    message_id = context['message_ids'][iteration % len(context['message_ids'])]
+    yield 'reply', 'POST', reverse('messaging:reply', args=[message_id]), {
+        'subject': f'قياس الأداء {iteration}',
+        'body': f'رد آلي من اختبار الأداء رقم {iteration}',
+    }
+    if context['forward_to']:
+        yield 'forward', 'POST', reverse('messaging:forward', args=[message_id]), {
+            'recipients': [context['forward_to']],
+            'additional_notes': f'تحويل آلي من اختبار الأداء رقم {iteration}',
+        }
+
+
+SCENARIOS = {
+    'browse': browse_steps,
+    'mailbox': mailbox_steps,
+}
@@ -0,0 +1,75 @@
+"""
+تلخيص عينات القياس: معدل الطلبات في الثانية والمئينات وعدد الاستعلامات لكل طلب
+"""
+import math
+from collections import OrderedDict
+
+
+def percentile(sorted_values, pct):
+    """
+    المئين بطريقة الرتبة الأقرب
+
+    Args:
+        sorted_values (list): قيم مرتبة تصاعدياً
+        pct (float): المئين المطلوب (0-100)
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _summarize_group(samples, elapsed):
+    latencies = sorted(sample['seconds'] for sample in samples)
+    queries = [sample['queries'] for sample in samples if sample['queries'] is not None]
+    return OrderedDict([
+        ('requests', len(samples)),
+        ('errors', sum(1 for sample in samples if not sample['ok'])),
+        ('rps', round(len(samples) / elapsed, 2) if elapsed else 0.0),
+        ('mean_ms', round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0),
+        ('p50_ms', round(percentile(latencies, 50) * 1000, 2)),
+        ('p95_ms', round(percentile(latencies, 95) * 1000, 2)),
+        ('p99_ms', round(percentile(latencies, 99) * 1000, 2)),
+        ('queries_per_request', round(sum(queries) / len(queries), 2) if queries else None),
+    ])
+
+
+def summarize(samples, elapsed):
+    """
+    تلخيص العينات إجمالاً ولكل خطوة
+
+    Args:
+        samples (list): قواميس {'step', 'seconds', 'queries', 'ok'}
+        elapsed (float): الزمن الكلي للتشغيل بالثواني
+
+    Returns:
+        dict: {'totals': {...}, 'steps': {اسم الخطوة: {...}}}
+    """
+    steps = OrderedDict()
+    for sample in samples:
+        steps.setdefault(sample['step'], []).append(sample)
+    return {
+        'totals': _summarize_group(samples, elapsed),
+        'steps': OrderedDict(
+            (name, _summarize_group(step_samples, elapsed)) for name, step_samples in steps.items()
+        ),
+    }
+
+
+def compare(current, baseline):
+    """
+    مقارنة نتيجتين لكل خطوة
+
+    Returns:
+        list: (الخطوة، تغير rps %، تغير p95 %) للخطوات المشتركة
+    """
+    def change(new, old):
+        return round((new - old) / old * 100, 1) if old else None
+
+    rows = []
+    names = ['totals'] + [name for name in current['steps'] if name in baseline['steps']]
+    for name in names:
+        new = current['totals'] if name == 'totals' else current['steps'][name]
+        old = baseline['totals'] if name == 'totals' else baseline['steps'][name]
+        rows.append((name, change(new['rps'], old['rps']), change(new['p95_ms'], old['p95_ms'])))
+    return rows
@@ -0,0 +1,92 @@
+"""
+قياس إنتاجية تخزين المرفقات: التخزين المشفر (messaging.storage) مقارنة بـ FileSystemStorage
+لكل تخزين: سرعة الكتابة والقراءة الكاملة (MB/s) وزمن قراءة نطاقات عشوائية (مثل طلبات Range)
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+from messaging.storage import EncryptedFileSystemStorage
+
+from .stats import percentile
+
+MEGABYTE = 1024 * 1024
+
+
+def _mb_per_second(size, seconds):
+    return round(size / seconds / MEGABYTE, 2) if seconds else 0.0
+
+
+def measure_storage(storage, content, iterations, range_size, ranges):
+    """
+    قياس تخزين واحد
+
+    Args:
+        storage: التخزين المقاس
+        content (bytes): محتوى الملف المكتوب في كل تكرار
+        iterations (int): عدد مرات الكتابة والقراءة
+        range_size (int): حجم النطاق المقروء بالبايت
+        ranges (int): عدد النطاقات العشوائية في كل تكرار
+
+    Returns:
+        OrderedDict: write_mb_s و read_mb_s و range_p50_ms و range_p95_ms
+    """
+    rng = random.Random(0)
+    write_seconds = read_seconds = 0.0
+    range_seconds = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        name = storage.save('benchmark.bin', ContentFile(content))
+        write_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with storage.open(name) as f:
+            for _ in f.chunks():
+                pass
+        read_seconds += time.perf_counter() - started
+
+        with storage.open(name) as f:
+            for _ in range(ranges):
+                start = rng.randrange(max(1, len(content) - range_size))
+                started = time.perf_counter()
+                f.seek(start)
+                f.read(range_size)
+                range_seconds.append(time.perf_counter() - started)
+        storage.delete(name)
+
+    range_seconds.sort()
+    total = len(content) * iterations
+    return OrderedDict([
+        ('write_mb_s', _mb_per_second(total, write_seconds)),
+        ('read_mb_s', _mb_per_second(total, read_seconds)),
+        ('range_p50_ms', round(percentile(range_seconds, 50) * 1000, 3)),
+        ('range_p95_ms', round(percentile(range_seconds, 95) * 1000, 3)),
+    ])
+
+
+def run_storage_benchmark(size, iterations=3, chunk_size=64 * 1024, range_size=64 * 1024, ranges=200):
+    """
+    قياس FileSystemStorage والتخزين المشفر على نفس المحتوى في مجلد مؤقت
+
+    Returns:
+        OrderedDict: {'filesystem': {...}, 'encrypted': {...}}
+    """
+    content = os.urandom(size)
+    location = tempfile.mkdtemp(prefix='storage-benchmark-')
+    try:
+        backends = OrderedDict([
+            ('filesystem', FileSystemStorage(location=os.path.join(location, 'filesystem'))),
+            ('encrypted', EncryptedFileSystemStorage(location=os.path.join(location, 'encrypted'), chunk_size=chunk_size)),
+        ])
+        return OrderedDict(
+            (name, measure_storage(storage, content, iterations, range_size, ranges))
+            for name, storage in backends.items()
+        )
+    finally:
+        shutil.rmtree(location, ignore_errors=True)
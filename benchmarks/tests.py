@@ -0,0 +1,88 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from accounts.models import User
+from myproject import perf_fixtures
+
+from .stats import percentile, summarize
+
+
+class PercentileTests(SimpleTestCase):
+    """المئينات بطريقة الرتبة الأقرب وتلخيص العينات"""
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile(values, 0), 1)
+
+    def test_small_samples(self):
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([1, 2, 3], 50), 2)
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(percentile([1, 2, 3, 4], 51), 3)
+
+    def test_summarize(self):
+        samples = [
+            {'step': 'inbox', 'seconds': seconds, 'queries': 4, 'ok': True} for seconds in (0.01, 0.02, 0.03)
+        ] + [{'step': 'read', 'seconds': 0.5, 'queries': None, 'ok': False}]
+        result = summarize(samples, elapsed=2)
+        self.assertEqual(result['totals']['requests'], 4)
+        self.assertEqual(result['totals']['errors'], 1)
+        self.assertEqual(result['totals']['rps'], 2.0)
+        self.assertEqual(result['steps']['inbox']['p50_ms'], 20.0)
+        self.assertEqual(result['steps']['inbox']['queries_per_request'], 4)
+        self.assertIsNone(result['steps']['read']['queries_per_request'])
+
+
+class RunBenchmarkSeedTests(TestCase):
+    """بيانات القياس الدائمة مقصورة على DEBUG وتُعاد استخدامها في التشغيل التالي"""
+
+    def setUp(self):
+        # سيناريو القياس يوقع الرسائل فتُكتب صور QR
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def _run(self, *args):
+        out = StringIO()
+        call_command(
+            'run_benchmark', '--seed', '--scale', '0.005', '--iterations', '1', '--warmup', '0', *args, stdout=out
+        )
+        return out.getvalue()
+
+    @override_settings(DEBUG=False)
+    def test_persistent_seed_requires_debug(self):
+        with self.assertRaises(CommandError):
+            self._run('--http', 'http://127.0.0.1:1')
+        with self.assertRaises(CommandError):
+            self._run('--keep-data')
+        self.assertFalse(User.objects.exists())
+
+    @override_settings(DEBUG=True)
+    def test_seed_is_reused_with_a_random_password(self):
+        first = self._run('--keep-data')
+        self.assertIn('جاري إنشاء بيانات القياس', first)
+        users = User.objects.count()
+        focus = User.objects.get(username='perf_focus')
+        self.assertFalse(focus.check_password('perf-pass'))
+
+        second = self._run('--keep-data')
+        self.assertIn('موجودة مسبقاً', second)
+        self.assertEqual(User.objects.count(), users)
+        password = second.split('perf_focus: ')[1].split()[0]
+        focus.refresh_from_db()
+        self.assertTrue(focus.check_password(password))
+
+    def test_scale_does_not_leak_into_perf_fixtures(self):
+        scale = perf_fixtures.PERF_TEST_SCALE
+        self._run()
+        self.assertEqual(perf_fixtures.PERF_TEST_SCALE, scale)
+        self.assertEqual(User.objects.filter(username='perf_focus').count(), 0)
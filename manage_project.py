@@ -14,6 +14,7 @@ django.setup()
 from django.contrib.auth import get_user_model
 from accounts.models import Department, Position
 from messaging.models import MessageCategory, Message
+from security.audit_chain import prune_audit_log
 from security.models import AuditLog
 from django.utils import timezone
 from datetime import timedelta
@@ -154,10 +155,8 @@ class ProjectManager:
         
         print(f"🧹 تنظيف البيانات الأقدم من {days} يوم...")
         
-        # حذف السجلات القديمة
-        old_logs = AuditLog.objects.filter(timestamp__lt=cutoff_date)
-        logs_count = old_logs.count()
-        old_logs.delete()
+        # حذف السجلات القديمة بفترات نقاط التحقق الكاملة حتى تبقى سلسلة التدقيق قابلة للتحقق
+        logs_count = prune_audit_log(cutoff_date)
         print(f"🗑️ تم حذف {logs_count} سجل أمان قديم")
         
         # حذف الرسائل المحذوفة نهائياً
@@ -3,7 +3,7 @@ from django.utils.html import format_html
 from django.urls import reverse
 from .models import (
     MessageCategory, Message, MessageRecipient, 
-    MessageAttachment, MessageHistory, DigitalSignature
+    MessageAttachment, MessageHistory, DigitalSignature, MailboxEntry, ColdMessage
 )
 
 
@@ -50,7 +50,7 @@ class MessageAdmin(admin.ModelAdmin):
         'created_at', 'is_encrypted'
     ]
     search_fields = [
-        'sequence_number', 'subject', 'body', 'sender__arabic_name',
+        'sequence_number', 'subject', 'snippet', 'sender__arabic_name',
         'sender__employee_id', 'reference_number', 'account_number'
     ]
     readonly_fields = [
@@ -106,6 +106,25 @@ class MessageRecipientAdmin(admin.ModelAdmin):
     ordering = ['-message__created_at']
 
 
+@admin.register(MailboxEntry)
+class MailboxEntryAdmin(admin.ModelAdmin):
+    list_display = ['message', 'user', 'folder', 'created_at']
+    list_filter = ['folder', 'created_at']
+    search_fields = ['message__sequence_number', 'user__arabic_name', 'user__employee_id']
+    raw_id_fields = ['message', 'user']
+    ordering = ['-created_at']
+
+
+@admin.register(ColdMessage)
+class ColdMessageAdmin(admin.ModelAdmin):
+    list_display = ['sequence_number', 'subject', 'sender', 'created_at', 'frozen_at']
+    list_filter = ['frozen_at']
+    search_fields = ['sequence_number', 'subject', 'sender__arabic_name']
+    readonly_fields = ['original_id', 'message_id', 'sequence_number', 'subject', 'sender', 'created_at', 'frozen_at']
+    exclude = ['payload']
+    ordering = ['-created_at']
+
+
 @admin.register(MessageAttachment)
 class MessageAttachmentAdmin(admin.ModelAdmin):
     list_display = [
@@ -138,12 +157,13 @@ class DigitalSignatureAdmin(admin.ModelAdmin):
         'message__sequence_number', 'message__subject'
     ]
     readonly_fields = [
-        'signature_id', 'hash_value', 'signed_at', 'expires_at',
+        'signature_id', 'hash_value', 'key_id', 'signed_at', 'expires_at',
         'qr_data', 'ip_address', 'user_agent', 'qr_code_preview',
         'verification_link'
     ]
     ordering = ['-signed_at']
     date_hierarchy = 'signed_at'
+    actions = ['revoke_signatures']
     
     fieldsets = (
         ('معلومات التوقيع', {
@@ -153,7 +173,7 @@ class DigitalSignatureAdmin(admin.ModelAdmin):
             'fields': ('verification_status', 'signed_at', 'expires_at')
         }),
         ('البيانات التقنية', {
-            'fields': ('hash_value', 'qr_data', 'signature_data'),
+            'fields': ('hash_value', 'key_id', 'qr_data', 'signature_data'),
             'classes': ['collapse']
         }),
         ('معلومات الشبكة', {
@@ -192,6 +212,15 @@ class DigitalSignatureAdmin(admin.ModelAdmin):
         return "غير متاح"
     verification_link.short_description = "رابط التحقق"
     
+    def revoke_signatures(self, request, queryset):
+        # الحفظ لكل توقيع يحذف نتيجة التحقق المخزنة له
+        revoked = 0
+        for signature in queryset.exclude(verification_status='REVOKED'):
+            signature.revoke()
+            revoked += 1
+        self.message_user(request, f"تم إلغاء {revoked} توقيع")
+    revoke_signatures.short_description = "إلغاء التوقيعات المحددة"
+    
     def has_add_permission(self, request):
         return False  # منع إضافة توقيعات جديدة من لوحة الإدارة
 
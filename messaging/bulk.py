@@ -0,0 +1,150 @@
+"""
+العمليات الجماعية على صندوق البريد
+أرشفة أو حذف أو استعادة أو نقل مجموعة رسائل بعدد ثابت من الاستعلامات: فحص الصلاحية
+باستعلام واحد، التعديل بـ QuerySet.update، وسجل التاريخ بـ bulk_create.
+الأرشفة خاصة بصندوق المستخدم (MailboxEntry) ولا تغير الرسالة لغيره.
+
+النتيجة لكل معرف:
+    'ok'         تم التعديل
+    'unchanged'  الرسالة في الحالة المطلوبة مسبقاً
+    'not_found'  غير موجودة أو لا صلاحية للمستخدم عليها (لا يُفرق بينهما)
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import MailboxEntry, Message, MessageHistory, MessageRecipient
+from .signature_utils import get_client_ip
+from .versions import mailbox_changed
+
+ACTIONS = ('archive', 'delete', 'restore', 'move')
+# المجلدات المتاحة للنقل
+FOLDERS = ('inbox', 'archive')
+
+HISTORY_DETAILS = {
+    'ARCHIVED': 'تم أرشفة الرسالة {sequence_number}',
+    'RESTORED': 'تم استعادة الرسالة {sequence_number}',
+    'DELETED': 'تم حذف الرسالة {sequence_number}',
+}
+
+
+class BulkActionError(Exception):
+    """طلب عملية جماعية غير صالح"""
+
+
+def get_max_messages():
+    return getattr(settings, 'MAILBOX_BULK_MAX_MESSAGES', 500)
+
+
+def apply_bulk_action(user, action, message_ids, folder=None, request=None):
+    """
+    تنفيذ عملية على مجموعة رسائل
+
+    Args:
+        user: المستخدم
+        action: 'archive' أو 'delete' أو 'restore' أو 'move'
+        message_ids: المعرفات الفريدة (UUID) للرسائل
+        folder: المجلد الهدف لعملية النقل ('inbox' أو 'archive')
+        request: الطلب لتسجيل عنوان IP ومعلومات المتصفح
+
+    Returns:
+        dict: {المعرف كنص: النتيجة}
+
+    Raises:
+        BulkActionError: عملية أو مجلد غير معروف، أو عدد رسائل يتجاوز الحد
+    """
+    if action == 'move':
+        if folder not in FOLDERS:
+            raise BulkActionError('مجلد غير معروف')
+        action = 'archive' if folder == 'archive' else 'restore'
+    elif action not in ACTIONS:
+        raise BulkActionError('عملية غير معروفة')
+
+    message_ids = list(dict.fromkeys(message_ids))
+    if not message_ids:
+        raise BulkActionError('لم يتم تحديد رسائل')
+    if len(message_ids) > get_max_messages():
+        raise BulkActionError(f'الحد الأعلى {get_max_messages()} رسالة في العملية الواحدة')
+
+    results = {str(message_id): 'not_found' for message_id in message_ids}
+    own_rows = MessageRecipient.objects.filter(message=OuterRef('pk'), recipient=user)
+    rows = list(
+        Message.objects.filter(message_id__in=message_ids).annotate(
+            is_recipient=Exists(own_rows),
+            is_deleted_for_user=Exists(own_rows.filter(is_deleted=True)),
+            is_archived=Exists(MailboxEntry.objects.filter(
+                user=user, message=OuterRef('pk'), folder='ARCHIVE'
+            )),
+        ).values(
+            'pk', 'message_id', 'sequence_number', 'sender_id', 'status',
+            'is_recipient', 'is_deleted_for_user', 'is_archived',
+        )
+    )
+    rows = [row for row in rows if row['sender_id'] == user.pk or row['is_recipient']]
+    if not rows:
+        return results
+
+    now = timezone.now()
+    changed = []  # (الصف، إجراء التاريخ)
+    with transaction.atomic():
+        if action == 'archive':
+            targets = [row for row in rows if not row['is_archived']]
+            MailboxEntry.objects.bulk_create([
+                MailboxEntry(user=user, message_id=row['pk'], folder='ARCHIVE', created_at=now)
+                for row in targets
+            ], ignore_conflicts=True)
+            changed = [(row, 'ARCHIVED') for row in targets]
+
+        elif action == 'restore':
+            archived = [row for row in rows if row['is_archived']]
+            MailboxEntry.objects.filter(
+                user=user, message_id__in=[row['pk'] for row in archived], folder='ARCHIVE'
+            ).delete()
+            deleted = [row for row in rows if row['is_deleted_for_user']]
+            MessageRecipient.objects.filter(
+                message_id__in=[row['pk'] for row in deleted], recipient=user
+            ).update(is_deleted=False, deleted_at=None)
+            changed = [(row, 'RESTORED') for row in {row['pk']: row for row in archived + deleted}.values()]
+
+        else:
+            sent = [row for row in rows if row['sender_id'] == user.pk and row['status'] != 'DELETED']
+            Message.objects.filter(pk__in=[row['pk'] for row in sent]).update(status='DELETED')
+            received = [
+                row for row in rows
+                if row['sender_id'] != user.pk and row['is_recipient'] and not row['is_deleted_for_user']
+            ]
+            MessageRecipient.objects.filter(
+                message_id__in=[row['pk'] for row in received], recipient=user
+            ).update(is_deleted=True, deleted_at=now)
+            changed = [(row, 'DELETED') for row in sent + received]
+
+        if changed:
+            ip_address = get_client_ip(request) if request is not None else None
+            user_agent = request.META.get('HTTP_USER_AGENT', '')[:500] if request is not None else ''
+            MessageHistory.objects.bulk_create([
+                MessageHistory(
+                    message_id=row['pk'],
+                    action=history_action,
+                    performed_by=user,
+                    details=HISTORY_DETAILS[history_action].format(sequence_number=row['sequence_number']),
+                    ip_address=ip_address,
+                    user_agent=user_agent,
+                )
+                for row, history_action in changed
+            ])
+
+    for row in rows:
+        results[str(row['message_id'])] = 'unchanged'
+    for row, _ in changed:
+        results[str(row['message_id'])] = 'ok'
+
+    if changed:
+        user_ids = {user.pk}
+        if action == 'delete':
+            # حذف المرسل يغير حالة الرسالة المشتركة الظاهرة في صناديق مستقبليها
+            user_ids.update(MessageRecipient.objects.filter(
+                message_id__in=[row['pk'] for row, _ in changed if row['sender_id'] == user.pk]
+            ).values_list('recipient_id', flat=True))
+        mailbox_changed(user_ids, [row['message_id'] for row, _ in changed])
+    return results
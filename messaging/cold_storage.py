@@ -0,0 +1,202 @@
+"""
+طبقة الأرشيف البارد للرسائل القديمة
+تنقل الرسائل الأقدم من MESSAGE_COLD_STORAGE_DAYS يوماً مع كل ما يتبعها إلى جدول ColdMessage
+(بيانات JSON مضغوطة) حتى تبقى جداول الرسائل وفهارسها بحجم البريد النشط فقط.
+الرسالة المنقولة تظهر في صفحة الأرشيف وتُستعاد تلقائياً إلى الجداول النشطة عند فتحها،
+أو يدوياً بالأمر rehydrate_messages.
+
+لا تُنقل المسودات ولا الرسائل التي لها موعد حذف تلقائي أو انتهاء صلاحية قادم (يتولاها
+محرك الاحتفاظ)، ولا الرسائل التي لها ردود أو تحويلات في الجداول النشطة حتى لا تنكسر
+العلاقة؛ الردود أحدث من أصولها فتُنقل قبلها ثم تلحقها الأصول في الدورات التالية.
+"""
+import json
+import logging
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import ColdMessage, ColdMessageParticipant, Message, MessageRecipient
+from .retention import MESSAGE_RELATED_MODELS, delete_message_rows
+from .versions import mailbox_changed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+
+
+def get_cold_storage_age():
+    """عمر الرسالة الذي تنقل بعده إلى الأرشيف البارد"""
+    return timedelta(days=getattr(settings, 'MESSAGE_COLD_STORAGE_DAYS', 365))
+
+
+class _PayloadEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder يقتطع أجزاء الثانية إلى ميلي ثانية، والاستعادة يجب أن تعيد القيم كما هي"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _pack(objects):
+    data = serializers.serialize('python', objects)
+    body_field = Message._meta.get_field('body')
+    for obj, item in zip(objects, data):
+        if isinstance(obj, Message):
+            # النص يُنقل مشفراً كما هو في قاعدة البيانات
+            item['fields']['body'] = body_field.stored_value(obj)
+    return zlib.compress(json.dumps(data, cls=_PayloadEncoder, ensure_ascii=False).encode())
+
+
+def _unpack(payload):
+    return list(serializers.deserialize('python', json.loads(zlib.decompress(bytes(payload)))))
+
+
+def freeze_old_messages(now=None, batch_size=DEFAULT_BATCH_SIZE, age=None):
+    """
+    نقل دفعة من الرسائل القديمة إلى الأرشيف البارد
+
+    Args:
+        now: الوقت المرجعي
+        batch_size: عدد الرسائل في الدفعة
+        age: عمر الرسالة المنقولة (افتراضياً MESSAGE_COLD_STORAGE_DAYS)
+
+    Returns:
+        int: عدد الرسائل المنقولة
+    """
+    now = now or timezone.now()
+    cutoff = now - (age if age is not None else get_cold_storage_age())
+    children = Message.objects.filter(Q(reply_to=OuterRef('pk')) | Q(forwarded_from=OuterRef('pk')))
+    with transaction.atomic():
+        messages = list(
+            Message.objects.select_for_update(skip_locked=True).filter(
+                created_at__lt=cutoff, auto_delete_at__isnull=True
+            ).exclude(status='DRAFT').exclude(expires_at__gt=now).exclude(
+                Exists(children)
+            ).order_by('created_at')[:batch_size]
+        )
+        if not messages:
+            return 0
+
+        message_pks = [message.pk for message in messages]
+        related = defaultdict(list)
+        for model in MESSAGE_RELATED_MODELS:
+            for obj in model.objects.filter(message_id__in=message_pks).order_by('pk'):
+                related[obj.message_id].append(obj)
+
+        cold_messages = ColdMessage.objects.bulk_create([
+            ColdMessage(
+                original_id=message.pk,
+                message_id=message.message_id,
+                sequence_number=message.sequence_number,
+                subject=message.subject,
+                sender_id=message.sender_id,
+                created_at=message.created_at,
+                frozen_at=now,
+                payload=_pack([message, *related[message.pk]]),
+            )
+            for message in messages
+        ])
+
+        participants = []
+        user_ids = set()
+        for message, cold_message in zip(messages, cold_messages):
+            parties = {message.sender_id: (True, message.status == 'DELETED')}
+            for obj in related[message.pk]:
+                if isinstance(obj, MessageRecipient) and obj.recipient_id not in parties:
+                    parties[obj.recipient_id] = (False, obj.is_deleted)
+            participants.extend(
+                ColdMessageParticipant(
+                    cold_message=cold_message, user_id=user_id, is_sender=is_sender,
+                    is_deleted=is_deleted, created_at=message.created_at,
+                )
+                for user_id, (is_sender, is_deleted) in parties.items()
+            )
+            user_ids.update(parties)
+        ColdMessageParticipant.objects.bulk_create(participants)
+
+        delete_message_rows(message_pks)
+
+    mailbox_changed(user_ids, [message.message_id for message in messages])
+    return len(messages)
+
+
+def rehydrate(cold_messages):
+    """
+    استعادة رسائل من الأرشيف البارد إلى الجداول النشطة كما كانت (نفس المعرفات والتواريخ)
+    أصول الردود والتحويلات المنقولة تُستعاد قبلها.
+
+    Args:
+        cold_messages: سجلات ColdMessage أو QuerySet منها
+
+    Returns:
+        int: عدد الرسائل المستعادة (مع الأصول)
+    """
+    restored = set()
+    with transaction.atomic():
+        for cold_message in cold_messages:
+            _rehydrate_one(cold_message, restored)
+    return len(restored)
+
+
+def _rehydrate_one(cold_message, restored):
+    if cold_message.original_id in restored:
+        return
+    objects = _unpack(cold_message.payload)
+    message = objects[0].object
+    parent_ids = {message.reply_to_id, message.forwarded_from_id} - {None} - restored
+    if parent_ids:
+        for parent in ColdMessage.objects.filter(original_id__in=parent_ids):
+            _rehydrate_one(parent, restored)
+    if not message.thread_id:
+        # رسالة نُقلت قبل إضافة المحادثات
+        message.assign_thread(message.created_at)
+    # الحفظ الخام يحتفظ بالقيم كما هي (auto_now_add وغيرها)
+    for obj in objects:
+        obj.save()
+    cold_message.delete()
+    restored.add(cold_message.original_id)
+
+
+def rehydrate_message(user, message_id):
+    """
+    استعادة رسالة من الأرشيف البارد عند فتحها من أحد أطرافها
+
+    Returns:
+        bool: هل وُجدت الرسالة واستُعيدت
+    """
+    cold_message = ColdMessage.objects.filter(
+        message_id=message_id, participants__user=user, participants__is_deleted=False
+    ).first()
+    if cold_message is None:
+        return False
+    rehydrate([cold_message])
+    logger.info('استعادة الرسالة %s من الأرشيف البارد عند فتحها', cold_message.sequence_number)
+    return True
+
+
+def process_cold_storage(now=None, batch_size=DEFAULT_BATCH_SIZE, max_batches=20, age=None):
+    """
+    دورة واحدة لنقل الرسائل القديمة: دفعات متتالية حتى تنتهي أو يبلغ الحد الأقصى
+
+    Returns:
+        int: عدد الرسائل المنقولة
+    """
+    now = now or timezone.now()
+    frozen = 0
+    for _ in range(max_batches):
+        processed = freeze_old_messages(now=now, batch_size=batch_size, age=age)
+        frozen += processed
+        # دفعة ناقصة قد تترك أصول الردود التي نُقلت فيها، فيُكمل حتى دفعة فارغة
+        if not processed:
+            break
+    if frozen:
+        logger.info('الأرشيف البارد: نقل %d رسالة', frozen)
+    return frozen
@@ -0,0 +1,422 @@
+"""
+تشفير نصوص الرسائل ومرفقاتها (تشفير المغلف)
+كل رسالة أو مرفق له مفتاح بيانات عشوائي (AES-256-GCM) يُخزن مغلفاً بالمفتاح الرئيسي الحالي
+(MESSAGE_ENCRYPTION_KEYS / MESSAGE_ENCRYPTION_KEY_ID) مع معرفه، فتدوير المفتاح الرئيسي يعيد تغليف
+مفاتيح البيانات فقط دون إعادة تشفير المحتوى (messaging.key_rotation).
+مفتاح الرسالة في سجلها، ومفتاح المرفق في ترويسة ملفه (messaging.storage).
+
+كائنات المفاتيح (Fernet للمفاتيح الرئيسية و AESGCM لمفاتيح البيانات المفكوكة) تُخزن في ذاكرة العملية،
+ونص الرسالة لا يُفك إلا عند قراءته فعلاً، وصفحات القوائم تعرض المقتطف (Message.snippet) فقط.
+"""
+import base64
+import hashlib
+import os
+import struct
+import threading
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import File
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+# معرف المفتاح الرئيسي المشتق من SECRET_KEY عند عدم ضبط MESSAGE_ENCRYPTION_KEYS
+DEFAULT_KEY_ID = 'default'
+
+# بادئة النصوص المشفرة في قاعدة البيانات (النصوص دونها رسائل سابقة للتشفير)
+TEXT_PREFIX = 'enc:v1:'
+
+# صيغة الملفات المشفرة: ترويسة (المعرف، حجم الجزء، بادئة nonce، طولا معرف المفتاح الرئيسي ومفتاح
+# البيانات المغلف يليانها) ثم أجزاء AES-GCM بحجم ثابت، فالجزء i يبدأ عند data_offset + i * (حجم الجزء + 16)
+STREAM_MAGIC = b'MCE2'
+STREAM_HEADER = struct.Struct('>4sI8sHH')
+DEFAULT_CHUNK_SIZE = 64 * 1024
+TAG_SIZE = 16
+
+
+class DecryptionError(Exception):
+    """المحتوى المشفر تالف أو مفتاحه غير متاح"""
+
+
+def get_master_keys():
+    """
+    المفاتيح الرئيسية المعروفة
+
+    Returns:
+        dict: {معرف المفتاح: مفتاح Fernet}
+    """
+    keys = {}
+    for entry in getattr(settings, 'MESSAGE_ENCRYPTION_KEYS', None) or []:
+        key_id, sep, secret = entry.partition(':')
+        if not sep or not key_id.strip() or not secret:
+            raise ImproperlyConfigured('MESSAGE_ENCRYPTION_KEYS يجب أن تكون بالصيغة key_id:fernet_key')
+        keys[key_id.strip()] = secret.strip().encode()
+    if not keys:
+        keys[DEFAULT_KEY_ID] = base64.urlsafe_b64encode(
+            hashlib.sha256(f'messaging.encryption:{settings.SECRET_KEY}'.encode()).digest()
+        )
+    return keys
+
+
+def get_current_key_id():
+    """معرف المفتاح الرئيسي المستخدم لتغليف مفاتيح البيانات الجديدة"""
+    keys = get_master_keys()
+    key_id = getattr(settings, 'MESSAGE_ENCRYPTION_KEY_ID', '') or next(iter(keys))
+    if key_id not in keys:
+        raise ImproperlyConfigured(f'مفتاح التشفير {key_id} غير موجود في MESSAGE_ENCRYPTION_KEYS')
+    return key_id
+
+
+@lru_cache(maxsize=16)
+def _master(secret):
+    return Fernet(secret)
+
+
+def _master_for(key_id):
+    secret = get_master_keys().get(key_id)
+    if secret is None:
+        raise DecryptionError(f'مفتاح التشفير {key_id} غير موجود')
+    return _master(secret)
+
+
+# مفاتيح البيانات المفكوكة في ذاكرة العملية: (المفتاح المغلف، المفتاح الرئيسي) -> AESGCM
+DATA_KEY_CACHE_SIZE = 4096
+_data_keys = OrderedDict()
+_data_keys_lock = threading.Lock()
+
+
+def _remember_data_key(cache_key, aesgcm):
+    with _data_keys_lock:
+        _data_keys[cache_key] = aesgcm
+        _data_keys.move_to_end(cache_key)
+        while len(_data_keys) > DATA_KEY_CACHE_SIZE:
+            _data_keys.popitem(last=False)
+    return aesgcm
+
+
+def new_data_key():
+    """
+    إنشاء مفتاح بيانات جديد مغلفاً بالمفتاح الرئيسي الحالي
+    (يُحفظ مفكوكاً في ذاكرة العملية فلا يُفك تغليفه عند التشفير مباشرة بعد إنشائه)
+
+    Returns:
+        tuple: (المفتاح المغلف، معرف المفتاح الرئيسي)
+    """
+    key_id = get_current_key_id()
+    secret = get_master_keys()[key_id]
+    raw = AESGCM.generate_key(bit_length=256)
+    wrapped = _master(secret).encrypt(raw).decode()
+    _remember_data_key((wrapped, secret), AESGCM(raw))
+    return wrapped, key_id
+
+
+def data_key(wrapped_key, key_id):
+    """مفتاح البيانات المفكوك (AESGCM) من ذاكرة العملية"""
+    secret = get_master_keys().get(key_id)
+    if secret is None:
+        raise DecryptionError(f'مفتاح التشفير {key_id} غير موجود')
+    cache_key = (wrapped_key, secret)
+    with _data_keys_lock:
+        aesgcm = _data_keys.get(cache_key)
+        if aesgcm is not None:
+            _data_keys.move_to_end(cache_key)
+            return aesgcm
+    try:
+        raw = _master(secret).decrypt(wrapped_key.encode())
+    except Exception as exc:
+        raise DecryptionError('تعذر فك مفتاح البيانات') from exc
+    return _remember_data_key(cache_key, AESGCM(raw))
+
+
+def rewrap_data_key(wrapped_key, key_id):
+    """
+    إعادة تغليف مفتاح بيانات بالمفتاح الرئيسي الحالي (تدوير المفاتيح)
+
+    Returns:
+        tuple: (المفتاح المغلف الجديد، معرف المفتاح الرئيسي الحالي)
+    """
+    current = get_current_key_id()
+    raw = _master_for(key_id).decrypt(wrapped_key.encode())
+    return _master_for(current).encrypt(raw).decode(), current
+
+
+def encrypt_text(text, wrapped_key, key_id):
+    nonce = os.urandom(12)
+    ciphertext = data_key(wrapped_key, key_id).encrypt(nonce, text.encode(), None)
+    return TEXT_PREFIX + base64.b64encode(nonce + ciphertext).decode()
+
+
+def decrypt_text(value, wrapped_key, key_id):
+    raw = base64.b64decode(value[len(TEXT_PREFIX):])
+    try:
+        return data_key(wrapped_key, key_id).decrypt(raw[:12], raw[12:], None).decode()
+    except InvalidTag as exc:
+        raise DecryptionError('النص المشفر تالف') from exc
+
+
+class EncryptedText(str):
+    """نص مشفر كما قُرئ من قاعدة البيانات (لم يُفك بعد)"""
+
+
+class DecryptedText(str):
+    """نص مفكوك يحتفظ بقيمته المشفرة، فإعادة حفظه دون تعديل لا تعيد تشفيره"""
+
+    def __new__(cls, text, ciphertext):
+        obj = super().__new__(cls, text)
+        obj.ciphertext = ciphertext
+        return obj
+
+
+class EncryptedTextDescriptor(DeferredAttribute):
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, EncryptedText):
+            field = self.field
+            value = DecryptedText(
+                decrypt_text(value, getattr(instance, field.key_field), getattr(instance, field.key_id_field)),
+                str(value),
+            )
+            instance.__dict__[field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        # واصف بيانات حتى لا تحجبه القيمة المخزنة في __dict__ فيُستدعى __get__ عند كل قراءة
+        instance.__dict__[self.field.attname] = value
+
+
+class EncryptedTextField(models.TextField):
+    """
+    حقل نص مشفر بمفتاح بيانات خاص بالسجل
+    مفتاح البيانات المغلف ومعرف المفتاح الرئيسي في الحقلين key_field و key_id_field (ويجب تعريفهما
+    بعد هذا الحقل حتى يُحفظا بعد إنشاء المفتاح في pre_save، ومنه bulk_create). النص يُفك عند أول قراءة.
+    إذا حُدد snippet_field يُحدّث بـ instance.build_snippet(النص) عند كل تشفير.
+
+    التحديث المباشر (update و bulk_update) بنص جديد يخزنه دون تشفير حتى يُعاد حفظه أو تشفره مهمة التدوير.
+    """
+    descriptor_class = EncryptedTextDescriptor
+
+    def __init__(self, *args, key_field, key_id_field, snippet_field=None, **kwargs):
+        self.key_field = key_field
+        self.key_id_field = key_id_field
+        self.snippet_field = snippet_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['key_field'] = self.key_field
+        kwargs['key_id_field'] = self.key_id_field
+        if self.snippet_field:
+            kwargs['snippet_field'] = self.snippet_field
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, str) and value.startswith(TEXT_PREFIX):
+            return EncryptedText(value)
+        return value
+
+    def to_python(self, value):
+        # القيم المشفرة في البيانات المتسلسلة (الأرشيف البارد) تبقى مشفرة
+        if isinstance(value, str) and not isinstance(value, DecryptedText) and value.startswith(TEXT_PREFIX):
+            return EncryptedText(value)
+        return super().to_python(value)
+
+    def get_prep_value(self, value):
+        if isinstance(value, DecryptedText):
+            return value.ciphertext
+        return super().get_prep_value(value)
+
+    def stored_value(self, instance):
+        """القيمة كما تُخزن في قاعدة البيانات (دون فك النص)"""
+        value = instance.__dict__.get(self.attname)
+        if isinstance(value, DecryptedText):
+            return value.ciphertext
+        return value
+
+    def pre_save(self, model_instance, add):
+        value = model_instance.__dict__.get(self.attname)
+        if value is None or isinstance(value, (EncryptedText, DecryptedText)):
+            return self.stored_value(model_instance)
+        if not getattr(model_instance, self.key_field):
+            wrapped, key_id = new_data_key()
+            setattr(model_instance, self.key_field, wrapped)
+            setattr(model_instance, self.key_id_field, key_id)
+        ciphertext = encrypt_text(
+            value, getattr(model_instance, self.key_field), getattr(model_instance, self.key_id_field)
+        )
+        if self.snippet_field:
+            setattr(model_instance, self.snippet_field, model_instance.build_snippet(value))
+        model_instance.__dict__[self.attname] = DecryptedText(value, ciphertext)
+        return ciphertext
+
+
+def _stream_nonce(prefix, index, final):
+    return prefix + struct.pack('>I', index), struct.pack('>I?', index, final)
+
+
+def _rechunk(chunks, size):
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer.extend(chunk)
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    yield bytes(buffer)
+
+
+StreamHeader = namedtuple('StreamHeader', 'chunk_size prefix key_id wrapped_key data_offset')
+
+
+def pack_stream_header(chunk_size, prefix, wrapped_key, key_id):
+    key_id, wrapped_key = key_id.encode(), wrapped_key.encode()
+    return STREAM_HEADER.pack(STREAM_MAGIC, chunk_size, prefix, len(key_id), len(wrapped_key)) + key_id + wrapped_key
+
+
+def read_stream_header(stream):
+    """
+    قراءة ترويسة ملف مشفر من بدايته
+
+    Returns:
+        StreamHeader: الترويسة، أو None إذا لم يكن الملف مشفراً (ملفات سابقة للتشفير)
+    """
+    fixed = stream.read(STREAM_HEADER.size)
+    if len(fixed) < STREAM_HEADER.size:
+        return None
+    magic, chunk_size, prefix, key_id_length, key_length = STREAM_HEADER.unpack(fixed)
+    if magic != STREAM_MAGIC:
+        return None
+    key_id = stream.read(key_id_length).decode()
+    wrapped_key = stream.read(key_length).decode()
+    return StreamHeader(chunk_size, prefix, key_id, wrapped_key, STREAM_HEADER.size + key_id_length + key_length)
+
+
+def stream_frame_count(header, encrypted_size):
+    # الجزء الأخير أقصر دائماً من الجزء الكامل (وقد يكون علامة فقط)، فغيره يعني ملفاً مقتطعاً
+    frames, last = divmod(encrypted_size - header.data_offset, header.chunk_size + TAG_SIZE)
+    if last < TAG_SIZE:
+        raise DecryptionError('الملف المشفر مقتطع')
+    return frames + 1
+
+
+def plaintext_size(header, encrypted_size):
+    """حجم المحتوى الأصلي لملف مشفر من حجمه المخزن دون فك أي جزء"""
+    return encrypted_size - header.data_offset - stream_frame_count(header, encrypted_size) * TAG_SIZE
+
+
+def encrypt_chunks(chunks, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    تشفير محتوى متدفق بمفتاح بيانات جديد في أجزاء AES-GCM بحجم ثابت (كل جزء موثق برقمه وبعلامة
+    الجزء الأخير، فإعادة ترتيب الأجزاء أو اقتطاع الملف يُكتشف عند الفك)
+
+    Args:
+        chunks: أجزاء المحتوى الأصلي (bytes) بأي حجم
+
+    Yields:
+        bytes: الترويسة (ومعها مفتاح البيانات المغلف) ثم الأجزاء المشفرة
+    """
+    wrapped_key, key_id = new_data_key()
+    aesgcm = data_key(wrapped_key, key_id)
+    prefix = os.urandom(8)
+    yield pack_stream_header(chunk_size, prefix, wrapped_key, key_id)
+    pending = None
+    index = 0
+    for chunk in _rechunk(chunks, chunk_size):
+        if pending is not None:
+            nonce, aad = _stream_nonce(prefix, index, False)
+            yield aesgcm.encrypt(nonce, pending, aad)
+            index += 1
+        pending = chunk
+    nonce, aad = _stream_nonce(prefix, index, True)
+    yield aesgcm.encrypt(nonce, pending, aad)
+
+
+def rewrap_stream(stream, header, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    نسخة من ملف مشفر بمفتاح بيانات معاد تغليفه بالمفتاح الرئيسي الحالي
+    (الأجزاء المشفرة تُنسخ كما هي دون فكها)
+
+    Yields:
+        bytes: الترويسة الجديدة ثم أجزاء الملف
+    """
+    wrapped_key, key_id = rewrap_data_key(header.wrapped_key, header.key_id)
+    yield pack_stream_header(header.chunk_size, header.prefix, wrapped_key, key_id)
+    stream.seek(header.data_offset)
+    yield from iter(lambda: stream.read(chunk_size), b'')
+
+
+class EncryptingFile(File):
+    """ملف يُشفر أثناء حفظه في التخزين (Storage.save يقرأ chunks) دون تحميله كاملاً في الذاكرة"""
+
+    def __init__(self, file, chunk_size=DEFAULT_CHUNK_SIZE):
+        super().__init__(file, name=getattr(file, 'name', None))
+        self.chunk_size = chunk_size
+
+    def chunks(self, chunk_size=None):
+        self.file.seek(0)
+        source = iter(lambda: self.file.read(self.chunk_size), b'')
+        return encrypt_chunks(source, self.chunk_size)
+
+    def __iter__(self):
+        return iter(self.chunks())
+
+
+class DecryptingFile(File):
+    """
+    ملف مشفر مفتوح للقراءة بمحتواه الأصلي
+    القراءة من أي موضع (seek) تفك الأجزاء التي تغطيها فقط، فطلبات Range لا تفك الملف كاملاً.
+    """
+
+    def __init__(self, file, header, encrypted_size, name=None):
+        super().__init__(file, name)
+        self.header = header
+        self.size = plaintext_size(header, encrypted_size)
+        self._last_index = stream_frame_count(header, encrypted_size) - 1
+        self._aesgcm = data_key(header.wrapped_key, header.key_id)
+        self._position = 0
+        self._frame = (None, b'')
+
+    def _decrypt_frame(self, index):
+        if self._frame[0] != index:
+            frame_size = self.header.chunk_size + TAG_SIZE
+            self.file.seek(self.header.data_offset + index * frame_size)
+            nonce, aad = _stream_nonce(self.header.prefix, index, index == self._last_index)
+            try:
+                self._frame = (index, self._aesgcm.decrypt(nonce, self.file.read(frame_size), aad))
+            except InvalidTag as exc:
+                raise DecryptionError(f'الجزء {index} من الملف المشفر تالف') from exc
+        return self._frame[1]
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.size, self._position + size)
+        parts = []
+        while self._position < end:
+            index, offset = divmod(self._position, self.header.chunk_size)
+            part = self._decrypt_frame(index)[offset:offset + end - self._position]
+            parts.append(part)
+            self._position += len(part)
+        return b''.join(parts)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._position, os.SEEK_END: self.size}[whence]
+        if base + offset < 0:
+            raise ValueError('موضع سالب')
+        self._position = base + offset
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def seekable(self):
+        return True
+
+    def open(self, mode=None):
+        if self.closed:
+            self.file = open(self.file.name, 'rb')
+        self.seek(0)
+        return self
@@ -0,0 +1,164 @@
+"""
+مهمة تدوير مفاتيح التشفير في الخلفية
+- مفاتيح البيانات المغلفة بمفتاح رئيسي غير الحالي يُعاد تغليفها بالحالي (دون إعادة تشفير المحتوى)،
+  ومفاتيح المرفقات في ترويسات ملفاتها فتُنسخ أجزاؤها المشفرة إلى ملف جديد بترويسة جديدة.
+- نصوص الرسائل والمرفقات السابقة للتشفير تُشفر بمفاتيح بيانات جديدة.
+بعد أن تنتهي المهمة من كل السجلات يمكن حذف المفتاح الرئيسي القديم من MESSAGE_ENCRYPTION_KEYS.
+"""
+import logging
+
+from django.db import transaction
+
+from .encryption import DecryptedText, encrypt_text, get_current_key_id, new_data_key, rewrap_data_key
+from .models import Message, MessageAttachment
+from .retention import delete_stored_files
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+# الملفات تُقرأ وتُكتب كاملة فدفعاتها أصغر
+ATTACHMENT_BATCH_SIZE = 20
+
+
+def rewrap_keys(model, key_field, key_id_field, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    إعادة تغليف دفعة من مفاتيح البيانات بالمفتاح الرئيسي الحالي
+
+    Returns:
+        int: عدد المفاتيح المعاد تغليفها
+    """
+    current = get_current_key_id()
+    with transaction.atomic():
+        rows = list(
+            model.objects.select_for_update(skip_locked=True).exclude(**{key_field: ''}).exclude(
+                **{key_id_field: current}
+            ).only('pk', key_field, key_id_field).order_by('pk')[:batch_size]
+        )
+        for row in rows:
+            wrapped, key_id = rewrap_data_key(getattr(row, key_field), getattr(row, key_id_field))
+            setattr(row, key_field, wrapped)
+            setattr(row, key_id_field, key_id)
+        model.objects.bulk_update(rows, [key_field, key_id_field])
+    return len(rows)
+
+
+def encrypt_plaintext_messages(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    تشفير دفعة من نصوص الرسائل المخزنة دون تشفير
+
+    Returns:
+        int: عدد الرسائل المشفرة
+    """
+    with transaction.atomic():
+        messages = list(
+            Message.objects.select_for_update(skip_locked=True).filter(body_key='').only(
+                'pk', 'body', 'confidentiality'
+            ).order_by('pk')[:batch_size]
+        )
+        for message in messages:
+            body = message.body
+            message.body_key, message.body_key_id = new_data_key()
+            message.body = DecryptedText(body, encrypt_text(body, message.body_key, message.body_key_id))
+            message.snippet = message.build_snippet(body)
+            message.is_encrypted = True
+        Message.objects.bulk_update(messages, ['body', 'body_key', 'body_key_id', 'snippet', 'is_encrypted'])
+    return len(messages)
+
+
+def rewrap_attachments(batch_size=ATTACHMENT_BATCH_SIZE):
+    """
+    إعادة تغليف مفاتيح دفعة من ملفات المرفقات بالمفتاح الرئيسي الحالي
+    الملف المعاد تغليفه يُكتب باسم جديد، والملف القديم يُحذف بعد نجاح المعاملة.
+
+    Returns:
+        int: عدد المرفقات المعاد تغليفها
+    """
+    current = get_current_key_id()
+    storage = MessageAttachment._meta.get_field('file').storage
+    rewrapped = 0
+    with transaction.atomic():
+        attachments = list(
+            MessageAttachment.objects.select_for_update(skip_locked=True).filter(is_encrypted=True).exclude(
+                encryption_key_id=current
+            ).exclude(file='').only('pk', 'file').order_by('pk')[:batch_size]
+        )
+        old_files = []
+        for attachment in attachments:
+            name = attachment.file.name
+            try:
+                new_name = storage.rewrap(name)
+            except OSError:
+                logger.warning('تعذر إعادة تغليف مفتاح المرفق %s', name, exc_info=True)
+                continue
+            MessageAttachment.objects.filter(pk=attachment.pk).update(
+                file=new_name or name, encryption_key_id=current
+            )
+            if new_name:
+                old_files.append((storage, name))
+            rewrapped += 1
+        transaction.on_commit(lambda: delete_stored_files(old_files))
+    return rewrapped
+
+
+def encrypt_plaintext_attachments(batch_size=ATTACHMENT_BATCH_SIZE):
+    """
+    تشفير دفعة من ملفات المرفقات المخزنة دون تشفير
+    الملف المشفر يُكتب باسم جديد، والملف الأصلي يُحذف بعد نجاح المعاملة.
+
+    Returns:
+        int: عدد المرفقات المشفرة
+    """
+    storage = MessageAttachment._meta.get_field('file').storage
+    current = get_current_key_id()
+    encrypted = 0
+    with transaction.atomic():
+        attachments = list(
+            MessageAttachment.objects.select_for_update(skip_locked=True).filter(
+                is_encrypted=False
+            ).exclude(file='').only('pk', 'file').order_by('pk')[:batch_size]
+        )
+        old_files = []
+        for attachment in attachments:
+            name = attachment.file.name
+            try:
+                with storage.open(name, 'rb') as source:
+                    new_name = storage.save(name, source)
+            except OSError:
+                logger.warning('تعذر تشفير ملف المرفق %s', name, exc_info=True)
+                continue
+            MessageAttachment.objects.filter(pk=attachment.pk).update(
+                file=new_name, encryption_key_id=current, is_encrypted=True
+            )
+            old_files.append((storage, name))
+            encrypted += 1
+        transaction.on_commit(lambda: delete_stored_files(old_files))
+    return encrypted
+
+
+def process_key_rotation(batch_size=DEFAULT_BATCH_SIZE, max_batches=20):
+    """
+    دورة واحدة لمهمة التدوير: دفعات متتالية حتى تنتهي السجلات أو يبلغ الحد الأقصى
+
+    Returns:
+        dict: {'rewrapped': int, 'messages': int, 'attachments': int}
+    """
+    stats = {'rewrapped': 0, 'messages': 0, 'attachments': 0}
+    handlers = (
+        (lambda: rewrap_keys(Message, 'body_key', 'body_key_id', batch_size), 'rewrapped', batch_size),
+        (rewrap_attachments, 'rewrapped', ATTACHMENT_BATCH_SIZE),
+        (lambda: encrypt_plaintext_messages(batch_size), 'messages', batch_size),
+        (encrypt_plaintext_attachments, 'attachments', ATTACHMENT_BATCH_SIZE),
+    )
+    for handler, key, size in handlers:
+        for _ in range(max_batches):
+            processed = handler()
+            stats[key] += processed
+            if processed < size:
+                break
+    if any(stats.values()):
+        logger.info(
+            'تدوير مفاتيح التشفير: إعادة تغليف %(rewrapped)d مفتاح وتشفير %(messages)d رسالة و %(attachments)d مرفق',
+            stats,
+        )
+    return stats
@@ -0,0 +1,42 @@
+"""
+أمر Django لنقل الرسائل القديمة إلى الأرشيف البارد
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from messaging.cold_storage import DEFAULT_BATCH_SIZE, process_cold_storage
+
+
+class Command(BaseCommand):
+    help = 'نقل الرسائل الأقدم من MESSAGE_COLD_STORAGE_DAYS إلى الأرشيف البارد'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            help='عمر الرسائل المنقولة بالأيام (افتراضياً MESSAGE_COLD_STORAGE_DAYS)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'عدد الرسائل في كل دفعة (افتراضي: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=20,
+            help='الحد الأقصى للدفعات (افتراضي: 20)'
+        )
+
+    def handle(self, *args, **options):
+        age = None
+        if options['older_than_days'] is not None:
+            age = timedelta(days=options['older_than_days'])
+        frozen = process_cold_storage(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            age=age,
+        )
+        self.stdout.write(f'تم نقل {frozen} رسالة إلى الأرشيف البارد')
@@ -0,0 +1,51 @@
+"""
+أمر Django لتنفيذ مواعيد الاحتفاظ: انتهاء الرسائل وحذفها التلقائي وانتهاء التوقيعات
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from messaging.retention import DEFAULT_BATCH_SIZE, process_retention
+
+
+class Command(BaseCommand):
+    help = 'تنفيذ مواعيد الاحتفاظ بالرسائل (انتهاء الصلاحية والحذف التلقائي وانتهاء التوقيعات)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='التشغيل المستمر بدلاً من دورة واحدة'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=300,
+            help='الفاصل بين الدورات بالثواني عند التشغيل المستمر (افتراضي: 300)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'عدد العناصر في كل دفعة (افتراضي: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=20,
+            help='الحد الأقصى للدفعات في كل دورة (افتراضي: 20)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = process_retention(
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+            )
+            self.stdout.write(
+                f'تم إنهاء {stats["expired"]} رسالة وحذف {stats["purged"]} رسالة '
+                f'وإنهاء {stats["signatures"]} توقيع'
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
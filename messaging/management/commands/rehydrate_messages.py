@@ -0,0 +1,42 @@
+"""
+أمر Django لاستعادة رسائل من الأرشيف البارد إلى الجداول النشطة
+"""
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from messaging.cold_storage import rehydrate
+from messaging.models import ColdMessage
+
+
+class Command(BaseCommand):
+    help = 'استعادة رسائل من الأرشيف البارد بالرقم التسلسلي أو المعرف الفريد أو المستخدم'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'messages',
+            nargs='*',
+            help='الأرقام التسلسلية أو المعرفات الفريدة (UUID) للرسائل'
+        )
+        parser.add_argument(
+            '--user',
+            help='استعادة كل رسائل المستخدم (اسم المستخدم)'
+        )
+
+    def handle(self, *args, **options):
+        if not options['messages'] and not options['user']:
+            raise CommandError('حدد رسالة واحدة على الأقل أو مستخدماً (--user)')
+
+        cold_messages = ColdMessage.objects.none()
+        for value in options['messages']:
+            lookup = {'sequence_number': value}
+            try:
+                lookup = {'message_id': uuid.UUID(value)}
+            except ValueError:
+                pass
+            cold_messages |= ColdMessage.objects.filter(**lookup)
+        if options['user']:
+            cold_messages |= ColdMessage.objects.filter(participants__user__username=options['user'])
+
+        restored = rehydrate(cold_messages.distinct().order_by('created_at'))
+        self.stdout.write(f'تم استعادة {restored} رسالة من الأرشيف البارد')
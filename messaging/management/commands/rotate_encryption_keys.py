@@ -0,0 +1,51 @@
+"""
+أمر Django لتدوير مفاتيح التشفير: إعادة تغليف مفاتيح البيانات وتشفير المحتوى السابق للتشفير
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from messaging.key_rotation import DEFAULT_BATCH_SIZE, process_key_rotation
+
+
+class Command(BaseCommand):
+    help = 'إعادة تغليف مفاتيح بيانات الرسائل والمرفقات بالمفتاح الرئيسي الحالي وتشفير المحتوى غير المشفر'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='التشغيل المستمر بدلاً من دورة واحدة'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=3600,
+            help='الفاصل بين الدورات بالثواني عند التشغيل المستمر (افتراضي: 3600)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'عدد السجلات في كل دفعة (افتراضي: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=20,
+            help='الحد الأقصى للدفعات في كل دورة (افتراضي: 20)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = process_key_rotation(
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+            )
+            self.stdout.write(
+                f'تمت إعادة تغليف {stats["rewrapped"]} مفتاح وتشفير {stats["messages"]} رسالة '
+                f'و {stats["attachments"]} مرفق'
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,67 @@
+"""
+أمر Django للتحقق الجماعي من التوقيعات الرقمية وإصدار تقرير للمراجعين
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from messaging.models import DigitalSignature
+from messaging.signature_utils import (
+    VERIFICATION_BATCH_SIZE, signatures_for_report, verify_signatures, write_verification_report,
+)
+
+
+class Command(BaseCommand):
+    help = 'التحقق من التوقيعات الرقمية لفترة أو بالمعرفات وإصدار تقرير JSON أو CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'signature_ids',
+            nargs='*',
+            help='معرفات التوقيعات (بدلاً من الفترة)'
+        )
+        parser.add_argument('--from', dest='date_from', help='أول يوم في الفترة (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='آخر يوم في الفترة (YYYY-MM-DD)')
+        parser.add_argument(
+            '--type',
+            choices=[choice for choice, _ in DigitalSignature.SIGNATURE_TYPE_CHOICES],
+            help='نوع التوقيع'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['json', 'csv'],
+            default='json',
+            help='صيغة التقرير (افتراضي: json)'
+        )
+        parser.add_argument('--output', help='ملف التقرير (افتراضياً المخرجات القياسية)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=VERIFICATION_BATCH_SIZE,
+            help=f'عدد التوقيعات في كل دفعة (افتراضي: {VERIFICATION_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            date_from = parse_date(options['date_from']) if options['date_from'] else None
+            date_to = parse_date(options['date_to']) if options['date_to'] else None
+        except ValueError as e:
+            raise CommandError(f'تاريخ غير صالح: {e}')
+
+        signatures = signatures_for_report(date_from, date_to, options['type'])
+        if options['signature_ids']:
+            signatures = signatures.filter(signature_id__in=options['signature_ids'])
+        elif not (date_from or date_to):
+            raise CommandError('حدد معرفات التوقيعات أو الفترة (--from و/أو --to)')
+
+        rows = verify_signatures(signatures, batch_size=options['batch_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as stream:
+                summary = write_verification_report(rows, stream, options['format'])
+        else:
+            # التقرير يُكتب على أجزاء فلا يُضاف سطر جديد بعد كل جزء
+            self.stdout.ending = ''
+            summary = write_verification_report(rows, self.stdout, options['format'])
+            self.stdout.write('\n')
+
+        summary_text = '، '.join(f'{status}: {count}' for status, count in sorted(summary.items())) or 'لا توجد توقيعات'
+        (self.stderr if not options['output'] else self.stdout).write(f'نتيجة التحقق: {summary_text}')
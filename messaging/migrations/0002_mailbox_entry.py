@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-19 16:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('folder', models.CharField(choices=[('ARCHIVE', 'الأرشيف')], default='ARCHIVE', max_length=20, verbose_name='المجلد')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ النقل')),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mailbox_entries', to='messaging.message', verbose_name='الرسالة')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mailbox_entries', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'موضع في صندوق البريد',
+                'verbose_name_plural': 'مواضع صناديق البريد',
+                'indexes': [models.Index(fields=['user', 'folder', '-created_at'], name='messaging_m_user_id_2e57af_idx')],
+                'unique_together': {('user', 'message')},
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# نقل حالة الأرشفة من الرسالة المشتركة إلى صندوق كل مستخدم
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def move_archive_state(apps, schema_editor):
+    """
+    الأرشفة كانت عامة على الرسالة فتُنشأ مواضع أرشيف للمرسل وكل المستقبلين
+    بتاريخ الأرشفة، ثم تُعاد الرسالة إلى حالتها قبل الأرشفة
+    """
+    Message = apps.get_model('messaging', 'Message')
+    MessageRecipient = apps.get_model('messaging', 'MessageRecipient')
+    MailboxEntry = apps.get_model('messaging', 'MailboxEntry')
+
+    archived = Message.objects.filter(archived_at__isnull=False).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(archived.filter(pk__gt=last_pk).values_list('pk', 'sender_id', 'archived_at')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        archived_at = {pk: value for pk, _, value in batch}
+        entries = [
+            MailboxEntry(user_id=sender_id, message_id=pk, folder='ARCHIVE', created_at=value)
+            for pk, sender_id, value in batch
+        ]
+        entries.extend(
+            MailboxEntry(user_id=recipient_id, message_id=message_id, folder='ARCHIVE', created_at=archived_at[message_id])
+            for message_id, recipient_id in MessageRecipient.objects.filter(
+                message_id__in=archived_at
+            ).values_list('message_id', 'recipient_id')
+        )
+        MailboxEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+    archived.filter(status='ARCHIVED', sent_at__isnull=False).update(status='SENT')
+    archived.filter(status='ARCHIVED').update(status='DRAFT')
+    archived.update(archived_at=None)
+
+
+def restore_archive_state(apps, schema_editor):
+    """إرجاع الأرشفة إلى الرسالة (مؤرشفة إذا أرشفها أي مستخدم)"""
+    Message = apps.get_model('messaging', 'Message')
+    MailboxEntry = apps.get_model('messaging', 'MailboxEntry')
+
+    entries = MailboxEntry.objects.filter(folder='ARCHIVE').order_by('message_id', 'created_at')
+    archived_at = {}
+    for message_id, created_at in entries.values_list('message_id', 'created_at').iterator():
+        archived_at.setdefault(message_id, created_at)
+    for message_id, value in archived_at.items():
+        Message.objects.filter(pk=message_id).update(archived_at=value, status='ARCHIVED')
+    entries.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_mailbox_entry'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_archive_state, restore_archive_state),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-19 16:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0003_move_archive_state_to_mailbox_entries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('expires_at__isnull', False), models.Q(('status', 'DELETED'), _negated=True)), fields=['expires_at'], name='msg_live_expires_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('auto_delete_at__isnull', False)), fields=['auto_delete_at'], name='msg_auto_delete_at_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.2 on 2026-10-19 16:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_message_retention_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColdMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True, verbose_name='المعرف الأصلي')),
+                ('message_id', models.UUIDField(unique=True, verbose_name='معرف الرسالة')),
+                ('sequence_number', models.CharField(db_index=True, max_length=50, verbose_name='الرقم التسلسلي')),
+                ('subject', models.CharField(max_length=200, verbose_name='الموضوع')),
+                ('created_at', models.DateTimeField(verbose_name='تاريخ الإنشاء')),
+                ('frozen_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ النقل للأرشيف البارد')),
+                ('payload', models.BinaryField(verbose_name='البيانات المضغوطة')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='cold_sent_messages', to=settings.AUTH_USER_MODEL, verbose_name='المرسل')),
+            ],
+            options={
+                'verbose_name': 'رسالة في الأرشيف البارد',
+                'verbose_name_plural': 'رسائل الأرشيف البارد',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ColdMessageParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_sender', models.BooleanField(default=False, verbose_name='المرسل')),
+                ('is_deleted', models.BooleanField(default=False, verbose_name='محذوفة')),
+                ('created_at', models.DateTimeField(verbose_name='تاريخ الإنشاء')),
+                ('cold_message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='messaging.coldmessage', verbose_name='الرسالة')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='cold_messages', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'طرف في رسالة مؤرشفة',
+                'verbose_name_plural': 'أطراف الرسائل المؤرشفة',
+                'indexes': [models.Index(fields=['user', '-created_at'], name='messaging_c_user_id_b994c3_idx')],
+                'unique_together': {('cold_message', 'user')},
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+SEGMENT_WIDTH = 11
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def path_segment(moment):
+    value = int(moment.timestamp() * 1_000_000)
+    segment = ''
+    while value:
+        value, remainder = divmod(value, 36)
+        segment = DIGITS[remainder] + segment
+    return segment.rjust(SEGMENT_WIDTH, '0')
+
+
+def assign_threads(apps, schema_editor):
+    """حساب المحادثات للرسائل الموجودة (الأصول قبل ردودها حسب وقت الإنشاء)"""
+    Message = apps.get_model('messaging', 'Message')
+    threads = {}
+    pending = []
+    rows = Message.objects.order_by('created_at', 'pk').values_list(
+        'pk', 'message_id', 'reply_to_id', 'created_at'
+    )
+    for pk, message_id, reply_to_id, created_at in rows.iterator(chunk_size=BATCH_SIZE):
+        segment = path_segment(created_at)
+        parent = threads.get(reply_to_id)
+        if parent is None:
+            thread = (message_id, 0, segment)
+        else:
+            thread = (parent[0], parent[1] + 1, parent[2] + segment)
+        threads[pk] = thread
+        pending.append(Message(pk=pk, thread_id=thread[0], thread_depth=thread[1], thread_path=thread[2]))
+        if len(pending) >= BATCH_SIZE:
+            Message.objects.bulk_update(pending, ['thread_id', 'thread_depth', 'thread_path'])
+            pending = []
+    if pending:
+        Message.objects.bulk_update(pending, ['thread_id', 'thread_depth', 'thread_path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_cold_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='thread_id',
+            field=models.UUIDField(null=True, verbose_name='معرف المحادثة'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='thread_depth',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='العمق في المحادثة'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='thread_path',
+            field=models.CharField(blank=True, max_length=1000, verbose_name='المسار في المحادثة'),
+        ),
+        migrations.RunPython(assign_threads, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='message',
+            name='thread_id',
+            field=models.UUIDField(verbose_name='معرف المحادثة'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['thread_id', 'thread_path'], name='msg_thread_path_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-19 17:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0006_message_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='digitalsignature',
+            name='key_id',
+            field=models.CharField(blank=True, max_length=50, verbose_name='معرف مفتاح التوقيع'),
+        ),
+        migrations.AlterField(
+            model_name='digitalsignature',
+            name='signed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='وقت التوقيع'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+from html import unescape
+
+import messaging.encryption
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+BATCH_SIZE = 2000
+SNIPPET_LENGTH = 200
+HIDDEN_CONFIDENTIALITY = ('CONFIDENTIAL', 'TOP_SECRET')
+
+
+def mark_plaintext_rows(apps, schema_editor):
+    """
+    الرسائل والمرفقات الموجودة مخزنة دون تشفير (تشفرها مهمة rotate_encryption_keys لاحقاً)،
+    وتُحسب مقتطفات الرسائل لصفحات القوائم
+    """
+    Message = apps.get_model('messaging', 'Message')
+    MessageAttachment = apps.get_model('messaging', 'MessageAttachment')
+    Message.objects.update(is_encrypted=False)
+    MessageAttachment.objects.update(is_encrypted=False)
+
+    pending = []
+    rows = Message.objects.values_list('pk', 'body', 'confidentiality')
+    for pk, body, confidentiality in rows.iterator(chunk_size=BATCH_SIZE):
+        snippet = '' if confidentiality in HIDDEN_CONFIDENTIALITY else ' '.join(unescape(strip_tags(body)).split())
+        pending.append(Message(pk=pk, snippet=snippet[:SNIPPET_LENGTH]))
+        if len(pending) >= BATCH_SIZE:
+            Message.objects.bulk_update(pending, ['snippet'])
+            pending = []
+    if pending:
+        Message.objects.bulk_update(pending, ['snippet'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0007_signature_hmac_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='body_key',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='مفتاح التشفير'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='body_key_id',
+            field=models.CharField(blank=True, editable=False, max_length=50, verbose_name='معرف المفتاح الرئيسي'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='snippet',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='مقتطف'),
+        ),
+        migrations.AddField(
+            model_name='messageattachment',
+            name='encryption_key',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='مفتاح التشفير'),
+        ),
+        migrations.AddField(
+            model_name='messageattachment',
+            name='encryption_key_id',
+            field=models.CharField(blank=True, editable=False, max_length=50, verbose_name='معرف المفتاح الرئيسي'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='body',
+            field=messaging.encryption.EncryptedTextField(key_field='body_key', key_id_field='body_key_id', snippet_field='snippet', verbose_name='نص الرسالة'),
+        ),
+        migrations.RunPython(mark_plaintext_rows, migrations.RunPython.noop),
+    ]
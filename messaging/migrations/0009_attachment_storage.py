@@ -0,0 +1,59 @@
+import os
+import struct
+
+import django.core.validators
+import messaging.models
+import messaging.storage
+from django.core.files.storage import FileSystemStorage
+from django.db import migrations, models
+
+OLD_HEADER = struct.Struct('>4sI8s')
+NEW_HEADER = struct.Struct('>4sI8sHH')
+COPY_SIZE = 1024 * 1024
+
+
+def move_keys_to_file_headers(apps, schema_editor):
+    """
+    مفاتيح بيانات المرفقات المشفرة تنتقل من السجل إلى ترويسة الملف (صيغة MCE1 إلى MCE2)
+    الأجزاء المشفرة تُنسخ كما هي، فلا يُفك أي ملف.
+    """
+    MessageAttachment = apps.get_model('messaging', 'MessageAttachment')
+    storage = FileSystemStorage()
+    rows = MessageAttachment.objects.exclude(encryption_key='').exclude(file='').values_list(
+        'file', 'encryption_key', 'encryption_key_id'
+    )
+    for name, wrapped_key, key_id in rows.iterator():
+        path = storage.path(name)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as source:
+            magic, chunk_size, prefix = OLD_HEADER.unpack(source.read(OLD_HEADER.size))
+            if magic != b'MCE1':
+                continue
+            with open(path + '.mce2', 'wb') as target:
+                key_id, wrapped_key = key_id.encode(), wrapped_key.encode()
+                target.write(NEW_HEADER.pack(b'MCE2', chunk_size, prefix, len(key_id), len(wrapped_key)))
+                target.write(key_id + wrapped_key)
+                for chunk in iter(lambda: source.read(COPY_SIZE), b''):
+                    target.write(chunk)
+        os.replace(path + '.mce2', path)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0008_message_encryption'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_keys_to_file_headers, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='messageattachment',
+            name='encryption_key',
+        ),
+        migrations.AlterField(
+            model_name='messageattachment',
+            name='file',
+            field=models.FileField(storage=messaging.storage.EncryptedFileSystemStorage(), upload_to=messaging.models.message_attachment_path, validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx', 'xls', 'xlsx', 'txt', 'jpg', 'png'])], verbose_name='الملف'),
+        ),
+    ]
@@ -1,13 +1,22 @@
 from django.db import models
+from django.db.models import Max
+from django.db.models.functions import Cast, Substr
 from django.conf import settings
 from django.utils import timezone
 from django.core.validators import FileExtensionValidator
 from django.urls import reverse
+from django.utils.html import strip_tags
 import uuid
 import os
 import json
 import hashlib
 from datetime import datetime
+from html import unescape
+
+from . import signing
+from .encryption import EncryptedTextField, get_current_key_id
+from .storage import attachment_storage
+
 
 class MessageCategory(models.Model):
     """تصنيف الرسائل"""
@@ -37,6 +46,34 @@ class MessageCategory(models.Model):
     def __str__(self):
         return self.get_name_display()
 
+THREAD_SEGMENT_WIDTH = 11  # أرقام base36 تكفي للوقت بالميكروثانية
+THREAD_PATH_MAX_LENGTH = 1000
+# أعمق مستوى يتسع مساره في العمود؛ الردود الأعمق تُلحق بهذا المستوى بجانب الرسالة التي ترد عليها
+MAX_THREAD_DEPTH = THREAD_PATH_MAX_LENGTH // THREAD_SEGMENT_WIDTH - 1
+
+
+def thread_path_segment(moment):
+    """مقطع مسار المحادثة: وقت الإنشاء بالميكروثانية بصيغة base36 بطول ثابت"""
+    value = int(moment.timestamp() * 1_000_000)
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    segment = ''
+    while value:
+        value, remainder = divmod(value, 36)
+        segment = digits[remainder] + segment
+    return segment.rjust(THREAD_SEGMENT_WIDTH, '0')
+
+
+SNIPPET_LENGTH = 200
+
+# مستويات السرية التي لا يُخزن لها مقتطف غير مشفر
+SNIPPET_HIDDEN_CONFIDENTIALITY = ('CONFIDENTIAL', 'TOP_SECRET')
+
+
+def build_snippet(body):
+    """مقتطف نصي من نص الرسالة (دون وسوم HTML ومسافات متكررة)"""
+    return ' '.join(unescape(strip_tags(body)).split())[:SNIPPET_LENGTH]
+
+
 class Message(models.Model):
     """نموذج الرسائل الأساسي"""
     PRIORITY_CHOICES = [
@@ -73,7 +110,14 @@ class Message(models.Model):
     
     # الأساسيات
     subject = models.CharField(max_length=200, verbose_name="الموضوع")
-    body = models.TextField(verbose_name="نص الرسالة")
+    body = EncryptedTextField(
+        key_field='body_key', key_id_field='body_key_id', snippet_field='snippet', verbose_name="نص الرسالة"
+    )
+    # مفتاح بيانات النص مغلفاً بالمفتاح الرئيسي (يجب أن تلي body، انظر EncryptedTextField)
+    body_key = models.CharField(max_length=255, blank=True, editable=False, verbose_name="مفتاح التشفير")
+    body_key_id = models.CharField(max_length=50, blank=True, editable=False, verbose_name="معرف المفتاح الرئيسي")
+    # مقتطف نصي لصفحات القوائم والبحث (فارغ للرسائل السرية)
+    snippet = models.CharField(max_length=200, blank=True, editable=False, verbose_name="مقتطف")
     
     # المرسل والمستقبل
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='sent_messages', verbose_name="المرسل")
@@ -98,6 +142,11 @@ class Message(models.Model):
     reply_to = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies', verbose_name="رد على")
     forwarded_from = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='forwards', verbose_name="محول من")
     
+    # المحادثة: معرف الرسالة الجذر ومسار الرسالة داخلها (تُحسب عند الإنشاء، انظر assign_thread)
+    thread_id = models.UUIDField(verbose_name="معرف المحادثة")
+    thread_depth = models.PositiveSmallIntegerField(default=0, verbose_name="العمق في المحادثة")
+    thread_path = models.CharField(max_length=THREAD_PATH_MAX_LENGTH, blank=True, verbose_name="المسار في المحادثة")
+    
     # الأمان والتشفير
     is_encrypted = models.BooleanField(default=True, verbose_name="مشفرة")
     digital_signature = models.TextField(blank=True, verbose_name="التوقيع الرقمي")
@@ -122,18 +171,88 @@ class Message(models.Model):
             models.Index(fields=['priority', '-created_at']),
             models.Index(fields=['reference_number']),
             models.Index(fields=['account_number']),
+            # الرسائل المستحقة فقط (يستخدمها محرك الاحتفاظ messaging.retention)
+            models.Index(
+                fields=['expires_at'],
+                name='msg_live_expires_at_idx',
+                condition=models.Q(expires_at__isnull=False) & ~models.Q(status='DELETED'),
+            ),
+            models.Index(
+                fields=['auto_delete_at'],
+                name='msg_auto_delete_at_idx',
+                condition=models.Q(auto_delete_at__isnull=False),
+            ),
+            # عرض المحادثة كاملة مرتبة بالمسار
+            models.Index(fields=['thread_id', 'thread_path'], name='msg_thread_path_idx'),
         ]
     
     def __str__(self):
         return f"{self.sequence_number} - {self.subject}"
     
+    @classmethod
+    def generate_sequence_numbers(cls, category, count=1):
+        """
+        إنشاء أرقام تسلسلية متتالية (تستخدم أيضاً في الإرسال الجماعي)
+        الرقم التالي بعد أكبر رقم مستخدم للسنة والتصنيف في الرسائل والأرشيف البارد، لا بعد عدد الرسائل،
+        فحذف الرسائل (الحذف التلقائي) أو نقلها للأرشيف البارد لا يعيد استخدام رقم موجود.
+        """
+        year = timezone.now().year
+        category_code = category.name[:3] if category else 'GEN'
+        prefix = f"{year}-{category_code}-"
+        last = 0
+        for model in (cls, ColdMessage):
+            suffix = Cast(Substr('sequence_number', len(prefix) + 1), models.IntegerField())
+            last = max(last, model.objects.filter(
+                sequence_number__startswith=prefix
+            ).aggregate(last=Max(suffix))['last'] or 0)
+        return [f"{prefix}{number:05d}" for number in range(last + 1, last + count + 1)]
+    
+    def assign_thread(self, moment=None):
+        """
+        حساب موضع الرسالة في المحادثة قبل إنشائها
+        الرد ينضم إلى محادثة الرسالة الأصلية تحت مسارها، وأي رسالة أخرى (ومنها المحولة)
+        تبدأ محادثة جديدة. كل مستوى في المسار مقطع بطول ثابت من وقت الإنشاء، فترتيب
+        المسار أبجدياً يعطي ترتيب المحادثة (الأصل ثم ردوده حسب وقتها).
+
+        Args:
+            moment: وقت الإنشاء المستخدم في المسار (افتراضياً الآن)
+        """
+        segment = thread_path_segment(moment or timezone.now())
+        parent = self.reply_to
+        if parent is None:
+            self.thread_id = self.message_id
+            self.thread_depth = 0
+            self.thread_path = segment
+        elif parent.thread_depth >= MAX_THREAD_DEPTH:
+            # لا يتسع المسار لمستوى آخر: الرد يبقى في آخر مستوى ويُرتب بعد الرسالة التي يرد عليها
+            self.thread_id = parent.thread_id
+            self.thread_depth = MAX_THREAD_DEPTH
+            self.thread_path = parent.thread_path[:MAX_THREAD_DEPTH * THREAD_SEGMENT_WIDTH] + segment
+        else:
+            self.thread_id = parent.thread_id
+            self.thread_depth = parent.thread_depth + 1
+            self.thread_path = parent.thread_path + segment
+    
+    def build_snippet(self, body):
+        """مقتطف النص المعروض في القوائم (يُخزن دون تشفير، فلا يُنشأ للرسائل السرية)"""
+        if self.confidentiality in SNIPPET_HIDDEN_CONFIDENTIALITY:
+            return ''
+        return build_snippet(body)
+    
     def save(self, *args, **kwargs):
         if not self.sequence_number:
             # إنشاء رقم تسلسلي
-            year = timezone.now().year
-            category_code = self.category.name[:3] if self.category else 'GEN'
-            count = Message.objects.filter(created_at__year=year).count() + 1
-            self.sequence_number = f"{year}-{category_code}-{count:05d}"
+            self.sequence_number = self.generate_sequence_numbers(self.category)[0]
+        if self._state.adding and not self.thread_id:
+            self.assign_thread()
+        self.is_encrypted = True  # النص يُشفر عند حفظه (EncryptedTextField)
+        if self.confidentiality in SNIPPET_HIDDEN_CONFIDENTIALITY:
+            # رفع درجة السرية دون تعديل النص يخفي المقتطف أيضاً
+            self.snippet = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'body' in update_fields:
+            # تشفير النص قد ينشئ مفتاح البيانات ويحدث المقتطف
+            kwargs['update_fields'] = {*update_fields, 'body_key', 'body_key_id', 'snippet', 'is_encrypted'}
         super().save(*args, **kwargs)
 
 class MessageRecipient(models.Model):
@@ -161,11 +280,48 @@ class MessageRecipient(models.Model):
         verbose_name = "مستقبل الرسالة"
         verbose_name_plural = "مستقبلو الرسائل"
     
-    def mark_as_read(self):
-        """تعليم الرسالة كمقروءة"""
-        if not self.read_at:
-            self.read_at = timezone.now()
-            self.save()
+    def mark_as_read(self, request=None):
+        """
+        تعليم الرسالة كمقروءة بتحديث موجه (انظر messaging.receipts)
+
+        Returns:
+            bool: True إذا عُلمت الآن، False إذا كانت مقروءة مسبقاً
+        """
+        if self.read_at:
+            return False
+        from .receipts import mark_recipient_read
+        read_at = mark_recipient_read(self, request=request)
+        if read_at is None:
+            self.refresh_from_db(fields=['read_at'])
+            return False
+        self.read_at = read_at
+        return True
+
+class MailboxEntry(models.Model):
+    """
+    موضع الرسالة في صندوق المستخدم
+    حالة الأرشفة (والمجلدات) لكل مستخدم على حدة، فأرشفة أحد المستقبلين لا تغير
+    الرسالة لغيره. وجود السجل يعني أن الرسالة خارج مجلدها الافتراضي (الوارد أو المرسل).
+    """
+    FOLDER_CHOICES = [
+        ('ARCHIVE', 'الأرشيف'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='mailbox_entries', verbose_name="المستخدم")
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='mailbox_entries', verbose_name="الرسالة")
+    folder = models.CharField(max_length=20, choices=FOLDER_CHOICES, default='ARCHIVE', verbose_name="المجلد")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="تاريخ النقل")
+
+    class Meta:
+        unique_together = ['user', 'message']
+        verbose_name = "موضع في صندوق البريد"
+        verbose_name_plural = "مواضع صناديق البريد"
+        indexes = [
+            models.Index(fields=['user', 'folder', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.message} ({self.get_folder_display()})"
 
 def message_attachment_path(instance, filename):
     """مسار حفظ المرفقات"""
@@ -176,6 +332,7 @@ class MessageAttachment(models.Model):
     message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='attachments', verbose_name="الرسالة")
     file = models.FileField(
         upload_to=message_attachment_path,
+        storage=attachment_storage,
         validators=[FileExtensionValidator(allowed_extensions=['pdf', 'doc', 'docx', 'xls', 'xlsx', 'txt', 'jpg', 'png'])],
         verbose_name="الملف"
     )
@@ -186,6 +343,8 @@ class MessageAttachment(models.Model):
     # الأمان
     is_encrypted = models.BooleanField(default=True, verbose_name="مشفر")
     checksum = models.CharField(max_length=64, verbose_name="المجموع التحققي")
+    # المفتاح الرئيسي الذي غُلف به مفتاح بيانات الملف (المفتاح نفسه في ترويسة الملف، انظر messaging.storage)
+    encryption_key_id = models.CharField(max_length=50, blank=True, editable=False, verbose_name="معرف المفتاح الرئيسي")
     
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الرفع")
     
@@ -196,6 +355,35 @@ class MessageAttachment(models.Model):
     def __str__(self):
         return self.original_filename
     
+    def save(self, *args, **kwargs):
+        if self.file and not self.file._committed:
+            # الملف الجديد يُشفر أثناء كتابته في التخزين بمفتاح بيانات خاص به
+            self.encryption_key_id = get_current_key_id()
+            self.is_encrypted = True
+        super().save(*args, **kwargs)
+    
+    def iter_content(self, start=0, end=None, chunk_size=64 * 1024):
+        """
+        محتوى الملف الأصلي على أجزاء (يُفك أثناء القراءة)
+        
+        Args:
+            start: أول بايت مطلوب
+            end: آخر بايت مطلوب (شاملاً)، أو None حتى نهاية الملف
+        
+        Yields:
+            bytes: أجزاء الملف
+        """
+        with self.file.open('rb') as stream:
+            stream.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = stream.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+    
     def delete(self, *args, **kwargs):
         # حذف الملف من النظام
         if self.file:
@@ -269,7 +457,8 @@ class DigitalSignature(models.Model):
     
     # معلومات التوقيع
     signature_data = models.JSONField(verbose_name="بيانات التوقيع")  # يحتوي على تفاصيل المستخدم عند التوقيع
-    hash_value = models.CharField(max_length=64, verbose_name="قيمة التشفير")  # SHA-256 hash
+    hash_value = models.CharField(max_length=64, verbose_name="قيمة التشفير")  # HMAC-SHA256
+    key_id = models.CharField(max_length=50, blank=True, verbose_name="معرف مفتاح التوقيع")  # فارغ للتوقيعات السابقة لـ HMAC
     
     # QR Code
     qr_code = models.ImageField(upload_to=signature_qr_path, verbose_name="رمز QR")
@@ -281,7 +470,7 @@ class DigitalSignature(models.Model):
     location_info = models.JSONField(blank=True, null=True, verbose_name="معلومات الموقع")
     
     # التوقيت والصلاحية
-    signed_at = models.DateTimeField(auto_now_add=True, verbose_name="وقت التوقيع")
+    signed_at = models.DateTimeField(default=timezone.now, verbose_name="وقت التوقيع")  # جزء من المحتوى الموقع
     expires_at = models.DateTimeField(verbose_name="انتهاء الصلاحية")
     verification_status = models.CharField(max_length=20, choices=VERIFICATION_STATUS_CHOICES, default='VALID', verbose_name="حالة التحقق")
     
@@ -303,18 +492,39 @@ class DigitalSignature(models.Model):
         return f"توقيع {self.signer.arabic_name} - {self.get_signature_type_display()}"
     
     def save(self, *args, **kwargs):
-        if not self.hash_value:
-            self.hash_value = self.generate_signature_hash()
         if not self.expires_at:
             # تعيين انتهاء الصلاحية بعد سنة واحدة
             from datetime import timedelta
             self.expires_at = timezone.now() + timedelta(days=365)
+        if not self.hash_value:
+            self.key_id = signing.get_current_key_id()
+            self.hash_value = self.generate_signature_hash()
         super().save(*args, **kwargs)
     
+    def get_signed_content(self):
+        """المحتوى الموقع: بيانات الرسالة (مع بصمة نصها) والموقع ووقت التوقيع وصلاحيته"""
+        return {
+            'signature_id': str(self.signature_id),
+            'signature_type': self.signature_type,
+            'reason': self.reason,
+            'signed_at': self.signed_at.isoformat() if self.signed_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'message': {
+                'message_id': str(self.message.message_id),
+                'sequence_number': self.message.sequence_number,
+                'subject': self.message.subject,
+                'body_sha256': hashlib.sha256(self.message.body.encode()).hexdigest(),
+                'sender': self.message.sender.employee_id,
+            },
+            'signer': {
+                'employee_id': self.signer.employee_id,
+                'arabic_name': self.signer.arabic_name,
+            },
+        }
+    
     def generate_signature_hash(self):
-        """إنشاء hash للتوقيع"""
-        signature_string = f"{self.signature_id}{self.message.message_id}{self.signer.employee_id}{timezone.now().isoformat()}"
-        return hashlib.sha256(signature_string.encode()).hexdigest()
+        """إنشاء توقيع HMAC-SHA256 للمحتوى الموقع بمفتاح key_id"""
+        return signing.sign(self.get_signed_content(), self.key_id)
     
     def generate_signature_data(self):
         """إنشاء بيانات التوقيع الكاملة"""
@@ -356,19 +566,31 @@ class DigitalSignature(models.Model):
         return ""
     
     def is_valid(self):
-        """فحص صحة التوقيع"""
+        """
+        فحص صحة التوقيع دون كتابة
+        تعليم التوقيعات المنتهية EXPIRED يتم في محرك الاحتفاظ (messaging.retention)
+        """
         if self.verification_status != 'VALID':
             return False
         if self.expires_at and timezone.now() > self.expires_at:
+            # الحالة المعروضة فقط، والحفظ يتم في محرك الاحتفاظ
             self.verification_status = 'EXPIRED'
-            self.save()
             return False
         return True
     
     def verify_hash(self):
-        """التحقق من صحة الـ hash"""
-        expected_hash = self.generate_signature_hash()
-        return self.hash_value == expected_hash
+        """
+        التحقق من أن المحتوى الموقع لم يتغير منذ التوقيع
+        التوقيعات السابقة لـ HMAC (دون key_id) لا يمكن التحقق منها وتعد غير مطابقة
+        """
+        if not self.key_id:
+            return False
+        return signing.verify(self.get_signed_content(), self.key_id, self.hash_value)
+    
+    def revoke(self):
+        """إلغاء التوقيع (نتيجة التحقق المخزنة تُحذف بإشارة الحفظ)"""
+        self.verification_status = 'REVOKED'
+        self.save(update_fields=['verification_status'])
     
     def get_qr_display_data(self):
         """الحصول على البيانات المختصرة لعرضها في QR"""
@@ -381,3 +603,44 @@ class DigitalSignature(models.Model):
             'signed_at': self.signed_at.strftime('%Y-%m-%d %H:%M') if self.signed_at else '',
             'verify_url': self.get_verification_url(),
         }
+
+
+class ColdMessage(models.Model):
+    """
+    رسالة قديمة في طبقة الأرشيف البارد (messaging.cold_storage)
+    الرسالة وكل ما يتبعها (المستقبلون، السجل، التوقيعات، المرفقات، مواضع الصناديق) محفوظة
+    مضغوطة في payload، مع الحقول اللازمة للبحث والعرض في أعمدة عادية.
+    """
+    original_id = models.BigIntegerField(unique=True, verbose_name="المعرف الأصلي")
+    message_id = models.UUIDField(unique=True, verbose_name="معرف الرسالة")
+    sequence_number = models.CharField(max_length=50, db_index=True, verbose_name="الرقم التسلسلي")
+    subject = models.CharField(max_length=200, verbose_name="الموضوع")
+    sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='cold_sent_messages', verbose_name="المرسل")
+    created_at = models.DateTimeField(verbose_name="تاريخ الإنشاء")
+    frozen_at = models.DateTimeField(default=timezone.now, verbose_name="تاريخ النقل للأرشيف البارد")
+    payload = models.BinaryField(verbose_name="البيانات المضغوطة")
+
+    class Meta:
+        verbose_name = "رسالة في الأرشيف البارد"
+        verbose_name_plural = "رسائل الأرشيف البارد"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.sequence_number} - {self.subject}"
+
+
+class ColdMessageParticipant(models.Model):
+    """أطراف الرسالة في الأرشيف البارد (للصلاحيات والبحث في صندوق كل مستخدم)"""
+    cold_message = models.ForeignKey(ColdMessage, on_delete=models.CASCADE, related_name='participants', verbose_name="الرسالة")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='cold_messages', verbose_name="المستخدم")
+    is_sender = models.BooleanField(default=False, verbose_name="المرسل")
+    is_deleted = models.BooleanField(default=False, verbose_name="محذوفة")
+    created_at = models.DateTimeField(verbose_name="تاريخ الإنشاء")
+
+    class Meta:
+        unique_together = ['cold_message', 'user']
+        verbose_name = "طرف في رسالة مؤرشفة"
+        verbose_name_plural = "أطراف الرسائل المؤرشفة"
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
@@ -0,0 +1,90 @@
+"""
+إرسال رسائل الإشعارات الداخلية دفعة واحدة
+تُستخدم من المهام الخلفية (المهل، التصعيد، ...) بدلاً من إنشاء كل رسالة على حدة
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from monitoring import metrics
+
+from .models import Message, MessageCategory, MessageRecipient
+from .versions import mailbox_changed
+
+logger = logging.getLogger(__name__)
+
+
+def get_notification_sender():
+    """
+    مرسل رسائل النظام: المستخدم المحدد في NOTIFICATION_SENDER_USERNAME
+    أو أول مدير نظام نشط
+    """
+    users = get_user_model().objects.filter(is_active=True)
+    username = getattr(settings, 'NOTIFICATION_SENDER_USERNAME', '')
+    if username:
+        return users.filter(username=username).first()
+    return users.filter(is_superuser=True).order_by('id').first()
+
+
+def send_bulk_notifications(notifications, sender=None, category_name='ADMIN', priority='NORMAL'):
+    """
+    إرسال مجموعة إشعارات بعدد ثابت من الاستعلامات
+
+    Args:
+        notifications: قائمة من (المستقبل أو معرفه، الموضوع، النص)
+        sender: المرسل (افتراضياً مرسل رسائل النظام)
+        category_name: تصنيف الرسائل
+        priority: أولوية الرسائل
+
+    Returns:
+        int: عدد الرسائل المرسلة
+    """
+    if not notifications:
+        return 0
+
+    sender = sender or get_notification_sender()
+    if sender is None:
+        logger.warning('تعذر إرسال %d إشعار: لا يوجد مرسل لرسائل النظام', len(notifications))
+        return 0
+
+    category, _ = MessageCategory.objects.get_or_create(name=category_name)
+    now = timezone.now()
+    sequence_numbers = Message.generate_sequence_numbers(category, len(notifications))
+
+    messages = [
+        Message(
+            sequence_number=sequence_number,
+            subject=subject[:200],
+            body=body,
+            sender=sender,
+            category=category,
+            priority=priority,
+            status='SENT',
+            sent_at=now,
+        )
+        for sequence_number, (_, subject, body) in zip(sequence_numbers, notifications)
+    ]
+    for message in messages:
+        message.assign_thread(now)
+
+    with transaction.atomic():
+        messages = Message.objects.bulk_create(messages)
+        recipients = MessageRecipient.objects.bulk_create([
+            MessageRecipient(
+                message=message,
+                recipient_id=getattr(recipient, 'pk', recipient),
+                recipient_type='TO',
+            )
+            for message, (recipient, _, _) in zip(messages, notifications)
+        ])
+
+    mailbox_changed(
+        [recipient.recipient_id for recipient in recipients] + [sender.pk],
+        [message.message_id for message in messages],
+    )
+    metrics.MESSAGES_SENT.inc(len(messages), priority=priority)
+    metrics.RECIPIENTS_FANNED_OUT.inc(len(messages), recipient_type='TO')
+    return len(messages)
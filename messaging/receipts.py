@@ -0,0 +1,85 @@
+"""
+إيصالات القراءة
+تعليم الرسائل كمقروءة بتحديث موجه واحد (UPDATE ... WHERE read_at IS NULL) مهما كان
+عدد السجلات، فتكرار الطلب لا يغير شيئاً ولا يكتب إلا السجلات غير المقروءة.
+
+السجلات التي عدلها الاستدعاء تُعرف بوقت القراءة الذي كتبه (استدعاء متزامن آخر يكتب
+وقتاً مختلفاً)، ومنها تُنشأ سجلات READ في تاريخ الرسائل التي تتطلب إيصال قراءة
+دفعة واحدة.
+"""
+from django.utils import timezone
+
+from .models import MessageHistory, MessageRecipient
+from .signature_utils import get_client_ip
+from .versions import mailbox_changed
+
+
+def mark_read(user, recipients=None, request=None):
+    """
+    تعليم سجلات المستقبل كمقروءة
+
+    Args:
+        user: المستقبل
+        recipients: QuerySet من سجلات MessageRecipient لتقييد التحديث (افتراضياً كل الوارد)
+        request: الطلب لتسجيل عنوان IP ومعلومات المتصفح في تاريخ الرسالة
+
+    Returns:
+        tuple: (عدد السجلات التي عُلمت الآن، وقت القراءة المكتوب)
+    """
+    if recipients is None:
+        recipients = MessageRecipient.objects.all()
+    now = timezone.now()
+    updated = recipients.filter(
+        recipient=user, read_at__isnull=True, is_deleted=False
+    ).update(read_at=now)
+    if not updated:
+        return 0, now
+
+    rows = list(
+        MessageRecipient.objects.filter(recipient=user, read_at=now).values_list(
+            'message_id', 'message__message_id', 'message__require_read_receipt'
+        )
+    )
+    _record_reads(user, rows, request)
+    return len(rows), now
+
+
+def mark_recipient_read(recipient, request=None):
+    """
+    تعليم سجل مستقبل واحد كمقروء (الرسالة محملة مسبقاً فلا حاجة لاستعلام قراءة)
+
+    Returns:
+        datetime أو None: وقت القراءة إذا عُلم الآن
+    """
+    now = timezone.now()
+    updated = MessageRecipient.objects.filter(pk=recipient.pk, read_at__isnull=True).update(read_at=now)
+    if not updated:
+        return None
+    message = recipient.message
+    _record_reads(
+        recipient.recipient, [(message.pk, message.message_id, message.require_read_receipt)], request
+    )
+    return now
+
+
+def _record_reads(user, rows, request):
+    """سجلات READ لما يتطلب إيصال قراءة، وتسجيل تغير الصندوق والرسائل"""
+    receipts = [message_pk for message_pk, _, require_receipt in rows if require_receipt]
+    if receipts:
+        ip_address = get_client_ip(request) if request is not None else None
+        user_agent = request.META.get('HTTP_USER_AGENT', '') if request is not None else ''
+        MessageHistory.objects.bulk_create([
+            MessageHistory(
+                message_id=message_pk,
+                action='READ',
+                performed_by=user,
+                ip_address=ip_address,
+                user_agent=user_agent,
+            )
+            for message_pk in receipts
+        ])
+
+    mailbox_changed([user.pk], [message_id for _, message_id, _ in rows])
+    # عداد غير المقروءة المحفوظ على نسخة المستخدم (القالب الأساسي)
+    if getattr(user, '_unread_messages_count', None) is not None:
+        user._unread_messages_count = max(user._unread_messages_count - len(rows), 0)
@@ -166,26 +166,18 @@ def get_system_health_status():
         return f'خطأ: {str(e)}'
 
 def get_suspicious_activities(start_date):
-    """الأنشطة المشبوهة"""
-    from security.models import AuditLog
+    """الأنشطة المشبوهة (الحوادث التي سجلها كاشف الشذوذ security.anomaly)"""
+    from security.models import SecurityIncident
+    from django.db.models import Sum
     
-    suspicious = []
+    incidents = SecurityIncident.objects.filter(
+        last_seen__gte=start_date
+    ).exclude(rule='').values('title', 'ip_address').annotate(count=Sum('event_count')).order_by('-count')
     
-    # محاولات دخول متعددة فاشلة
-    from django.db.models import Count
-    failed_attempts = AuditLog.objects.filter(
-        action_type='FAILED_LOGIN',
-        timestamp__gte=start_date
-    ).values('user_ip').annotate(count=Count('id')).filter(count__gte=5)
-    
-    for attempt in failed_attempts:
-        suspicious.append({
-            'type': 'محاولات دخول متعددة فاشلة',
-            'ip': attempt['user_ip'],
-            'count': attempt['count']
-        })
-    
-    return suspicious
+    return [
+        {'type': incident['title'], 'ip': incident['ip_address'], 'count': incident['count']}
+        for incident in incidents
+    ]
 
 def export_report_to_excel(report_data, filename):
     """تصدير التقرير إلى Excel"""
@@ -0,0 +1,172 @@
+"""
+محرك الاحتفاظ بالرسائل
+ينفذ مواعيد انتهاء الصلاحية المخزنة في الرسائل والتوقيعات خارج مسار الطلبات:
+- الرسائل التي تجاوزت expires_at تُحذف من صناديق مرسلها ومستقبليها (DELETED).
+- الرسائل التي تجاوزت auto_delete_at تُحذف نهائياً مع مستقبليها ومرفقاتها وتوقيعاتها.
+- التوقيعات الصالحة التي تجاوزت expires_at تُعلم EXPIRED.
+كل دفعة في معاملة مستقلة محدودة الحجم، وتعتمد على الفهارس الجزئية على مواعيد الاستحقاق.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    DigitalSignature, MailboxEntry, Message, MessageAttachment, MessageHistory, MessageRecipient,
+)
+from .versions import mailbox_changed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+# الجداول التابعة للرسالة (كلها message_id و on_delete=CASCADE)
+MESSAGE_RELATED_MODELS = (MailboxEntry, MessageHistory, DigitalSignature, MessageAttachment, MessageRecipient)
+
+
+def expire_due_messages(now=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    حذف دفعة من الرسائل المنتهية الصلاحية من صناديق البريد
+
+    Returns:
+        int: عدد الرسائل المنتهية
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = list(
+            Message.objects.select_for_update(skip_locked=True).filter(
+                expires_at__isnull=False, expires_at__lte=now
+            ).exclude(status='DELETED').order_by('expires_at').values_list(
+                'pk', 'message_id', 'sender_id'
+            )[:batch_size]
+        )
+        if not due:
+            return 0
+
+        message_pks = [pk for pk, _, _ in due]
+        recipients = MessageRecipient.objects.filter(message_id__in=message_pks)
+        user_ids = set(recipients.values_list('recipient_id', flat=True))
+        Message.objects.filter(pk__in=message_pks).update(status='DELETED')
+        recipients.filter(is_deleted=False).update(is_deleted=True, deleted_at=now)
+
+    mailbox_changed(user_ids | {sender_id for _, _, sender_id in due}, [message_id for _, message_id, _ in due])
+    return len(due)
+
+
+def purge_due_messages(now=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    حذف دفعة من الرسائل التي حان موعد حذفها التلقائي نهائياً
+
+    الحذف يتم بجمل DELETE مباشرة (delete_message_rows)، والردود والتحويلات خارج الدفعة تُفصل عن الرسالة الأصلية بدلاً من حذفها معها.
+    ملفات المرفقات ورموز QR تُحذف من التخزين بعد نجاح المعاملة.
+
+    Returns:
+        int: عدد الرسائل المحذوفة
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = list(
+            Message.objects.select_for_update(skip_locked=True).filter(
+                auto_delete_at__isnull=False, auto_delete_at__lte=now
+            ).order_by('auto_delete_at').values_list('pk', 'message_id', 'sender_id')[:batch_size]
+        )
+        if not due:
+            return 0
+
+        message_pks = [pk for pk, _, _ in due]
+        user_ids = set(
+            MessageRecipient.objects.filter(message_id__in=message_pks).values_list('recipient_id', flat=True)
+        )
+        files = [
+            (MessageAttachment._meta.get_field('file').storage, name)
+            for name in MessageAttachment.objects.filter(message_id__in=message_pks).values_list('file', flat=True)
+        ] + [
+            (DigitalSignature._meta.get_field('qr_code').storage, name)
+            for name in DigitalSignature.objects.filter(message_id__in=message_pks).values_list('qr_code', flat=True)
+        ]
+
+        Message.objects.filter(reply_to_id__in=message_pks).exclude(pk__in=message_pks).update(reply_to=None)
+        Message.objects.filter(forwarded_from_id__in=message_pks).exclude(pk__in=message_pks).update(
+            forwarded_from=None
+        )
+        delete_message_rows(message_pks)
+
+        transaction.on_commit(lambda: delete_stored_files(files))
+
+    mailbox_changed(user_ids | {sender_id for _, _, sender_id in due}, [message_id for _, message_id, _ in due])
+    return len(due)
+
+
+def delete_message_rows(message_pks):
+    """
+    حذف صفوف الرسائل وكل الصفوف التابعة لها بجمل DELETE مباشرة
+    (دون تحميل الصفوف أو إشارات الحذف لكل صف، فالمستدعي يسجل تغير الصناديق بنفسه)
+    """
+    for model in MESSAGE_RELATED_MODELS:
+        queryset = model.objects.filter(message_id__in=message_pks)
+        queryset._raw_delete(queryset.db)
+    queryset = Message.objects.filter(pk__in=message_pks)
+    queryset._raw_delete(queryset.db)
+
+
+def delete_stored_files(files):
+    """حذف ملفات من التخزين (قائمة (storage, name)) مع تجاهل الملفات المفقودة"""
+    for storage, name in files:
+        if not name:
+            continue
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning('تعذر حذف الملف %s', name, exc_info=True)
+
+
+def expire_due_signatures(now=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    تعليم دفعة من التوقيعات الصالحة المنتهية بـ EXPIRED
+
+    Returns:
+        int: عدد التوقيعات المنتهية
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = list(
+            DigitalSignature.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                verification_status='VALID', expires_at__lte=now
+            ).order_by('expires_at').values_list('pk', 'message__message_id')[:batch_size]
+        )
+        if not due:
+            return 0
+        DigitalSignature.objects.filter(pk__in=[pk for pk, _ in due], verification_status='VALID').update(
+            verification_status='EXPIRED'
+        )
+
+    mailbox_changed([], {message_id for _, message_id in due})
+    return len(due)
+
+
+def process_retention(now=None, batch_size=DEFAULT_BATCH_SIZE, max_batches=20):
+    """
+    دورة واحدة لمحرك الاحتفاظ: دفعات متتالية حتى تنتهي العناصر المستحقة أو يبلغ الحد الأقصى
+
+    Returns:
+        dict: {'expired': int, 'purged': int, 'signatures': int}
+    """
+    now = now or timezone.now()
+    stats = {'expired': 0, 'purged': 0, 'signatures': 0}
+    handlers = (
+        (purge_due_messages, 'purged'),
+        (expire_due_messages, 'expired'),
+        (expire_due_signatures, 'signatures'),
+    )
+    for handler, key in handlers:
+        for _ in range(max_batches):
+            processed = handler(now=now, batch_size=batch_size)
+            stats[key] += processed
+            if processed < batch_size:
+                break
+    if any(stats.values()):
+        logger.info(
+            'الاحتفاظ بالرسائل: انتهاء %(expired)d رسالة وحذف %(purged)d رسالة وانتهاء %(signatures)d توقيع',
+            stats,
+        )
+    return stats
@@ -0,0 +1,72 @@
+"""
+تسجيل تغير صناديق البريد والرسائل (لوحة التحكم ونسخ ETag)
+الإنشاء والتحديث الجماعي (bulk_create / update) لا يرسل post_save فيُسجل في موضعه
+"""
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import DigitalSignature, Message, MessageAttachment, MessageRecipient
+from .signature_utils import signature_verification_cache_key
+from .versions import mailbox_changed
+
+
+def _message_recipient_ids(message):
+    return list(MessageRecipient.objects.filter(message_id=message.pk).values_list('recipient_id', flat=True))
+
+
+def _deleted_with_message(origin):
+    """الحذف المتتالي من حذف رسالة: معالج الرسالة يسجل التغير مرة واحدة بدلاً من كل صف تابع"""
+    if isinstance(origin, QuerySet):
+        return origin.model is Message
+    return isinstance(origin, Message)
+
+
+@receiver(pre_delete, sender=Message)
+def message_deleting(sender, instance, **kwargs):
+    # المستقبلون يُحذفون قبل الرسالة، فتُقرأ معرفاتهم قبل الحذف
+    instance._deleted_recipient_ids = _message_recipient_ids(instance)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def message_changed(sender, instance, created=False, **kwargs):
+    user_ids = [instance.sender_id]
+    if hasattr(instance, '_deleted_recipient_ids'):
+        user_ids.extend(instance._deleted_recipient_ids)
+    elif not created and instance.pk:
+        # حالة الرسالة تظهر في صفوف صناديق مستقبليها
+        user_ids.extend(_message_recipient_ids(instance))
+    mailbox_changed(user_ids, [instance.message_id])
+
+
+def _message_uuid(instance):
+    if type(instance).message.is_cached(instance):
+        return instance.message.message_id
+    return Message.objects.filter(pk=instance.message_id).values_list('message_id', flat=True).first()
+
+
+@receiver(post_save, sender=MessageRecipient)
+@receiver(post_delete, sender=MessageRecipient)
+def recipient_changed(sender, instance, origin=None, **kwargs):
+    if _deleted_with_message(origin):
+        return
+    mailbox_changed([instance.recipient_id], [_message_uuid(instance)])
+
+
+@receiver(post_save, sender=MessageAttachment)
+@receiver(post_delete, sender=MessageAttachment)
+@receiver(post_save, sender=DigitalSignature)
+@receiver(post_delete, sender=DigitalSignature)
+def message_part_changed(sender, instance, origin=None, **kwargs):
+    if _deleted_with_message(origin):
+        return
+    mailbox_changed([], [_message_uuid(instance)])
+
+
+@receiver(post_save, sender=DigitalSignature)
+@receiver(post_delete, sender=DigitalSignature)
+def signature_changed(sender, instance, **kwargs):
+    # نتيجة التحقق المخزنة (إلغاء التوقيع أو تعديله من لوحة الإدارة)
+    cache.delete(signature_verification_cache_key(instance.signature_id))
@@ -6,12 +6,19 @@ import json
 import hashlib
 import io
 import base64
+import csv
+import time
+import uuid
 from PIL import Image, ImageDraw, ImageFont
+from django.core.cache import cache
 from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta
+from monitoring import metrics
 from .models import DigitalSignature
+from .versions import mailbox_changed
 
 
 def generate_qr_code(data, size=(300, 300), border=4):
@@ -203,52 +210,90 @@ def create_digital_signature(message, signer, signature_type='REPLY', reason='',
     except:
         pass
     
+    started = time.perf_counter()
     qr_file = generate_signature_qr_with_logo(qr_display_data, logo_path)
+    metrics.SIGNATURE_QR_RENDER.observe(time.perf_counter() - started)
     signature.qr_code.save(f'signature_{signature.signature_id}.png', qr_file)
     
     return signature
 
 
-def verify_signature(signature_id):
+def signature_verification_cache_key(signature_id):
+    """مفتاح نتيجة التحقق المخزنة للتوقيع"""
+    return f'signature_verification_{signature_id}'
+
+
+def _verification_entry(signature):
+    """الأجزاء الثابتة من نتيجة التحقق (تُخزن في cache ولا تعتمد على وقت الطلب)"""
+    return {
+        'signature': {
+            'id': signature.id,
+            'signature_id': str(signature.signature_id),
+            'hash_value': signature.hash_value,
+            'key_id': signature.key_id,
+            'qr_code': signature.qr_code.name or '',
+        },
+        'verification_details': {
+            'status': signature.verification_status,
+            'signed_at': signature.signed_at,
+            'expires_at': signature.expires_at,
+            'hash_valid': signature.verify_hash(),
+            'signer_info': signature.signature_data.get('signer_info', {}),
+            'message_info': signature.signature_data.get('message_info', {}),
+        },
+    }
+
+
+def verify_signature(signature_id, now=None):
     """
     التحقق من صحة التوقيع الرقمي
     
+    نتيجة التحقق تُخزن في cache لكل توقيع (SIGNATURE_VERIFICATION_CACHE_TIMEOUT) فمسح رمز QR
+    المتكرر لا يصل إلى قاعدة البيانات، وتُحذف عند تعديل التوقيع أو إلغائه (messaging.signals).
+    انتهاء الصلاحية يُحسب عند كل طلب من expires_at المخزن.
+    
     Args:
         signature_id: معرف التوقيع
+        now: الوقت المرجعي لانتهاء الصلاحية
     
     Returns:
         dict: نتيجة التحقق
     """
-    try:
-        signature = DigitalSignature.objects.get(signature_id=signature_id)
-        
-        verification_result = {
-            'is_valid': signature.is_valid(),
-            'signature': signature,
-            'verification_details': {
-                'status': signature.verification_status,
-                'signed_at': signature.signed_at,
-                'expires_at': signature.expires_at,
-                'hash_valid': signature.verify_hash(),
-                'signer_info': signature.signature_data.get('signer_info', {}),
-                'message_info': signature.signature_data.get('message_info', {}),
+    cache_key = signature_verification_cache_key(signature_id)
+    entry = cache.get(cache_key)
+    if entry is None:
+        try:
+            signature = DigitalSignature.objects.select_related(
+                'signer', 'message__sender'
+            ).get(signature_id=signature_id)
+            entry = _verification_entry(signature)
+        except DigitalSignature.DoesNotExist:
+            return {
+                'is_valid': False,
+                'error': 'التوقيع غير موجود',
+                'verification_details': None
             }
-        }
-        
-        return verification_result
-        
-    except DigitalSignature.DoesNotExist:
-        return {
-            'is_valid': False,
-            'error': 'التوقيع غير موجود',
-            'verification_details': None
-        }
-    except Exception as e:
-        return {
-            'is_valid': False,
-            'error': f'خطأ في التحقق: {str(e)}',
-            'verification_details': None
-        }
+        except Exception as e:
+            return {
+                'is_valid': False,
+                'error': f'خطأ في التحقق: {str(e)}',
+                'verification_details': None
+            }
+        timeout = getattr(settings, 'SIGNATURE_VERIFICATION_CACHE_TIMEOUT', 3600)
+        if timeout:
+            cache.set(cache_key, entry, timeout)
+    
+    now = now or timezone.now()
+    details = dict(entry['verification_details'])
+    if details['status'] == 'VALID' and details['expires_at'] and now > details['expires_at']:
+        details['status'] = 'EXPIRED'
+    # التوقيعات السابقة لـ HMAC (دون key_id) تُقبل بحالتها فقط
+    hash_ok = details['hash_valid'] or not entry['signature']['key_id']
+    return {
+        'is_valid': details['status'] == 'VALID' and hash_ok,
+        'signature': entry['signature'],
+        'verification_details': details,
+    }
 
 
 def get_client_ip(request):
@@ -286,6 +331,71 @@ def generate_signature_certificate(signature):
     return f"CHAM-{cert_hash[:12].upper()}"
 
 
+VERIFICATION_BATCH_SIZE = 1000
+
+# أعمدة تقرير التحقق (JSON و CSV)
+VERIFICATION_REPORT_FIELDS = [
+    'signature_id', 'is_valid', 'status', 'signature_type', 'signer', 'employee_id',
+    'message', 'signed_at', 'expires_at', 'hash_valid',
+]
+
+
+def verify_signatures(queryset, now=None, batch_size=VERIFICATION_BATCH_SIZE):
+    """
+    التحقق من مجموعة كبيرة من التوقيعات على دفعات
+
+    الموقعون والرسائل يُحملون مع التوقيعات (select_related)، والتوقيعات التي انتهت
+    صلاحيتها ولم تُعلم بعد تُحدث بجملة UPDATE واحدة لكل دفعة.
+
+    Args:
+        queryset: التوقيعات المطلوب التحقق منها
+        now: الوقت المرجعي لانتهاء الصلاحية
+        batch_size: عدد التوقيعات في كل دفعة
+
+    Yields:
+        dict: صف التقرير لكل توقيع (VERIFICATION_REPORT_FIELDS)
+    """
+    now = now or timezone.now()
+    signatures = queryset.select_related('signer', 'message__sender').order_by('pk')
+    batch = []
+    for signature in signatures.iterator(chunk_size=batch_size):
+        batch.append(signature)
+        if len(batch) >= batch_size:
+            yield from _verify_batch(batch, now)
+            batch = []
+    if batch:
+        yield from _verify_batch(batch, now)
+
+
+def _verify_batch(signatures, now):
+    expired = [
+        signature for signature in signatures
+        if signature.verification_status == 'VALID' and signature.expires_at and signature.expires_at <= now
+    ]
+    if expired:
+        DigitalSignature.objects.filter(
+            pk__in=[signature.pk for signature in expired], verification_status='VALID'
+        ).update(verification_status='EXPIRED')
+        mailbox_changed([], {signature.message.message_id for signature in expired})
+        for signature in expired:
+            signature.verification_status = 'EXPIRED'
+
+    for signature in signatures:
+        hash_valid = signature.verify_hash()
+        yield {
+            'signature_id': str(signature.signature_id),
+            'is_valid': signature.verification_status == 'VALID' and (hash_valid or not signature.key_id),
+            'status': signature.verification_status,
+            'signature_type': signature.signature_type,
+            'signer': signature.signer.arabic_name,
+            'employee_id': signature.signer.employee_id,
+            'message': signature.message.sequence_number,
+            'signed_at': signature.signed_at,
+            'expires_at': signature.expires_at,
+            'hash_valid': hash_valid,
+        }
+
+
 def batch_verify_signatures(signature_ids):
     """
     التحقق من عدة توقيعات دفعة واحدة
@@ -294,26 +404,84 @@ def batch_verify_signatures(signature_ids):
         signature_ids: قائمة معرفات التوقيع
     
     Returns:
-        dict: نتائج التحقق لكل توقيع
+        dict: نتائج التحقق لكل توقيع (المعرف كنص)
     """
-    results = {}
-    signatures = DigitalSignature.objects.filter(signature_id__in=signature_ids)
-    
-    for signature in signatures:
-        results[str(signature.signature_id)] = {
-            'is_valid': signature.is_valid(),
-            'status': signature.verification_status,
-            'signer': signature.signer.arabic_name,
-            'signed_at': signature.signed_at,
-        }
+    requested = {}
+    for signature_id in signature_ids:
+        try:
+            requested[str(signature_id)] = str(uuid.UUID(str(signature_id)))
+        except ValueError:
+            requested[str(signature_id)] = None
+
+    found = {
+        row['signature_id']: row
+        for row in verify_signatures(
+            DigitalSignature.objects.filter(signature_id__in={value for value in requested.values() if value})
+        )
+    }
     
     # إضافة التوقيعات غير الموجودة
-    found_ids = [str(sig.signature_id) for sig in signatures]
-    for sig_id in signature_ids:
-        if sig_id not in found_ids:
-            results[sig_id] = {
-                'is_valid': False,
-                'error': 'التوقيع غير موجود'
-            }
-    
-    return results
\ No newline at end of file
+    not_found = {'is_valid': False, 'error': 'التوقيع غير موجود'}
+    return {key: found.get(value, not_found) for key, value in requested.items()}
+
+
+def get_batch_verify_max():
+    return getattr(settings, 'SIGNATURE_BATCH_VERIFY_MAX', 1000)
+
+
+def signatures_for_report(date_from=None, date_to=None, signature_type=None):
+    """
+    التوقيعات الموقعة في فترة (للمراجعين)
+
+    Args:
+        date_from: أول يوم (date) شاملاً
+        date_to: آخر يوم (date) شاملاً
+        signature_type: نوع التوقيع (APPROVAL، REPLY، ...)
+
+    Returns:
+        QuerySet: التوقيعات المطابقة
+    """
+    signatures = DigitalSignature.objects.all()
+    if date_from:
+        signatures = signatures.filter(
+            signed_at__gte=timezone.make_aware(datetime.combine(date_from, datetime.min.time()))
+        )
+    if date_to:
+        signatures = signatures.filter(
+            signed_at__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+        )
+    if signature_type:
+        signatures = signatures.filter(signature_type=signature_type)
+    return signatures
+
+
+def write_verification_report(rows, stream, report_format='json'):
+    """
+    كتابة تقرير التحقق بصيغة JSON أو CSV
+
+    Args:
+        rows: صفوف التقرير (من verify_signatures)
+        stream: ملف أو استجابة HTTP للكتابة
+        report_format: 'json' أو 'csv'
+
+    Returns:
+        dict: عدد التوقيعات لكل حالة
+    """
+    summary = {}
+    if report_format == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=VERIFICATION_REPORT_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            summary[row['status']] = summary.get(row['status'], 0) + 1
+            writer.writerow({
+                **row,
+                'signed_at': row['signed_at'].isoformat() if row['signed_at'] else '',
+                'expires_at': row['expires_at'].isoformat() if row['expires_at'] else '',
+            })
+        return summary
+
+    rows = list(rows)
+    for row in rows:
+        summary[row['status']] = summary.get(row['status'], 0) + 1
+    json.dump({'summary': summary, 'signatures': rows}, stream, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return summary
@@ -0,0 +1,66 @@
+"""
+مفاتيح التوقيع الرقمي (HMAC-SHA256)
+كل توقيع يُخزن مع معرف المفتاح الذي وُقّع به (key_id)، فتدوير المفاتيح يتم بإضافة مفتاح جديد
+إلى SIGNATURE_HMAC_KEYS وجعله SIGNATURE_HMAC_KEY_ID مع إبقاء المفاتيح القديمة للتحقق من التوقيعات السابقة.
+"""
+import hashlib
+import hmac
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+
+# معرف المفتاح المشتق من SECRET_KEY عند عدم ضبط SIGNATURE_HMAC_KEYS
+DEFAULT_KEY_ID = 'default'
+
+
+def get_signing_keys():
+    """
+    مفاتيح التوقيع المعروفة
+
+    Returns:
+        dict: {معرف المفتاح: المفتاح (bytes)}
+    """
+    keys = {}
+    for entry in getattr(settings, 'SIGNATURE_HMAC_KEYS', None) or []:
+        key_id, sep, secret = entry.partition(':')
+        if not sep or not key_id.strip() or not secret:
+            raise ImproperlyConfigured('SIGNATURE_HMAC_KEYS يجب أن تكون بالصيغة key_id:secret')
+        keys[key_id.strip()] = secret.encode()
+    if not keys:
+        keys[DEFAULT_KEY_ID] = hashlib.sha256(f'messaging.signature:{settings.SECRET_KEY}'.encode()).digest()
+    return keys
+
+
+def get_current_key_id():
+    """معرف المفتاح المستخدم للتوقيعات الجديدة"""
+    keys = get_signing_keys()
+    key_id = getattr(settings, 'SIGNATURE_HMAC_KEY_ID', '') or next(iter(keys))
+    if key_id not in keys:
+        raise ImproperlyConfigured(f'مفتاح التوقيع {key_id} غير موجود في SIGNATURE_HMAC_KEYS')
+    return key_id
+
+
+def canonicalize(data):
+    """تمثيل ثابت للبيانات (مفاتيح مرتبة ودون مسافات) حتى يعطي نفس المحتوى نفس التوقيع دائماً"""
+    return json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def sign(data, key_id):
+    """
+    حساب HMAC-SHA256 للبيانات بالمفتاح المحدد
+
+    Returns:
+        str: التوقيع بصيغة hex (64 حرفاً)، أو None إذا كان المفتاح غير معروف
+    """
+    key = get_signing_keys().get(key_id)
+    if key is None:
+        return None
+    return hmac.new(key, canonicalize(data), hashlib.sha256).hexdigest()
+
+
+def verify(data, key_id, digest):
+    """مقارنة التوقيع المخزن بالمحسوب بزمن ثابت"""
+    expected = sign(data, key_id)
+    return expected is not None and bool(digest) and hmac.compare_digest(expected, digest)
@@ -0,0 +1,70 @@
+"""
+تخزين مرفقات الرسائل مشفرة
+الملفات تُشفر أثناء كتابتها وتُفك أثناء قراءتها في أجزاء موثقة بحجم ثابت (messaging.encryption)،
+ومفتاح بيانات كل ملف مغلفاً في ترويسته، فالتخزين لا يحتاج إلى قاعدة البيانات لفك ملفاته.
+"""
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+
+from .encryption import (
+    DEFAULT_CHUNK_SIZE, DecryptingFile, EncryptingFile, get_current_key_id, plaintext_size, read_stream_header,
+    rewrap_stream,
+)
+
+
+class _StreamContent(File):
+    """محتوى جاهز للكتابة كما هو من مولد أجزاء"""
+
+    def __init__(self, chunks):
+        super().__init__(None)
+        self._chunks = chunks
+
+    def chunks(self, chunk_size=None):
+        return self._chunks
+
+
+class EncryptedFileSystemStorage(FileSystemStorage):
+    """
+    تخزين ملفات يشفر المحتوى عند الحفظ ويفكه عند الفتح
+    open يعيد DecryptingFile يقبل seek، فقراءة جزء من الملف (طلبات Range) تفك الأجزاء التي تغطيه فقط.
+    الملفات غير المشفرة (السابقة للتشفير) تُقرأ كما هي حتى تشفرها مهمة rotate_encryption_keys.
+    """
+
+    def __init__(self, *args, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chunk_size = chunk_size
+
+    def _save(self, name, content):
+        return super()._save(name, EncryptingFile(content, self.chunk_size))
+
+    def _open(self, name, mode='rb'):
+        if set(mode) - set('rb'):
+            raise ValueError('الملفات المشفرة تُفتح للقراءة فقط')
+        raw = super()._open(name, 'rb')
+        header = read_stream_header(raw)
+        if header is None:
+            raw.seek(0)
+            return raw
+        return DecryptingFile(raw.file, header, super().size(name), name=name)
+
+    def size(self, name):
+        encrypted_size = super().size(name)
+        with super()._open(name, 'rb') as raw:
+            header = read_stream_header(raw)
+        return encrypted_size if header is None else plaintext_size(header, encrypted_size)
+
+    def rewrap(self, name):
+        """
+        إعادة تغليف مفتاح بيانات الملف بالمفتاح الرئيسي الحالي في ملف جديد (الأجزاء المشفرة تُنسخ كما هي)
+
+        Returns:
+            str: اسم الملف الجديد، أو None إذا كان الملف غير مشفر أو مفتاحه مغلفاً بالمفتاح الحالي
+        """
+        with super()._open(name, 'rb') as raw:
+            header = read_stream_header(raw)
+            if header is None or header.key_id == get_current_key_id():
+                return None
+            return super()._save(self.get_available_name(name), _StreamContent(rewrap_stream(raw, header)))
+
+
+attachment_storage = EncryptedFileSystemStorage()
@@ -0,0 +1,26 @@
+"""
+المهام الخلفية لتطبيق المراسلات (Celery)
+"""
+from celery import shared_task
+
+from .cold_storage import process_cold_storage
+from .key_rotation import process_key_rotation
+from .retention import process_retention
+
+
+@shared_task(ignore_result=True)
+def process_message_retention():
+    """دورة محرك الاحتفاظ بالرسائل (تُشغل دورياً عبر celery beat)"""
+    return process_retention()
+
+
+@shared_task(ignore_result=True)
+def freeze_old_messages():
+    """نقل الرسائل القديمة إلى الأرشيف البارد (يومياً عبر celery beat)"""
+    return process_cold_storage()
+
+
+@shared_task(ignore_result=True)
+def rotate_encryption_keys():
+    """إعادة تغليف مفاتيح البيانات بالمفتاح الرئيسي الحالي وتشفير المحتوى السابق للتشفير"""
+    return process_key_rotation()
@@ -0,0 +1,130 @@
+"""
+تخزين صفوف صناديق البريد المعروضة في الـ cache
+
+كل صف يُخزن بمفتاح يتضمن نسخة حالته (للوارد: رقم سجل المستقبل، وقت القراءة، الحذف
+وحالة الرسالة)، والوقت النسبي المعروض، ونسخة دليل الموظفين (اسم المرسل ومنصبه)،
+فأي تغيير في الحالة ينتج مفتاحاً جديداً ولا حاجة لإبطال صريح.
+
+الاستخدام:
+    {% load mailbox_cache %}
+    {% prefetch_mailbox_rows 'inbox' message_recipients %}
+    {% for recipient in message_recipients %}
+        {% mailbox_row 'inbox' recipient %} ... {% endmailbox_row %}
+    {% endfor %}
+
+prefetch_mailbox_rows يجلب صفوف الصفحة كلها بطلب get_many واحد.
+"""
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+from django.utils.timesince import timesince
+
+from accounts.directory import get_directory_version
+
+register = template.Library()
+
+ROW_KEY = 'mailbox_row_{name}_{pk}_{digest}'
+PREFETCH_CONTEXT_KEY = '_mailbox_rows'
+
+
+def _age(value):
+    return timesince(value) if value else ''
+
+
+# نسخة كل نوع من الصفوف: كل ما يظهر في الصف ويتغير بعد الإرسال
+ROW_VERSIONS = {
+    'inbox': lambda recipient: (
+        recipient.pk, recipient.read_at, recipient.is_deleted, recipient.message.status,
+        _age(recipient.message.created_at),
+    ),
+    'sent': lambda message: (
+        message.pk, message.status, message.recipient_count, message.read_count,
+        _age(message.created_at), _age(message.last_read_at),
+    ),
+    'archive': lambda entry: (
+        entry.pk, entry.created_at, entry.message.status, _age(entry.created_at),
+    ),
+}
+
+
+def get_timeout():
+    return getattr(settings, 'MAILBOX_ROW_CACHE_TIMEOUT', 3600)
+
+
+def row_key(name, obj, viewer_id, directory_version):
+    """
+    مفتاح الصف في الـ cache
+
+    Args:
+        name: نوع الصف ('inbox' أو 'sent' أو 'archive')
+        obj: سجل المستقبل أو الرسالة أو موضع الأرشيف
+        viewer_id: المستخدم الحالي (بعض الصفوف تختلف حسب المشاهد)
+        directory_version: نسخة دليل الموظفين
+
+    Returns:
+        str: المفتاح
+    """
+    version = ROW_VERSIONS[name](obj) + (viewer_id, directory_version)
+    digest = hashlib.md5(repr(version).encode('utf-8')).hexdigest()
+    return ROW_KEY.format(name=name, pk=obj.pk, digest=digest)
+
+
+def _viewer_id(context):
+    user = context.get('user')
+    return getattr(user, 'pk', None)
+
+
+@register.simple_tag(takes_context=True)
+def prefetch_mailbox_rows(context, name, rows):
+    """جلب الصفوف المخزنة لصفحة كاملة بطلب واحد"""
+    if get_timeout() <= 0:
+        return ''
+    directory_version = get_directory_version()
+    viewer_id = _viewer_id(context)
+    keys = [row_key(name, obj, viewer_id, directory_version) for obj in rows]
+    context[PREFETCH_CONTEXT_KEY] = {
+        'directory_version': directory_version,
+        'fragments': cache.get_many(keys) if keys else {},
+    }
+    return ''
+
+
+class MailboxRowNode(template.Node):
+    def __init__(self, nodelist, name, obj):
+        self.nodelist = nodelist
+        self.name = name
+        self.obj = obj
+
+    def render(self, context):
+        timeout = get_timeout()
+        if timeout <= 0:
+            return self.nodelist.render(context)
+
+        name = self.name.resolve(context)
+        obj = self.obj.resolve(context)
+        prefetched = context.get(PREFETCH_CONTEXT_KEY)
+        if prefetched is not None:
+            key = row_key(name, obj, _viewer_id(context), prefetched['directory_version'])
+            html = prefetched['fragments'].get(key)
+        else:
+            key = row_key(name, obj, _viewer_id(context), get_directory_version())
+            html = cache.get(key)
+
+        if html is None:
+            html = self.nodelist.render(context)
+            cache.set(key, str(html), timeout)
+        return mark_safe(html)
+
+
+@register.tag
+def mailbox_row(parser, token):
+    """{% mailbox_row name obj %} ... {% endmailbox_row %}"""
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' يتطلب نوع الصف والكائن")
+    nodelist = parser.parse(('endmailbox_row',))
+    parser.delete_first_token()
+    return MailboxRowNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
@@ -1,3 +1,1002 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from cryptography.fernet import Fernet
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Department, Position, User
+from myproject.perf_fixtures import TEST_STORAGES, PerformanceTestCase
+
+from .cold_storage import process_cold_storage
+from .encryption import DecryptingFile, DecryptionError
+from .key_rotation import process_key_rotation
+from .models import (
+    MAX_THREAD_DEPTH, THREAD_SEGMENT_WIDTH, ColdMessage, ColdMessageParticipant, DigitalSignature, MailboxEntry, Message, MessageAttachment, MessageHistory, MessageRecipient,
+)
+from .receipts import mark_read
+from .retention import process_retention
+from .signature_utils import batch_verify_signatures
+from .storage import EncryptedFileSystemStorage
+from .notifications import send_bulk_notifications
+
+
+class MailboxQueryBudgetTests(PerformanceTestCase):
+    """ميزانية الاستعلامات والزمن لصفحات البريد"""
+
+    def test_inbox(self):
+        self.assertQueryBudget(reverse('messaging:inbox'), max_queries=5)
+
+    def test_inbox_full_page(self):
+        self.assertQueryBudget(reverse('messaging:inbox') + '?per_page=50', max_queries=5)
+
+    def test_sent(self):
+        self.assertQueryBudget(reverse('messaging:sent'), max_queries=7)
+
+    def test_archive(self):
+        self.assertQueryBudget(reverse('messaging:archive'), max_queries=9)
+
+    def test_message_detail(self):
+        recipient = MessageRecipient.objects.filter(recipient=self.focus).select_related('message').first()
+        self.assertQueryBudget(
+            reverse('messaging:message_detail', args=[recipient.message.message_id]), max_queries=10
+        )
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class MailboxRowCacheTests(TestCase):
+    """صفوف صندوق الوارد تُقرأ من الـ cache وتُعاد عند تغير حالتها"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.user, cls.sender = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'مستخدم {i}',
+                employee_id=f'100{i}', phone=f'10{i}', department=department, position=position,
+            )
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        send_bulk_notifications([(self.user, 'الموضوع الأول', 'نص')], sender=self.sender)
+        self.client.force_login(self.user)
+
+    def test_row_is_cached_until_state_changes(self):
+        self.assertContains(self.client.get(reverse('messaging:inbox')), 'الموضوع الأول')
+
+        # تعديل لا يغير نسخة الصف: يبقى الصف المخزن
+        Message.objects.update(subject='الموضوع المعدل')
+        self.assertContains(self.client.get(reverse('messaging:inbox')), 'الموضوع الأول')
+
+        # القراءة تغير نسخة الصف فيُعاد عرضه
+        MessageRecipient.objects.get(recipient=self.user).mark_as_read()
+        response = self.client.get(reverse('messaging:inbox'))
+        self.assertContains(response, 'الموضوع المعدل')
+        self.assertNotContains(response, 'الموضوع الأول')
+
+    @override_settings(MAILBOX_ROW_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        self.client.get(reverse('messaging:inbox'))
+        Message.objects.update(subject='الموضوع المعدل')
+        self.assertContains(self.client.get(reverse('messaging:inbox')), 'الموضوع المعدل')
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ConditionalGetTests(TestCase):
+    """صندوق الوارد وتفاصيل الرسالة يردان بـ 304 ما دامت النسخ لم تتغير"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.user, cls.sender = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'مستخدم {i}',
+                employee_id=f'100{i}', phone=f'10{i}', department=department, position=position,
+            )
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        send_bulk_notifications([(self.user, 'موضوع', 'نص')], sender=self.sender)
+        self.client.force_login(self.user)
+
+    def _revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_inbox(self):
+        url = reverse('messaging:inbox')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self._revalidate(url, etag).status_code, 304)
+
+        send_bulk_notifications([(self.user, 'موضوع آخر', 'نص')], sender=self.sender)
+        response = self._revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_inbox_etag_is_per_user(self):
+        url = reverse('messaging:inbox')
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.sender)
+        self.assertEqual(self._revalidate(url, etag).status_code, 200)
+
+    def test_message_detail(self):
+        recipient = MessageRecipient.objects.select_related('message').get(recipient=self.user)
+        url = reverse('messaging:message_detail', args=[recipient.message.message_id])
+
+        # أول عرض يعلم الرسالة كمقروءة ويرسل ETag ما بعد القراءة
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self._revalidate(url, etag).status_code, 304)
+
+        recipient.message.subject = 'موضوع معدل'
+        recipient.message.save()
+        self.assertContains(self._revalidate(url, etag), 'موضوع معدل')
+
+    def test_deleting_message_invalidates_recipient_inbox(self):
+        url = reverse('messaging:inbox')
+        etag = self.client.get(url)['ETag']
+        Message.objects.get(recipients=self.user).delete()
+        self.assertEqual(self._revalidate(url, etag).status_code, 200)
+
+    def test_cascade_delete_query_count_is_constant(self):
+        department, position = self.user.department, self.user.position
+        users = [
+            User.objects.create_user(
+                username=f'reader{i}', password='pass', arabic_name=f'قارئ {i}',
+                employee_id=f'200{i}', phone=f'20{i}', department=department, position=position,
+            )
+            for i in range(10)
+        ]
+        message = Message.objects.get(recipients=self.user)
+
+        def delete_with(recipients):
+            copy = Message.objects.get(pk=message.pk)
+            copy.pk = None
+            copy.sequence_number = f'{message.sequence_number}-{len(recipients)}'
+            copy.message_id = uuid.uuid4()
+            copy.save()
+            MessageRecipient.objects.bulk_create(MessageRecipient(message=copy, recipient=user) for user in recipients)
+            with CaptureQueriesContext(connection) as queries:
+                copy.delete()
+            return len(queries)
+
+        self.assertEqual(delete_with(users[:2]), delete_with(users))
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ReadReceiptTests(TestCase):
+    """تعليم القراءة بتحديث موجه واحد مهما كان عدد الرسائل"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.user, cls.sender = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'مستخدم {i}',
+                employee_id=f'100{i}', phone=f'10{i}', department=department, position=position,
+            )
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        send_bulk_notifications([(self.user, f'موضوع {i}', 'نص') for i in range(30)], sender=self.sender)
+        self.messages = list(Message.objects.order_by('pk'))
+        Message.objects.filter(pk__in=[m.pk for m in self.messages[:10]]).update(require_read_receipt=True)
+
+    def test_mark_read_is_idempotent_and_constant(self):
+        with self.assertNumQueries(3):
+            updated, _ = mark_read(self.user)
+        self.assertEqual(updated, 30)
+        self.assertEqual(MessageHistory.objects.filter(action='READ').count(), 10)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(mark_read(self.user)[0], 0)
+        self.assertEqual(MessageHistory.objects.filter(action='READ').count(), 10)
+
+    def test_model_mark_as_read(self):
+        recipient = MessageRecipient.objects.select_related('recipient').get(message=self.messages[0])
+        self.assertTrue(recipient.mark_as_read())
+        self.assertIsNotNone(recipient.read_at)
+        stale = MessageRecipient.objects.select_related('recipient').get(pk=recipient.pk)
+        stale.read_at = None
+        self.assertFalse(stale.mark_as_read())
+        self.assertEqual(stale.read_at, recipient.read_at)
+
+    def test_bulk_api(self):
+        self.client.force_login(self.user)
+        url = reverse('messaging:mark_read_bulk')
+        selected = [str(m.message_id) for m in self.messages[:5]]
+        response = self.client.post(url, {'message_ids': selected})
+        self.assertEqual(response.json(), {'success': True, 'updated': 5, 'unread_count': 25})
+
+        response = self.client.post(url, {'all': '1'})
+        self.assertEqual(response.json(), {'success': True, 'updated': 25, 'unread_count': 0})
+
+        self.assertEqual(self.client.post(url, {'message_ids': ['x']}).status_code, 400)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class BulkActionTests(TestCase):
+    """العمليات الجماعية بعدد ثابت من الاستعلامات ونتيجة لكل رسالة"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.user, cls.sender, cls.other = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'مستخدم {i}',
+                employee_id=f'100{i}', phone=f'10{i}', department=department, position=position,
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        send_bulk_notifications([(self.user, f'موضوع {i}', 'نص') for i in range(20)], sender=self.sender)
+        send_bulk_notifications([(self.other, 'رسالة أخرى', 'نص')], sender=self.sender)
+        self.ids = [str(m.message_id) for m in Message.objects.filter(messagerecipient__recipient=self.user)]
+        self.foreign = str(Message.objects.get(messagerecipient__recipient=self.other).message_id)
+        self.client.force_login(self.user)
+
+    def _post(self, **data):
+        return self.client.post(reverse('messaging:bulk_action'), data)
+
+    def _count_queries(self, ids):
+        with CaptureQueriesContext(connection) as queries:
+            self._post(action='archive', message_ids=ids)
+        return len(queries)
+
+    def test_query_count_is_constant(self):
+        self.assertEqual(self._count_queries(self.ids[:2]), self._count_queries(self.ids[2:]))
+
+    def test_archive_and_restore(self):
+        response = self._post(action='archive', message_ids=self.ids[:3] + [self.foreign])
+        self.assertEqual(response.json()['updated'], 3)
+        self.assertEqual(response.json()['results'][self.foreign], 'not_found')
+        self.assertEqual(MailboxEntry.objects.filter(user=self.user, folder='ARCHIVE').count(), 3)
+        self.assertEqual(MessageHistory.objects.filter(action='ARCHIVED').count(), 3)
+
+        response = self._post(action='archive', message_ids=self.ids[:4])
+        results = response.json()['results']
+        self.assertEqual([results[i] for i in self.ids[:4]], ['unchanged'] * 3 + ['ok'])
+
+        response = self._post(action='move', folder='inbox', message_ids=self.ids[:4])
+        self.assertEqual(response.json()['updated'], 4)
+        self.assertFalse(MailboxEntry.objects.exists())
+
+    def test_delete_and_restore(self):
+        self._post(action='delete', message_ids=self.ids[:5])
+        self.assertEqual(MessageRecipient.objects.filter(recipient=self.user, is_deleted=True).count(), 5)
+        self._post(action='restore', message_ids=self.ids[:5])
+        self.assertFalse(MessageRecipient.objects.filter(is_deleted=True).exists())
+
+    @override_settings(MAILBOX_BULK_MAX_MESSAGES=10)
+    def test_invalid_requests(self):
+        self.assertEqual(self._post(action='archive', message_ids=self.ids).status_code, 400)
+        self.assertEqual(self._post(action='burn', message_ids=self.ids[:1]).status_code, 400)
+        self.assertEqual(self._post(action='move', folder='x', message_ids=self.ids[:1]).status_code, 400)
+        self.assertEqual(self._post(action='archive', message_ids=['x']).status_code, 400)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class MailboxArchiveTests(TestCase):
+    """الأرشفة خاصة بصندوق كل مستخدم"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.first, cls.second, cls.sender = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'مستخدم {i}',
+                employee_id=f'100{i}', phone=f'10{i}', department=department, position=position,
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        send_bulk_notifications(
+            [(self.first, 'تعميم الفرع', 'نص'), (self.second, 'رسالة خاصة', 'نص')], sender=self.sender
+        )
+        message = Message.objects.get(messagerecipient__recipient=self.first)
+        MessageRecipient.objects.create(message=message, recipient=self.second)
+        self.message = message
+
+    def test_archive_is_per_user(self):
+        self.client.force_login(self.first)
+        self.client.post(reverse('messaging:archive_message', args=[self.message.message_id]))
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.status, 'SENT')
+        self.assertNotContains(self.client.get(reverse('messaging:inbox')), 'تعميم الفرع')
+        self.assertContains(self.client.get(reverse('messaging:archive')), 'تعميم الفرع')
+
+        self.client.force_login(self.second)
+        self.assertContains(self.client.get(reverse('messaging:inbox')), 'تعميم الفرع')
+        self.assertNotContains(self.client.get(reverse('messaging:archive')), 'تعميم الفرع')
+        response = self.client.get(reverse('messaging:unarchive_message', args=[self.message.message_id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_unarchive_returns_message_to_inbox(self):
+        self.client.force_login(self.first)
+        self.client.post(reverse('messaging:archive_message', args=[self.message.message_id]))
+        response = self.client.get(reverse('messaging:unarchive_message', args=[self.message.message_id]))
+        self.assertEqual(response.status_code, 200)
+        self.client.post(reverse('messaging:unarchive_message', args=[self.message.message_id]))
+        self.assertFalse(MailboxEntry.objects.exists())
+        self.assertContains(self.client.get(reverse('messaging:inbox')), 'تعميم الفرع')
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class RetentionTests(TestCase):
+    """محرك الاحتفاظ ينفذ مواعيد الانتهاء والحذف التلقائي خارج مسار الطلبات"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.user, cls.sender = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'مستخدم {i}',
+                employee_id=f'100{i}', phone=f'10{i}', department=department, position=position,
+            )
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        send_bulk_notifications([(self.user, f'موضوع {i}', 'نص') for i in range(6)], sender=self.sender)
+        self.messages = list(Message.objects.order_by('pk'))
+        self.past = timezone.now() - timedelta(minutes=1)
+
+    def _sign(self, message, expires_at):
+        return DigitalSignature.objects.create(
+            message=message, signer=self.sender, signature_type='APPROVAL', signature_data={},
+            qr_data='', ip_address='127.0.0.1', user_agent='test', expires_at=expires_at,
+        )
+
+    def test_expire_due_messages(self):
+        Message.objects.filter(pk__in=[m.pk for m in self.messages[:3]]).update(expires_at=self.past)
+        Message.objects.filter(pk=self.messages[3].pk).update(expires_at=timezone.now() + timedelta(days=1))
+        stats = process_retention(batch_size=2)
+        self.assertEqual(stats['expired'], 3)
+        self.assertEqual(Message.objects.filter(status='DELETED').count(), 3)
+        self.assertEqual(MessageRecipient.objects.filter(recipient=self.user, is_deleted=False).count(), 3)
+        self.assertEqual(process_retention()['expired'], 0)
+
+    def test_purge_due_messages(self):
+        doomed, reply = self.messages[0], self.messages[1]
+        Message.objects.filter(pk=reply.pk).update(reply_to=doomed)
+        Message.objects.filter(pk=doomed.pk).update(auto_delete_at=self.past)
+        attachment = MessageAttachment.objects.create(
+            message=doomed, file=ContentFile(b'data', name='report.pdf'), original_filename='report.pdf',
+            file_size=4, mime_type='application/pdf', checksum='x',
+        )
+        self._sign(doomed, timezone.now() + timedelta(days=1))
+        storage, name = attachment.file.storage, attachment.file.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_retention()['purged'], 1)
+        self.assertFalse(Message.objects.filter(pk=doomed.pk).exists())
+        self.assertFalse(MessageRecipient.objects.filter(message_id=doomed.pk).exists())
+        self.assertFalse(DigitalSignature.objects.exists())
+        self.assertFalse(storage.exists(name))
+        reply.refresh_from_db()
+        self.assertIsNone(reply.reply_to_id)
+
+    def test_sequence_numbers_are_not_reused_after_purge(self):
+        numbers = [m.sequence_number for m in self.messages]
+        Message.objects.filter(pk=self.messages[0].pk).update(auto_delete_at=self.past)
+        process_retention()
+        for i in range(2):
+            message = Message.objects.create(
+                sender=self.sender, category=self.messages[0].category, subject=f'بعد الحذف {i}', body='نص',
+            )
+            self.assertNotIn(message.sequence_number, numbers)
+            numbers.append(message.sequence_number)
+        self.assertEqual(numbers[-1], numbers[-2][:-5] + f'{int(numbers[-2][-5:]) + 1:05d}')
+
+    def test_expire_due_signatures(self):
+        expired = self._sign(self.messages[0], self.past)
+        valid = self._sign(self.messages[1], timezone.now() + timedelta(days=1))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(DigitalSignature.objects.get(pk=expired.pk).is_valid())
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(process_retention()['signatures'], 1)
+        self.assertEqual(DigitalSignature.objects.get(pk=expired.pk).verification_status, 'EXPIRED')
+        self.assertEqual(DigitalSignature.objects.get(pk=valid.pk).verification_status, 'VALID')
+
+
+class RecipientSearchTests(TestCase):
+    """واجهة البحث عن المستقبلين (دليل الموظفين)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'سامر {i}',
+                employee_id=f'S10{i}', phone=f'10{i}', department=department, position=position,
+            )
+            for i in range(3)
+        ]
+
+    def test_requires_login(self):
+        response = self.client.get(reverse('messaging:recipient_search'), {'q': 'سامر'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_results_exclude_current_user(self):
+        self.client.force_login(self.users[0])
+        response = self.client.get(reverse('messaging:recipient_search'), {'q': 'سامر', 'limit': 'x'})
+        results = response.json()['results']
+        self.assertEqual([row['id'] for row in results], [self.users[1].pk, self.users[2].pk])
+        self.assertEqual(set(results[0]), {'id', 'arabic_name', 'employee_id', 'department', 'position', 'english_name'})
+
+        response = self.client.get(reverse('messaging:recipient_search'), {'q': 'سامر', 'limit': 1})
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertEqual(self.client.post(reverse('messaging:recipient_search')).status_code, 405)
+        self.assertEqual(self.client.get(reverse('messaging:recipient_search')).json(), {'results': []})
+
+
+class BulkNotificationTests(TestCase):
+    """إشعارات النظام تُرسل دفعة واحدة بعدد ثابت من الاستعلامات"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'مستخدم {i}', is_superuser=(i == 0),
+                employee_id=f'100{i}', phone=f'10{i}', department=department, position=position,
+            )
+            for i in range(4)
+        ]
+
+    def _send(self, count):
+        notifications = [(self.users[1 + i % 3], f'إشعار {i}', 'نص') for i in range(count)]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(send_bulk_notifications(notifications), count)
+        return len(queries)
+
+    def test_query_count_is_constant(self):
+        self._send(1)  # إنشاء تصنيف الإشعارات
+        self.assertEqual(self._send(2), self._send(30))
+        self.assertEqual(Message.objects.filter(sender=self.users[0], status='SENT').count(), 33)
+        self.assertEqual(MessageRecipient.objects.filter(recipient=self.users[1]).count(), 12)
+        numbers = list(Message.objects.values_list('sequence_number', flat=True))
+        self.assertEqual(len(set(numbers)), 33)
+
+    def test_without_sender(self):
+        User.objects.filter(is_superuser=True).update(is_superuser=False)
+        self.assertEqual(send_bulk_notifications([(self.users[1], 'إشعار', 'نص')]), 0)
+        self.assertEqual(send_bulk_notifications([]), 0)
+        self.assertFalse(Message.objects.exists())
+
+
+@override_settings(STORAGES=TEST_STORAGES, MESSAGE_COLD_STORAGE_DAYS=30)
+class ColdStorageTests(TestCase):
+    """الرسائل القديمة تنتقل إلى الأرشيف البارد وتُستعاد كما كانت عند فتحها"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.user, cls.sender, cls.other = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'مستخدم {i}',
+                employee_id=f'100{i}', phone=f'10{i}', department=department, position=position,
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        send_bulk_notifications([(self.user, f'تعميم قديم {i}', 'نص') for i in range(3)], sender=self.sender)
+        self.old = list(Message.objects.order_by('pk'))
+        self.created_at = timezone.now() - timedelta(days=90)
+        Message.objects.update(created_at=self.created_at)
+        MessageRecipient.objects.filter(message=self.old[0]).update(read_at=self.created_at)
+        MailboxEntry.objects.create(user=self.user, message=self.old[0])
+        send_bulk_notifications([(self.user, 'تعميم حديث', 'نص')], sender=self.sender)
+
+    def test_freeze_and_open(self):
+        self.assertEqual(process_cold_storage(), 3)
+        self.assertEqual(Message.objects.count(), 1)
+        self.assertFalse(MailboxEntry.objects.exists())
+        self.assertEqual(ColdMessageParticipant.objects.filter(user=self.user).count(), 3)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('messaging:archive') + '?search=قديم')
+        self.assertContains(response, 'تعميم قديم 0')
+        self.assertNotContains(response, 'تعميم حديث')
+
+        response = self.client.get(reverse('messaging:message_detail', args=[self.old[0].message_id]))
+        self.assertEqual(response.status_code, 200)
+        message = Message.objects.get(pk=self.old[0].pk)
+        self.assertEqual(message.created_at, self.created_at)
+        self.assertEqual(message.messagerecipient_set.get().read_at, self.created_at)
+        self.assertTrue(MailboxEntry.objects.filter(user=self.user, message=message).exists())
+        self.assertEqual(ColdMessage.objects.count(), 2)
+
+    def test_sequence_numbers_are_not_reused_after_freeze(self):
+        frozen = {message.sequence_number for message in self.old}
+        Message.objects.exclude(pk__in=[message.pk for message in self.old]).delete()
+        process_cold_storage()
+        self.assertFalse(Message.objects.exists())
+        send_bulk_notifications([(self.user, 'بعد النقل', 'نص')], sender=self.sender)
+        self.assertNotIn(Message.objects.get().sequence_number, frozen)
+
+    def test_only_participants_can_open(self):
+        process_cold_storage()
+        self.client.force_login(self.other)
+        response = self.client.get(reverse('messaging:message_detail', args=[self.old[0].message_id]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(ColdMessage.objects.count(), 3)
+
+    def test_replies_keep_their_original(self):
+        Message.objects.filter(pk=self.old[1].pk).update(reply_to=self.old[0])
+        Message.objects.filter(pk=Message.objects.latest('pk').pk).update(reply_to=self.old[1])
+        self.assertEqual(process_cold_storage(), 1)
+        Message.objects.filter(subject='تعميم حديث').update(reply_to=None)
+        self.assertEqual(process_cold_storage(), 2)
+
+        call_command('rehydrate_messages', self.old[1].sequence_number, stdout=StringIO())
+        self.assertEqual(Message.objects.get(pk=self.old[1].pk).reply_to_id, self.old[0].pk)
+        self.assertEqual(ColdMessage.objects.get().original_id, self.old[2].pk)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ThreadTests(TestCase):
+    """المحادثة تُحمل باستعلام واحد مرتب بالمسار، والوارد يُجمع حسب المحادثة"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.user, cls.sender = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'مستخدم {i}',
+                employee_id=f'100{i}', phone=f'10{i}', department=department, position=position,
+            )
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        send_bulk_notifications([(self.user, 'بداية المحادثة', 'نص'), (self.user, 'رسالة منفردة', 'نص')],
+                                sender=self.sender)
+        self.root = Message.objects.get(subject='بداية المحادثة')
+
+    def _reply(self, parent, sender, recipient, subject):
+        reply = Message.objects.create(
+            subject=subject, body='نص', sender=sender, category=parent.category,
+            status='SENT', reply_to=parent,
+        )
+        MessageRecipient.objects.create(message=reply, recipient=recipient)
+        return reply
+
+    def _build_thread(self, replies):
+        parent = self.root
+        for i in range(replies):
+            first = self._reply(parent, self.user, self.sender, f'رد {i}')
+            parent = self._reply(first, self.sender, self.user, f'رد على الرد {i}')
+        return parent
+
+    def test_thread_fields(self):
+        leaf = self._build_thread(1)
+        self.assertEqual(self.root.thread_id, self.root.message_id)
+        self.assertEqual(leaf.thread_id, self.root.message_id)
+        self.assertEqual(leaf.thread_depth, 2)
+        self.assertTrue(leaf.thread_path.startswith(self.root.thread_path))
+        self.assertEqual(
+            list(Message.objects.filter(thread_id=self.root.thread_id).order_by('thread_path')
+                 .values_list('thread_depth', flat=True)),
+            [0, 1, 2],
+        )
+
+    def test_thread_depth_is_capped_to_the_path_column(self):
+        # رسالة في أعمق مستوى يتسع له العمود (بدلاً من إنشاء 89 رداً متتالياً)
+        deepest = self._reply(self.root, self.sender, self.user, 'رد عميق')
+        path = self.root.thread_path + '0' * (MAX_THREAD_DEPTH - 1) * THREAD_SEGMENT_WIDTH + deepest.thread_path[-THREAD_SEGMENT_WIDTH:]
+        Message.objects.filter(pk=deepest.pk).update(thread_depth=MAX_THREAD_DEPTH, thread_path=path)
+        deepest.refresh_from_db()
+        self.assertEqual(len(deepest.thread_path), (MAX_THREAD_DEPTH + 1) * THREAD_SEGMENT_WIDTH)
+
+        max_length = Message._meta.get_field('thread_path').max_length
+        deeper = self._reply(deepest, self.user, self.sender, 'رد أعمق')
+        deepest_again = self._reply(deeper, self.sender, self.user, 'رد على الرد الأعمق')
+        for reply in (deeper, deepest_again):
+            self.assertEqual(reply.thread_depth, MAX_THREAD_DEPTH)
+            self.assertLessEqual(len(reply.thread_path), max_length)
+            self.assertEqual(reply.thread_path[:-THREAD_SEGMENT_WIDTH], deepest.thread_path[:-THREAD_SEGMENT_WIDTH])
+        self.assertEqual(deepest_again.reply_to, deeper)
+        self.assertEqual(
+            list(Message.objects.filter(thread_id=self.root.thread_id).order_by('thread_path')
+                 .values_list('subject', flat=True)),
+            ['بداية المحادثة', 'رد عميق', 'رد أعمق', 'رد على الرد الأعمق'],
+        )
+
+    def test_thread_view_query_count_is_constant(self):
+        self.client.force_login(self.user)
+        self._build_thread(1)
+        url = reverse('messaging:thread', args=[self.root.thread_id])
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        self._build_thread(5)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(response.context['thread_messages']), 13)
+
+    def test_thread_view_hides_foreign_threads(self):
+        other = User.objects.create_user(
+            username='other', password='pass', arabic_name='آخر', employee_id='2000', phone='200',
+            department=self.user.department, position=self.user.position,
+        )
+        self.client.force_login(other)
+        response = self.client.get(reverse('messaging:thread', args=[self.root.thread_id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_conversations_mode(self):
+        leaf = self._build_thread(2)
+        MessageRecipient.objects.filter(message=self.root).update(read_at=timezone.now())
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('messaging:inbox') + '?view=conversations')
+        threads = list(response.context['threads'])
+        self.assertEqual(len(threads), 2)
+        self.assertEqual(threads[0]['message__thread_id'], self.root.thread_id)
+        self.assertEqual(threads[0]['message_count'], 3)
+        self.assertEqual(threads[0]['unread_count'], 2)
+        self.assertEqual(threads[0]['latest'].message, leaf)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class BatchSignatureVerificationTests(TestCase):
+    """التحقق الجماعي من التوقيعات بعدد ثابت من الاستعلامات وتحديث جماعي للمنتهية"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.user, cls.auditor = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'مستخدم {i}',
+                employee_id=f'100{i}', phone=f'10{i}', department=department, position=position,
+                is_staff=i == 1,
+            )
+            for i in range(2)
+        ]
+        send_bulk_notifications([(cls.auditor, f'موضوع {i}', 'نص') for i in range(4)], sender=cls.user)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def _sign(self, count, expires_at):
+        return [
+            DigitalSignature.objects.create(
+                message=message, signer=self.user, signature_type='APPROVAL', signature_data={},
+                qr_data='', ip_address='127.0.0.1', user_agent='test', expires_at=expires_at,
+            )
+            for message in Message.objects.all()[:count]
+        ]
+
+    def _verify(self, ids):
+        with CaptureQueriesContext(connection) as queries:
+            results = batch_verify_signatures(ids)
+        return results, len(queries)
+
+    def test_query_count_is_constant(self):
+        valid = self._sign(4, timezone.now() + timedelta(days=1))
+        expired = self._sign(4, timezone.now() - timedelta(days=1))
+        _, small = self._verify([str(valid[0].signature_id), str(expired[0].signature_id)])
+        DigitalSignature.objects.update(verification_status='VALID')
+        results, large = self._verify([str(s.signature_id) for s in valid + expired] + ['missing'])
+        self.assertEqual(small, large)
+        self.assertEqual(sum(1 for row in results.values() if row['is_valid']), 4)
+        self.assertEqual(results['missing']['error'], 'التوقيع غير موجود')
+        self.assertEqual(DigitalSignature.objects.filter(verification_status='EXPIRED').count(), 4)
+
+    def test_report(self):
+        self._sign(3, timezone.now() + timedelta(days=1))
+        today = timezone.localdate().isoformat()
+        self.client.force_login(self.user)
+        url = reverse('messaging:signature_report') + f'?from={today}&to={today}'
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(self.auditor)
+        report = self.client.get(url).json()
+        self.assertEqual(report['summary'], {'VALID': 3})
+        response = self.client.get(url + '&format=csv')
+        self.assertEqual(len(response.content.decode().strip().splitlines()), 4)
+
+        stdout, stderr = StringIO(), StringIO()
+        call_command('verify_signatures', '--from', today, '--format', 'csv', stdout=stdout, stderr=stderr)
+        self.assertEqual(len(stdout.getvalue().strip().splitlines()), 4)
+        self.assertIn('VALID: 3', stderr.getvalue())
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class SignatureHmacTests(TestCase):
+    """توقيع HMAC ثابت للمحتوى مع معرف المفتاح، ونتيجة تحقق مخزنة تُحذف عند الإلغاء"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.user = User.objects.create_user(
+            username='signer', password='pass', arabic_name='موقع', employee_id='2001', phone='201',
+            department=department, position=position,
+        )
+        send_bulk_notifications([(cls.user, 'موضوع', 'نص')], sender=cls.user)
+        cls.message = Message.objects.get()
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def _sign(self):
+        return DigitalSignature.objects.create(
+            message=self.message, signer=self.user, signature_type='APPROVAL', signature_data={},
+            qr_data='', ip_address='127.0.0.1', user_agent='test',
+        )
+
+    def test_hash_is_deterministic_and_detects_changes(self):
+        signature = DigitalSignature.objects.get(pk=self._sign().pk)
+        self.assertEqual(signature.key_id, 'default')
+        self.assertEqual(signature.generate_signature_hash(), signature.hash_value)
+        self.assertTrue(signature.verify_hash())
+
+        Message.objects.filter(pk=self.message.pk).update(body='نص معدل')
+        self.assertFalse(DigitalSignature.objects.get(pk=signature.pk).verify_hash())
+
+    def test_key_rotation(self):
+        with override_settings(SIGNATURE_HMAC_KEYS=['k1:first']):
+            old = self._sign()
+        with override_settings(SIGNATURE_HMAC_KEYS=['k1:first', 'k2:second'], SIGNATURE_HMAC_KEY_ID='k2'):
+            new = self._sign()
+            self.assertEqual((old.key_id, new.key_id), ('k1', 'k2'))
+            self.assertTrue(DigitalSignature.objects.get(pk=old.pk).verify_hash())
+            self.assertTrue(DigitalSignature.objects.get(pk=new.pk).verify_hash())
+        with override_settings(SIGNATURE_HMAC_KEYS=['k2:second']):
+            self.assertFalse(DigitalSignature.objects.get(pk=old.pk).verify_hash())
+
+    def test_verification_is_cached_until_revoked(self):
+        signature = self._sign()
+        url = reverse('messaging:verify_signature', args=[signature.signature_id])
+        self.assertTrue(self.client.get(url).context['verification_result']['is_valid'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertTrue(response.context['verification_result']['is_valid'])
+        self.assertFalse([q for q in queries if 'messaging_digitalsignature' in q['sql']])
+
+        signature.revoke()
+        result = self.client.get(url).context['verification_result']
+        self.assertFalse(result['is_valid'])
+        self.assertEqual(result['verification_details']['status'], 'REVOKED')
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class MessageEncryptionTests(TestCase):
+    """تشفير نصوص الرسائل والمرفقات بمفاتيح بيانات مغلفة، والقوائم تعرض المقتطف دون فك النص"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.user = User.objects.create_user(
+            username='reader', password='pass', arabic_name='قارئ', employee_id='3001', phone='301',
+            department=department, position=position,
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        cache.clear()
+
+    def _send(self, body):
+        send_bulk_notifications([(self.user, 'موضوع', body)], sender=self.user)
+        return Message.objects.latest('pk')
+
+    def test_body_is_encrypted_at_rest(self):
+        message = self._send('<p>رصيد الحساب 1500</p>')
+        stored = Message.objects.values_list('body', flat=True).get(pk=message.pk)
+        self.assertTrue(stored.startswith('enc:v1:'))
+        self.assertNotIn('1500', stored)
+        message = Message.objects.get(pk=message.pk)
+        self.assertTrue(message.is_encrypted)
+        self.assertEqual(message.body, '<p>رصيد الحساب 1500</p>')
+        self.assertEqual(message.snippet, 'رصيد الحساب 1500')
+
+        message.confidentiality = 'CONFIDENTIAL'
+        message.save()
+        self.assertEqual(Message.objects.get(pk=message.pk).snippet, '')
+
+    def test_inbox_does_not_decrypt_bodies(self):
+        self._send('نص يظهر مقتطفه')
+        self.client.force_login(self.user)
+        with mock.patch('messaging.encryption.decrypt_text', side_effect=AssertionError):
+            response = self.client.get(reverse('messaging:inbox'))
+        self.assertContains(response, 'نص يظهر مقتطفه')
+
+    def test_key_rotation(self):
+        old_key, new_key = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+        with override_settings(MESSAGE_ENCRYPTION_KEYS=[f'k1:{old_key}']):
+            message = self._send('نص سري')
+        legacy = self._send('نص قديم')
+        Message.objects.filter(pk=legacy.pk).update(body='نص قديم', body_key='', body_key_id='', is_encrypted=False)
+
+        with override_settings(MESSAGE_ENCRYPTION_KEYS=[f'k1:{old_key}', f'k2:{new_key}'], MESSAGE_ENCRYPTION_KEY_ID='k2'):
+            stats = process_key_rotation()
+        self.assertEqual((stats['rewrapped'], stats['messages']), (1, 1))
+
+        with override_settings(MESSAGE_ENCRYPTION_KEYS=[f'k2:{new_key}']):
+            self.assertEqual(Message.objects.get(pk=message.pk).body, 'نص سري')
+            legacy = Message.objects.get(pk=legacy.pk)
+            self.assertEqual((legacy.body, legacy.is_encrypted), ('نص قديم', True))
+        self.assertTrue(Message.objects.values_list('body', flat=True).get(pk=legacy.pk).startswith('enc:v1:'))
+
+    def test_attachment_is_encrypted_and_streamed(self):
+        message = self._send('نص')
+        content = b'statement line\n' * 10000
+        attachment = MessageAttachment.objects.create(
+            message=message, file=SimpleUploadedFile('statement.txt', content), original_filename='statement.txt',
+            file_size=len(content), mime_type='text/plain',
+        )
+        with open(attachment.file.path, 'rb') as stored:
+            self.assertNotIn(b'statement line', stored.read())
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('messaging:download_attachment', args=[attachment.pk]))
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), content)
+
+    def test_attachment_range_request(self):
+        message = self._send('نص')
+        content = bytes(range(256)) * 1024
+        attachment = MessageAttachment.objects.create(
+            message=message, file=SimpleUploadedFile('data.pdf', content), original_filename='data.pdf',
+            file_size=len(content), mime_type='application/pdf',
+        )
+        self.client.force_login(self.user)
+        url = reverse('messaging:view_attachment', args=[attachment.pk])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=70000-140000')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 70000-140000/{len(content)}')
+        self.assertEqual(b''.join(response.streaming_content), content[70000:140001])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-100')
+        self.assertEqual(b''.join(response.streaming_content), content[-100:])
+
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(content)}-')
+        self.assertEqual(response.status_code, 416)
+
+        empty = MessageAttachment.objects.create(
+            message=message, file=SimpleUploadedFile('empty.pdf', b''), original_filename='empty.pdf',
+            file_size=0, mime_type='application/pdf',
+        )
+        empty_url = reverse('messaging:view_attachment', args=[empty.pk])
+        for header in ('bytes=-10', 'bytes=0-'):
+            response = self.client.get(empty_url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 416)
+            self.assertEqual(response['Content-Range'], 'bytes */0')
+        self.assertEqual(b''.join(self.client.get(empty_url).streaming_content), b'')
+
+    def test_key_rotation_encrypts_plaintext_attachments(self):
+        message = self._send('نص')
+        plain_storage = FileSystemStorage()
+        name = plain_storage.save('attachments/legacy.txt', ContentFile(b'legacy statement'))
+        attachment = MessageAttachment.objects.create(
+            message=message, file='placeholder.txt', original_filename='legacy.txt', file_size=16, mime_type='text/plain',
+        )
+        MessageAttachment.objects.filter(pk=attachment.pk).update(file=name, is_encrypted=False, encryption_key_id='')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_key_rotation()['attachments'], 1)
+        attachment.refresh_from_db()
+        self.assertTrue(attachment.is_encrypted)
+        self.assertFalse(plain_storage.exists(name))
+        with open(attachment.file.path, 'rb') as stored:
+            self.assertNotIn(b'legacy statement', stored.read())
+        self.assertEqual(b''.join(attachment.iter_content()), b'legacy statement')
+
+
+class EncryptedStorageTests(SimpleTestCase):
+    """تخزين المرفقات المشفر: أجزاء موثقة بحجم ثابت وقراءة أي نطاق بفك الأجزاء اللازمة فقط"""
+
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        self.storage = EncryptedFileSystemStorage(location=location, chunk_size=16)
+        self.content = bytes(range(200)) * 5
+
+    def test_round_trip_and_size(self):
+        for content in (self.content, b'x' * 64, b''):
+            name = self.storage.save('file.bin', ContentFile(content))
+            with open(self.storage.path(name), 'rb') as raw:
+                stored = raw.read()
+            self.assertTrue(stored.startswith(b'MCE2'))
+            if content:
+                self.assertNotIn(content[:32], stored)
+            self.assertEqual(self.storage.size(name), len(content))
+            with self.storage.open(name) as f:
+                self.assertEqual(f.read(), content)
+
+    def test_seek_decrypts_only_covering_chunks(self):
+        name = self.storage.save('file.bin', ContentFile(self.content))
+        with mock.patch.object(
+            DecryptingFile, '_decrypt_frame', autospec=True, side_effect=DecryptingFile._decrypt_frame
+        ) as decrypt_frame:
+            with self.storage.open(name) as f:
+                f.seek(37)
+                self.assertEqual(f.read(50), self.content[37:87])
+                f.seek(-5, os.SEEK_END)
+                self.assertEqual(f.read(), self.content[-5:])
+        self.assertEqual({call.args[1] for call in decrypt_frame.call_args_list}, {2, 3, 4, 5, 62})
+
+    def test_tampering_is_detected(self):
+        name = self.storage.save('file.bin', ContentFile(self.content))
+        path = self.storage.path(name)
+        with open(path, 'rb') as raw:
+            stored = bytearray(raw.read())
+
+        tampered = stored.copy()
+        tampered[-40] ^= 1
+        with open(path, 'wb') as raw:
+            raw.write(tampered)
+        with self.assertRaises(DecryptionError), self.storage.open(name) as f:
+            f.read()
+
+        # حذف الجزء الأخير كاملاً يجعل الجزء السابق أخيراً، وعلامته لا تطابق
+        with open(path, 'wb') as raw:
+            raw.write(stored[:len(stored) - (len(self.content) % 16 + 16)])
+        with self.assertRaises(DecryptionError), self.storage.open(name) as f:
+            f.read()
+
+    def test_plaintext_files_are_read_as_is(self):
+        FileSystemStorage(location=self.storage.location).save('legacy.txt', ContentFile(b'legacy'))
+        self.assertEqual(self.storage.size('legacy.txt'), 6)
+        with self.storage.open('legacy.txt') as f:
+            self.assertEqual(f.read(), b'legacy')
+
+    def test_rewrap_copies_chunks_under_current_key(self):
+        old_key, new_key = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+        with override_settings(MESSAGE_ENCRYPTION_KEYS=[f'k1:{old_key}']):
+            name = self.storage.save('file.bin', ContentFile(self.content))
+            self.assertIsNone(self.storage.rewrap(name))
+        with override_settings(MESSAGE_ENCRYPTION_KEYS=[f'k1:{old_key}', f'k2:{new_key}'], MESSAGE_ENCRYPTION_KEY_ID='k2'):
+            new_name = self.storage.rewrap(name)
+        self.assertNotEqual(new_name, name)
+        with open(self.storage.path(name), 'rb') as old, open(self.storage.path(new_name), 'rb') as new:
+            self.assertEqual(old.read()[-64:], new.read()[-64:])
+        with override_settings(MESSAGE_ENCRYPTION_KEYS=[f'k2:{new_key}']):
+            with self.storage.open(new_name) as f:
+                self.assertEqual(f.read(), self.content)
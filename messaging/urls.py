@@ -21,12 +21,17 @@ urlpatterns = [
     path('message/<uuid:message_id>/delete/', views.delete_message, name='delete'),
     path('message/<uuid:message_id>/archive/', views.archive_message, name='archive_message'),
     path('message/<uuid:message_id>/unarchive/', views.unarchive_message, name='unarchive_message'),
+    path('thread/<uuid:thread_id>/', views.thread_detail, name='thread'),
     
     # AJAX endpoints
     path('api/unread-count/', views.unread_count, name='unread_count'),
+    path('api/mark-read/', views.mark_as_read_bulk, name='mark_read_bulk'),
     path('api/mark-read/<uuid:message_id>/', views.mark_as_read, name='mark_read'),
+    path('api/bulk/', views.bulk_action, name='bulk_action'),
+    path('api/signatures/verify/', views.batch_verify_signatures_view, name='batch_verify_signatures'),
     path('api/save-draft/', views.save_draft, name='save_draft'),
     path('api/search/', views.search_messages, name='search'),
+    path('api/recipients/', views.recipient_search, name='recipient_search'),
     
     # Categories
     path('categories/', views.category_list, name='categories'),
@@ -45,6 +50,7 @@ urlpatterns = [
     path('verify-signature/<uuid:signature_id>/', views.verify_signature_view, name='verify_signature'),
     path('signature/<uuid:signature_id>/qr/', views.signature_qr_image, name='signature_qr'),
     path('signature/<uuid:signature_id>/certificate/', views.signature_certificate, name='signature_certificate'),
+    path('signatures/report/', views.signature_report, name='signature_report'),
     
     # Testing and Debug
     path('test-editor/', views.test_editor, name='test_editor'),
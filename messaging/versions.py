@@ -0,0 +1,36 @@
+"""
+نسخ صناديق البريد والرسائل
+نسخة صندوق المستخدم تتغير مع أي تعديل على سجلات المستقبلين الخاصة به، ونسخة الرسالة
+مع أي تعديل عليها أو على مستقبليها أو مرفقاتها أو توقيعاتها. تُستخدم في ETag الصفحات
+(انظر myproject.conditional) مع إبطال لقطة لوحة التحكم في نفس الموضع.
+"""
+from myproject.conditional import bump_versions
+from myproject.dashboard import DashboardSnapshot
+
+MAILBOX_VERSION_KEY = 'mailbox_version_{user_id}'
+MESSAGE_VERSION_KEY = 'message_version_{message_id}'
+
+
+def mailbox_version_key(user_id):
+    return MAILBOX_VERSION_KEY.format(user_id=user_id)
+
+
+def message_version_key(message_id):
+    """message_id هو المعرف الفريد (UUID) المستخدم في الروابط"""
+    return MESSAGE_VERSION_KEY.format(message_id=message_id)
+
+
+def mailbox_changed(user_ids, message_ids=()):
+    """
+    تسجيل تغير صناديق المستخدمين والرسائل
+
+    Args:
+        user_ids: المستخدمون المتأثرون (المستقبلون والمرسل)
+        message_ids: المعرفات الفريدة للرسائل المتأثرة
+    """
+    user_ids = [user_id for user_id in user_ids if user_id]
+    DashboardSnapshot.invalidate(*user_ids)
+    bump_versions(
+        *(mailbox_version_key(user_id) for user_id in user_ids),
+        *(message_version_key(message_id) for message_id in message_ids),
+    )
@@ -1,35 +1,73 @@
 """
 Views for messaging app
 """
+import uuid
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
-from django.db.models import Q, Prefetch, Count
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.db.models import Q, Prefetch, Count, Exists, Max, OuterRef
 from django.core.paginator import Paginator
 from django.utils import timezone
-from django.views.decorators.cache import cache_page
+from django.views.decorators.cache import cache_control, cache_page
 from django.core.cache import cache
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
+from django.utils.dateparse import parse_date
+from django.utils.http import quote_etag
 
-from .models import Message, MessageRecipient, MessageCategory, MessageAttachment, DigitalSignature
+from .models import ColdMessageParticipant, MailboxEntry, Message, MessageRecipient, MessageCategory, MessageAttachment, DigitalSignature
 from .utils import sanitize_message_content, validate_content_length, is_content_safe
-from .signature_utils import create_digital_signature, verify_signature
+from .signature_utils import (
+    batch_verify_signatures, create_digital_signature, get_batch_verify_max, signatures_for_report,
+    verify_signature, verify_signatures, write_verification_report,
+)
+from .bulk import BulkActionError, apply_bulk_action
+from .cold_storage import rehydrate_message
+from .receipts import mark_read
+from .versions import mailbox_changed, mailbox_version_key, message_version_key
+from accounts.directory import search_directory
+from myproject.conditional import make_etag
 from security.models import AuditLog
 
+def _inbox_etag(request):
+    # الوقت النسبي المعروض في الصفوف يتغير كل دقيقة
+    return make_etag(
+        request, [mailbox_version_key(request.user.pk)],
+        request.GET.urlencode(), int(timezone.now().timestamp() // 60),
+    )
+
+
+def _message_detail_etag(request, message_id):
+    # نسخة الصندوق تشمل عداد غير المقروءة في القالب الأساسي
+    return make_etag(request, [message_version_key(message_id), mailbox_version_key(request.user.pk)])
+
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_inbox_etag)
 def inbox(request):
     """صندوق الوارد"""
     message_recipients = MessageRecipient.objects.filter(
         recipient=request.user,
         is_deleted=False
-    ).select_related('message__sender', 'message__category').order_by('-message__created_at')
+    ).exclude(
+        # الرسائل المؤرشفة في صندوق المستخدم
+        Exists(MailboxEntry.objects.filter(
+            user=request.user, message=OuterRef('message'), folder='ARCHIVE'
+        ))
+    ).select_related(
+        'message__sender__position', 'message__sender__department', 'message__category'
+    ).order_by('-message__created_at')
     
     # تحسين عدد العناصر للأداء
     items_per_page = int(request.GET.get('per_page', 15))  # تقليل العدد الافتراضي
     if items_per_page > 50:  # حد أقصى للأمان
         items_per_page = 50
+    
+    if request.GET.get('view') == 'conversations':
+        return _inbox_conversations(request, message_recipients, items_per_page)
         
     paginator = Paginator(message_recipients, items_per_page)
     page_number = request.GET.get('page')
@@ -39,12 +77,62 @@ def inbox(request):
         'message_recipients': message_recipients
     })
 
+def _inbox_conversations(request, message_recipients, items_per_page):
+    """صندوق الوارد مجمعاً حسب المحادثة، مرتباً بآخر نشاط مع عدد غير المقروء لكل محادثة"""
+    threads = message_recipients.order_by().values('message__thread_id').annotate(
+        last_activity=Max('message__created_at'),
+        message_count=Count('pk'),
+        unread_count=Count('pk', filter=Q(read_at__isnull=True)),
+    ).order_by('-last_activity')
+    threads = Paginator(threads, items_per_page).get_page(request.GET.get('page'))
+    threads.object_list = list(threads.object_list)
+    
+    # أحدث رسالة واردة في كل محادثة من الصفحة باستعلام واحد
+    latest = {}
+    for recipient in message_recipients.filter(
+        message__thread_id__in=[thread['message__thread_id'] for thread in threads]
+    ):
+        latest.setdefault(recipient.message.thread_id, recipient)
+    for thread in threads:
+        thread['latest'] = latest[thread['message__thread_id']]
+    
+    return render(request, 'messaging/conversations.html', {
+        'threads': threads
+    })
+
+@login_required
+def thread_detail(request, thread_id):
+    """المحادثة كاملة باستعلام واحد مرتب بالمسار (الرسائل التي يطلع عليها المستخدم فقط)"""
+    own_rows = MessageRecipient.objects.filter(message=OuterRef('pk'), recipient=request.user)
+    thread_messages = list(
+        Message.objects.filter(thread_id=thread_id).filter(
+            Q(sender=request.user) | Exists(own_rows.filter(is_deleted=False))
+        ).exclude(status='DRAFT').annotate(
+            is_unread=Exists(own_rows.filter(read_at__isnull=True))
+        ).select_related('sender', 'category').order_by('thread_path')
+    )
+    if not thread_messages:
+        raise Http404
+    
+    base_depth = min(message.thread_depth for message in thread_messages)
+    for message in thread_messages:
+        message.indent = min(message.thread_depth - base_depth, 6)
+    
+    return render(request, 'messaging/thread.html', {
+        'thread_messages': thread_messages,
+        'root': thread_messages[0],
+    })
+
 @login_required
 def sent_messages(request):
     """الرسائل المرسلة"""
     messages_sent = Message.objects.filter(
         sender=request.user
-    ).select_related('category').order_by('-created_at')
+    ).select_related('category').annotate(
+        recipient_count=Count('messagerecipient'),
+        read_count=Count('messagerecipient', filter=Q(messagerecipient__read_at__isnull=False)),
+        last_read_at=Max('messagerecipient__read_at'),
+    ).prefetch_related('messagerecipient_set__recipient').order_by('-created_at')
     
     # تحسين عدد العناصر للأداء
     items_per_page = int(request.GET.get('per_page', 15))
@@ -78,28 +166,23 @@ def drafts(request):
 
 @login_required
 def archive(request):
-    """الأرشيف"""
-    # البحث في الرسائل المؤرشفة
+    """الأرشيف (مواضع الأرشيف في صندوق المستخدم)"""
     search_query = request.GET.get('search', '')
     period = request.GET.get('period', '')
     message_type = request.GET.get('type', '')
     
-    # الرسائل المؤرشفة للمستخدم
-    archived_messages = Message.objects.filter(
-        Q(sender=request.user) | Q(messagerecipient__recipient=request.user),
-        archived_at__isnull=False
-    ).select_related('sender', 'category').prefetch_related('messagerecipient_set__recipient').distinct()
+    entries = MailboxEntry.objects.filter(user=request.user, folder='ARCHIVE')
     
     # تطبيق الفلاتر
     if search_query:
-        archived_messages = archived_messages.filter(
-            Q(subject__icontains=search_query) | 
-            Q(body__icontains=search_query) |
-            Q(sender__arabic_name__icontains=search_query)
+        entries = entries.filter(
+            Q(message__subject__icontains=search_query) | 
+            Q(message__snippet__icontains=search_query) |
+            Q(message__sender__arabic_name__icontains=search_query)
         )
     
     if period:
-        from datetime import datetime, timedelta
+        from datetime import timedelta
         now = timezone.now()
         if period == 'week':
             start_date = now - timedelta(weeks=1)
@@ -107,45 +190,63 @@ def archive(request):
             start_date = now - timedelta(days=30)
         elif period == 'year':
             start_date = now - timedelta(days=365)
-        archived_messages = archived_messages.filter(archived_at__gte=start_date)
+        else:
+            start_date = None
+        if start_date:
+            entries = entries.filter(created_at__gte=start_date)
     
     if message_type == 'sent':
-        archived_messages = archived_messages.filter(sender=request.user)
+        entries = entries.filter(message__sender=request.user)
     elif message_type == 'received':
-        archived_messages = archived_messages.filter(messagerecipient__recipient=request.user)
+        entries = entries.exclude(message__sender=request.user)
     
-    # ترتيب حسب تاريخ الأرشفة ثم تاريخ الإرسال
-    archived_messages = archived_messages.order_by('-archived_at', '-sent_at', '-created_at')
+    # الرسائل القديمة في الأرشيف البارد (تُستعاد عند فتحها)
+    cold_entries = ColdMessageParticipant.objects.filter(user=request.user, is_deleted=False)
+    if search_query:
+        cold_entries = cold_entries.filter(
+            Q(cold_message__subject__icontains=search_query) |
+            Q(cold_message__sequence_number__icontains=search_query) |
+            Q(cold_message__sender__arabic_name__icontains=search_query)
+        )
+    if message_type == 'sent':
+        cold_entries = cold_entries.filter(is_sender=True)
+    elif message_type == 'received':
+        cold_entries = cold_entries.filter(is_sender=False)
+    if period:
+        # فلتر الفترة على تاريخ الأرشفة، والأرشيف البارد أقدم من أي فترة متاحة
+        cold_entries = cold_entries.none()
+    cold_entries = cold_entries.select_related('cold_message__sender').order_by('-created_at')
     
-    # إحصائيات الأرشيف
-    total_archived = archived_messages.count()
-    archived_this_month = archived_messages.filter(
-        archived_at__month=timezone.now().month,
-        archived_at__year=timezone.now().year
-    ).count()
-    sent_archived = archived_messages.filter(sender=request.user).count()
-    received_archived = archived_messages.exclude(sender=request.user).count()
+    # إحصائيات الأرشيف في استعلام واحد
+    month_start = timezone.localtime().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    stats = entries.aggregate(
+        total=Count('pk'),
+        this_month=Count('pk', filter=Q(created_at__gte=month_start)),
+        sent=Count('pk', filter=Q(message__sender=request.user)),
+    )
+    stats['received'] = stats['total'] - stats['sent']
+    
+    entries = entries.select_related(
+        'message__sender', 'message__category'
+    ).prefetch_related('message__messagerecipient_set__recipient').order_by('-created_at')
     
     # التصفح للأداء
     items_per_page = int(request.GET.get('per_page', 15))
     if items_per_page > 50:
         items_per_page = 50
         
-    paginator = Paginator(archived_messages, items_per_page)
+    paginator = Paginator(entries, items_per_page)
     page_number = request.GET.get('page')
-    archived_messages = paginator.get_page(page_number)
+    entries = paginator.get_page(page_number)
+    cold_entries = Paginator(cold_entries, items_per_page).get_page(request.GET.get('cold_page'))
     
     return render(request, 'messaging/archive.html', {
-        'message_recipients': archived_messages,
+        'entries': entries,
+        'cold_entries': cold_entries,
         'search_query': search_query,
         'period': period,
         'message_type': message_type,
-        'stats': {
-            'total': total_archived,
-            'this_month': archived_this_month,
-            'sent': sent_archived,
-            'received': received_archived,
-        }
+        'stats': stats,
     })
 
 @login_required
@@ -247,30 +348,34 @@ def compose_message(request):
         categories = list(MessageCategory.objects.all())
         cache.set('message_categories', categories, 300)  # 5 دقائق
     
-    from accounts.models import User
-    users_cache_key = f'active_users_exclude_{request.user.id}'
-    users = cache.get(users_cache_key)
-    if users is None:
-        users = User.objects.filter(is_active=True).exclude(id=request.user.id).select_related('department', 'position')
-        cache.set(users_cache_key, users, 180)  # 3 دقائق
-    
+    # المستقبلون يُختارون عبر البحث في دليل الموظفين (recipient_search)
     return render(request, 'messaging/compose.html', {
         'categories': categories,
-        'users': users
     })
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_message_detail_etag)
 def message_detail(request, message_id):
     """تفاصيل الرسالة"""
     # تحسين الاستعلام مع select_related و prefetch_related
-    message = get_object_or_404(
+    queryset = (
         Message.objects.select_related('sender', 'category')
+        .annotate(is_archived=Exists(MailboxEntry.objects.filter(
+            user=request.user, message=OuterRef('pk'), folder='ARCHIVE'
+        )))
         .prefetch_related(
             Prefetch('messagerecipient_set', 
                     queryset=MessageRecipient.objects.select_related('recipient'))
-        ),
-        message_id=message_id
+        )
     )
+    try:
+        message = get_object_or_404(queryset, message_id=message_id)
+    except Http404:
+        # الرسائل القديمة تُستعاد من الأرشيف البارد عند فتحها من أحد أطرافها
+        if not rehydrate_message(request.user, message_id):
+            raise
+        message = get_object_or_404(queryset, message_id=message_id)
     
     # Check if user has access to this message (استعلام محسن)
     user_recipient = None
@@ -288,12 +393,18 @@ def message_detail(request, message_id):
         return redirect('messaging:inbox')
     
     # Mark as read if recipient (تحسين الأداء)
-    if user_recipient and not user_recipient.read_at:
-        user_recipient.mark_as_read()
+    marked_read = user_recipient is not None and not user_recipient.read_at
+    if marked_read:
+        marked_read = user_recipient.mark_as_read(request)
     
-    return render(request, 'messaging/message_detail.html', {
-        'message': message
+    response = render(request, 'messaging/message_detail.html', {
+        'message': message,
+        'is_archived': message.is_archived,
     })
+    if marked_read:
+        # القراءة غيرت النسخة بعد حساب الـ ETag فيُرسل الجديد حتى يصح الطلب التالي
+        response['ETag'] = quote_etag(_message_detail_etag(request, message_id))
+    return response
 
 @login_required
 def reply_message(request, message_id):
@@ -448,12 +559,8 @@ def forward_message(request, message_id):
             messages.error(request, f'حدث خطأ أثناء تحويل الرسالة: {str(e)}')
             return redirect('messaging:forward', message_id=message_id)
     
-    from accounts.models import User
-    users = User.objects.filter(is_active=True).exclude(id=request.user.id)
-    
     return render(request, 'messaging/forward.html', {
         'original_message': original_message,
-        'users': users
     })
 
 @login_required
@@ -472,6 +579,7 @@ def delete_message(request, message_id):
                 message=message,
                 recipient=request.user
             ).update(is_deleted=True)
+            mailbox_changed([request.user.pk], [message.message_id])
         
         messages.success(request, 'تم حذف الرسالة بنجاح.')
         return redirect('messaging:inbox')
@@ -492,20 +600,8 @@ def archive_message(request, message_id):
         return redirect('messaging:inbox')
     
     if request.method == 'POST':
-        message.archived_at = timezone.now()
-        message.status = 'ARCHIVED'
-        message.save()
-        
-        # تسجيل في سجل التاريخ
-        from .models import MessageHistory
-        MessageHistory.objects.create(
-            message=message,
-            action='ARCHIVED',
-            performed_by=request.user,
-            details=f'تم أرشفة الرسالة {message.sequence_number}',
-            ip_address=request.META.get('REMOTE_ADDR'),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')[:500]
-        )
+        # الأرشفة في صندوق المستخدم فقط مع سجل التاريخ
+        apply_bulk_action(request.user, 'archive', [message.message_id], request=request)
         
         messages.success(request, 'تم أرشفة الرسالة بنجاح.')
         
@@ -526,7 +622,10 @@ def archive_message(request, message_id):
 @login_required
 def unarchive_message(request, message_id):
     """استعادة رسالة من الأرشيف"""
-    message = get_object_or_404(Message, message_id=message_id, archived_at__isnull=False)
+    message = get_object_or_404(
+        Message, message_id=message_id,
+        mailbox_entries__user=request.user, mailbox_entries__folder='ARCHIVE'
+    )
     
     # التأكد من صلاحية المستخدم
     if not (message.sender == request.user or 
@@ -537,20 +636,7 @@ def unarchive_message(request, message_id):
         return redirect('messaging:archive')
     
     if request.method == 'POST':
-        message.archived_at = None
-        message.status = 'SENT' if message.sent_at else 'DRAFT'
-        message.save()
-        
-        # تسجيل في سجل التاريخ
-        from .models import MessageHistory
-        MessageHistory.objects.create(
-            message=message,
-            action='RESTORED',
-            performed_by=request.user,
-            details=f'تم استعادة الرسالة {message.sequence_number} من الأرشيف',
-            ip_address=request.META.get('REMOTE_ADDR'),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')[:500]
-        )
+        apply_bulk_action(request.user, 'move', [message.message_id], folder='inbox', request=request)
         
         messages.success(request, 'تم استعادة الرسالة من الأرشيف بنجاح.')
         
@@ -565,7 +651,8 @@ def unarchive_message(request, message_id):
     
     # GET request - عرض صفحة تأكيد الاستعادة
     return render(request, 'messaging/unarchive_confirm.html', {
-        'message': message
+        'message': message,
+        'archived_entry': MailboxEntry.objects.get(user=request.user, message=message, folder='ARCHIVE'),
     })
 
 @login_required
@@ -588,22 +675,119 @@ def unread_count(request):
     except Exception as e:
         return JsonResponse({'error': 'Internal server error'}, status=500)
 
+@login_required
+@require_http_methods(["GET"])
+def recipient_search(request):
+    """البحث بالبادئة في دليل الموظفين لاختيار المستقبلين"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(int(request.GET.get('limit', 20)), 50)
+    except ValueError:
+        limit = 20
+    
+    results = search_directory(query, limit=limit, exclude_ids=[request.user.id])
+    return JsonResponse({'results': results})
+
 @login_required
 def mark_as_read(request, message_id):
     """تعليم الرسالة كمقروءة"""
     if request.method == 'POST':
-        try:
-            recipient = MessageRecipient.objects.get(
-                message__message_id=message_id,
-                recipient=request.user
-            )
-            recipient.mark_as_read()
-            return JsonResponse({'success': True})
-        except MessageRecipient.DoesNotExist:
-            return JsonResponse({'success': False})
+        recipients = MessageRecipient.objects.filter(message__message_id=message_id, recipient=request.user)
+        updated, _ = mark_read(request.user, recipients, request=request)
+        return JsonResponse({'success': bool(updated) or recipients.exists()})
     
     return JsonResponse({'success': False})
 
+@login_required
+@require_http_methods(["POST"])
+def mark_as_read_bulk(request):
+    """
+    تعليم عدة رسائل كمقروءة بتحديث واحد
+
+    POST: message_ids (معرفات متعددة) أو all=1 لكل الوارد
+    """
+    if request.POST.get('all') in ('1', 'true'):
+        recipients = None
+    else:
+        try:
+            message_ids = [uuid.UUID(value) for value in request.POST.getlist('message_ids')]
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'معرف رسالة غير صالح'}, status=400)
+        if not message_ids:
+            return JsonResponse({'success': False, 'error': 'لم يتم تحديد رسائل'}, status=400)
+        recipients = MessageRecipient.objects.filter(message__message_id__in=message_ids)
+
+    updated, _ = mark_read(request.user, recipients, request=request)
+    unread = MessageRecipient.objects.filter(
+        recipient=request.user, read_at__isnull=True, is_deleted=False
+    ).count()
+    return JsonResponse({'success': True, 'updated': updated, 'unread_count': unread})
+
+@login_required
+@require_http_methods(["POST"])
+def bulk_action(request):
+    """
+    عملية جماعية على الرسائل (انظر messaging.bulk)
+
+    POST: action (archive/delete/restore/move)، message_ids (معرفات متعددة)، folder للنقل
+    """
+    try:
+        message_ids = [uuid.UUID(value) for value in request.POST.getlist('message_ids')]
+        results = apply_bulk_action(
+            request.user, request.POST.get('action', ''), message_ids,
+            folder=request.POST.get('folder'), request=request,
+        )
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'معرف رسالة غير صالح'}, status=400)
+    except BulkActionError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    updated = sum(1 for result in results.values() if result == 'ok')
+    return JsonResponse({'success': True, 'updated': updated, 'results': results})
+
+@login_required
+@require_http_methods(["POST"])
+def batch_verify_signatures_view(request):
+    """
+    التحقق من عدة توقيعات دفعة واحدة
+
+    POST: signature_ids (معرفات متعددة)
+    """
+    signature_ids = request.POST.getlist('signature_ids')
+    if not signature_ids:
+        return JsonResponse({'success': False, 'error': 'لم يتم تحديد توقيعات'}, status=400)
+    if len(signature_ids) > get_batch_verify_max():
+        return JsonResponse(
+            {'success': False, 'error': f'الحد الأعلى {get_batch_verify_max()} توقيع في الطلب الواحد'}, status=400
+        )
+    return JsonResponse({'success': True, 'results': batch_verify_signatures(signature_ids)})
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def signature_report(request):
+    """
+    تقرير التحقق من توقيعات فترة للمراجعين (JSON أو CSV)
+
+    GET: from و to (YYYY-MM-DD)، type (نوع التوقيع)، format (json أو csv)
+    """
+    try:
+        date_from = parse_date(request.GET.get('from', '')) if request.GET.get('from') else None
+        date_to = parse_date(request.GET.get('to', '')) if request.GET.get('to') else None
+    except ValueError:
+        date_from = date_to = None
+    if not date_from or not date_to:
+        return JsonResponse({'success': False, 'error': 'حدد الفترة (from و to بصيغة YYYY-MM-DD)'}, status=400)
+    
+    report_format = 'csv' if request.GET.get('format') == 'csv' else 'json'
+    signatures = signatures_for_report(date_from, date_to, request.GET.get('type') or None)
+    if report_format == 'csv':
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="signatures-{date_from}-{date_to}.csv"'
+    else:
+        response = HttpResponse(content_type='application/json')
+    write_verification_report(verify_signatures(signatures), response, report_format)
+    return response
+
 @login_required
 def save_draft(request):
     """حفظ مسودة"""
@@ -622,9 +806,9 @@ def search_messages(request):
     if len(query) < 2:
         return JsonResponse({'results': []})
     
-    # Basic search implementation
+    # البحث في الموضوع والمقتطف (النص مشفر)
     messages_list = Message.objects.filter(
-        Q(subject__icontains=query) | Q(body__icontains=query),
+        Q(subject__icontains=query) | Q(snippet__icontains=query),
         Q(sender=request.user) | Q(messagerecipient__recipient=request.user)
     ).distinct()[:10]
     
@@ -632,7 +816,7 @@ def search_messages(request):
     for msg in messages_list:
         results.append({
             'title': msg.subject,
-            'description': msg.body[:100] + '...' if len(msg.body) > 100 else msg.body,
+            'description': msg.snippet[:100] + '...' if len(msg.snippet) > 100 else msg.snippet,
             'url': f'/messaging/message/{msg.message_id}/'
         })
     
@@ -698,8 +882,58 @@ def download_attachment(request, attachment_id):
     )
     
     # Return file
-    response = HttpResponse(attachment.file, content_type=attachment.mime_type)
-    response['Content-Disposition'] = f'attachment; filename="{attachment.original_filename}"'
+    return _attachment_response(request, attachment, 'attachment')
+
+def _parse_range(header, size):
+    """
+    نطاق بايتات واحد من ترويسة Range
+    
+    Returns:
+        tuple: (البداية، النهاية شاملة)، أو None لطلب الملف كاملاً (لا ترويسة أو نطاقات متعددة أو صيغة غير مدعومة)
+    
+    Raises:
+        ValueError: إذا كان النطاق خارج حجم الملف
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash or not (first + last).isdigit():
+        return None
+    if not first:
+        # آخر N بايت (لا يوجد نطاق قابل للإرضاء في ملف فارغ)
+        if int(last) == 0 or size == 0:
+            raise ValueError(header)
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+def _attachment_response(request, attachment, disposition):
+    """
+    محتوى المرفق متدفقاً (يُفك جزءاً بجزء دون تحميل الملف كاملاً في الذاكرة)
+    طلب Range لنطاق واحد يعيد 206 بالجزء المطلوب فقط، فلا تُفك إلا الأجزاء المشفرة التي تغطيه.
+    """
+    size = attachment.file.size
+    try:
+        byte_range = _parse_range(request.META.get('HTTP_RANGE', ''), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    
+    if byte_range is None:
+        response = StreamingHttpResponse(attachment.iter_content(), content_type=attachment.mime_type)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(attachment.iter_content(start, end), content_type=attachment.mime_type, status=206)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = f'{disposition}; filename="{attachment.original_filename}"'
     return response
 
 @login_required
@@ -720,9 +954,7 @@ def view_attachment(request, attachment_id):
         messages.error(request, 'ليس لديك صلاحية لعرض هذا الملف.')
         return redirect('messaging:inbox')
     
-    response = HttpResponse(attachment.file, content_type=attachment.mime_type)
-    response['Content-Disposition'] = f'inline; filename="{attachment.original_filename}"'
-    return response
+    return _attachment_response(request, attachment, 'inline')
 
 @login_required
 def test_editor(request):
@@ -758,7 +990,7 @@ def verify_signature_view(request, signature_id):
             user=request.user if request.user.is_authenticated else None,
             action_type='SIGNATURE_VERIFICATION',
             resource_type='DigitalSignature',
-            resource_id=str(signature.id),
+            resource_id=str(signature['id']),
             details=f'تم التحقق من التوقيع {signature_id}',
             ip_address=get_client_ip(request),
             user_agent=request.META.get('HTTP_USER_AGENT', '')
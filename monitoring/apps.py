@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class MonitoringConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'monitoring'
+    verbose_name = 'مراقبة الأداء'
+
+    def ready(self):
+        from . import profiling, signals  # noqa: F401
+        profiling.install_instrumentation()
@@ -0,0 +1,384 @@
+"""
+مقاييس التطبيق بصيغة Prometheus النصية
+عدادات (Counter) ومقاييس لحظية (Gauge) ومدرجات تكرارية (Histogram) بدون مكتبات خارجية.
+
+التجميع بين العمليات: عند ضبط METRICS_MULTIPROC_DIR تكتب كل عملية (عامل gunicorn)
+قيمها في ملف باسم رقمها ورمز عشوائي لها كل METRICS_FLUSH_INTERVAL ثانية، ونقطة /metrics تجمع كل الملفات.
+الرمز يمنع عاملاً جديداً أخذ رقم عملية منتهية من الكتابة فوق ملفها.
+العدادات والمدرجات تُجمع من كل الملفات (حتى العمليات المنتهية حتى لا تتراجع القيم)،
+والمقاييس اللحظية من العمليات الحية فقط. عند كل عرض تُدمج عدادات ومدرجات العمليات المنتهية
+في ملف واحد (metrics_dead.json) وتُحذف ملفاتها، فلا يزيد عدد الملفات مع إعادة تشغيل العمال.
+"""
+import atexit
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+
+DEAD_WORKERS_FILE = 'metrics_dead.json'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    type = ''
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name}: التسميات المطلوبة {self.labelnames}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def dump(self):
+        return [
+            [list(key), list(value) if isinstance(value, list) else value]
+            for key, value in self.values.items()
+        ]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.registry.check_fork()
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.maybe_flush()
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.registry.check_fork()
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.registry.check_fork()
+            # [عدادات الفئات غير التراكمية..., المجموع، العدد]
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+        self.registry.maybe_flush()
+
+
+class Registry:
+    """سجل المقاييس لعملية واحدة"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.metrics = OrderedDict()
+        self.pid = os.getpid()
+        self.token = uuid.uuid4().hex
+        self.last_flush = 0.0
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """دالة تُستدعى قبل كل كتابة أو عرض لتحديث المقاييس اللحظية"""
+        self.collectors.append(collector)
+        return collector
+
+    def check_fork(self):
+        # العملية الفرعية بعد fork ترث قيم الأصل فتبدأ من الصفر حتى لا تُحسب مرتين
+        pid = os.getpid()
+        if pid != self.pid:
+            self.pid = pid
+            self.token = uuid.uuid4().hex
+            self.last_flush = 0.0
+            for metric in self.metrics.values():
+                metric.values = {}
+
+    def collect(self):
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception:
+                pass
+
+    def snapshot(self):
+        with self.lock:
+            self.check_fork()
+            return {
+                'pid': self.pid,
+                'token': self.token,
+                'metrics': {name: metric.dump() for name, metric in self.metrics.items()},
+            }
+
+    # -- التجميع بين العمليات -------------------------------------------------
+
+    @staticmethod
+    def multiproc_dir():
+        return getattr(settings, 'METRICS_MULTIPROC_DIR', '') or ''
+
+    def maybe_flush(self):
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+        if self.multiproc_dir() and time.monotonic() - self.last_flush >= interval:
+            self.flush()
+
+    def flush(self):
+        """كتابة قيم العملية في ملفها (كتابة ذرية عبر ملف مؤقت)"""
+        directory = self.multiproc_dir()
+        if not directory:
+            return
+        self.last_flush = time.monotonic()
+        self.collect()
+        snapshot = self.snapshot()
+        path = os.path.join(directory, f'metrics_{snapshot["pid"]}_{snapshot["token"]}.json')
+        temporary = f'{path}.tmp'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(temporary, path)
+        except OSError:
+            pass
+
+    def load_snapshots(self):
+        """لقطات كل العمليات (أو العملية الحالية فقط بدون مجلد مشترك)"""
+        directory = self.multiproc_dir()
+        if not directory:
+            self.collect()
+            return [self.snapshot()]
+        self.flush()
+        try:
+            self.fold_dead_workers(directory)
+        except OSError:
+            pass
+        snapshots = []
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            names = []
+        for name in names:
+            if not (name.startswith('metrics_') and name.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(directory, name), encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def fold_dead_workers(self, directory):
+        """
+        دمج عدادات ومدرجات العمليات المنتهية في ملف DEAD_WORKERS_FILE وحذف ملفاتها
+
+        القفل يمنع عمليتين تعرضان /metrics في نفس الوقت من دمج الملف نفسه مرتين.
+        """
+        with open(os.path.join(directory, 'metrics.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = []
+            for name in os.listdir(directory):
+                if name == DEAD_WORKERS_FILE or not name.startswith('metrics_'):
+                    continue
+                pid = name[len('metrics_'):].split('.')[0].split('_')[0]
+                if pid.isdigit() and not _pid_alive(int(pid)):
+                    dead.append(name)
+            if not dead:
+                return
+
+            path = os.path.join(directory, DEAD_WORKERS_FILE)
+            totals = {}
+            for name in [DEAD_WORKERS_FILE] + dead:
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(directory, name), encoding='utf-8') as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                for metric_name, samples in snapshot.get('metrics', {}).items():
+                    metric = self.metrics.get(metric_name)
+                    if metric is not None and metric.type == 'gauge':
+                        continue
+                    _merge_samples(totals.setdefault(metric_name, {}), samples)
+
+            temporary = f'{path}.tmp'
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'pid': None,
+                    'metrics': {
+                        name: [[list(key), value] for key, value in samples.items()]
+                        for name, samples in totals.items()
+                    },
+                }, f)
+            os.replace(temporary, path)
+            for name in dead:
+                os.remove(os.path.join(directory, name))
+
+
+def _merge_samples(totals, samples):
+    """إضافة عينات لقطة ([[مفتاح التسميات، قيمة]، ...]) إلى مجاميع مقياس"""
+    for key, value in samples:
+        key = tuple(key)
+        current = totals.get(key)
+        if current is None:
+            totals[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            totals[key] = [a + b for a, b in zip(current, value)]
+        else:
+            totals[key] = current + value
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def aggregate(registry):
+    """
+    جمع لقطات العمليات لكل مقياس
+
+    Returns:
+        dict: {اسم المقياس: {مفتاح التسميات: قيمة}}
+    """
+    totals = {name: {} for name in registry.metrics}
+    for snapshot in registry.load_snapshots():
+        alive = None
+        for name, samples in snapshot.get('metrics', {}).items():
+            metric = registry.metrics.get(name)
+            if metric is None:
+                continue
+            if metric.type == 'gauge':
+                if alive is None:
+                    alive = _pid_alive(snapshot.get('pid', 0))
+                if not alive:
+                    continue
+            _merge_samples(totals[name], samples)
+    return totals
+
+
+def render(registry):
+    """نص صيغة Prometheus (text exposition 0.0.4)"""
+    totals = aggregate(registry)
+    lines = []
+    for name, metric in registry.metrics.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        for key, value in sorted(totals[name].items()):
+            if metric.type == 'histogram':
+                cumulative = 0
+                for bound, count in zip(metric.buckets, value[:-2]):
+                    cumulative += count
+                    labels = _format_labels(metric.labelnames, key, [('le', _format_value(float(bound)))])
+                    lines.append(f'{name}_bucket{labels} {cumulative}')
+                labels = _format_labels(metric.labelnames, key)
+                lines.append(f'{name}_sum{labels} {_format_value(value[-2])}')
+                lines.append(f'{name}_count{labels} {value[-1]}')
+            else:
+                lines.append(f'{name}{_format_labels(metric.labelnames, key)} {_format_value(value)}')
+
+    # نسبة إصابة الـ cache محسوبة من العدادات المجمعة
+    lookups = totals.get(CACHE_LOOKUPS.name, {})
+    hits, misses = lookups.get(('hit',), 0), lookups.get(('miss',), 0)
+    lines.append('# HELP mcham_cache_hit_ratio Cache hit ratio since process start (all workers)')
+    lines.append('# TYPE mcham_cache_hit_ratio gauge')
+    lines.append(f'mcham_cache_hit_ratio {_format_value(round(hits / (hits + misses), 4) if hits + misses else 0.0)}')
+    return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+# -- المقاييس ----------------------------------------------------------------
+
+MESSAGES_SENT = REGISTRY.counter(
+    'mcham_messages_sent_total', 'Messages created with a sent status', ['priority'])
+RECIPIENTS_FANNED_OUT = REGISTRY.counter(
+    'mcham_message_recipients_total', 'Recipient rows delivered', ['recipient_type'])
+SIGNATURES_GENERATED = REGISTRY.counter(
+    'mcham_signatures_generated_total', 'Digital signatures generated', ['signature_type'])
+SIGNATURE_QR_RENDER = REGISTRY.histogram(
+    'mcham_signature_qr_render_seconds', 'Time spent rendering signature QR images')
+LOGIN_ATTEMPTS = REGISTRY.counter(
+    'mcham_login_attempts_total', 'Login attempts by result', ['result'])
+AUDIT_WRITE_LAG = REGISTRY.histogram(
+    'mcham_audit_write_lag_seconds', 'Delay between an audit entry timestamp and its commit',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+APPROVAL_STEP_LATENCY = REGISTRY.histogram(
+    'mcham_approval_step_latency_seconds', 'Time from step assignment to response', ['action'],
+    buckets=(60, 300, 900, 3600, 4 * 3600, 8 * 3600, 24 * 3600, 3 * 24 * 3600, 7 * 24 * 3600))
+CACHE_LOOKUPS = REGISTRY.counter(
+    'mcham_cache_lookups_total', 'Cache reads by result', ['result'])
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    'mcham_http_request_duration_seconds', 'Request wall time', ['method'])
+DB_QUERIES = REGISTRY.counter(
+    'mcham_db_queries_total', 'Database queries executed while serving requests')
+DB_CONNECTIONS_OPEN = REGISTRY.gauge(
+    'mcham_db_connections_open', 'Open database connections (live workers)', ['alias'])
+
+
+@REGISTRY.add_collector
+def _collect_db_connections():
+    from django.db import connections
+    for alias in connections:
+        connection = connections[alias]
+        DB_CONNECTIONS_OPEN.set(int(connection.connection is not None), alias=alias)
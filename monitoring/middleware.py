@@ -0,0 +1,71 @@
+"""
+Middleware قياس أداء الطلبات
+يقيس كل طلب بتكلفة منخفضة، ويحفظ عينة منها (PROFILING_SAMPLE_RATE) وكل طلب بطيء
+يتجاوز PROFILING_SLOW_MS مع قائمة استعلاماته. نسبة PROFILING_PROFILE_RATE من الطلبات
+تُشغل تحت المحلل وتُحفظ لقطته إذا كان الطلب بطيئاً.
+"""
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics, profiling
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.1)
+        self.profile_rate = getattr(settings, 'PROFILING_PROFILE_RATE', 0.01)
+        self.slow_ms = getattr(settings, 'PROFILING_SLOW_MS', 500)
+        self.exclude_paths = tuple(getattr(
+            settings, 'PROFILING_EXCLUDE_PATHS', ('/static/', '/media/', '/monitoring/')
+        ))
+
+    def __call__(self, request):
+        if request.path.startswith(self.exclude_paths):
+            return self.get_response(request)
+
+        record = profiling.RequestRecord(request)
+        recorder = profiling.QueryRecorder(record)
+        session = profiling.start_profiler() if random.random() < self.profile_rate else None
+        token = profiling.activate(record)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            record.duration_ms = (time.perf_counter() - started) * 1000
+            profiling.deactivate(token)
+            if session is not None:
+                session.stop()
+
+        metrics.HTTP_REQUEST_DURATION.observe(record.duration_ms / 1000, method=request.method)
+        metrics.DB_QUERIES.inc(record.db_count)
+
+        record.slow = record.duration_ms >= self.slow_ms
+        if record.slow or random.random() < self.sample_rate:
+            self._finish(record, request, response, session)
+        return response
+
+    def _finish(self, record, request, response, session):
+        record.status = response.status_code
+        match = getattr(request, 'resolver_match', None)
+        record.view = match.view_name if match else ''
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            record.user_id = user.pk
+        if record.slow:
+            if session is not None:
+                record.profile = session.render()
+        else:
+            # قائمة الاستعلامات تُحفظ للطلبات البطيئة فقط
+            record.queries = []
+        profiling.store_record(record)
@@ -0,0 +1,295 @@
+"""
+قياس أداء الطلبات
+يسجل لكل طلب: الزمن الكلي، عدد استعلامات قاعدة البيانات وزمنها، إصابات وإخفاقات الـ cache
+وزمن عرض القوالب. الطلبات البطيئة تحتفظ بقائمة الاستعلامات كاملة ولقطة من المحلل (profiler).
+
+السجلات تُحفظ في حلقة (ring buffer) من خانات ثابتة في الـ cache المشترك حتى ترى
+لوحة المراقبة طلبات جميع عمليات gunicorn.
+"""
+import contextvars
+import functools
+import io
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+BUFFER_COUNTER_KEY = 'profiling_buffer_counter'
+BUFFER_SLOT_KEY = 'profiling_buffer_{slot}'
+BUFFER_TIMEOUT = 60 * 60 * 24
+
+MAX_RECORDED_QUERIES = 500
+PROFILE_LINES = 40
+
+_current = contextvars.ContextVar('profiling_record', default=None)
+_installed = False
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RequestRecord:
+    """قياسات طلب واحد"""
+
+    def __init__(self, request):
+        self.id = None
+        self.method = request.method
+        self.path = request.path
+        self.view = ''
+        self.status = None
+        self.user_id = None
+        self.started_at = timezone.now()
+        self.duration_ms = 0.0
+        self.db_count = 0
+        self.db_ms = 0.0
+        self.queries = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_ms = 0.0
+        self.slow = False
+        self.profile = ''
+
+    def add_query(self, sql, seconds):
+        self.db_count += 1
+        self.db_ms += seconds * 1000
+        if len(self.queries) < MAX_RECORDED_QUERIES:
+            self.queries.append([sql, round(seconds * 1000, 3)])
+
+    def summary(self):
+        """الحقول المختصرة بدون قائمة الاستعلامات ولقطة المحلل"""
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'view': self.view,
+            'status': self.status,
+            'user_id': self.user_id,
+            'started_at': self.started_at.isoformat(),
+            'duration_ms': round(self.duration_ms, 2),
+            'db_count': self.db_count,
+            'db_ms': round(self.db_ms, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'template_ms': round(self.template_ms, 2),
+            'slow': self.slow,
+        }
+
+    def as_dict(self):
+        data = self.summary()
+        data['queries'] = self.queries
+        data['profile'] = self.profile
+        return data
+
+
+def current_record():
+    """سجل الطلب الجاري في هذا السياق (أو None)"""
+    return _current.get()
+
+
+def activate(record):
+    return _current.set(record)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def record_cache_lookup(hits, misses):
+    record = _current.get()
+    if record is not None:
+        record.cache_hits += hits
+        record.cache_misses += misses
+
+
+class QueryRecorder:
+    """غلاف تنفيذ الاستعلامات (connection.execute_wrapper) لسجل طلب"""
+
+    def __init__(self, record):
+        self.record = record
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record.add_query(sql, time.perf_counter() - started)
+
+
+# ---------------------------------------------------------------------------
+# المحلل (profiler)
+# ---------------------------------------------------------------------------
+
+class _CProfileSession:
+    def __init__(self):
+        import cProfile
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def render(self):
+        import pstats
+        output = io.StringIO()
+        pstats.Stats(self.profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        return output.getvalue()
+
+
+class _PyinstrumentSession:
+    def __init__(self):
+        from pyinstrument import Profiler
+        self.profiler = Profiler()
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def render(self):
+        return self.profiler.output_text(unicode=True)
+
+
+def start_profiler():
+    """
+    بدء جلسة تحليل حسب PROFILING_PROFILER ('cprofile' أو 'pyinstrument')
+
+    Returns:
+        الجلسة أو None إذا تعذر البدء (مثلاً محلل آخر نشط في نفس الخيط)
+    """
+    profiler = get_setting('PROFILING_PROFILER', 'cprofile')
+    try:
+        if profiler == 'pyinstrument':
+            try:
+                return _PyinstrumentSession()
+            except ImportError:
+                logger.warning('pyinstrument غير مثبت، سيتم استخدام cProfile')
+        return _CProfileSession()
+    except (ValueError, RuntimeError):
+        return None
+
+
+# ---------------------------------------------------------------------------
+# الحلقة المشتركة
+# ---------------------------------------------------------------------------
+
+def get_buffer_size():
+    return get_setting('PROFILING_BUFFER_SIZE', 200)
+
+
+def store_record(record):
+    """
+    حفظ السجل في الخانة التالية من الحلقة (يستبدل أقدم سجل عند الامتلاء)
+
+    Returns:
+        int: رقم السجل
+    """
+    try:
+        record.id = cache.incr(BUFFER_COUNTER_KEY)
+    except ValueError:
+        cache.add(BUFFER_COUNTER_KEY, 0, None)
+        record.id = cache.incr(BUFFER_COUNTER_KEY)
+    slot = record.id % get_buffer_size()
+    cache.set(BUFFER_SLOT_KEY.format(slot=slot), record.as_dict(), BUFFER_TIMEOUT)
+
+    if get_setting('PROFILING_LOG_SINK', False):
+        logger.log(
+            logging.WARNING if record.slow else logging.INFO,
+            json.dumps(record.summary(), ensure_ascii=False),
+        )
+    return record.id
+
+
+def recent_records():
+    """كل السجلات الموجودة في الحلقة مرتبة من الأحدث"""
+    keys = [BUFFER_SLOT_KEY.format(slot=slot) for slot in range(get_buffer_size())]
+    records = [record for record in cache.get_many(keys).values() if record]
+    return sorted(records, key=lambda record: record['id'], reverse=True)
+
+
+def get_record(record_id):
+    """سجل برقمه إن لم يُستبدل بعد"""
+    record = cache.get(BUFFER_SLOT_KEY.format(slot=record_id % get_buffer_size()))
+    if record and record['id'] == record_id:
+        return record
+    return None
+
+
+# ---------------------------------------------------------------------------
+# قياس الـ cache والقوالب
+# ---------------------------------------------------------------------------
+
+def _instrument_get(original):
+    @functools.wraps(original)
+    def get(self, key, default=None, *args, **kwargs):
+        value = original(self, key, default, *args, **kwargs)
+        hit = value is not default
+        metrics.CACHE_LOOKUPS.inc(result='hit' if hit else 'miss')
+        record_cache_lookup(int(hit), int(not hit))
+        return value
+    return get
+
+
+def _instrument_get_many(original):
+    @functools.wraps(original)
+    def get_many(self, keys, *args, **kwargs):
+        keys = list(keys)
+        values = original(self, keys, *args, **kwargs)
+        hits, misses = len(values), len(keys) - len(values)
+        if hits:
+            metrics.CACHE_LOOKUPS.inc(hits, result='hit')
+        if misses:
+            metrics.CACHE_LOOKUPS.inc(misses, result='miss')
+        record_cache_lookup(hits, misses)
+        return values
+    return get_many
+
+
+def _instrument_template_render(original):
+    @functools.wraps(original)
+    def render(self, *args, **kwargs):
+        record = _current.get()
+        if record is None:
+            return original(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            record.template_ms += (time.perf_counter() - started) * 1000
+    return render
+
+
+def install_instrumentation():
+    """
+    تغليف دوال القراءة في أصناف الـ cache المستخدمة وعرض القوالب مرة واحدة لكل عملية
+    (ومنها يُحسب مقياس mcham_cache_lookups_total).
+    get_many الموروثة من BaseCache تستدعي get لكل مفتاح فلا تُغلف حتى لا تُحسب مرتين.
+    """
+    global _installed
+    if _installed or not get_setting('PROFILING_ENABLED', False):
+        return
+    _installed = True
+
+    from django.core.cache.backends.base import BaseCache
+    from django.template.backends.django import Template
+
+    for options in settings.CACHES.values():
+        try:
+            backend = import_string(options['BACKEND'])
+        except ImportError:
+            continue
+        if getattr(backend, '_profiling_instrumented', False):
+            continue
+        backend.get = _instrument_get(backend.get)
+        if backend.get_many is not BaseCache.get_many:
+            backend.get_many = _instrument_get_many(backend.get_many)
+        backend._profiling_instrumented = True
+
+    Template.render = _instrument_template_render(Template.render)
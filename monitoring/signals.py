@@ -0,0 +1,70 @@
+"""
+ربط أحداث التطبيق بالمقاييس
+الإنشاء الجماعي (bulk_create) لا يرسل post_save فيُحسب في موضعه (مثل send_bulk_notifications)
+"""
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from messaging.models import DigitalSignature, Message, MessageRecipient
+from security.models import AuditLog
+from workflows import signals as workflow_signals
+
+from . import metrics
+
+
+@receiver(post_save, sender=Message)
+def count_message_sent(sender, instance, created, raw=False, **kwargs):
+    # الحفظ الخام (الاستعادة من الأرشيف البارد أو loaddata) ليس إرسالاً جديداً
+    if created and not raw and instance.status != 'DRAFT':
+        metrics.MESSAGES_SENT.inc(priority=instance.priority)
+
+
+@receiver(post_save, sender=MessageRecipient)
+def count_recipient(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        metrics.RECIPIENTS_FANNED_OUT.inc(recipient_type=instance.recipient_type)
+
+
+@receiver(post_save, sender=DigitalSignature)
+def count_signature(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        metrics.SIGNATURES_GENERATED.inc(signature_type=instance.signature_type)
+
+
+@receiver(user_logged_in)
+def count_login_success(sender, request, user, **kwargs):
+    metrics.LOGIN_ATTEMPTS.inc(result='success')
+
+
+@receiver(user_login_failed)
+def count_login_failure(sender, credentials, request=None, **kwargs):
+    metrics.LOGIN_ATTEMPTS.inc(result='failure')
+
+
+@receiver(post_save, sender=AuditLog)
+def measure_audit_write_lag(sender, instance, created, **kwargs):
+    if created and instance.timestamp:
+        timestamp = instance.timestamp
+        transaction.on_commit(lambda: metrics.AUDIT_WRITE_LAG.observe(
+            max((timezone.now() - timestamp).total_seconds(), 0.0)
+        ))
+
+
+def _observe_step_latency(step, action):
+    if step is not None and step.assigned_at and step.responded_at:
+        metrics.APPROVAL_STEP_LATENCY.observe(
+            max((step.responded_at - step.assigned_at).total_seconds(), 0.0), action=action
+        )
+
+
+@receiver(workflow_signals.step_approved)
+def measure_step_approved(sender, step=None, **kwargs):
+    _observe_step_latency(step, 'approve')
+
+
+@receiver(workflow_signals.request_rejected)
+def measure_step_rejected(sender, step=None, **kwargs):
+    _observe_step_latency(step, 'reject')
@@ -0,0 +1,149 @@
+import json
+import os
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import Department, Position, User
+from myproject.perf_fixtures import TEST_STORAGES
+
+from . import metrics, profiling
+
+
+@override_settings(
+    STORAGES=TEST_STORAGES,
+    PROFILING_SAMPLE_RATE=1.0,
+    PROFILING_PROFILE_RATE=1.0,
+    PROFILING_BUFFER_SIZE=5,
+)
+class ProfilingMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='تقنية المعلومات', code='IT')
+        position = Position.objects.create(title='مدير نظام', level=5, department=department)
+        cls.staff = User.objects.create_user(
+            username='admin', password='pass', arabic_name='مدير النظام', employee_id='1',
+            phone='100', department=department, position=position, is_staff=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def test_records_request_measurements(self):
+        self.client.get(reverse('messaging:inbox'))
+        record = profiling.recent_records()[0]
+        self.assertEqual(record['path'], reverse('messaging:inbox'))
+        self.assertEqual(record['view'], 'messaging:inbox')
+        self.assertEqual(record['user_id'], self.staff.pk)
+        self.assertGreater(record['db_count'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertEqual(record['queries'], [])
+
+    @override_settings(PROFILING_SLOW_MS=0)
+    def test_slow_request_keeps_queries_and_profile(self):
+        self.client.get(reverse('messaging:inbox'))
+        record = profiling.recent_records()[0]
+        self.assertTrue(record['slow'])
+        self.assertEqual(len(record['queries']), record['db_count'])
+        self.assertIn('cumulative', record['profile'])
+
+    def test_buffer_keeps_latest_records(self):
+        for _ in range(7):
+            self.client.get(reverse('messaging:inbox'))
+        records = profiling.recent_records()
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[0]['id'], 7)
+        self.assertIsNone(profiling.get_record(1))
+
+    def test_dashboard_lists_records(self):
+        self.client.get(reverse('messaging:inbox'))
+        response = self.client.get(reverse('monitoring:requests'))
+        self.assertContains(response, reverse('messaging:inbox'))
+        record_id = profiling.recent_records()[0]['id']
+        response = self.client.get(reverse('monitoring:request_detail', args=[record_id]))
+        self.assertEqual(response.status_code, 200)
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.counter = self.registry.counter('test_events_total', 'Events', ['kind'])
+        self.histogram = self.registry.histogram('test_latency_seconds', 'Latency', buckets=(0.1, 1))
+        self.gauge = self.registry.gauge('test_open', 'Open')
+
+    def test_render_text_exposition(self):
+        self.counter.inc(kind='a')
+        self.counter.inc(2, kind='a')
+        self.histogram.observe(0.05)
+        self.histogram.observe(0.5)
+        self.histogram.observe(3)
+        text = metrics.render(self.registry)
+        self.assertIn('# TYPE test_events_total counter', text)
+        self.assertIn('test_events_total{kind="a"} 3', text)
+        self.assertIn('test_latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{le="1"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn('test_latency_seconds_count 3', text)
+
+    def test_aggregates_worker_files(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_MULTIPROC_DIR=directory):
+            self.counter.inc(kind='a')
+            self.gauge.set(1)
+            # عامل آخر انتهى: عداداته تبقى ومقاييسه اللحظية تُهمل
+            with open(os.path.join(directory, 'metrics_999999999.json'), 'w') as f:
+                json.dump({'pid': 999999999, 'metrics': {
+                    'test_events_total': [[['a'], 4]],
+                    'test_open': [[[], 7]],
+                }}, f)
+            totals = metrics.aggregate(self.registry)
+        self.assertEqual(totals['test_events_total'][('a',)], 5)
+        self.assertEqual(totals['test_open'][()], 1)
+
+    def test_reused_pid_does_not_overwrite_totals(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_MULTIPROC_DIR=directory):
+            self.counter.inc(3, kind='a')
+            self.registry.flush()
+            # عامل جديد بنفس رقم العملية (أُعيد استخدامه بعد انتهاء العامل السابق)
+            restarted = metrics.Registry()
+            counter = restarted.counter('test_events_total', 'Events', ['kind'])
+            counter.inc(kind='a')
+            restarted.flush()
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertEqual(metrics.aggregate(restarted)['test_events_total'][('a',)], 4)
+
+    def test_dead_worker_files_are_folded(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_MULTIPROC_DIR=directory):
+            self.counter.inc(kind='a')
+            for restart in range(5):
+                # عمال منتهون من عمليات إعادة تشغيل سابقة
+                for pid in (999999990 + restart * 2, 999999991 + restart * 2):
+                    with open(os.path.join(directory, f'metrics_{pid}_token.json'), 'w') as f:
+                        json.dump({'pid': pid, 'metrics': {
+                            'test_events_total': [[['a'], 2]],
+                            'test_latency_seconds': [[[], [1, 0, 0, 0.004, 1]]],
+                            'test_open': [[[], 7]],
+                        }}, f)
+                totals = metrics.aggregate(self.registry)
+                files = [name for name in os.listdir(directory) if name.endswith('.json')]
+                self.assertEqual(len(files), 2)
+                self.assertEqual(totals['test_events_total'][('a',)], 1 + 4 * (restart + 1))
+                self.assertEqual(totals['test_latency_seconds'][()][-1], 2 * (restart + 1))
+                self.assertEqual(totals['test_open'], {})
+
+    def test_endpoint_requires_allowed_client(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            response = self.client.get(
+                '/metrics', REMOTE_ADDR='10.0.0.5', HTTP_AUTHORIZATION='Bearer secret'
+            )
+        self.assertContains(response, 'mcham_messages_sent_total')
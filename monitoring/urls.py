@@ -0,0 +1,12 @@
+"""
+URLs for monitoring app
+"""
+from django.urls import path
+from . import views
+
+app_name = 'monitoring'
+
+urlpatterns = [
+    path('requests/', views.request_list, name='requests'),
+    path('requests/<int:record_id>/', views.request_detail, name='request_detail'),
+]
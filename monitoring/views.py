@@ -0,0 +1,83 @@
+"""
+Views for monitoring app
+"""
+import hmac
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.shortcuts import render
+
+from . import metrics as app_metrics
+from . import profiling
+
+SORT_FIELDS = {
+    'duration': 'duration_ms',
+    'queries': 'db_count',
+    'db': 'db_ms',
+    'template': 'template_ms',
+}
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def request_list(request):
+    """سجلات أداء الطلبات الأخيرة"""
+    records = profiling.recent_records()
+
+    slow_only = request.GET.get('slow') == '1'
+    if slow_only:
+        records = [record for record in records if record['slow']]
+
+    path_filter = request.GET.get('path', '').strip()
+    if path_filter:
+        records = [record for record in records if path_filter in record['path']]
+
+    sort = request.GET.get('sort', '')
+    if sort in SORT_FIELDS:
+        records.sort(key=lambda record: record[SORT_FIELDS[sort]], reverse=True)
+
+    return render(request, 'monitoring/request_list.html', {
+        'records': records,
+        'slow_only': slow_only,
+        'path_filter': path_filter,
+        'sort': sort,
+        'slow_ms': profiling.get_setting('PROFILING_SLOW_MS', 500),
+    })
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def request_detail(request, record_id):
+    """تفاصيل سجل طلب: الاستعلامات ولقطة المحلل"""
+    record = profiling.get_record(record_id)
+    if record is None:
+        raise Http404('السجل غير موجود أو تم استبداله')
+    return render(request, 'monitoring/request_detail.html', {'record': record})
+
+
+def _can_scrape(request):
+    """
+    السماح لـ Prometheus بالقراءة: رمز METRICS_TOKEN، أو مستخدم إداري،
+    أو طلب مباشر (غير ممرر عبر nginx) من عنوان في METRICS_ALLOWED_IPS
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if hmac.compare_digest(header, f'Bearer {token}'):
+            return True
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    if 'HTTP_X_FORWARDED_FOR' in request.META:
+        return False
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1',))
+
+
+def metrics(request):
+    """مقاييس التطبيق بصيغة Prometheus النصية"""
+    if not _can_scrape(request):
+        return HttpResponseForbidden('غير مصرح')
+    return HttpResponse(
+        app_metrics.render(app_metrics.REGISTRY),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,66 @@
+"""
+الطلبات الشرطية (ETag)
+نسخ (stamps) محفوظة في الـ cache تتغير عند كل تعديل على البيانات المعروضة، ومنها
+يُبنى الـ ETag فيرد Django بـ 304 دون تنفيذ الـ view إذا لم يتغير شيء.
+
+الـ ETag يشمل أيضاً المستخدم وسر CSRF (الصفحة تحتوي رمزه) ونسخة دليل
+الموظفين (الأسماء والمناصب المعروضة). لا يُرسل Last-Modified لأن هذه المدخلات
+ليست أوقاتاً يمكن مقارنتها.
+"""
+import hashlib
+import time
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+
+from accounts.directory import DIRECTORY_VERSION_KEY, get_directory_version
+
+
+def get_versions(*keys):
+    """
+    قيم النسخ بطلب cache واحد (النسخة المفقودة تُنشأ بقيمة جديدة)
+
+    Returns:
+        list: القيم بترتيب المفاتيح
+    """
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            if key == DIRECTORY_VERSION_KEY:
+                found[key] = get_directory_version()
+            else:
+                cache.add(key, time.time_ns(), None)
+                found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump_versions(*keys):
+    """تغيير النسخ بعد تعديل البيانات"""
+    if keys:
+        stamp = time.time_ns()
+        cache.set_many({key: stamp for key in set(keys)}, None)
+
+
+def make_etag(request, version_keys, *extra):
+    """
+    ETag لصفحة المستخدم
+
+    Args:
+        request: الطلب
+        version_keys: مفاتيح النسخ التي تعتمد عليها الصفحة
+        extra: قيم إضافية (مثل معاملات الرابط)
+
+    Returns:
+        str أو None: None يعطل الطلب الشرطي (مثلاً عند وجود تنبيهات لم تُعرض بعد)
+    """
+    if len(get_messages(request)):
+        return None
+    values = get_versions(DIRECTORY_VERSION_KEY, *version_keys)
+    parts = (
+        request.user.pk,
+        # سر CSRF من الـ middleware (أو الذي أُنشئ أثناء عرض الصفحة)
+        request.META.get('CSRF_COOKIE', ''),
+        *values,
+        *extra,
+    )
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
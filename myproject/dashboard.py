@@ -0,0 +1,149 @@
+"""
+لقطة لوحة التحكم
+تجمع إحصائيات المستخدم في استعلام واحد (استعلامات فرعية عددية على صف المستخدم)،
+وتحفظ اللقطة في الـ cache لكل مستخدم لمدة قصيرة مع إبطالها عند الإرسال أو القراءة
+أو أحداث الموافقات. عدد المستخدمين المتصلين يُقرأ من فهرس الحضور (accounts.presence).
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, Exists, F, Func, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts import presence
+from messaging.models import Message, MessageCategory, MessageRecipient
+from security.models import AuditLog
+from workflows.engine import OPEN_STATUSES
+from workflows.models import ApprovalRequest, ApprovalStep
+
+SNAPSHOT_KEY = 'dashboard_snapshot_{user_id}'
+SNAPSHOT_TIMEOUT = 60
+RECENT_LIMIT = 5
+CATEGORY_LABELS = dict(MessageCategory.CATEGORY_CHOICES)
+
+
+def _count(queryset, field='pk', distinct=False):
+    """استعلام فرعي عددي COUNT بدون GROUP BY"""
+    template = '%(function)s(DISTINCT %(expressions)s)' if distinct else '%(function)s(%(expressions)s)'
+    return Coalesce(
+        Subquery(
+            queryset.order_by().annotate(
+                _count=Func(F(field), function='COUNT', template=template, output_field=IntegerField())
+            ).values('_count')[:1],
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def _current_steps_for(user_pk):
+    return ApprovalStep.objects.filter(
+        Q(approver_id=user_pk) | Q(delegated_to_id=user_pk),
+        is_current_step=True,
+        is_completed=False,
+    )
+
+
+class DashboardSnapshot:
+    """بناء لقطة لوحة التحكم وحفظها وإبطالها"""
+
+    @staticmethod
+    def get(user):
+        """
+        لقطة المستخدم من الـ cache أو بناؤها
+
+        Returns:
+            dict: {'stats', 'recent_messages', 'recent_approvals', 'weekly_activity'}
+        """
+        key = SNAPSHOT_KEY.format(user_id=user.pk)
+        snapshot = cache.get(key)
+        if snapshot is None:
+            snapshot = DashboardSnapshot.build(user)
+            cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+        snapshot['stats']['active_users'] = DashboardSnapshot.active_users()
+        return snapshot
+
+    @staticmethod
+    def build(user):
+        """بناء اللقطة من قاعدة البيانات"""
+        user_pk = user.pk
+        received = MessageRecipient.objects.filter(recipient_id=user_pk, is_deleted=False)
+
+        counts = {
+            'unread_messages': _count(received.filter(read_at__isnull=True)),
+            'total_messages': _count(received),
+            'sent_messages': _count(Message.objects.filter(
+                sender_id=user_pk, status__in=['SENT', 'READ', 'REPLIED']
+            )),
+            'pending_approvals': _count(_current_steps_for(user_pk), 'request_id', distinct=True),
+            'my_requests': _count(ApprovalRequest.objects.filter(
+                requester_id=user_pk, status__in=OPEN_STATUSES
+            )),
+        }
+        # البادئة تتجنب تعارض الأسماء مع علاقات المستخدم العكسية (sent_messages مثلاً)
+        row = get_user_model().objects.filter(pk=user_pk).annotate(
+            **{f'dashboard_{name}': expression for name, expression in counts.items()}
+        ).values(*(f'dashboard_{name}' for name in counts)).get()
+        stats = {name: row[f'dashboard_{name}'] for name in counts}
+
+        recent_messages = [
+            {
+                'message_id': row['message__message_id'],
+                'subject': row['message__subject'],
+                'created_at': row['message__created_at'],
+                'priority': row['message__priority'],
+                'category': {
+                    'name': row['message__category__name'],
+                    'display': CATEGORY_LABELS.get(row['message__category__name'], row['message__category__name']),
+                },
+                'sender': {
+                    'arabic_name': row['message__sender__arabic_name'],
+                    'username': row['message__sender__username'],
+                },
+            }
+            for row in received.order_by('-message__created_at').values(
+                'message__message_id', 'message__subject', 'message__created_at', 'message__priority',
+                'message__category__name', 'message__sender__arabic_name', 'message__sender__username',
+            )[:RECENT_LIMIT]
+        ]
+
+        recent_approvals = [
+            {
+                'request_id': row['request_id'],
+                'title': row['title'],
+                'requester': {'arabic_name': row['requester__arabic_name']},
+            }
+            for row in ApprovalRequest.objects.filter(
+                Exists(_current_steps_for(user_pk).filter(request=OuterRef('pk')))
+            ).order_by('-created_at').values(
+                'request_id', 'title', 'requester__arabic_name'
+            )[:RECENT_LIMIT]
+        ]
+
+        week_ago = timezone.now().date() - timedelta(days=7)
+        weekly_activity = list(
+            AuditLog.objects.filter(
+                user_id=user_pk, timestamp__date__gte=week_ago
+            ).values('timestamp__date').annotate(count=Count('id')).order_by('timestamp__date')
+        )
+
+        return {
+            'stats': stats,
+            'recent_messages': recent_messages,
+            'recent_approvals': recent_approvals,
+            'weekly_activity': weekly_activity,
+        }
+
+    @staticmethod
+    def active_users():
+        """عدد المستخدمين المتصلين الآن من فهرس الحضور (دون استعلام)"""
+        return presence.online_count()
+
+    @staticmethod
+    def invalidate(*user_ids):
+        """إبطال لقطات المستخدمين بعد حدث يغير إحصائياتهم"""
+        keys = [SNAPSHOT_KEY.format(user_id=user_id) for user_id in set(user_ids) if user_id]
+        if keys:
+            cache.delete_many(keys)
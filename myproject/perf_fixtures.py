@@ -0,0 +1,246 @@
+"""
+أدوات اختبارات الأداء المشتركة
+تنشئ بيانات واقعية الحجم عبر bulk_create وتتحقق من حد أعلى لعدد الاستعلامات
+وزمن الاستجابة لكل صفحة، حتى تفشل الاختبارات عند ظهور استعلامات N+1
+
+حجم البيانات قابل للتعديل بمتغير البيئة PERF_TEST_SCALE (الافتراضي 1)
+ومهلة الزمن بمتغير PERF_TIME_FACTOR لتكييفها مع الأجهزة البطيئة
+"""
+import os
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import Department, Position, User
+from messaging.models import MailboxEntry, Message, MessageCategory, MessageRecipient
+from security.models import AuditLog, LoginAttempt, UserSession
+from workflows.models import ApprovalRequest, ApprovalStep, ApprovalWorkflow
+
+PERF_TEST_SCALE = float(os.environ.get('PERF_TEST_SCALE', 1))
+PERF_TIME_FACTOR = float(os.environ.get('PERF_TIME_FACTOR', 1))
+
+# تخزين الملفات الثابتة بدون manifest حتى تعمل القوالب دون collectstatic
+TEST_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+BATCH_SIZE = 2000
+
+
+def scaled(count, scale=None):
+    """تطبيق معامل الحجم على عدد السجلات (افتراضياً PERF_TEST_SCALE)"""
+    if scale is None:
+        scale = PERF_TEST_SCALE
+    return max(1, int(count * scale))
+
+
+def seed_dataset(users=1000, messages=10000, recipients_per_message=3, audit_logs=10000,
+                 approval_requests=1000, focus_share=0.05, password='perf-pass', scale=None):
+    """
+    إنشاء مجموعة بيانات للاختبار بعدد ثابت تقريباً من الاستعلامات
+
+    المستخدم المحوري (focus) مدير نظام يستقبل نسبة focus_share من الرسائل
+    ويرسل مثلها، وعليه خطوات موافقة حالية، حتى تحمل صفحاته بيانات حقيقية.
+
+    Args:
+        users: عدد الموظفين
+        messages: عدد الرسائل
+        recipients_per_message: عدد المستقبلين لكل رسالة
+        audit_logs: عدد سجلات التدقيق (ومثلها لمحاولات الدخول)
+        approval_requests: عدد طلبات الموافقة
+        focus_share: نسبة الرسائل والطلبات الخاصة بالمستخدم المحوري
+        password: كلمة مرور كل المستخدمين المنشئين
+        scale: معامل الحجم (افتراضياً PERF_TEST_SCALE)
+
+    Returns:
+        dict: {'focus': User, 'users': list, 'messages': list, 'workflow': ApprovalWorkflow}
+    """
+    users, messages = scaled(users, scale), scaled(messages, scale)
+    audit_logs, approval_requests = scaled(audit_logs, scale), scaled(approval_requests, scale)
+    now = timezone.now()
+    password = make_password(password)
+
+    departments = Department.objects.bulk_create([
+        Department(name=f'قسم {i}', code=f'D{i:03d}') for i in range(20)
+    ])
+    positions = Position.objects.bulk_create([
+        Position(title=f'منصب {i}', level=(i % 5) + 1, department=departments[i % len(departments)])
+        for i in range(40)
+    ])
+
+    focus = User.objects.create(
+        username='perf_focus', password=password, arabic_name='المستخدم المحوري',
+        employee_id='9999999', phone='999', department=departments[0], position=positions[0],
+        is_staff=True, is_superuser=True,
+    )
+    staff = User.objects.bulk_create([
+        User(
+            username=f'perf_user{i}', password=password, arabic_name=f'موظف رقم {i}',
+            first_name='Employee', last_name=str(i), employee_id=str(100000 + i),
+            phone=f'{i % 1000:03d}', department=departments[i % len(departments)],
+            position=positions[i % len(positions)], direct_manager=focus,
+        )
+        for i in range(users)
+    ], batch_size=BATCH_SIZE)
+
+    categories = [
+        MessageCategory.objects.get_or_create(name=name)[0]
+        for name, _ in MessageCategory.CATEGORY_CHOICES
+    ]
+
+    focus_every = max(1, int(1 / focus_share))
+    year = now.year
+    message_objects = []
+    for i in range(messages):
+        sender = focus if i % (focus_every * 2) == focus_every else staff[i % len(staff)]
+        message_objects.append(Message(
+            sequence_number=f'{year}-PRF-{i:07d}',
+            subject=f'رسالة اختبار {i}',
+            body=f'نص رسالة اختبار الأداء رقم {i}',
+            sender=sender,
+            category=categories[i % len(categories)],
+            priority=Message.PRIORITY_CHOICES[i % len(Message.PRIORITY_CHOICES)][0],
+            status='SENT',
+            sent_at=now - timedelta(minutes=i),
+        ))
+    for message in message_objects:
+        message.assign_thread(message.sent_at)
+    message_objects = Message.objects.bulk_create(message_objects, batch_size=BATCH_SIZE)
+
+    recipient_objects = []
+    for i, message in enumerate(message_objects):
+        chosen = {staff[(i * 7 + offset * 131) % len(staff)] for offset in range(recipients_per_message)}
+        chosen.discard(message.sender)
+        if i % focus_every == 0 and message.sender != focus:
+            chosen.add(focus)
+        recipient_objects.extend(
+            MessageRecipient(
+                message=message, recipient=recipient,
+                read_at=now if (i + recipient.pk) % 3 == 0 else None,
+            )
+            for recipient in chosen
+        )
+    MessageRecipient.objects.bulk_create(recipient_objects, batch_size=BATCH_SIZE)
+
+    # كل رسالة عاشرة مؤرشفة في صناديق مرسلها ومستقبليها
+    archived_at = {
+        message.pk: now - timedelta(days=i % 60)
+        for i, message in enumerate(message_objects) if i % 10 == 0
+    }
+    MailboxEntry.objects.bulk_create([
+        MailboxEntry(user_id=user_id, message_id=message_pk, folder='ARCHIVE', created_at=archived_at[message_pk])
+        for message_pk, user_id in [
+            (message.pk, message.sender_id) for message in message_objects if message.pk in archived_at
+        ] + [
+            (recipient.message_id, recipient.recipient_id)
+            for recipient in recipient_objects if recipient.message_id in archived_at
+        ]
+    ], batch_size=BATCH_SIZE)
+
+    AuditLog.objects.bulk_create([
+        AuditLog(
+            action_type=AuditLog.ACTION_TYPES[i % len(AuditLog.ACTION_TYPES)][0],
+            description=f'عملية اختبار {i}',
+            user=focus if i % focus_every == 0 else staff[i % len(staff)],
+            user_ip=f'10.0.{(i // 250) % 250}.{i % 250}',
+        )
+        for i in range(audit_logs)
+    ], batch_size=BATCH_SIZE)
+    LoginAttempt.objects.bulk_create([
+        LoginAttempt(
+            username=staff[i % len(staff)].username,
+            ip_address=f'10.1.{(i // 250) % 250}.{i % 250}',
+            is_successful=i % 4 != 0,
+            user_agent='perf-test',
+        )
+        for i in range(audit_logs)
+    ], batch_size=BATCH_SIZE)
+    UserSession.objects.bulk_create([
+        UserSession(
+            user=user, session_key=f'perf{user.pk:032d}', ip_address='10.2.0.1',
+            user_agent='perf-test', is_active=index % 2 == 0,
+        )
+        for index, user in enumerate(staff[:scaled(500, scale)])
+    ], batch_size=BATCH_SIZE)
+
+    workflow = ApprovalWorkflow.objects.create(
+        workflow_type='DOCUMENT_APPROVAL', name='سير عمل اختبار الأداء'
+    )
+    request_objects = ApprovalRequest.objects.bulk_create([
+        ApprovalRequest(
+            workflow=workflow,
+            requester=focus if i % focus_every == 0 else staff[i % len(staff)],
+            content_type='document', object_id=str(i),
+            title=f'طلب اختبار {i}', description='وصف',
+            status='IN_PROGRESS',
+        )
+        for i in range(approval_requests)
+    ], batch_size=BATCH_SIZE)
+    step_objects = []
+    for i, approval_request in enumerate(request_objects):
+        first = focus if i % focus_every == 1 else staff[(i + 1) % len(staff)]
+        second = staff[(i + 2) % len(staff)]
+        step_objects.append(ApprovalStep(
+            request=approval_request, approver=first, step_order=1, is_current_step=True,
+        ))
+        step_objects.append(ApprovalStep(
+            request=approval_request, approver=second, step_order=2,
+        ))
+    ApprovalStep.objects.bulk_create(step_objects, batch_size=BATCH_SIZE)
+
+    return {
+        'focus': focus,
+        'users': staff,
+        'messages': message_objects,
+        'workflow': workflow,
+    }
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class PerformanceTestCase(TestCase):
+    """
+    أساس اختبارات ميزانية الاستعلامات: تُنشأ البيانات مرة واحدة لكل صنف
+    والمستخدم المحوري متاح في self.focus
+    """
+    seed_options = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = seed_dataset(**cls.seed_options)
+        cls.focus = cls.dataset['focus']
+
+    def assertQueryBudget(self, url, max_queries, max_seconds=1.0, user=None, status_code=200):
+        """
+        طلب الصفحة والتحقق من عدد الاستعلامات والزمن
+
+        Args:
+            url: عنوان الصفحة
+            max_queries: الحد الأعلى لعدد الاستعلامات
+            max_seconds: الحد الأعلى للزمن (يُضرب في PERF_TIME_FACTOR)
+            user: المستخدم (افتراضياً المستخدم المحوري)
+
+        Returns:
+            HttpResponse: الاستجابة
+        """
+        self.client.force_login(user or self.focus)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.get(url)
+            elapsed = time.perf_counter() - started
+        self.assertEqual(response.status_code, status_code, url)
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f'{url} نفذ {len(queries)} استعلام (الحد {max_queries}):\n'
+            + '\n'.join(query['sql'] for query in queries.captured_queries)
+        )
+        self.assertLessEqual(
+            elapsed, max_seconds * PERF_TIME_FACTOR,
+            f'{url} استغرق {elapsed:.3f} ثانية (الحد {max_seconds * PERF_TIME_FACTOR:.3f})'
+        )
+        return response
@@ -45,14 +45,19 @@ INSTALLED_APPS = [
     'messaging',
     'security',
     'workflows',
+    'benchmarks',
+    'monitoring',
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'security.middleware.SessionActivityMiddleware',
+    'accounts.middleware.PresenceMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -214,11 +219,23 @@ else:
         }
     }
 
+# مدة تخزين صفوف صناديق البريد المعروضة (0 لتعطيل التخزين)
+MAILBOX_ROW_CACHE_TIMEOUT = config('MAILBOX_ROW_CACHE_TIMEOUT', default=3600, cast=int)
+
 # إعدادات الجلسات لتحسين الأداء
 SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'  # استخدام قاعدة البيانات مع cache
 SESSION_CACHE_ALIAS = 'default'
 SESSION_SAVE_EVERY_REQUEST = False  # لا تحفظ الجلسة في كل طلب
 
+# أقل فاصل بالثواني بين تسجيلين لنشاط نفس الجلسة في الـ cache (security.sessions)
+SESSION_ACTIVITY_RESOLUTION = config('SESSION_ACTIVITY_RESOLUTION', default=60, cast=int)
+
+# فهرس الحضور (accounts.presence): المستخدم متصل خلال هذه المدة بالثواني بعد آخر نبضة
+PRESENCE_ONLINE_WINDOW = config('PRESENCE_ONLINE_WINDOW', default=300, cast=int)
+
+# أقل فاصل بالثواني بين نبضتي حضور لنفس المستخدم من نفس العملية
+PRESENCE_HEARTBEAT_INTERVAL = config('PRESENCE_HEARTBEAT_INTERVAL', default=60, cast=int)
+
 # ضغط الاستجابات
 USE_GZIP = True
 
@@ -318,3 +335,95 @@ ADMIN_MEDIA_PREFIX = '/static/admin/'
 
 # إعدادات الصفحات (Pagination)
 PAGINATE_BY = 20  # عدد أقل من العناصر لتحسين الأداء
+
+# إعدادات Celery للمهام الخلفية
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default=REDIS_URL)
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'process-approval-deadlines': {
+        'task': 'workflows.tasks.process_approval_deadlines',
+        'schedule': 60.0,  # كل دقيقة
+    },
+    'process-message-retention': {
+        'task': 'messaging.tasks.process_message_retention',
+        'schedule': 300.0,  # كل 5 دقائق
+    },
+    'freeze-old-messages': {
+        'task': 'messaging.tasks.freeze_old_messages',
+        'schedule': 86400.0,  # يومياً
+    },
+    'seal-audit-log': {
+        'task': 'security.tasks.seal_audit_log',
+        'schedule': 60.0,  # كل دقيقة
+    },
+    'rotate-encryption-keys': {
+        'task': 'messaging.tasks.rotate_encryption_keys',
+        'schedule': 3600.0,  # كل ساعة
+    },
+    'process-user-sessions': {
+        'task': 'security.tasks.process_user_sessions',
+        'schedule': 60.0,  # كل دقيقة
+    },
+    'detect-anomalies': {
+        'task': 'security.tasks.detect_anomalies',
+        'schedule': 60.0,  # كل دقيقة (بعد ختم السجلات)
+    },
+}
+
+# إعدادات سير العمل
+WORKFLOW_ESCALATION_GRACE_HOURS = 24  # المهلة الجديدة للخطوة بعد تصعيدها
+
+# مرسل رسائل النظام (الإشعارات) - افتراضياً أول مدير نظام
+NOTIFICATION_SENDER_USERNAME = config('NOTIFICATION_SENDER_USERNAME', default='')
+
+# الحد الأعلى لعدد الرسائل في عملية جماعية واحدة (أرشفة، حذف، استعادة، نقل)
+MAILBOX_BULK_MAX_MESSAGES = config('MAILBOX_BULK_MAX_MESSAGES', default=500, cast=int)
+
+# الحد الأعلى لعدد التوقيعات في طلب تحقق جماعي واحد
+SIGNATURE_BATCH_VERIFY_MAX = config('SIGNATURE_BATCH_VERIFY_MAX', default=1000, cast=int)
+
+# مفاتيح توقيع HMAC بالصيغة key_id:secret مفصولة بفواصل (افتراضياً مفتاح مشتق من SECRET_KEY)
+# المفاتيح القديمة تبقى في القائمة للتحقق من التوقيعات السابقة بعد التدوير
+SIGNATURE_HMAC_KEYS = config('SIGNATURE_HMAC_KEYS', default='', cast=Csv())
+
+# معرف المفتاح المستخدم للتوقيعات الجديدة (افتراضياً أول مفتاح)
+SIGNATURE_HMAC_KEY_ID = config('SIGNATURE_HMAC_KEY_ID', default='')
+
+# مدة تخزين نتيجة التحقق من التوقيع بالثواني (0 لتعطيل التخزين)
+SIGNATURE_VERIFICATION_CACHE_TIMEOUT = config('SIGNATURE_VERIFICATION_CACHE_TIMEOUT', default=3600, cast=int)
+
+# المفاتيح الرئيسية لتشفير الرسائل والمرفقات بالصيغة key_id:fernet_key مفصولة بفواصل
+# (افتراضياً مفتاح مشتق من SECRET_KEY) - المفاتيح القديمة تبقى حتى تنهي rotate_encryption_keys إعادة التغليف
+MESSAGE_ENCRYPTION_KEYS = config('MESSAGE_ENCRYPTION_KEYS', default='', cast=Csv())
+
+# معرف المفتاح الرئيسي لمفاتيح البيانات الجديدة (افتراضياً أول مفتاح)
+MESSAGE_ENCRYPTION_KEY_ID = config('MESSAGE_ENCRYPTION_KEY_ID', default='')
+
+# عمر الرسالة بالأيام الذي تنقل بعده إلى الأرشيف البارد (messaging.cold_storage)
+MESSAGE_COLD_STORAGE_DAYS = config('MESSAGE_COLD_STORAGE_DAYS', default=365, cast=int)
+
+# مفتاح HMAC لسلسلة سجلات التدقيق (افتراضياً مشتق من SECRET_KEY) - security.audit_chain
+AUDIT_CHAIN_KEY = config('AUDIT_CHAIN_KEY', default='')
+
+# طول فترة نقطة التحقق لسجلات التدقيق بالثواني
+AUDIT_CHECKPOINT_INTERVAL = config('AUDIT_CHECKPOINT_INTERVAL', default=3600, cast=int)
+
+# أطول فاصل بالثواني بين حفظين لحالة كاشف الشذوذ عند تشغيله المستمر (security.anomaly)
+ANOMALY_CHECKPOINT_INTERVAL = config('ANOMALY_CHECKPOINT_INTERVAL', default=300, cast=int)
+
+# قياس أداء الطلبات (monitoring.middleware.ProfilingMiddleware)
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=True, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.1, cast=float)  # نسبة الطلبات المحفوظة
+PROFILING_PROFILE_RATE = config('PROFILING_PROFILE_RATE', default=0.01, cast=float)  # نسبة الطلبات تحت المحلل
+PROFILING_SLOW_MS = config('PROFILING_SLOW_MS', default=500, cast=int)  # الطلب البطيء يُحفظ دائماً
+PROFILING_BUFFER_SIZE = 200
+PROFILING_PROFILER = config('PROFILING_PROFILER', default='cprofile')  # cprofile أو pyinstrument
+PROFILING_LOG_SINK = config('PROFILING_LOG_SINK', default=False, cast=bool)
+PROFILING_EXCLUDE_PATHS = ('/static/', '/media/', '/monitoring/', '/metrics')
+
+# مقاييس Prometheus على /metrics
+# مجلد مشترك لتجميع قيم عمال gunicorn (بدونه تعرض كل عملية قيمها فقط)
+METRICS_MULTIPROC_DIR = config('METRICS_MULTIPROC_DIR', default='')
+METRICS_FLUSH_INTERVAL = 5  # ثوانٍ بين كتابات ملف كل عملية
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1', cast=Csv())
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
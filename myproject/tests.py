@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import Department, Position, User
+from messaging.models import MessageRecipient
+from messaging.notifications import send_bulk_notifications
+from workflows import engine
+from workflows.models import ApprovalWorkflow
+
+from .dashboard import DashboardSnapshot
+from .perf_fixtures import TEST_STORAGES, PerformanceTestCase
+
+
+class DashboardQueryBudgetTests(PerformanceTestCase):
+    """ميزانية الاستعلامات والزمن للوحة التحكم"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_dashboard(self):
+        self.assertQueryBudget(reverse('dashboard'), max_queries=7)
+
+    def test_dashboard_cached(self):
+        self.client.force_login(self.focus)
+        self.client.get(reverse('dashboard'))
+        self.assertQueryBudget(reverse('dashboard'), max_queries=2)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class DashboardSnapshotTests(TestCase):
+    """لقطة لوحة التحكم تُخزن لكل مستخدم وتُبطل عند الإرسال والقراءة والموافقات"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.user, cls.other = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'مستخدم {i}',
+                employee_id=f'100{i}', phone=f'10{i}', department=department, position=position,
+            )
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot_is_cached(self):
+        send_bulk_notifications([(self.user, 'موضوع', 'نص')], sender=self.other)
+        snapshot = DashboardSnapshot.get(self.user)
+        self.assertEqual(snapshot['stats']['unread_messages'], 1)
+        self.assertEqual(snapshot['recent_messages'][0]['sender']['arabic_name'], 'مستخدم 1')
+        with self.assertNumQueries(0):
+            DashboardSnapshot.get(self.user)
+
+    def test_send_and_read_invalidate(self):
+        self.assertEqual(DashboardSnapshot.get(self.user)['stats']['unread_messages'], 0)
+        send_bulk_notifications([(self.user, 'موضوع', 'نص')], sender=self.other)
+        self.assertEqual(DashboardSnapshot.get(self.user)['stats']['unread_messages'], 1)
+        self.assertEqual(DashboardSnapshot.get(self.other)['stats']['sent_messages'], 1)
+
+        recipient = MessageRecipient.objects.get(recipient=self.user)
+        recipient.mark_as_read()
+        stats = DashboardSnapshot.get(self.user)['stats']
+        self.assertEqual((stats['unread_messages'], stats['total_messages']), (0, 1))
+
+    def test_approval_events_invalidate(self):
+        workflow = ApprovalWorkflow.objects.create(workflow_type='DOCUMENT_APPROVAL', name='موافقة وثيقة')
+        self.assertEqual(DashboardSnapshot.get(self.other)['stats']['pending_approvals'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            approval_request = engine.submit_request(
+                workflow, self.user, 'طلب', 'وصف', 'document', 1, approvers=[self.other],
+            )
+        self.assertEqual(DashboardSnapshot.get(self.other)['stats']['pending_approvals'], 1)
+        self.assertEqual(DashboardSnapshot.get(self.user)['stats']['my_requests'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            engine.approve(approval_request, self.other)
+        self.assertEqual(DashboardSnapshot.get(self.other)['stats']['pending_approvals'], 0)
+        self.assertEqual(DashboardSnapshot.get(self.user)['stats']['my_requests'], 0)
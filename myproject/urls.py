@@ -6,6 +6,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from monitoring import views as monitoring_views
 from . import views
 
 urlpatterns = [
@@ -15,12 +16,14 @@ urlpatterns = [
     # Main views
     path('', views.home, name='home'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('metrics', monitoring_views.metrics, name='metrics'),
     
     # App URLs
     path('accounts/', include('accounts.urls')),
     path('messaging/', include('messaging.urls')),
     path('security/', include('security.urls')),
     path('workflows/', include('workflows.urls')),
+    path('monitoring/', include('monitoring.urls')),
 ]
 
 # Serve media files in development
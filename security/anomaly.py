@@ -0,0 +1,273 @@
+"""
+كاشف الشذوذ في سجلات التدقيق
+يستهلك الكاشف سجلات التدقيق تدريجياً بترتيب السلسلة (sequence) بدلاً من عدها في كل طلب أو تقرير،
+ويحتفظ في الذاكرة بنافذة منزلقة لكل (قاعدة، مستخدم أو عنوان IP). عندما يبلغ عدد أحداث النافذة حد القاعدة
+تُسجل نتيجة في SecurityIncident، والنتائج المتتالية لنفس المفتاح تُدمج في الحادث المفتوح.
+
+الرقم التسلسلي يُعين عند الختم (security.audit_chain) بعد التزام السجل وبترتيب تصاعدي، فتتبع السجلات به
+لا يتخطى سجلاً التزم متأخراً برقم id أصغر. آخر رقم معالج والنوافذ تُحفظ في AnomalyDetectorState
+دورياً ومع كل دفعة أنتجت حوادث (في نفس المعاملة)، فالاستئناف بعد توقف لا يكرر الحوادث.
+"""
+import logging
+import time
+from collections import deque, namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AnomalyDetectorState, AuditLog, SecurityIncident
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+STATE_NAME = 'default'
+
+# ساعات العمل (بالتوقيت المحلي): العمليات الحساسة خارجها تُعد شذوذاً
+WORK_HOURS_START = 6
+WORK_HOURS_END = 22
+
+Rule = namedtuple('Rule', ['name', 'title', 'subject', 'actions', 'window', 'threshold', 'severity', 'predicate'])
+
+
+def _off_hours(timestamp):
+    hour = timezone.localtime(timestamp).hour
+    return hour < WORK_HOURS_START or hour > WORK_HOURS_END
+
+
+# subject: ip لكل عنوان، user لكل مستخدم (أو عنوانه إذا لم يكن معروفاً)، user_action لكل مستخدم وعملية
+# window بالثواني، و threshold عدد الأحداث في النافذة الذي ينتج حادثاً
+RULES = (
+    Rule('FAILED_LOGIN_BURST', 'محاولات دخول متعددة فاشلة', 'ip',
+         frozenset({'FAILED_LOGIN'}), 900, 5, 'HIGH', None),
+    Rule('UNAUTHORIZED_ACCESS_BURST', 'محاولات وصول غير مصرح متكررة', 'user',
+         frozenset({'UNAUTHORIZED_ACCESS', 'SECURITY_VIOLATION'}), 900, 3, 'HIGH', None),
+    Rule('ACTION_BURST', 'تكرار غير معتاد لنفس العملية', 'user_action',
+         frozenset({'MESSAGE_SEND', 'MESSAGE_READ', 'MESSAGE_DELETE', 'FILE_UPLOAD', 'FILE_DOWNLOAD'}), 300, 11, 'MEDIUM', None),
+    Rule('OFF_HOURS_ACTIVITY', 'نشاط خارج ساعات العمل', 'user',
+         frozenset({'MESSAGE_SEND', 'FILE_UPLOAD'}), 3600, 1, 'LOW', _off_hours),
+)
+
+RULES_BY_NAME = {rule.name: rule for rule in RULES}
+
+WATCHED_ACTIONS = frozenset().union(*(rule.actions for rule in RULES))
+
+# أطول نافذة: النوافذ التي لم يصلها حدث خلالها تُحذف عند الحفظ
+MAX_WINDOW = max(rule.window for rule in RULES)
+
+Event = namedtuple('Event', ['sequence', 'action_type', 'user_id', 'user_ip', 'timestamp'])
+
+
+def get_checkpoint_interval():
+    """أطول فاصل بالثواني بين حفظين لحالة الكاشف عند التشغيل المستمر"""
+    return getattr(settings, 'ANOMALY_CHECKPOINT_INTERVAL', 300)
+
+
+def _subject(rule, event):
+    if rule.subject == 'ip' or event.user_id is None:
+        return f'ip:{event.user_ip}'
+    if rule.subject == 'user_action':
+        return f'user:{event.user_id}:{event.action_type}'
+    return f'user:{event.user_id}'
+
+
+def _from_epoch(value):
+    return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+
+
+class AnomalyDetector:
+    """
+    الكاشف المتدفق: نوافذ منزلقة في الذاكرة وحوادث معلقة تُكتب مع كل دفعة
+
+    Args:
+        last_sequence: آخر رقم تسلسلي معالج
+        state: {'windows': {مفتاح النافذة: [[الوقت، الرقم التسلسلي]، ...]}، 'reported': {مفتاح النافذة: آخر رقم أُبلغ عنه}}
+    """
+
+    def __init__(self, last_sequence=0, state=None):
+        self._restore(last_sequence, state)
+
+    def _restore(self, last_sequence, state):
+        state = state or {}
+        self.last_sequence = last_sequence
+        self.saved_sequence = last_sequence
+        self.saved_at = time.monotonic()
+        self.clock = 0.0
+        self.windows = {key: deque(tuple(entry) for entry in entries) for key, entries in state.get('windows', {}).items()}
+        # أحداث النافذة التي دخلت في حادث سابق لا تُحسب مرة أخرى
+        self.reported = dict(state.get('reported', {}))
+        for entries in self.windows.values():
+            if entries:
+                self.clock = max(self.clock, entries[-1][0])
+        self.pending = {}
+
+    @classmethod
+    def load(cls):
+        """استئناف الكاشف من نقطة الحفظ"""
+        state = AnomalyDetectorState.objects.filter(name=STATE_NAME).first()
+        if state is None:
+            return cls()
+        return cls(state.last_sequence, state.state)
+
+    def observe(self, event):
+        """
+        إضافة حدث إلى نوافذه وتسجيل النتائج المعلقة
+
+        Returns:
+            int: عدد القواعد التي بلغت حدها بهذا الحدث
+        """
+        moment = event.timestamp.timestamp()
+        self.clock = max(self.clock, moment)
+        self.last_sequence = max(self.last_sequence, event.sequence)
+        findings = 0
+        for rule in RULES:
+            if event.action_type not in rule.actions:
+                continue
+            if rule.predicate is not None and not rule.predicate(event.timestamp):
+                continue
+            key = f'{rule.name}:{_subject(rule, event)}'
+            window = self.windows.setdefault(key, deque())
+            window.append((moment, event.sequence))
+            while window[0][0] < moment - rule.window:
+                window.popleft()
+            if len(window) >= rule.threshold:
+                self._record(rule, key, event, window)
+                findings += 1
+        return findings
+
+    def _record(self, rule, key, event, window):
+        segments = self.pending.setdefault(key, [])
+        moment, sequence = window[-1]
+        reported = self.reported.get(key, 0)
+        fresh = [entry for entry in window if entry[1] > reported]
+        self.reported[key] = sequence
+        if segments and moment - segments[-1]['last_seen'] <= rule.window:
+            segment = segments[-1]
+            segment['events'] += len(fresh)
+        else:
+            # بداية نتيجة جديدة: أحداث النافذة التي بلغت الحد ولم يُبلغ عنها
+            segment = {
+                'rule': rule,
+                'events': len(fresh),
+                'first_seen': fresh[0][0],
+                'first_sequence': fresh[0][1],
+            }
+            segments.append(segment)
+        segment.update(last_seen=moment, last_sequence=sequence, user_id=event.user_id, ip_address=event.user_ip)
+
+    def flush_incidents(self):
+        """
+        كتابة النتائج المعلقة: دمجها في الحوادث المفتوحة القريبة أو إنشاء حوادث جديدة
+
+        Returns:
+            int: عدد الحوادث الجديدة
+        """
+        if not self.pending:
+            return 0
+        existing = {}
+        for incident in SecurityIncident.objects.filter(
+            dedup_key__in=list(self.pending), status__in=SecurityIncident.OPEN_STATUSES
+        ).order_by('last_seen'):
+            existing[incident.dedup_key] = incident
+        created, updated = [], {}
+        for key, segments in self.pending.items():
+            incident = existing.get(key)
+            for segment in segments:
+                rule = segment['rule']
+                first_seen = _from_epoch(segment['first_seen'])
+                if incident is not None and (first_seen - incident.last_seen).total_seconds() <= rule.window:
+                    incident.event_count += segment['events']
+                    incident.last_seen = _from_epoch(segment['last_seen'])
+                    incident.last_sequence = segment['last_sequence']
+                    if incident.pk:
+                        updated[incident.pk] = incident
+                    continue
+                incident = SecurityIncident(
+                    rule=rule.name,
+                    title=rule.title,
+                    description=f'{rule.title}: {segment["events"]} عملية خلال {rule.window // 60} دقيقة',
+                    severity=rule.severity,
+                    user_id=segment['user_id'] if rule.subject != 'ip' else None,
+                    ip_address=segment['ip_address'],
+                    dedup_key=key,
+                    event_count=segment['events'],
+                    first_seen=first_seen,
+                    last_seen=_from_epoch(segment['last_seen']),
+                    first_sequence=segment['first_sequence'],
+                    last_sequence=segment['last_sequence'],
+                )
+                created.append(incident)
+        SecurityIncident.objects.bulk_create(created)
+        SecurityIncident.objects.bulk_update(list(updated.values()), ['event_count', 'last_seen', 'last_sequence'])
+        self.pending = {}
+        return len(created)
+
+    def checkpoint(self):
+        """حفظ آخر رقم معالج والنوافذ (بعد حذف النوافذ المنتهية)"""
+        horizon = self.clock - MAX_WINDOW
+        self.windows = {key: window for key, window in self.windows.items() if window and window[-1][0] >= horizon}
+        self.reported = {key: sequence for key, sequence in self.reported.items() if key in self.windows}
+        AnomalyDetectorState.objects.update_or_create(
+            name=STATE_NAME,
+            defaults={
+                'last_sequence': self.last_sequence,
+                'state': {
+                    'windows': {key: [list(entry) for entry in window] for key, window in self.windows.items()},
+                    'reported': self.reported,
+                },
+            },
+        )
+        self.saved_sequence = self.last_sequence
+        self.saved_at = time.monotonic()
+
+    def process_batch(self, batch_size=DEFAULT_BATCH_SIZE, force_checkpoint=False):
+        """
+        معالجة دفعة من السجلات المختومة بعد آخر رقم معالج
+
+        Returns:
+            tuple: (عدد السجلات المعالجة، عدد الحوادث الجديدة)
+        """
+        with transaction.atomic():
+            state, _ = AnomalyDetectorState.objects.select_for_update().get_or_create(name=STATE_NAME)
+            if state.last_sequence != self.saved_sequence:
+                # عامل آخر تقدم في السجلات منذ آخر حفظ: الاستئناف من حالته
+                self._restore(state.last_sequence, state.state)
+            rows = AuditLog.objects.filter(
+                sequence__gt=self.last_sequence, action_type__in=WATCHED_ACTIONS
+            ).order_by('sequence').values_list('sequence', 'action_type', 'user_id', 'user_ip', 'timestamp')[:batch_size]
+            processed = 0
+            for row in rows:
+                self.observe(Event(*row))
+                processed += 1
+            created = self.flush_incidents() if self.pending else 0
+            due = time.monotonic() - self.saved_at >= get_checkpoint_interval()
+            if created or (self.last_sequence != self.saved_sequence and (force_checkpoint or due)):
+                self.checkpoint()
+        return processed, created
+
+
+def process_anomalies(detector=None, batch_size=DEFAULT_BATCH_SIZE, max_batches=20):
+    """
+    دورة واحدة للكاشف: دفعات متتالية حتى تنتهي السجلات المختومة أو يبلغ الحد الأقصى
+
+    Args:
+        detector: كاشف يبقى في الذاكرة بين الدورات (التشغيل المستمر)، وإلا يُستأنف من نقطة الحفظ ويُحفظ في النهاية
+
+    Returns:
+        dict: {'events': int, 'incidents': int}
+    """
+    persistent = detector is not None
+    detector = detector or AnomalyDetector.load()
+    stats = {'events': 0, 'incidents': 0}
+    for _ in range(max_batches):
+        processed, created = detector.process_batch(batch_size, force_checkpoint=not persistent)
+        stats['events'] += processed
+        stats['incidents'] += created
+        if processed < batch_size:
+            break
+    if any(stats.values()):
+        logger.info('كاشف الشذوذ: معالجة %(events)d سجل وإنشاء %(incidents)d حادث أمني', stats)
+    return stats
+
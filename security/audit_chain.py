@@ -0,0 +1,343 @@
+"""
+سلسلة التدقيق المقاومة للعبث
+كل سجل تدقيق يُختم في الخلفية برقم تسلسلي و entry_hash = HMAC(المفتاح، entry_hash السابق + محتوى السجل)،
+فتعديل سجل أو حذفه يكسر السلسلة ولا يمكن إعادة حسابها دون المفتاح (AUDIT_CHAIN_KEY).
+كل فترة زمنية مغلقة (AUDIT_CHECKPOINT_INTERVAL) تُلخص في نقطة تحقق AuditCheckpoint تحمل جذر Merkle
+لسجلاتها وترتبط بالنقطة السابقة، وحذف السجلات القديمة يتم بفترات كاملة مع إبقاء نقاطها.
+
+التحقق من نطاق (verify_audit_range) يقرأ نقاط التحقق المتداخلة معه فقط بالفهرس ثم سجلات النطاق نفسه،
+دون إعادة فحص الجدول كاملاً.
+"""
+import hashlib
+import hmac
+import json
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import AuditCheckpoint, AuditLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+# entry_hash السابق لأول سجل في السلسلة
+GENESIS_HASH = '0' * 64
+
+
+def _get_key():
+    key = getattr(settings, 'AUDIT_CHAIN_KEY', '')
+    if key:
+        return key.encode()
+    return hashlib.sha256(f'security.audit_chain:{settings.SECRET_KEY}'.encode()).digest()
+
+
+def _hmac(data):
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+    return hmac.new(_get_key(), payload, hashlib.sha256).hexdigest()
+
+
+def get_checkpoint_interval():
+    """طول الفترة الزمنية لكل نقطة تحقق"""
+    return timedelta(seconds=getattr(settings, 'AUDIT_CHECKPOINT_INTERVAL', 3600))
+
+
+def compute_entry_hash(entry, previous_hash):
+    """
+    حساب entry_hash لسجل تدقيق
+
+    Args:
+        entry: سجل AuditLog (بعد تعيين sequence)
+        previous_hash: entry_hash للسجل السابق في السلسلة
+
+    Returns:
+        str: HMAC-SHA256 بصيغة hex
+    """
+    return _hmac({
+        'previous': previous_hash,
+        'sequence': entry.sequence,
+        'operation_id': str(entry.operation_id),
+        'action_type': entry.action_type,
+        'description': entry.description,
+        'user_id': entry.user_id,
+        'user_ip': entry.user_ip,
+        'timestamp': entry.timestamp.isoformat(),
+        'is_successful': entry.is_successful,
+    })
+
+
+def compute_checkpoint_hash(checkpoint):
+    return _hmac({
+        'bucket_start': checkpoint.bucket_start.isoformat(),
+        'bucket_end': checkpoint.bucket_end.isoformat(),
+        'first_sequence': checkpoint.first_sequence,
+        'last_sequence': checkpoint.last_sequence,
+        'entry_count': checkpoint.entry_count,
+        'merkle_root': checkpoint.merkle_root,
+        'last_entry_hash': checkpoint.last_entry_hash,
+        'previous_hash': checkpoint.previous_hash,
+    })
+
+
+def merkle_root(hashes):
+    """
+    جذر Merkle (SHA-256) لقائمة entry_hash مرتبة بالتسلسل
+    العقدة الفردية في آخر المستوى تنتقل كما هي إلى المستوى التالي.
+    """
+    level = [bytes.fromhex(value) for value in hashes]
+    if not level:
+        return hashlib.sha256(b'').hexdigest()
+    while len(level) > 1:
+        level = [
+            hashlib.sha256(level[i] + level[i + 1]).digest() if i + 1 < len(level) else level[i]
+            for i in range(0, len(level), 2)
+        ]
+    return level[0].hex()
+
+
+def seal_pending_entries(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    ختم دفعة من سجلات التدقيق الجديدة بترتيب إنشائها
+
+    رأس السلسلة يُقفل (select_for_update) فلا يختم عاملان نفس الموضع، والقيد الفريد على sequence
+    يمنع تفرع السلسلة إذا بدأ عاملان من سلسلة فارغة.
+
+    Returns:
+        int: عدد السجلات المختومة
+    """
+    with transaction.atomic():
+        head = AuditLog.objects.select_for_update().filter(
+            sequence__isnull=False
+        ).order_by('-sequence').values_list('sequence', 'entry_hash').first()
+        sequence, previous_hash = head or (0, GENESIS_HASH)
+
+        pending = list(AuditLog.objects.filter(sequence__isnull=True).order_by('pk')[:batch_size])
+        for entry in pending:
+            sequence += 1
+            entry.sequence = sequence
+            entry.entry_hash = compute_entry_hash(entry, previous_hash)
+            previous_hash = entry.entry_hash
+        AuditLog.objects.bulk_update(pending, ['sequence', 'entry_hash'], batch_size=batch_size)
+    return len(pending)
+
+
+def _bucket_floor(moment, interval):
+    seconds = int(interval.total_seconds())
+    epoch = int(moment.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=dt_timezone.utc)
+
+
+def create_checkpoints(now=None, max_checkpoints=100):
+    """
+    إنشاء نقاط التحقق للفترات الزمنية المغلقة
+
+    كل نقطة تغطي التسلسلات التالية للنقطة السابقة حتى آخر سجل مختوم قبل نهاية فترتها،
+    فالسجلات المتأخرة الختم تدخل في النقطة التالية ولا تبقى خارج أي نقطة.
+
+    Returns:
+        int: عدد النقاط المنشأة
+    """
+    now = now or timezone.now()
+    interval = get_checkpoint_interval()
+    created = 0
+    for _ in range(max_checkpoints):
+        last = AuditCheckpoint.objects.order_by('-last_sequence').first()
+        after = last.last_sequence if last else 0
+        first_entry = AuditLog.objects.filter(sequence__gt=after).order_by('sequence').values('timestamp').first()
+        if first_entry is None:
+            break
+        bucket_start = _bucket_floor(first_entry['timestamp'], interval)
+        if last and bucket_start < last.bucket_end:
+            bucket_start = last.bucket_end
+        bucket_end = bucket_start + interval
+        if bucket_end > now:
+            break  # الفترة لم تغلق بعد
+
+        last_sequence = AuditLog.objects.filter(
+            sequence__gt=after, timestamp__lt=bucket_end
+        ).aggregate(last=Max('sequence'))['last']
+        hashes = list(
+            AuditLog.objects.filter(sequence__gt=after, sequence__lte=last_sequence).order_by(
+                'sequence'
+            ).values_list('entry_hash', flat=True)
+        )
+        checkpoint = AuditCheckpoint(
+            bucket_start=bucket_start,
+            bucket_end=bucket_end,
+            first_sequence=after + 1,
+            last_sequence=last_sequence,
+            entry_count=len(hashes),
+            merkle_root=merkle_root(hashes),
+            last_entry_hash=hashes[-1],
+            previous_hash=last.checkpoint_hash if last else '',
+        )
+        checkpoint.checkpoint_hash = compute_checkpoint_hash(checkpoint)
+        checkpoint.save()
+        created += 1
+    return created
+
+
+def process_audit_chain(now=None, batch_size=DEFAULT_BATCH_SIZE, max_batches=20):
+    """
+    دورة واحدة لسلسلة التدقيق: ختم السجلات الجديدة ثم إنشاء نقاط التحقق للفترات المغلقة
+
+    Returns:
+        dict: {'sealed': int, 'checkpoints': int}
+    """
+    sealed = 0
+    for _ in range(max_batches):
+        processed = seal_pending_entries(batch_size=batch_size)
+        sealed += processed
+        if processed < batch_size:
+            break
+    checkpoints = create_checkpoints(now=now)
+    if sealed or checkpoints:
+        logger.info('سلسلة التدقيق: ختم %d سجل وإنشاء %d نقطة تحقق', sealed, checkpoints)
+    return {'sealed': sealed, 'checkpoints': checkpoints}
+
+
+def prune_audit_log(before):
+    """
+    حذف سجلات التدقيق القديمة بفترات كاملة (بدلاً من الحذف بالتاريخ الذي يكسر السلسلة)
+    نقاط التحقق تبقى، والسجلات غير المختومة أو خارج أي نقطة لا تُحذف.
+
+    Args:
+        before: تُحذف سجلات الفترات المنتهية قبل هذا الوقت
+
+    Returns:
+        int: عدد السجلات المحذوفة
+    """
+    deleted = 0
+    checkpoints = AuditCheckpoint.objects.filter(bucket_end__lte=before, pruned=False).order_by('first_sequence')
+    for checkpoint in checkpoints:
+        with transaction.atomic():
+            count, _ = AuditLog.objects.filter(
+                sequence__gte=checkpoint.first_sequence, sequence__lte=checkpoint.last_sequence
+            ).delete()
+            AuditCheckpoint.objects.filter(pk=checkpoint.pk).update(pruned=True)
+        deleted += count
+    return deleted
+
+
+def sequence_range_for_period(date_from=None, date_to=None):
+    """
+    نطاق التسلسلات المختومة لسجلات فترة زمنية
+
+    Returns:
+        tuple: (أول تسلسل، آخر تسلسل) أو (None, None) إذا لم توجد سجلات
+    """
+    entries = AuditLog.objects.filter(sequence__isnull=False)
+    if date_from:
+        entries = entries.filter(timestamp__gte=date_from)
+    if date_to:
+        entries = entries.filter(timestamp__lt=date_to)
+    first = entries.order_by('sequence').values_list('sequence', flat=True).first()
+    last = entries.order_by('-sequence').values_list('sequence', flat=True).first()
+    return first, last
+
+
+def verify_audit_range(first_sequence=None, last_sequence=None):
+    """
+    التحقق من سلامة نطاق من سلسلة التدقيق
+
+    يتحقق من توقيع نقاط التحقق المتداخلة مع النطاق وارتباطها ببعضها، ثم يعيد حساب سلسلة سجلات
+    النطاق من entry_hash للسجل السابق له، ويقارن جذر Merkle لكل نقطة باستخدام القيم المحسوبة داخل
+    النطاق والمخزنة خارجه. الفترات المحذوفة بسياسة الاحتفاظ تُستثنى من بداية النطاق.
+
+    Args:
+        first_sequence: أول تسلسل (افتراضياً بداية السلسلة)
+        last_sequence: آخر تسلسل (افتراضياً آخر سجل مختوم)
+
+    Returns:
+        dict: {'is_valid', 'first_sequence', 'last_sequence', 'entries', 'checkpoints', 'errors'}
+    """
+    errors = []
+    pruned_until = AuditCheckpoint.objects.filter(pruned=True).aggregate(last=Max('last_sequence'))['last'] or 0
+    first_sequence = max(first_sequence or 1, pruned_until + 1)
+    if last_sequence is None:
+        last_sequence = AuditLog.objects.aggregate(last=Max('sequence'))['last'] or 0
+    result = {
+        'is_valid': True, 'first_sequence': first_sequence, 'last_sequence': last_sequence,
+        'entries': 0, 'checkpoints': 0, 'errors': errors,
+    }
+    if first_sequence > last_sequence:
+        return result
+
+    # نقاط التحقق المتداخلة مع النطاق والنقطة السابقة لها (للربط وبداية السلسلة)
+    checkpoints = list(
+        AuditCheckpoint.objects.filter(
+            last_sequence__gte=first_sequence, first_sequence__lte=last_sequence
+        ).order_by('first_sequence')
+    )
+    previous_checkpoint = AuditCheckpoint.objects.filter(
+        last_sequence__lt=first_sequence
+    ).order_by('-last_sequence').first()
+
+    chain = previous_checkpoint
+    for checkpoint in checkpoints:
+        if checkpoint.checkpoint_hash != compute_checkpoint_hash(checkpoint):
+            errors.append(f'نقطة التحقق {checkpoint.first_sequence}-{checkpoint.last_sequence}: توقيع غير مطابق')
+        expected_first = chain.last_sequence + 1 if chain else 1
+        expected_previous = chain.checkpoint_hash if chain else ''
+        if checkpoint.first_sequence != expected_first or checkpoint.previous_hash != expected_previous:
+            errors.append(f'نقطة التحقق {checkpoint.first_sequence}-{checkpoint.last_sequence}: انقطاع في سلسلة النقاط')
+        chain = checkpoint
+    result['checkpoints'] = len(checkpoints)
+
+    # بداية سلسلة السجلات
+    if first_sequence == 1:
+        previous_hash = GENESIS_HASH
+    else:
+        previous_hash = AuditLog.objects.filter(sequence=first_sequence - 1).values_list('entry_hash', flat=True).first()
+        if previous_hash is None and previous_checkpoint and previous_checkpoint.last_sequence == first_sequence - 1:
+            previous_hash = previous_checkpoint.last_entry_hash
+        if previous_hash is None:
+            errors.append(f'السجل {first_sequence - 1} السابق للنطاق غير موجود')
+
+    computed = {}
+    expected = first_sequence
+    entries = AuditLog.objects.filter(
+        sequence__gte=first_sequence, sequence__lte=last_sequence
+    ).order_by('sequence').iterator(chunk_size=DEFAULT_BATCH_SIZE)
+    for entry in entries:
+        if entry.sequence != expected:
+            errors.append(f'السجلات {expected}-{entry.sequence - 1} محذوفة')
+            previous_hash = None
+        entry_hash = compute_entry_hash(entry, previous_hash) if previous_hash is not None else None
+        if entry_hash != entry.entry_hash:
+            if entry_hash is not None:
+                errors.append(f'السجل {entry.sequence}: محتوى غير مطابق للسلسلة')
+            # المتابعة بالقيمة المخزنة حتى لا يُبلغ عن كل ما بعد السجل المعدل
+            entry_hash = entry.entry_hash
+        computed[entry.sequence] = entry_hash
+        previous_hash = entry_hash
+        expected = entry.sequence + 1
+        result['entries'] += 1
+    if expected <= last_sequence:
+        errors.append(f'السجلات {expected}-{last_sequence} محذوفة')
+
+    for checkpoint in checkpoints:
+        hashes = {}
+        if checkpoint.first_sequence < first_sequence or checkpoint.last_sequence > last_sequence:
+            # القيم المخزنة للسجلات خارج النطاق في الفترات التي يقطعها النطاق
+            hashes.update(
+                AuditLog.objects.filter(
+                    sequence__gte=checkpoint.first_sequence, sequence__lte=checkpoint.last_sequence
+                ).exclude(
+                    sequence__gte=first_sequence, sequence__lte=last_sequence
+                ).values_list('sequence', 'entry_hash')
+            )
+        hashes.update(
+            (sequence, value) for sequence, value in computed.items()
+            if checkpoint.first_sequence <= sequence <= checkpoint.last_sequence
+        )
+        leaves = [hashes[sequence] for sequence in sorted(hashes)]
+        if len(leaves) != checkpoint.entry_count or merkle_root(leaves) != checkpoint.merkle_root:
+            errors.append(f'نقطة التحقق {checkpoint.first_sequence}-{checkpoint.last_sequence}: جذر Merkle غير مطابق')
+
+    result['is_valid'] = not errors
+    return result
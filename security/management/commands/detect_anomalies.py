@@ -0,0 +1,51 @@
+"""
+أمر Django لتشغيل كاشف الشذوذ على سجلات التدقيق المختومة وتسجيل الحوادث الأمنية
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from security.anomaly import DEFAULT_BATCH_SIZE, AnomalyDetector, process_anomalies
+
+
+class Command(BaseCommand):
+    help = 'تشغيل كاشف الشذوذ على سجلات التدقيق المختومة الجديدة وتسجيل النتائج في الحوادث الأمنية'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='التشغيل المستمر بدلاً من دورة واحدة'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='الفاصل بين الدورات بالثواني عند التشغيل المستمر (افتراضي: 60)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'عدد السجلات في كل دفعة (افتراضي: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=20,
+            help='الحد الأقصى للدفعات في كل دورة (افتراضي: 20)'
+        )
+
+    def handle(self, *args, **options):
+        # عند التشغيل المستمر تبقى النوافذ في الذاكرة بين الدورات وتُحفظ دورياً
+        detector = AnomalyDetector.load() if options['loop'] else None
+        while True:
+            stats = process_anomalies(
+                detector=detector,
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+            )
+            self.stdout.write(f'تمت معالجة {stats["events"]} سجل وإنشاء {stats["incidents"]} حادث أمني')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,48 @@
+"""
+أمر Django لنقل نشاط الجلسات من الـ cache إلى UserSession وتعطيل الجلسات المنتهية
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from security.sessions import DEFAULT_BATCH_SIZE, process_sessions
+
+
+class Command(BaseCommand):
+    help = 'نقل نشاط الجلسات المسجل في الـ cache إلى قاعدة البيانات وتعطيل الجلسات المنتهية دفعات'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='التشغيل المستمر بدلاً من دورة واحدة'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='الفاصل بين الدورات بالثواني عند التشغيل المستمر (افتراضي: 60)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'عدد السجلات في كل دفعة (افتراضي: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=20,
+            help='الحد الأقصى للدفعات في كل دورة (افتراضي: 20)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = process_sessions(
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+            )
+            self.stdout.write(f'تم نقل {stats["flushed"]} نشاط وتعطيل {stats["expired"]} جلسة منتهية')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
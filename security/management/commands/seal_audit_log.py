@@ -0,0 +1,48 @@
+"""
+أمر Django لختم سجلات التدقيق الجديدة في السلسلة وإنشاء نقاط التحقق
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from security.audit_chain import DEFAULT_BATCH_SIZE, process_audit_chain
+
+
+class Command(BaseCommand):
+    help = 'ختم سجلات التدقيق الجديدة في سلسلة التدقيق وإنشاء نقاط التحقق للفترات المغلقة'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='التشغيل المستمر بدلاً من دورة واحدة'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='الفاصل بين الدورات بالثواني عند التشغيل المستمر (افتراضي: 60)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'عدد السجلات في كل دفعة (افتراضي: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=20,
+            help='الحد الأقصى للدفعات في كل دورة (افتراضي: 20)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = process_audit_chain(
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+            )
+            self.stdout.write(f'تم ختم {stats["sealed"]} سجل وإنشاء {stats["checkpoints"]} نقطة تحقق')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
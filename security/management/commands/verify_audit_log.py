@@ -0,0 +1,50 @@
+"""
+أمر Django للتحقق من سلامة سلسلة التدقيق لنطاق من التسلسلات أو لفترة زمنية
+"""
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from security.audit_chain import sequence_range_for_period, verify_audit_range
+from security.models import AuditLog
+
+
+class Command(BaseCommand):
+    help = 'التحقق من سلامة سجلات التدقيق (سلسلة HMAC ونقاط التحقق) لنطاق أو فترة'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-sequence', type=int, help='أول تسلسل في النطاق')
+        parser.add_argument('--to-sequence', type=int, help='آخر تسلسل في النطاق')
+        parser.add_argument('--from', dest='date_from', help='أول يوم في الفترة (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='آخر يوم في الفترة (YYYY-MM-DD)')
+
+    def _parse_day(self, value):
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'تاريخ غير صالح: {value}')
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    def handle(self, *args, **options):
+        first, last = options['from_sequence'], options['to_sequence']
+        if options['date_from'] or options['date_to']:
+            date_from = self._parse_day(options['date_from']) if options['date_from'] else None
+            date_to = self._parse_day(options['date_to']) + timedelta(days=1) if options['date_to'] else None
+            first, last = sequence_range_for_period(date_from, date_to)
+            if first is None:
+                self.stdout.write('لا توجد سجلات مختومة في الفترة')
+                return
+
+        result = verify_audit_range(first, last)
+        pending = AuditLog.objects.filter(sequence__isnull=True).count()
+        self.stdout.write(
+            f'النطاق {result["first_sequence"]}-{result["last_sequence"]}: '
+            f'{result["entries"]} سجل و {result["checkpoints"]} نقطة تحقق، '
+            f'{pending} سجل بانتظار الختم'
+        )
+        for error in result['errors']:
+            self.stderr.write(error)
+        if not result['is_valid']:
+            raise CommandError(f'سلسلة التدقيق غير سليمة ({len(result["errors"])} خطأ)')
+        self.stdout.write('سلسلة التدقيق سليمة')
@@ -0,0 +1,21 @@
+"""
+Middleware تتبع نشاط الجلسات
+يسجل نشاط الجلسة في الـ cache (security.sessions.touch_session) دون أي استعلام لقاعدة البيانات،
+والنشاط يُنقل إلى UserSession دفعات بمهمة process_sessions.
+"""
+from django.contrib.auth import SESSION_KEY
+
+from .sessions import touch_session
+
+
+class SessionActivityMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        session = getattr(request, 'session', None)
+        # التحقق من الجلسة نفسها بدلاً من request.user حتى لا يُحمّل المستخدم في طلبات لم تحتجه
+        if session is not None and session.session_key and session.get(SESSION_KEY):
+            touch_session(request)
+        return response
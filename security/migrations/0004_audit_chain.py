@@ -0,0 +1,49 @@
+# Generated by Django 5.0.2 on 2026-10-19 17:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('security', '0003_alter_auditlog_action_type_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField(unique=True)),
+                ('bucket_end', models.DateTimeField()),
+                ('first_sequence', models.PositiveBigIntegerField(unique=True)),
+                ('last_sequence', models.PositiveBigIntegerField(unique=True)),
+                ('entry_count', models.PositiveIntegerField()),
+                ('merkle_root', models.CharField(max_length=64)),
+                ('last_entry_hash', models.CharField(max_length=64)),
+                ('previous_hash', models.CharField(blank=True, max_length=64)),
+                ('checkpoint_hash', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('pruned', models.BooleanField(default=False)),
+            ],
+            options={
+                'ordering': ['first_sequence'],
+            },
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='entry_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='sequence',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(condition=models.Q(('sequence__isnull', True)), fields=['id'], name='audit_pending_seal_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.2 on 2026-10-19 17:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('security', '0004_audit_chain'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersession',
+            name='forced_logout',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='usersession',
+            name='logout_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='usersession',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='usersession',
+            name='login_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.0.2 on 2026-10-19 17:41
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('security', '0005_session_tracking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalyDetectorState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_sequence', models.PositiveBigIntegerField(default=0)),
+                ('state', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SecurityIncident',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('incident_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('rule', models.CharField(blank=True, max_length=50)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('severity', models.CharField(choices=[('LOW', 'منخفضة'), ('MEDIUM', 'متوسطة'), ('HIGH', 'عالية'), ('CRITICAL', 'حرجة')], default='MEDIUM', max_length=10)),
+                ('status', models.CharField(choices=[('OPEN', 'مفتوح'), ('INVESTIGATING', 'قيد التحقيق'), ('RESOLVED', 'تم الحل'), ('FALSE_POSITIVE', 'إنذار كاذب')], default='OPEN', max_length=20)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('dedup_key', models.CharField(blank=True, max_length=200)),
+                ('event_count', models.PositiveIntegerField(default=0)),
+                ('first_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('first_sequence', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('last_sequence', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('reported_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reported_incidents', to=settings.AUTH_USER_MODEL)),
+                ('resolved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resolved_incidents', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='security_incidents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_seen'],
+                'indexes': [models.Index(fields=['status', '-last_seen'], name='security_se_status_a6d0da_idx'), models.Index(fields=['rule', '-last_seen'], name='security_se_rule_578acb_idx'), models.Index(fields=['dedup_key', '-last_seen'], name='security_se_dedup_k_ac9cfa_idx'), models.Index(fields=['user', '-last_seen'], name='security_se_user_id_32c61a_idx')],
+            },
+        ),
+    ]
@@ -29,6 +29,10 @@ class AuditLog(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     is_successful = models.BooleanField(default=True)
     
+    # سلسلة التدقيق (security.audit_chain): تُعين عند الختم في الخلفية
+    sequence = models.PositiveBigIntegerField(null=True, blank=True, unique=True, editable=False)
+    entry_hash = models.CharField(max_length=64, blank=True, editable=False)  # HMAC-SHA256 مع السجل السابق
+    
     class Meta:
         ordering = ['-timestamp']
         indexes = [
@@ -37,20 +41,48 @@ class AuditLog(models.Model):
             models.Index(fields=['user_ip', '-timestamp']),
             models.Index(fields=['is_successful', '-timestamp']),
             models.Index(fields=['-timestamp']),  # للترتيب العام
+            models.Index(fields=['id'], condition=models.Q(sequence__isnull=True), name='audit_pending_seal_idx'),
         ]
     
     def __str__(self):
         return f"{self.get_action_type_display()} - {self.user}"
 
+class AuditCheckpoint(models.Model):
+    """
+    نقطة تحقق لسلسلة التدقيق: جذر Merkle لسجلات فترة زمنية واحدة
+    كل نقطة مرتبطة بالسابقة (previous_hash) وموقعة بمفتاح السلسلة (checkpoint_hash)
+    """
+    bucket_start = models.DateTimeField(unique=True)
+    bucket_end = models.DateTimeField()
+    first_sequence = models.PositiveBigIntegerField(unique=True)
+    last_sequence = models.PositiveBigIntegerField(unique=True)
+    entry_count = models.PositiveIntegerField()
+    merkle_root = models.CharField(max_length=64)
+    last_entry_hash = models.CharField(max_length=64)
+    previous_hash = models.CharField(max_length=64, blank=True)
+    checkpoint_hash = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    pruned = models.BooleanField(default=False)  # حُذفت سجلاتها بسياسة الاحتفاظ وبقيت النقطة
+    
+    class Meta:
+        ordering = ['first_sequence']
+    
+    def __str__(self):
+        return f"{self.bucket_start:%Y-%m-%d %H:%M} ({self.first_sequence}-{self.last_sequence})"
+
+
 class UserSession(models.Model):
     """جلسات المستخدمين النشطة"""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     session_key = models.CharField(max_length=40, unique=True)
-    login_time = models.DateTimeField(auto_now_add=True)
-    last_activity = models.DateTimeField(auto_now=True)
+    # الأوقات تُنقل من الـ cache دفعات (security.sessions) فلا تُحسب عند الحفظ
+    login_time = models.DateTimeField(default=timezone.now)
+    last_activity = models.DateTimeField(default=timezone.now)
+    logout_time = models.DateTimeField(null=True, blank=True)
     ip_address = models.GenericIPAddressField()
     user_agent = models.TextField()
     is_active = models.BooleanField(default=True)
+    forced_logout = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['-login_time']
@@ -85,3 +117,82 @@ class LoginAttempt(models.Model):
     def __str__(self):
         status = "نجح" if self.is_successful else "فشل"
         return f"{self.username} - {status}"
+
+
+class SecurityIncident(models.Model):
+    """
+    حادث أمني: نتيجة من كاشف الشذوذ (security.anomaly) أو حادث يضيفه مسؤول الأمن يدوياً
+    نتائج نفس القاعدة لنفس المستخدم أو العنوان تُدمج في الحادث المفتوح ما دامت متقاربة (dedup_key).
+    """
+    SEVERITY_CHOICES = [
+        ('LOW', 'منخفضة'),
+        ('MEDIUM', 'متوسطة'),
+        ('HIGH', 'عالية'),
+        ('CRITICAL', 'حرجة'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('OPEN', 'مفتوح'),
+        ('INVESTIGATING', 'قيد التحقيق'),
+        ('RESOLVED', 'تم الحل'),
+        ('FALSE_POSITIVE', 'إنذار كاذب'),
+    ]
+    
+    OPEN_STATUSES = ('OPEN', 'INVESTIGATING')
+    
+    incident_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    rule = models.CharField(max_length=50, blank=True)  # فارغ للحوادث اليدوية
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES, default='MEDIUM')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='OPEN')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='security_incidents'
+    )
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    dedup_key = models.CharField(max_length=200, blank=True)
+    event_count = models.PositiveIntegerField(default=0)
+    first_seen = models.DateTimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now)
+    # نطاق سجلات التدقيق المرتبطة (أرقام السلسلة)
+    first_sequence = models.PositiveBigIntegerField(null=True, blank=True)
+    last_sequence = models.PositiveBigIntegerField(null=True, blank=True)
+    notes = models.TextField(blank=True)
+    reported_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='reported_incidents'
+    )
+    resolved_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='resolved_incidents'
+    )
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-last_seen']
+        indexes = [
+            models.Index(fields=['status', '-last_seen']),
+            models.Index(fields=['rule', '-last_seen']),
+            models.Index(fields=['dedup_key', '-last_seen']),
+            models.Index(fields=['user', '-last_seen']),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} ({self.get_severity_display()})"
+    
+    @property
+    def is_open(self):
+        return self.status in self.OPEN_STATUSES
+
+
+class AnomalyDetectorState(models.Model):
+    """
+    نقطة حفظ كاشف الشذوذ: آخر رقم تسلسلي معالج ونوافذ الإحصاءات المنزلقة وآخر حدث أُبلغ عنه لكل نافذة
+    يُستأنف منها الكاشف بعد إعادة التشغيل أو في كل تشغيل لمهمة celery.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_sequence = models.PositiveBigIntegerField(default=0)
+    state = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.last_sequence})"
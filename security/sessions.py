@@ -0,0 +1,220 @@
+"""
+تتبع جلسات المستخدمين دون كتابة في قاعدة البيانات مع كل دخول أو طلب
+- الدخول والخروج والنشاط (مرة كل SESSION_ACTIVITY_RESOLUTION ثانية على الأكثر لكل جلسة) تُسجل في الـ cache،
+  ومفتاح الجلسة يُضاف إلى قائمة انتظار (عداد وخانات مرقمة مثل حلقة سجلات القياس).
+- flush_session_activity تنقل القائمة إلى UserSession دفعات (bulk_create للجلسات الجديدة و bulk_update للبقية).
+- sweep_expired_sessions تعطل دفعات من الجلسات التي انتهت أو حُذفت جلسة Django الخاصة بها.
+- terminate_session تحذف جلسة Django من الـ cache وقاعدة البيانات (cached_db) فيخرج المستخدم فعلاً.
+"""
+import logging
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UserSession
+from .utils import SecurityUtils
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_KEY = 'security:session-activity:{session_key}'
+QUEUE_COUNTER_KEY = 'security:session-activity:counter'
+QUEUE_CURSOR_KEY = 'security:session-activity:cursor'
+QUEUE_SLOT_KEY = 'security:session-activity:slot:{slot}'
+
+# مدة بقاء نشاط الجلسة وخانات الانتظار في الـ cache (يوم، أطول بكثير من فاصل النقل)
+ACTIVITY_TIMEOUT = 86400
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def get_activity_resolution():
+    """أقل فاصل بالثواني بين تسجيلين لنشاط نفس الجلسة"""
+    return getattr(settings, 'SESSION_ACTIVITY_RESOLUTION', 60)
+
+
+def _session_store():
+    return import_module(settings.SESSION_ENGINE).SessionStore
+
+
+def _enqueue(session_key):
+    try:
+        slot = cache.incr(QUEUE_COUNTER_KEY)
+    except ValueError:
+        cache.add(QUEUE_COUNTER_KEY, 0, None)
+        slot = cache.incr(QUEUE_COUNTER_KEY)
+    cache.set(QUEUE_SLOT_KEY.format(slot=slot), session_key, ACTIVITY_TIMEOUT)
+
+
+def _new_activity(request, user):
+    return {
+        'user_id': user.pk,
+        'ip_address': SecurityUtils.get_client_ip(request) or '0.0.0.0',
+        'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+        'login_time': None,
+        'logout_time': None,
+    }
+
+
+def _store_activity(session_key, activity):
+    cache.set(ACTIVITY_KEY.format(session_key=session_key), activity, ACTIVITY_TIMEOUT)
+    _enqueue(session_key)
+
+
+def record_login(request, user, now=None):
+    """
+    تسجيل بداية جلسة بعد login (سجل UserSession يُنشأ عند النقل التالي)
+
+    Args:
+        request: الطلب بعد login (مفتاح الجلسة الجديد)
+        user: المستخدم
+    """
+    if not request.session.session_key:
+        request.session.save()
+    now = now or timezone.now()
+    activity = _new_activity(request, user)
+    activity['login_time'] = activity['last_activity'] = now
+    _store_activity(request.session.session_key, activity)
+
+
+def touch_session(request, now=None):
+    """
+    تسجيل نشاط الجلسة الحالية (قراءة واحدة من الـ cache لكل طلب، وكتابة مرة كل فاصل على الأكثر)
+
+    Returns:
+        bool: هل سُجل النشاط
+    """
+    session_key = request.session.session_key
+    if not session_key:
+        return False
+    now = now or timezone.now()
+    activity = cache.get(ACTIVITY_KEY.format(session_key=session_key))
+    if activity is not None and (now - activity['last_activity']).total_seconds() < get_activity_resolution():
+        return False
+    if activity is None:
+        # جلسة بدأت قبل تفعيل التتبع أو انتهت مدة نشاطها في الـ cache
+        activity = _new_activity(request, request.user)
+    activity['last_activity'] = now
+    _store_activity(session_key, activity)
+    return True
+
+
+def record_logout(request, now=None):
+    """تسجيل نهاية الجلسة الحالية (قبل logout لأنه يحذف الجلسة ومفتاحها)"""
+    session_key = request.session.session_key
+    if not session_key:
+        return
+    now = now or timezone.now()
+    activity = cache.get(ACTIVITY_KEY.format(session_key=session_key)) or _new_activity(request, request.user)
+    activity['last_activity'] = activity['logout_time'] = now
+    _store_activity(session_key, activity)
+
+
+def flush_session_activity(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    نقل دفعة من قائمة انتظار النشاط إلى UserSession
+
+    Returns:
+        int: عدد خانات القائمة المعالجة
+    """
+    last = cache.get(QUEUE_COUNTER_KEY) or 0
+    cursor = cache.get(QUEUE_CURSOR_KEY) or 0
+    if cursor > last:
+        # أُفرغ الـ cache فبدأ العداد من جديد
+        cursor = 0
+    end = min(last, cursor + batch_size)
+    if end == cursor:
+        return 0
+
+    slots = cache.get_many([QUEUE_SLOT_KEY.format(slot=slot) for slot in range(cursor + 1, end + 1)])
+    keys = {ACTIVITY_KEY.format(session_key=session_key): session_key for session_key in set(slots.values())}
+    pending = {keys[key]: activity for key, activity in cache.get_many(list(keys)).items()}
+
+    with transaction.atomic():
+        existing = UserSession.objects.select_for_update().in_bulk(list(pending), field_name='session_key')
+        created, updated = [], []
+        for session_key, activity in pending.items():
+            session = existing.get(session_key)
+            if session is None:
+                created.append(UserSession(
+                    user_id=activity['user_id'],
+                    session_key=session_key,
+                    login_time=activity['login_time'] or activity['last_activity'],
+                    last_activity=activity['last_activity'],
+                    logout_time=activity['logout_time'],
+                    ip_address=activity['ip_address'],
+                    user_agent=activity['user_agent'],
+                    is_active=activity['logout_time'] is None,
+                ))
+                continue
+            session.last_activity = max(session.last_activity, activity['last_activity'])
+            if activity['logout_time'] and session.is_active:
+                session.is_active = False
+                session.logout_time = activity['logout_time']
+            updated.append(session)
+        UserSession.objects.bulk_create(created, ignore_conflicts=True)
+        UserSession.objects.bulk_update(updated, ['last_activity', 'is_active', 'logout_time'])
+    cache.set(QUEUE_CURSOR_KEY, end, None)
+    return end - cursor
+
+
+def sweep_expired_sessions(now=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    تعطيل دفعة من سجلات الجلسات النشطة التي انتهت صلاحية جلسة Django الخاصة بها أو حُذفت
+
+    Returns:
+        int: عدد الجلسات المعطلة
+    """
+    if not issubclass(_session_store(), DatabaseSessionStore):
+        # الجلسات غير محفوظة في قاعدة البيانات فلا يمكن مقارنتها دفعة واحدة
+        return 0
+    now = now or timezone.now()
+    live = Session.objects.filter(expire_date__gt=now).values('session_key')
+    pks = list(
+        UserSession.objects.filter(is_active=True).exclude(session_key__in=live).values_list('pk', flat=True)[:batch_size]
+    )
+    if pks:
+        UserSession.objects.filter(pk__in=pks).update(is_active=False, logout_time=now)
+    return len(pks)
+
+
+def process_sessions(now=None, batch_size=DEFAULT_BATCH_SIZE, max_batches=20):
+    """
+    دورة واحدة: نقل النشاط المسجل ثم تعطيل الجلسات المنتهية وحذف جلسات Django المنتهية
+
+    Returns:
+        dict: {'flushed': int, 'expired': int}
+    """
+    stats = {'flushed': 0, 'expired': 0}
+    for key, handler in (
+        ('flushed', lambda: flush_session_activity(batch_size)),
+        ('expired', lambda: sweep_expired_sessions(now, batch_size)),
+    ):
+        for _ in range(max_batches):
+            processed = handler()
+            stats[key] += processed
+            if processed < batch_size:
+                break
+    _session_store().clear_expired()
+    if any(stats.values()):
+        logger.info('الجلسات: نقل %(flushed)d نشاط وتعطيل %(expired)d جلسة منتهية', stats)
+    return stats
+
+
+def terminate_session(user_session, now=None):
+    """
+    إنهاء جلسة قسراً: حذف جلسة Django (من الـ cache وقاعدة البيانات) فيُطلب من المستخدم الدخول من جديد
+
+    Args:
+        user_session: سجل UserSession
+    """
+    _session_store()(session_key=user_session.session_key).delete()
+    cache.delete(ACTIVITY_KEY.format(session_key=user_session.session_key))
+    user_session.is_active = False
+    user_session.logout_time = now or timezone.now()
+    user_session.forced_logout = True
+    user_session.save(update_fields=['is_active', 'logout_time', 'forced_logout'])
@@ -0,0 +1,26 @@
+"""
+المهام الخلفية لتطبيق الأمان (Celery)
+"""
+from celery import shared_task
+
+from .anomaly import process_anomalies
+from .audit_chain import process_audit_chain
+from .sessions import process_sessions
+
+
+@shared_task(ignore_result=True)
+def seal_audit_log():
+    """ختم سجلات التدقيق الجديدة وإنشاء نقاط التحقق (تُشغل دورياً عبر celery beat)"""
+    return process_audit_chain()
+
+
+@shared_task(ignore_result=True)
+def process_user_sessions():
+    """نقل نشاط الجلسات من الـ cache إلى UserSession وتعطيل الجلسات المنتهية (تُشغل دورياً عبر celery beat)"""
+    return process_sessions()
+
+
+@shared_task(ignore_result=True)
+def detect_anomalies():
+    """تشغيل كاشف الشذوذ على سجلات التدقيق المختومة الجديدة (تُشغل دورياً عبر celery beat)"""
+    return process_anomalies()
@@ -1,3 +1,303 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Department, Position, User
+from myproject.perf_fixtures import TEST_STORAGES, PerformanceTestCase
+
+from messaging.reports import get_suspicious_activities
+
+from .anomaly import AnomalyDetector, process_anomalies
+from .audit_chain import process_audit_chain, prune_audit_log, verify_audit_range
+from .models import AnomalyDetectorState, AuditCheckpoint, AuditLog, SecurityIncident, UserSession
+from .sessions import QUEUE_COUNTER_KEY, process_sessions, touch_session
+from .utils import SecurityUtils
+
+
+class SecurityReportsQueryBudgetTests(PerformanceTestCase):
+    """ميزانية الاستعلامات والزمن لتقارير الأمان"""
+    seed_options = {'messages': 1000, 'approval_requests': 100}
+
+    def test_security_reports(self):
+        self.assertQueryBudget(reverse('security:reports'), max_queries=7)
+
+
+class AuditChainTests(TestCase):
+    """ختم سجلات التدقيق في سلسلة HMAC ونقاط تحقق Merkle واكتشاف التعديل والحذف"""
+
+    def setUp(self):
+        self.base = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=5)
+        for hour, count in ((0, 10), (1, 5), (2, 3)):
+            logs = AuditLog.objects.bulk_create([
+                AuditLog(action_type='LOGIN', description=f'دخول {hour}-{i}', user_ip='10.0.0.1')
+                for i in range(count)
+            ])
+            AuditLog.objects.filter(pk__in=[log.pk for log in logs]).update(
+                timestamp=self.base + timedelta(hours=hour, minutes=10)
+            )
+        self.now = self.base + timedelta(hours=2, minutes=30)
+        self.assertEqual(process_audit_chain(now=self.now), {'sealed': 18, 'checkpoints': 2})
+
+    def test_chain_verifies(self):
+        self.assertEqual(
+            list(AuditCheckpoint.objects.values_list('first_sequence', 'last_sequence')), [(1, 10), (11, 15)]
+        )
+        result = verify_audit_range()
+        self.assertTrue(result['is_valid'], result['errors'])
+        self.assertEqual((result['entries'], result['checkpoints']), (18, 2))
+
+        partial = verify_audit_range(4, 12)
+        self.assertTrue(partial['is_valid'], partial['errors'])
+        self.assertEqual((partial['entries'], partial['checkpoints']), (9, 2))
+
+        stdout = StringIO()
+        call_command('verify_audit_log', stdout=stdout)
+        self.assertIn('سلسلة التدقيق سليمة', stdout.getvalue())
+
+    def test_new_entries_extend_chain(self):
+        AuditLog.objects.create(action_type='LOGOUT', description='خروج', user_ip='10.0.0.1')
+        self.assertEqual(process_audit_chain(now=self.now)['sealed'], 1)
+        self.assertEqual(AuditLog.objects.get(description='خروج').sequence, 19)
+        self.assertTrue(verify_audit_range()['is_valid'])
+
+    def test_modification_is_detected(self):
+        AuditLog.objects.filter(sequence=4).update(description='وصف معدل')
+        result = verify_audit_range()
+        self.assertFalse(result['is_valid'])
+        self.assertEqual(result['errors'], ['السجل 4: محتوى غير مطابق للسلسلة'])
+        self.assertTrue(verify_audit_range(11, 18)['is_valid'])
+
+    def test_deletion_is_detected(self):
+        AuditLog.objects.filter(sequence=7).delete()
+        self.assertFalse(verify_audit_range(5, 9)['is_valid'])
+        with self.assertRaises(CommandError):
+            call_command('verify_audit_log', '--from-sequence', '1', stdout=StringIO(), stderr=StringIO())
+
+        # حذف فترة كاملة مع نقطتها
+        AuditLog.objects.filter(sequence__lte=10).delete()
+        AuditCheckpoint.objects.filter(first_sequence=1).delete()
+        self.assertFalse(verify_audit_range()['is_valid'])
+
+    def test_prune_keeps_chain_verifiable(self):
+        self.assertEqual(prune_audit_log(self.base + timedelta(hours=1, minutes=30)), 10)
+        self.assertTrue(AuditCheckpoint.objects.get(first_sequence=1).pruned)
+        result = verify_audit_range()
+        self.assertTrue(result['is_valid'], result['errors'])
+        self.assertEqual(result['first_sequence'], 11)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class SessionTrackingTests(TestCase):
+    """تتبع الجلسات في الـ cache ونقلها دفعات وتعطيل المنتهية والخروج القسري"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='الأمن', code='SEC')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.user = User.objects.create_user(
+            username='employee', password='pass', arabic_name='موظف', employee_id='4001', phone='401',
+            department=department, position=position,
+        )
+        cls.admin = User.objects.create_user(
+            username='security_admin', password='pass', arabic_name='مدير', employee_id='4002', phone='402',
+            department=department, position=position, is_staff=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _login(self, client, user):
+        response = client.post(reverse('accounts:login'), {'username': user.username, 'password': 'pass'})
+        self.assertEqual(response.status_code, 302)
+        return client.session.session_key
+
+    def test_login_and_activity_are_flushed_in_batches(self):
+        session_key = self._login(self.client, self.user)
+        self.assertFalse(UserSession.objects.exists())
+        self.assertTrue(AuditLog.objects.filter(action_type='LOGIN', user=self.user).exists())
+
+        # النشاط ضمن الفاصل نفسه لا يُسجل مرة أخرى
+        self.client.get(reverse('accounts:profile'))
+        self.client.get(reverse('accounts:profile'))
+        self.assertEqual(cache.get(QUEUE_COUNTER_KEY), 1)
+
+        self.assertEqual(process_sessions(), {'flushed': 1, 'expired': 0})
+        session = UserSession.objects.get()
+        self.assertEqual((session.session_key, session.user, session.is_active), (session_key, self.user, True))
+
+        later = timezone.now() + timedelta(minutes=5)
+        request = RequestFactory().get('/')
+        request.session, request.user = self.client.session, self.user
+        self.assertTrue(touch_session(request, now=later))
+        process_sessions()
+        session.refresh_from_db()
+        self.assertEqual(session.last_activity, later)
+
+        self.client.get(reverse('accounts:logout'))
+        process_sessions()
+        session.refresh_from_db()
+        self.assertFalse(session.is_active)
+        self.assertIsNotNone(session.logout_time)
+
+    def test_sweeper_deactivates_expired_sessions(self):
+        live_key = self._login(self.client, self.user)
+        process_sessions()
+        UserSession.objects.bulk_create([
+            UserSession(user=self.user, session_key=f'gone{i}', ip_address='10.0.0.1', user_agent='') for i in range(3)
+        ])
+        self.assertEqual(process_sessions()['expired'], 3)
+        self.assertEqual(list(UserSession.objects.filter(is_active=True).values_list('session_key', flat=True)), [live_key])
+
+    def test_forced_logout_deletes_django_session(self):
+        session_key = self._login(self.client, self.user)
+        process_sessions()
+        admin_client = Client()
+        admin_client.force_login(self.admin)
+
+        user_session = UserSession.objects.get(session_key=session_key)
+        url = reverse('security:terminate_session', args=[user_session.pk])
+        self.assertEqual(admin_client.get(url).status_code, 405)
+        self.assertEqual(admin_client.post(url).json(), {'success': True})
+
+        user_session.refresh_from_db()
+        self.assertEqual((user_session.is_active, user_session.forced_logout), (False, True))
+        self.assertFalse(Session.objects.filter(session_key=session_key).exists())
+        response = self.client.get(reverse('accounts:profile'))
+        self.assertRedirects(response, f'{reverse("accounts:login")}?next={reverse("accounts:profile")}', fetch_redirect_response=False)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class AnomalyDetectionTests(TestCase):
+    """كشف الشذوذ تدريجياً من سلسلة التدقيق ودمج النتائج في الحوادث وواجهات الحوادث"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='الأمن', code='SEC')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.user = User.objects.create_user(
+            username='employee', password='pass', arabic_name='موظف', employee_id='5001', phone='501',
+            department=department, position=position,
+        )
+        cls.admin = User.objects.create_user(
+            username='security_admin', password='pass', arabic_name='مدير', employee_id='5002', phone='502',
+            department=department, position=position, is_staff=True,
+        )
+
+    def setUp(self):
+        # ضمن ساعات العمل حتى لا تنتج قاعدة النشاط خارج الدوام حوادث
+        self.now = timezone.localtime().replace(hour=10, minute=0, second=0, microsecond=0)
+
+    def _log(self, action_type, count, user=None, ip='10.0.0.9', at=None, step=timedelta(seconds=10)):
+        at = at or self.now
+        for i in range(count):
+            log = AuditLog.objects.create(action_type=action_type, description=action_type, user=user, user_ip=ip)
+            AuditLog.objects.filter(pk=log.pk).update(timestamp=at + i * step)
+        process_audit_chain(now=at)
+
+    def test_failed_logins_from_one_ip_open_one_incident(self):
+        self._log('FAILED_LOGIN', 4)
+        self.assertEqual(process_anomalies(), {'events': 4, 'incidents': 0})
+        # النافذة تُستأنف من نقطة الحفظ فيكتمل الحد في التشغيل التالي
+        self._log('FAILED_LOGIN', 2, at=self.now + timedelta(minutes=1))
+        self.assertEqual(process_anomalies(), {'events': 2, 'incidents': 1})
+
+        incident = SecurityIncident.objects.get()
+        self.assertEqual((incident.rule, incident.ip_address, incident.user), ('FAILED_LOGIN_BURST', '10.0.0.9', None))
+        self.assertEqual(incident.event_count, 6)
+        self.assertEqual(incident.first_seen, self.now)
+
+        # المحاولات التالية تُضاف إلى الحادث المفتوح نفسه
+        self._log('FAILED_LOGIN', 3, at=self.now + timedelta(minutes=3))
+        process_anomalies()
+        incident.refresh_from_db()
+        self.assertEqual((SecurityIncident.objects.count(), incident.event_count), (1, 9))
+        self.assertEqual(process_anomalies(), {'events': 0, 'incidents': 0})
+        self.assertEqual(AnomalyDetectorState.objects.get().last_sequence, AuditLog.objects.count())
+
+        # بعد إغلاق الحادث تفتح المحاولات الجديدة حادثاً جديداً بأحداثها فقط
+        SecurityIncident.objects.update(status='RESOLVED')
+        self._log('FAILED_LOGIN', 1, at=self.now + timedelta(minutes=4))
+        process_anomalies()
+        self.assertEqual(SecurityIncident.objects.get(status='OPEN').event_count, 1)
+
+    def test_action_burst_is_per_user_and_action(self):
+        self._log('MESSAGE_SEND', 10, user=self.user)
+        self._log('FILE_UPLOAD', 10, user=self.user)
+        self.assertEqual(process_anomalies(), {'events': 20, 'incidents': 0})
+        self.assertFalse(SecurityUtils.is_suspicious_activity(self.user, 'MESSAGE_SEND'))
+
+        self._log('MESSAGE_SEND', 1, user=self.user, at=self.now + timedelta(minutes=2))
+        process_anomalies()
+        incident = SecurityIncident.objects.get()
+        self.assertEqual((incident.rule, incident.user, incident.event_count), ('ACTION_BURST', self.user, 11))
+        # is_suspicious_activity تنظر في الحوادث المفتوحة خلال آخر ساعة
+        SecurityIncident.objects.update(last_seen=timezone.now())
+        self.assertTrue(SecurityUtils.is_suspicious_activity(self.user, 'MESSAGE_SEND'))
+
+        # الأحداث الأقدم من النافذة تخرج منها
+        self._log('MESSAGE_SEND', 10, user=self.user, at=self.now + timedelta(hours=1), step=timedelta(minutes=1))
+        process_anomalies()
+        self.assertEqual(SecurityIncident.objects.count(), 1)
+
+    def test_off_hours_activity(self):
+        night = self.now.replace(hour=23)
+        self._log('MESSAGE_SEND', 2, user=self.user, at=night)
+        self._log('MESSAGE_READ', 1, user=self.user, at=night)
+        process_anomalies()
+        incident = SecurityIncident.objects.get()
+        self.assertEqual((incident.rule, incident.severity, incident.event_count), ('OFF_HOURS_ACTIVITY', 'LOW', 2))
+
+    def test_persistent_detector_checkpoints_and_reloads(self):
+        detector = AnomalyDetector.load()
+        self._log('FAILED_LOGIN', 3)
+        self.assertEqual(process_anomalies(detector=detector)['events'], 3)
+        # لا حوادث ولم يحن موعد الحفظ: التقدم في الذاكرة فقط
+        self.assertEqual(AnomalyDetectorState.objects.get().last_sequence, 0)
+
+        # عامل آخر عالج السجلات نفسها وحفظ حالته: الكاشف يستأنف منها دون تكرار
+        process_anomalies()
+        self._log('FAILED_LOGIN', 2, at=self.now + timedelta(minutes=1))
+        self.assertEqual(process_anomalies(detector=detector), {'events': 2, 'incidents': 1})
+        self.assertEqual(SecurityIncident.objects.get().event_count, 5)
+
+    def test_reports_and_login_failures(self):
+        for _ in range(5):
+            self.client.post(reverse('accounts:login'), {'username': 'employee', 'password': 'wrong'})
+        self.assertEqual(AuditLog.objects.filter(action_type='FAILED_LOGIN', user=None).count(), 5)
+        process_audit_chain()
+        process_anomalies()
+        self.assertEqual(
+            get_suspicious_activities(timezone.now() - timedelta(days=7)),
+            [{'type': 'محاولات دخول متعددة فاشلة', 'ip': '127.0.0.1', 'count': 5}],
+        )
+
+    def test_incident_views(self):
+        self._log('FAILED_LOGIN', 5)
+        process_anomalies()
+        incident = SecurityIncident.objects.get()
+        self.client.force_login(self.admin)
+
+        response = self.client.get(reverse('security:incidents'), {'status': 'OPEN'})
+        self.assertContains(response, incident.title)
+        detail_url = reverse('security:incident_detail', args=[incident.incident_id])
+        response = self.client.get(detail_url)
+        self.assertEqual(len(response.context['logs']), 5)
+
+        update_url = reverse('security:update_incident', args=[incident.incident_id])
+        self.assertEqual(self.client.get(update_url).status_code, 405)
+        self.assertRedirects(self.client.post(update_url, {'status': 'RESOLVED', 'notes': 'فحص'}), detail_url)
+        incident.refresh_from_db()
+        self.assertEqual((incident.status, incident.resolved_by, incident.notes), ('RESOLVED', self.admin, 'فحص'))
+        self.assertIsNotNone(incident.resolved_at)
+
+        response = self.client.post(reverse('security:add_incident'), {'title': 'تسريب', 'severity': 'CRITICAL'})
+        manual = SecurityIncident.objects.get(title='تسريب')
+        self.assertRedirects(response, reverse('security:incident_detail', args=[manual.incident_id]))
+        self.assertEqual((manual.rule, manual.reported_by), ('', self.admin))
+        self.assertContains(self.client.post(reverse('security:add_incident'), {'title': 'x', 'ip_address': 'bad'}), 'عنوان IP غير صحيح')
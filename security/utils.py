@@ -12,8 +12,14 @@ from django.conf import settings
 from django.core.cache import cache
 from django.utils import timezone
 from datetime import timedelta
+from functools import lru_cache
 from cryptography.fernet import Fernet
-from .models import AuditLog, LoginAttempt
+from .models import AuditLog, LoginAttempt, SecurityIncident
+
+@lru_cache(maxsize=16)
+def _fernet(key):
+    """كائن Fernet للمفتاح (يُنشأ مرة واحدة لكل عملية)"""
+    return Fernet(base64.urlsafe_b64encode(key))
 
 class SecurityUtils:
     """فئة أدوات الأمان"""
@@ -53,7 +59,7 @@ class SecurityUtils:
         if key is None:
             key = settings.SECRET_KEY[:32].encode()
         
-        fernet = Fernet(base64.urlsafe_b64encode(key))
+        fernet = _fernet(key)
         encrypted_data = fernet.encrypt(data.encode())
         return encrypted_data.decode()
     
@@ -64,7 +70,7 @@ class SecurityUtils:
             key = settings.SECRET_KEY[:32].encode()
         
         try:
-            fernet = Fernet(base64.urlsafe_b64encode(key))
+            fernet = _fernet(key)
             decrypted_data = fernet.decrypt(encrypted_data.encode())
             return decrypted_data.decode()
         except Exception:
@@ -181,14 +187,12 @@ class SecurityUtils:
     @staticmethod
     def is_suspicious_activity(user, action):
         """فحص النشاط المشبوه"""
-        # فحص تكرار العمليات
-        recent_actions = AuditLog.objects.filter(
+        # تكرار العمليات يكشفه security.anomaly في الخلفية: حادث مفتوح للمستخدم خلال آخر ساعة
+        if SecurityIncident.objects.filter(
             user=user,
-            action_type=action,
-            timestamp__gte=timezone.now() - timedelta(minutes=5)
-        ).count()
-        
-        if recent_actions > 10:  # أكثر من 10 عمليات في 5 دقائق
+            status__in=SecurityIncident.OPEN_STATUSES,
+            last_seen__gte=timezone.now() - timedelta(hours=1)
+        ).exclude(rule='').exists():
             return True
         
         # فحص التوقيت غير المعتاد
@@ -1,14 +1,21 @@
 """
 Views for security app
 """
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_ipv46_address
 from django.http import JsonResponse, HttpResponse
+from django.views.decorators.http import require_POST
 from django.db.models import Count
 from django.utils import timezone
 from datetime import timedelta
 
-from .models import AuditLog, UserSession, LoginAttempt
+from . import sessions
+from .anomaly import RULES_BY_NAME
+from .models import AuditLog, UserSession, LoginAttempt, SecurityIncident
+from .utils import SecurityUtils
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)
@@ -49,13 +56,18 @@ def my_sessions(request):
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)
+@require_POST
 def terminate_session(request, session_id):
-    """إنهاء جلسة"""
-    session = get_object_or_404(UserSession, id=session_id)
-    session.is_active = False
-    session.logout_time = timezone.now()
-    session.forced_logout = True
-    session.save()
+    """إنهاء جلسة (تسجيل خروج قسري بحذف جلسة Django)"""
+    session = get_object_or_404(UserSession.objects.select_related('user'), id=session_id)
+    sessions.terminate_session(session)
+    AuditLog.objects.create(
+        action_type='ADMIN_ACTION',
+        description=f'إنهاء جلسة المستخدم {session.user.username} قسرياً',
+        user=request.user,
+        user_ip=SecurityUtils.get_client_ip(request),
+        is_successful=True
+    )
     return JsonResponse({'success': True})
 
 @login_required
@@ -151,23 +163,110 @@ def disable_2fa(request):
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 def security_incidents(request):
-    """الحوادث الأمنية"""
-    return render(request, 'security/incidents.html')
+    """الحوادث الأمنية (نتائج كاشف الشذوذ والحوادث المضافة يدوياً)"""
+    status = request.GET.get('status', '')
+    incidents = SecurityIncident.objects.select_related('user').order_by('-last_seen')
+    if status in dict(SecurityIncident.STATUS_CHOICES):
+        incidents = incidents.filter(status=status)
+    status_counts = dict(
+        SecurityIncident.objects.values_list('status').annotate(count=Count('id')).order_by()
+    )
+    return render(request, 'security/incidents.html', {
+        'incidents': incidents[:100],
+        'status': status,
+        'status_choices': [
+            (value, label, status_counts.get(value, 0)) for value, label in SecurityIncident.STATUS_CHOICES
+        ],
+    })
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 def add_incident(request):
     """إضافة حادث أمني"""
-    return render(request, 'security/add_incident.html')
+    if request.method == 'POST':
+        title = request.POST.get('title', '').strip()
+        severity = request.POST.get('severity', 'MEDIUM')
+        ip_address = request.POST.get('ip_address', '').strip() or None
+        errors = []
+        if not title:
+            errors.append('عنوان الحادث مطلوب.')
+        if severity not in dict(SecurityIncident.SEVERITY_CHOICES):
+            errors.append('درجة الخطورة غير صحيحة.')
+        if ip_address:
+            try:
+                validate_ipv46_address(ip_address)
+            except ValidationError:
+                errors.append('عنوان IP غير صحيح.')
+        if not errors:
+            incident = SecurityIncident.objects.create(
+                title=title,
+                description=request.POST.get('description', ''),
+                severity=severity,
+                ip_address=ip_address,
+                reported_by=request.user,
+            )
+            AuditLog.objects.create(
+                action_type='ADMIN_ACTION',
+                description=f'إضافة حادث أمني: {title}',
+                user=request.user,
+                user_ip=SecurityUtils.get_client_ip(request),
+                is_successful=True
+            )
+            messages.success(request, 'تمت إضافة الحادث الأمني.')
+            return redirect('security:incident_detail', incident_id=incident.incident_id)
+        for error in errors:
+            messages.error(request, error)
+    return render(request, 'security/add_incident.html', {
+        'severity_choices': SecurityIncident.SEVERITY_CHOICES,
+        'data': request.POST,
+    })
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 def incident_detail(request, incident_id):
-    """تفاصيل الحادث الأمني"""
-    return render(request, 'security/incident_detail.html')
+    """تفاصيل الحادث الأمني مع سجلات التدقيق التي أنتجته"""
+    incident = get_object_or_404(
+        SecurityIncident.objects.select_related('user', 'reported_by', 'resolved_by'), incident_id=incident_id
+    )
+    logs = AuditLog.objects.none()
+    if incident.first_sequence is not None:
+        logs = AuditLog.objects.filter(
+            sequence__gte=incident.first_sequence, sequence__lte=incident.last_sequence
+        ).select_related('user').order_by('sequence')
+        logs = logs.filter(user=incident.user) if incident.user_id else logs.filter(user_ip=incident.ip_address)
+        rule = RULES_BY_NAME.get(incident.rule)
+        if rule is not None:
+            logs = logs.filter(action_type__in=rule.actions)
+    return render(request, 'security/incident_detail.html', {
+        'incident': incident,
+        'logs': logs[:100],
+        'status_choices': SecurityIncident.STATUS_CHOICES,
+    })
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)
+@require_POST
 def update_incident(request, incident_id):
-    """تحديث الحادث الأمني"""
-    return render(request, 'security/update_incident.html')
+    """تحديث حالة الحادث الأمني وملاحظات التحقيق"""
+    incident = get_object_or_404(SecurityIncident, incident_id=incident_id)
+    status = request.POST.get('status', incident.status)
+    if status not in dict(SecurityIncident.STATUS_CHOICES):
+        messages.error(request, 'حالة الحادث غير صحيحة.')
+        return redirect('security:incident_detail', incident_id=incident.incident_id)
+    incident.status = status
+    incident.notes = request.POST.get('notes', incident.notes)
+    if incident.is_open:
+        incident.resolved_at = incident.resolved_by = None
+    elif incident.resolved_at is None:
+        incident.resolved_at = timezone.now()
+        incident.resolved_by = request.user
+    incident.save(update_fields=['status', 'notes', 'resolved_at', 'resolved_by'])
+    AuditLog.objects.create(
+        action_type='ADMIN_ACTION',
+        description=f'تحديث الحادث الأمني {incident.title} إلى {incident.get_status_display()}',
+        user=request.user,
+        user_ip=SecurityUtils.get_client_ip(request),
+        is_successful=True
+    )
+    messages.success(request, 'تم تحديث الحادث الأمني.')
+    return redirect('security:incident_detail', incident_id=incident.incident_id)
@@ -632,10 +632,77 @@ function getCachedData(key) {
     }
 }
 
+// منتقي المستقبلين: بحث بالبادئة في دليل الموظفين بدلاً من عرض القائمة كاملة
+function initRecipientPicker(input) {
+    const select = document.querySelector(input.dataset.target);
+    const results = document.querySelector(input.dataset.results);
+    if (!select || !results) {
+        return;
+    }
+    let controller = null;
+    let timer = null;
+
+    function addRecipient(user) {
+        let option = select.querySelector(`option[value="${user.id}"]`);
+        if (!option) {
+            option = document.createElement('option');
+            option.value = user.id;
+            option.textContent = `${user.arabic_name} (${user.department})`;
+            select.appendChild(option);
+        }
+        option.selected = true;
+        select.dispatchEvent(new Event('change', { bubbles: true }));
+    }
+
+    function render(users) {
+        results.innerHTML = '';
+        users.forEach(user => {
+            const item = document.createElement('button');
+            item.type = 'button';
+            item.className = 'list-group-item list-group-item-action py-1';
+            item.textContent = `${user.arabic_name} - ${user.employee_id} (${user.department} / ${user.position})`;
+            item.addEventListener('click', function() {
+                addRecipient(user);
+                results.innerHTML = '';
+                input.value = '';
+                input.focus();
+            });
+            results.appendChild(item);
+        });
+    }
+
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (!query) {
+            render([]);
+            return;
+        }
+        timer = setTimeout(function() {
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            fetch(`${input.dataset.url}?q=${encodeURIComponent(query)}`, {
+                headers: { 'X-Requested-With': 'XMLHttpRequest' },
+                signal: controller.signal
+            })
+            .then(response => response.ok ? response.json() : { results: [] })
+            .then(data => render(data.results || []))
+            .catch(error => {
+                if (error.name !== 'AbortError') {
+                    console.error('خطأ في البحث عن المستقبلين:', error);
+                }
+            });
+        }, 200);
+    });
+}
+
 // تهيئة تحسينات الأداء عند تحميل الصفحة
 document.addEventListener('DOMContentLoaded', function() {
     lazyLoadContent();
     optimizeLocalStorage();
+    document.querySelectorAll('.recipient-search').forEach(initRecipientPicker);
 });
 
 // تنظيف الذاكرة عند إغلاق الصفحة
@@ -0,0 +1,428 @@
+"""
+محرك سير عمل الموافقات
+آلة حالات لطلبات الموافقة: إنشاء الخطوات من القوالب، وتقدم الموافقات المتسلسلة
+أو المتوازية داخل معاملة واحدة مقفلة (select_for_update)، وإرسال الأحداث بعد التثبيت.
+عدد الاستعلامات لكل إجراء ثابت ولا يعتمد على طول سلسلة الموافقات.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import signals
+from .models import ApprovalRequest, ApprovalStep, WorkflowTemplate
+
+FINAL_STATUSES = ('APPROVED', 'REJECTED', 'CANCELLED', 'EXPIRED')
+OPEN_STATUSES = ('PENDING', 'IN_PROGRESS')
+
+# الانتقالات المسموح بها بين حالات الطلب
+TRANSITIONS = {
+    'PENDING': {'IN_PROGRESS', 'APPROVED', 'REJECTED', 'CANCELLED', 'EXPIRED'},
+    'IN_PROGRESS': {'APPROVED', 'REJECTED', 'CANCELLED', 'EXPIRED'},
+}
+
+
+class WorkflowError(Exception):
+    """خطأ في تنفيذ إجراء على طلب الموافقة"""
+
+
+def can_transition(current_status, new_status):
+    """فحص ما إذا كان الانتقال بين الحالتين مسموحاً"""
+    return new_status in TRANSITIONS.get(current_status, ())
+
+
+def _emit(signal, **kwargs):
+    """إرسال الحدث بعد تثبيت المعاملة"""
+    transaction.on_commit(lambda: signal.send(sender=ApprovalRequest, **kwargs))
+
+
+def _transition(approval_request, new_status, now, original=None):
+    """نقل الطلب إلى حالة جديدة بتحديث واحد"""
+    if not can_transition(approval_request.status, new_status):
+        raise WorkflowError(
+            f'لا يمكن نقل الطلب من حالة "{approval_request.get_status_display()}" '
+            f'إلى "{dict(ApprovalRequest.STATUS_CHOICES)[new_status]}".'
+        )
+    completed_at = now if new_status in FINAL_STATUSES else None
+    ApprovalRequest.objects.filter(pk=approval_request.pk).update(
+        status=new_status, completed_at=completed_at
+    )
+    for instance in (approval_request, original):
+        if instance is not None:
+            instance.status = new_status
+            instance.completed_at = completed_at
+
+
+def is_auto_approved(workflow, amount):
+    """الطلبات التي لا يتجاوز مبلغها حد الموافقة التلقائية لا تحتاج خطوات"""
+    if workflow.auto_approve_threshold is None or amount is None:
+        return False
+    return Decimal(str(amount)) <= workflow.auto_approve_threshold
+
+
+def get_template_steps(template):
+    """خطوات القالب سواء خُزنت كقائمة أو تحت المفتاح steps"""
+    steps = template.template_steps
+    if isinstance(steps, dict):
+        steps = steps.get('steps', [])
+    return list(steps or [])
+
+
+def template_matches(template, requester, amount=None):
+    """
+    فحص شروط القالب
+
+    الشروط المدعومة في conditions:
+        min_amount / max_amount: حدود المبلغ
+        departments: قائمة رموز الأقسام المسموح بها
+    """
+    conditions = template.conditions or {}
+    if amount is not None:
+        amount = Decimal(str(amount))
+        if conditions.get('min_amount') is not None and amount < Decimal(str(conditions['min_amount'])):
+            return False
+        if conditions.get('max_amount') is not None and amount > Decimal(str(conditions['max_amount'])):
+            return False
+    departments = conditions.get('departments')
+    if departments and requester.department.code not in departments:
+        return False
+    return True
+
+
+def find_template(workflow, requester, amount=None):
+    """أول قالب نشط من نفس نوع سير العمل تنطبق شروطه على الطلب"""
+    templates = WorkflowTemplate.objects.filter(
+        workflow_type=workflow.workflow_type, is_active=True
+    ).order_by('id')
+    for template in templates:
+        if template_matches(template, requester, amount):
+            return template
+    return None
+
+
+def resolve_template_approvers(template, requester):
+    """
+    تحويل خطوات القالب إلى موافقين فعليين
+
+    كل خطوة قاموس بأحد المفاتيح:
+        approver: "direct_manager" أو "department_manager"
+        user_id / employee_id: موافق محدد
+    ومفتاح اختياري deadline_hours لمهلة الخطوة، و optional لتخطيها إذا تعذر تحديد الموافق.
+
+    Returns:
+        list: أزواج (الموافق، مهلة الخطوة بالساعات)
+    """
+    User = get_user_model()
+    specs = get_template_steps(template)
+
+    user_ids = {int(spec['user_id']) for spec in specs if spec.get('user_id')}
+    employee_ids = {str(spec['employee_id']) for spec in specs if spec.get('employee_id')}
+    by_id, by_employee_id = {}, {}
+    if user_ids or employee_ids:
+        for user in User.objects.filter(
+            Q(id__in=user_ids) | Q(employee_id__in=employee_ids), is_active=True
+        ):
+            by_id[user.id] = user
+            by_employee_id[user.employee_id] = user
+
+    resolved = []
+    for order, spec in enumerate(specs, start=1):
+        role = spec.get('approver')
+        if role == 'direct_manager':
+            approver = requester.direct_manager
+        elif role == 'department_manager':
+            approver = requester.department.manager
+        elif spec.get('user_id'):
+            approver = by_id.get(int(spec['user_id']))
+        elif spec.get('employee_id'):
+            approver = by_employee_id.get(str(spec['employee_id']))
+        else:
+            raise WorkflowError(f'الخطوة {order} في القالب "{template.name}" غير صالحة.')
+
+        if approver is None or approver == requester:
+            if spec.get('optional'):
+                continue
+            raise WorkflowError(f'تعذر تحديد الموافق للخطوة {order} في القالب "{template.name}".')
+        resolved.append((approver, spec.get('deadline_hours')))
+    return resolved
+
+
+def instantiate_steps(approval_request, step_specs, now=None):
+    """
+    إنشاء خطوات الموافقة دفعة واحدة
+
+    في الموافقة المتسلسلة تكون الخطوة الأولى فقط حالية، وفي المتوازية كل الخطوات حالية.
+    """
+    now = now or timezone.now()
+    sequential = approval_request.workflow.requires_sequential_approval
+    steps = [
+        ApprovalStep(
+            request=approval_request,
+            step_order=order,
+            approver=approver,
+            deadline=now + timedelta(hours=hours) if hours else approval_request.deadline,
+            is_current_step=(order == 1 or not sequential),
+        )
+        for order, (approver, hours) in enumerate(step_specs, start=1)
+    ]
+    return ApprovalStep.objects.bulk_create(steps)
+
+
+def submit_request(workflow, requester, title, description, content_type, object_id,
+                   amount=None, approvers=None, template=None, **fields):
+    """
+    إنشاء طلب موافقة مع خطواته
+
+    Args:
+        workflow: سير العمل
+        requester: طالب الموافقة
+        approvers: قائمة موافقين صريحة بالترتيب (بدلاً من القالب)
+        template: قالب محدد (وإلا يُختار أول قالب مطابق)
+        fields: حقول إضافية لـ ApprovalRequest مثل deadline و is_urgent
+
+    Returns:
+        ApprovalRequest: الطلب المنشأ
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        approval_request = ApprovalRequest.objects.create(
+            workflow=workflow,
+            requester=requester,
+            title=title,
+            description=description,
+            content_type=content_type,
+            object_id=str(object_id),
+            amount=amount,
+            **fields
+        )
+        _emit(signals.request_submitted, approval_request=approval_request)
+
+        if is_auto_approved(workflow, amount):
+            _transition(approval_request, 'APPROVED', now)
+            _emit(signals.request_approved, approval_request=approval_request)
+            return approval_request
+
+        if approvers is not None:
+            step_specs = [(approver, None) for approver in approvers]
+        else:
+            template = template or find_template(workflow, requester, amount)
+            if template is None:
+                raise WorkflowError('لا يوجد قالب سير عمل مطابق لهذا الطلب.')
+            step_specs = resolve_template_approvers(template, requester)
+
+        if not step_specs:
+            raise WorkflowError('لا توجد خطوات موافقة لهذا الطلب.')
+        instantiate_steps(approval_request, step_specs, now)
+
+    return approval_request
+
+
+def _lock_request(approval_request):
+    """قفل الطلب حتى نهاية المعاملة"""
+    locked = ApprovalRequest.objects.select_for_update(of=('self',)).select_related(
+        'workflow'
+    ).get(pk=approval_request.pk)
+    if locked.status in FINAL_STATUSES:
+        raise WorkflowError('تم إغلاق هذا الطلب مسبقاً.')
+    return locked
+
+
+def _actionable_step(approval_request, user):
+    """الخطوة الحالية المسندة للمستخدم (كموافق أو مفوض إليه)"""
+    step = ApprovalStep.objects.select_for_update().filter(
+        Q(approver=user) | Q(delegated_to=user),
+        request=approval_request,
+        is_current_step=True,
+        is_completed=False,
+    ).order_by('step_order').first()
+    if step is None:
+        raise WorkflowError('لا توجد خطوة موافقة حالية مسندة إليك في هذا الطلب.')
+    return step
+
+
+def _complete_step(step, action, comments, now):
+    ApprovalStep.objects.filter(pk=step.pk).update(
+        action=action,
+        comments=comments,
+        responded_at=now,
+        is_completed=True,
+        is_current_step=False,
+    )
+    step.action = action
+    step.comments = comments
+    step.responded_at = now
+    step.is_completed = True
+    step.is_current_step = False
+
+
+def _close_open_steps(approval_request, action=None):
+    """إغلاق كل الخطوات الحالية المتبقية في الطلب"""
+    updates = {'is_current_step': False}
+    if action:
+        updates.update(action=action, is_completed=True)
+    return ApprovalStep.objects.filter(
+        request=approval_request, is_current_step=True, is_completed=False
+    ).update(**updates)
+
+
+def _activate_next_step(approval_request, after_order, now):
+    """
+    تفعيل الخطوة التالية في الموافقة المتسلسلة
+
+    Returns:
+        ApprovalStep أو None إذا لم تبق خطوات
+    """
+    next_step = ApprovalStep.objects.filter(
+        request=approval_request, is_completed=False, step_order__gt=after_order
+    ).order_by('step_order').only('pk', 'step_order', 'deadline', 'assigned_at').first()
+    if next_step is None:
+        return None
+
+    # مهلة deadline_hours تبدأ من لحظة وصول الخطوة إلى الموافق، ولا تتجاوز مهلة الطلب
+    # (الخطوات بلا deadline_hours تأخذ مهلة الطلب المطلقة فتبقى كما هي)
+    deadline = next_step.deadline
+    if deadline and next_step.assigned_at:
+        deadline = now + (deadline - next_step.assigned_at)
+        if approval_request.deadline:
+            deadline = min(deadline, approval_request.deadline)
+    ApprovalStep.objects.filter(pk=next_step.pk).update(
+        is_current_step=True, assigned_at=now, deadline=deadline
+    )
+    next_step.is_current_step = True
+    next_step.assigned_at = now
+    next_step.deadline = deadline
+    return next_step
+
+
+def approve(approval_request, user, comments=''):
+    """
+    الموافقة على الخطوة الحالية للمستخدم وتقديم الطلب
+
+    - المتسلسلة: تفعيل الخطوة التالية أو اعتماد الطلب عند آخر خطوة
+    - المتوازية: اعتماد الطلب عند بلوغ minimum_approvers وتخطي الخطوات المتبقية
+
+    Returns:
+        ApprovalRequest: الطلب بعد التحديث
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        locked = _lock_request(approval_request)
+        step = _actionable_step(locked, user)
+        _complete_step(step, 'APPROVE', comments, now)
+
+        workflow = locked.workflow
+        if workflow.requires_sequential_approval:
+            finished = _activate_next_step(locked, step.step_order, now) is None
+        else:
+            counts = ApprovalStep.objects.filter(request=locked).aggregate(
+                total=Count('pk'),
+                approved=Count('pk', filter=Q(action='APPROVE')),
+            )
+            required = min(max(workflow.minimum_approvers, 1), counts['total'])
+            finished = counts['approved'] >= required
+            if finished:
+                _close_open_steps(locked, action='SKIP')
+
+        new_status = 'APPROVED' if finished else 'IN_PROGRESS'
+        if new_status != locked.status:
+            _transition(locked, new_status, now, original=approval_request)
+
+        _emit(signals.step_approved, approval_request=locked, step=step, user=user)
+        if finished:
+            _emit(signals.request_approved, approval_request=locked)
+    return locked
+
+
+def reject(approval_request, user, comments=''):
+    """رفض الطلب من الموافق الحالي وإغلاق بقية الخطوات"""
+    now = timezone.now()
+    with transaction.atomic():
+        locked = _lock_request(approval_request)
+        step = _actionable_step(locked, user)
+        _complete_step(step, 'REJECT', comments, now)
+        _close_open_steps(locked)
+        _transition(locked, 'REJECTED', now, original=approval_request)
+        _emit(signals.request_rejected, approval_request=locked, step=step, user=user)
+    return locked
+
+
+def cancel(approval_request, user):
+    """إلغاء الطلب من طالبه"""
+    now = timezone.now()
+    with transaction.atomic():
+        locked = _lock_request(approval_request)
+        if locked.requester_id != user.pk:
+            raise WorkflowError('لا يمكنك إلغاء هذا الطلب.')
+        _close_open_steps(locked)
+        _transition(locked, 'CANCELLED', now, original=approval_request)
+        _emit(signals.request_cancelled, approval_request=locked, user=user)
+    return locked
+
+
+def delegate(approval_request, user, delegate_to, comments=''):
+    """تفويض الخطوة الحالية للمستخدم إلى موظف آخر"""
+    if delegate_to is None or delegate_to.pk == user.pk or not delegate_to.is_active:
+        raise WorkflowError('لا يمكن التفويض إلى هذا المستخدم.')
+
+    with transaction.atomic():
+        locked = _lock_request(approval_request)
+        step = _actionable_step(locked, user)
+        ApprovalStep.objects.filter(pk=step.pk).update(delegated_to=delegate_to, comments=comments)
+        step.delegated_to = delegate_to
+        step.comments = comments
+        _emit(signals.step_delegated, approval_request=locked, step=step, user=user,
+              delegate_to=delegate_to)
+    return step
+
+
+# العلاقات اللازمة لحساب جهة التصعيد دون استعلامات إضافية لكل خطوة
+ESCALATION_RELATED = (
+    'approver__delegate_to', 'approver__direct_manager',
+    'delegated_to__delegate_to', 'delegated_to__direct_manager',
+)
+
+
+def escalation_target(step):
+    """
+    الجهة التي تُصعد إليها الخطوة انطلاقاً من حاملها الحالي (المفوض إليه وإلا الموافق):
+    من فوضه الحامل إن كان تفويضه نشطاً، وإلا مديره المباشر
+    """
+    holder = step.delegated_to or step.approver
+    if holder.delegate_to_id and holder.has_delegation_active():
+        target = holder.delegate_to
+    else:
+        target = holder.direct_manager
+    if target is None or target.pk in (step.approver_id, step.delegated_to_id):
+        return None
+    return target
+
+
+def escalate(approval_request, user=None, reason=''):
+    """
+    تصعيد الخطوات الحالية للطلب
+
+    Returns:
+        list: الخطوات التي تم تصعيدها
+    """
+    with transaction.atomic():
+        locked = _lock_request(approval_request)
+        steps = ApprovalStep.objects.select_for_update(of=('self',)).filter(
+            request=locked, is_current_step=True, is_completed=False
+        ).select_related(*ESCALATION_RELATED)
+        escalated = []
+        for step in steps:
+            target = escalation_target(step)
+            if target is None:
+                continue
+            step.delegated_to = target
+            if reason:
+                step.comments = f'{step.comments}\n{reason}'.strip()
+            escalated.append(step)
+
+        if escalated:
+            ApprovalStep.objects.bulk_update(escalated, ['delegated_to', 'comments'])
+            _emit(signals.request_escalated, approval_request=locked, steps=escalated, user=user)
+    return escalated
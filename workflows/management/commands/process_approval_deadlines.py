@@ -0,0 +1,50 @@
+"""
+أمر Django لمعالجة مهل الموافقات: إنهاء الطلبات المنتهية وتصعيد الخطوات المتأخرة
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from workflows.scheduler import DEFAULT_BATCH_SIZE, process_due_items
+
+
+class Command(BaseCommand):
+    help = 'معالجة مهل الموافقات (إنهاء الطلبات وتصعيد الخطوات المتأخرة)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='التشغيل المستمر بدلاً من دورة واحدة'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='الفاصل بين الدورات بالثواني عند التشغيل المستمر (افتراضي: 60)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'عدد العناصر في كل دفعة (افتراضي: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=20,
+            help='الحد الأقصى للدفعات في كل دورة (افتراضي: 20)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = process_due_items(
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+            )
+            self.stdout.write(
+                f'تم إنهاء {stats["expired"]} طلب وتصعيد {stats["escalated"]} خطوة'
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-19 16:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflows', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='approvalrequest',
+            index=models.Index(condition=models.Q(('deadline__isnull', False), ('status__in', ['PENDING', 'IN_PROGRESS'])), fields=['deadline'], name='wf_request_open_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approvalstep',
+            index=models.Index(condition=models.Q(('deadline__isnull', False), ('is_completed', False), ('is_current_step', True)), fields=['deadline'], name='wf_step_open_deadline_idx'),
+        ),
+    ]
@@ -82,6 +82,14 @@ class ApprovalRequest(models.Model):
         verbose_name = "طلب موافقة"
         verbose_name_plural = "طلبات الموافقة"
         ordering = ['-created_at']
+        indexes = [
+            # الطلبات المفتوحة المستحقة فقط (يستخدمه مجدول المهل)
+            models.Index(
+                fields=['deadline'],
+                name='wf_request_open_deadline_idx',
+                condition=models.Q(status__in=['PENDING', 'IN_PROGRESS'], deadline__isnull=False),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.get_status_display()}"
@@ -119,6 +127,14 @@ class ApprovalStep(models.Model):
     class Meta:
         unique_together = ['request', 'step_order']
         ordering = ['step_order']
+        indexes = [
+            # الخطوات الحالية غير المكتملة المستحقة فقط (يستخدمه مجدول المهل)
+            models.Index(
+                fields=['deadline'],
+                name='wf_step_open_deadline_idx',
+                condition=models.Q(is_current_step=True, is_completed=False, deadline__isnull=False),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.request.title} - Step {self.step_order} - {self.approver}"
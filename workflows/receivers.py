@@ -0,0 +1,30 @@
+"""
+إبطال لقطات لوحة التحكم ونسخة الطلب عند أحداث سير العمل
+يتأثر مقدم الطلب وكل المعتمدين والمفوضين في خطواته
+"""
+from django.dispatch import receiver
+
+from myproject.conditional import bump_versions
+from myproject.dashboard import DashboardSnapshot
+
+from . import signals
+from .models import ApprovalStep
+from .versions import request_version_key
+
+
+@receiver(signals.request_submitted)
+@receiver(signals.step_approved)
+@receiver(signals.request_approved)
+@receiver(signals.request_rejected)
+@receiver(signals.request_cancelled)
+@receiver(signals.step_delegated)
+@receiver(signals.request_escalated)
+@receiver(signals.request_expired)
+def request_changed(sender, approval_request, **kwargs):
+    user_ids = [approval_request.requester_id]
+    for approver_id, delegated_to_id in ApprovalStep.objects.filter(
+        request=approval_request
+    ).values_list('approver_id', 'delegated_to_id'):
+        user_ids.extend((approver_id, delegated_to_id))
+    DashboardSnapshot.invalidate(*user_ids)
+    bump_versions(request_version_key(approval_request.request_id))
@@ -0,0 +1,140 @@
+"""
+مجدول مهل الموافقات
+ينهي الطلبات التي تجاوزت مهلتها (EXPIRED) ويصعد الخطوات المتأخرة إلى المدير المباشر
+أو المفوض إليه، ثم يرسل الإشعارات دفعة واحدة.
+يعتمد على الفهارس الجزئية على deadline فلا يمسح إلا العناصر المستحقة.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from messaging.notifications import send_bulk_notifications
+
+from . import signals
+from .engine import ESCALATION_RELATED, OPEN_STATUSES, escalation_target
+from .models import ApprovalRequest, ApprovalStep
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def get_escalation_grace():
+    """المهلة الجديدة للخطوة بعد تصعيدها"""
+    return timedelta(hours=getattr(settings, 'WORKFLOW_ESCALATION_GRACE_HOURS', 24))
+
+
+def expire_due_requests(now=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    إنهاء دفعة من الطلبات المفتوحة التي تجاوزت مهلتها
+
+    Returns:
+        int: عدد الطلبات المنتهية
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = list(
+            ApprovalRequest.objects.select_for_update(skip_locked=True).filter(
+                status__in=OPEN_STATUSES, deadline__isnull=False, deadline__lte=now
+            ).order_by('deadline').values_list('pk', 'requester_id', 'title')[:batch_size]
+        )
+        if not due:
+            return 0
+
+        request_ids = [pk for pk, _, _ in due]
+        ApprovalRequest.objects.filter(pk__in=request_ids, status__in=OPEN_STATUSES).update(
+            status='EXPIRED', completed_at=now
+        )
+        ApprovalStep.objects.filter(
+            request_id__in=request_ids, is_current_step=True, is_completed=False
+        ).update(is_current_step=False)
+
+        send_bulk_notifications([
+            (requester_id,
+             f'انتهت مهلة طلب الموافقة: {title}',
+             f'انتهت مهلة طلب الموافقة "{title}" قبل استكمال الموافقات، وتم إغلاقه تلقائياً.')
+            for _, requester_id, title in due
+        ])
+
+        expired = list(ApprovalRequest.objects.filter(pk__in=request_ids))
+        transaction.on_commit(lambda: [
+            signals.request_expired.send(sender=ApprovalRequest, approval_request=approval_request)
+            for approval_request in expired
+        ])
+    return len(due)
+
+
+def escalate_overdue_steps(now=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    تصعيد دفعة من الخطوات الحالية المتأخرة
+
+    الخطوة المصعدة تُسند إلى جهة التصعيد وتحصل على مهلة جديدة، والخطوة التي لا توجد
+    لها جهة تصعيد تُؤجل فقط حتى لا تعود في كل دورة.
+
+    Returns:
+        int: عدد الخطوات التي تمت معالجتها
+    """
+    now = now or timezone.now()
+    new_deadline = now + get_escalation_grace()
+    with transaction.atomic():
+        steps = list(
+            ApprovalStep.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                is_current_step=True, is_completed=False,
+                deadline__isnull=False, deadline__lte=now,
+                request__status__in=OPEN_STATUSES,
+            ).select_related('request', *ESCALATION_RELATED).order_by('deadline')[:batch_size]
+        )
+        if not steps:
+            return 0
+
+        notifications = []
+        escalated = defaultdict(list)
+        for step in steps:
+            target = escalation_target(step)
+            step.deadline = new_deadline
+            if target is None:
+                continue
+            step.delegated_to = target
+            step.comments = f'{step.comments}\nتم التصعيد تلقائياً لتجاوز المهلة'.strip()
+            escalated[step.request].append(step)
+            notifications.append((
+                target,
+                f'تم تصعيد طلب موافقة إليك: {step.request.title}',
+                f'تجاوزت الخطوة {step.step_order} من طلب الموافقة "{step.request.title}" '
+                f'مهلتها وتم تصعيدها إليك للبت فيها.',
+            ))
+
+        ApprovalStep.objects.bulk_update(steps, ['deadline', 'delegated_to', 'comments'])
+        send_bulk_notifications(notifications, priority='HIGH')
+
+        transaction.on_commit(lambda: [
+            signals.request_escalated.send(
+                sender=ApprovalRequest, approval_request=approval_request, steps=request_steps, user=None
+            )
+            for approval_request, request_steps in escalated.items()
+        ])
+    return len(steps)
+
+
+def process_due_items(now=None, batch_size=DEFAULT_BATCH_SIZE, max_batches=20):
+    """
+    دورة واحدة للمجدول: دفعات متتالية حتى تنتهي العناصر المستحقة أو يبلغ الحد الأقصى
+
+    Returns:
+        dict: {'expired': int, 'escalated': int}
+    """
+    now = now or timezone.now()
+    stats = {'expired': 0, 'escalated': 0}
+    for handler, key in ((expire_due_requests, 'expired'), (escalate_overdue_steps, 'escalated')):
+        for _ in range(max_batches):
+            processed = handler(now=now, batch_size=batch_size)
+            stats[key] += processed
+            if processed < batch_size:
+                break
+    if stats['expired'] or stats['escalated']:
+        logger.info('مجدول المهل: انتهاء %(expired)d طلب وتصعيد %(escalated)d خطوة', stats)
+    return stats
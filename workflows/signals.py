@@ -0,0 +1,29 @@
+"""
+أحداث محرك سير العمل
+تُرسل بعد تثبيت المعاملة (on_commit) حتى لا يرى المستمعون حالة لم تُحفظ
+"""
+from django.dispatch import Signal
+
+# يُرسل مع: approval_request
+request_submitted = Signal()
+
+# يُرسل مع: approval_request, step, user
+step_approved = Signal()
+
+# يُرسل مع: approval_request
+request_approved = Signal()
+
+# يُرسل مع: approval_request, step, user
+request_rejected = Signal()
+
+# يُرسل مع: approval_request, user
+request_cancelled = Signal()
+
+# يُرسل مع: approval_request, step, user, delegate_to
+step_delegated = Signal()
+
+# يُرسل مع: approval_request, steps, user
+request_escalated = Signal()
+
+# يُرسل مع: approval_request
+request_expired = Signal()
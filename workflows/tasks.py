@@ -0,0 +1,12 @@
+"""
+المهام الخلفية لتطبيق سير العمل (Celery)
+"""
+from celery import shared_task
+
+from .scheduler import process_due_items
+
+
+@shared_task(ignore_result=True)
+def process_approval_deadlines():
+    """دورة مجدول مهل الموافقات (تُشغل دورياً عبر celery beat)"""
+    return process_due_items()
@@ -1,3 +1,341 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Department, Position, User
+from messaging.models import MessageRecipient
+from myproject.perf_fixtures import TEST_STORAGES, PerformanceTestCase
+
+from . import engine, scheduler
+from .models import ApprovalRequest, ApprovalStep, ApprovalWorkflow, WorkflowTemplate
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class RequestListQueryCountTests(TestCase):
+    """عدد استعلامات صفحتي طلباتي وسجل الموافقات ثابت مهما زاد عدد الطلبات"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='العمليات', code='OPS')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.requester = User.objects.create_user(
+            username='requester', password='pass', arabic_name='طالب الموافقة',
+            employee_id='1001', phone='101', department=department, position=position,
+        )
+        cls.approvers = [
+            User.objects.create_user(
+                username=f'approver{i}', password='pass', arabic_name=f'موافق {i}',
+                employee_id=f'200{i}', phone=f'20{i}', department=department, position=position,
+            )
+            for i in range(3)
+        ]
+        cls.workflow = ApprovalWorkflow.objects.create(
+            workflow_type='DOCUMENT_APPROVAL', name='موافقة وثيقة'
+        )
+
+    def _create_requests(self, count):
+        for i in range(count):
+            approval_request = engine.submit_request(
+                self.workflow, self.requester, f'طلب {i}', 'وصف', 'document', i,
+                approvers=self.approvers,
+            )
+            # الموافق الأول يعتمد حتى تظهر الطلبات في سجله
+            engine.approve(approval_request, self.approvers[0])
+
+    def _count_queries(self, url_name, user):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_my_requests_query_count_is_constant(self):
+        self._create_requests(2)
+        small = self._count_queries('workflows:my_requests', self.requester)
+        self._create_requests(15)
+        large = self._count_queries('workflows:my_requests', self.requester)
+        self.assertEqual(small, large)
+
+    def test_step_status_conditional_get(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            approval_request = engine.submit_request(
+                self.workflow, self.requester, 'طلب', 'وصف', 'document', 1, approvers=self.approvers,
+            )
+        url = reverse('workflows:step_status', args=[approval_request.request_id])
+        self.client.force_login(self.requester)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            engine.approve(approval_request, self.approvers[0])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['steps'][0]['completed'])
+
+    def test_approval_history_query_count_is_constant(self):
+        self._create_requests(2)
+        small = self._count_queries('workflows:history', self.approvers[0])
+        self._create_requests(15)
+        large = self._count_queries('workflows:history', self.approvers[0])
+        self.assertEqual(small, large)
+
+
+class WorkflowEngineTests(TestCase):
+    """آلة حالات طلبات الموافقة: الخطوات المتسلسلة والمتوازية والرفض والقوالب"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='المالية', code='FIN')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'مستخدم {i}',
+                employee_id=f'300{i}', phone=f'30{i}', department=department, position=position,
+            )
+            for i in range(12)
+        ]
+        cls.requester, cls.approvers = cls.users[0], cls.users[1:]
+        cls.requester.direct_manager = cls.approvers[0]
+        cls.requester.save(update_fields=['direct_manager'])
+        department.manager = cls.approvers[1]
+        department.save(update_fields=['manager'])
+        cls.workflow = ApprovalWorkflow.objects.create(workflow_type='BUDGET_APPROVAL', name='موافقة مصروف')
+
+    def _submit(self, approvers, workflow=None, **kwargs):
+        return engine.submit_request(
+            workflow or self.workflow, self.requester, 'طلب', 'وصف', 'expense', 1, approvers=approvers, **kwargs
+        )
+
+    def test_sequential_steps_advance_to_approved(self):
+        approval_request = self._submit(self.approvers[:3])
+        self.assertEqual(
+            list(approval_request.approval_steps.order_by('step_order').values_list('is_current_step', flat=True)),
+            [True, False, False],
+        )
+        with self.assertRaises(engine.WorkflowError):
+            engine.approve(approval_request, self.approvers[1])
+
+        engine.approve(approval_request, self.approvers[0])
+        self.assertEqual(approval_request.status, 'IN_PROGRESS')
+        current = ApprovalStep.objects.get(request=approval_request, is_current_step=True)
+        self.assertEqual(current.approver, self.approvers[1])
+
+        engine.approve(approval_request, self.approvers[1])
+        engine.approve(approval_request, self.approvers[2])
+        approval_request.refresh_from_db()
+        self.assertEqual(approval_request.status, 'APPROVED')
+        self.assertIsNotNone(approval_request.completed_at)
+        self.assertFalse(approval_request.approval_steps.filter(is_current_step=True).exists())
+        with self.assertRaises(engine.WorkflowError):
+            engine.approve(approval_request, self.approvers[2])
+
+    def test_next_step_deadline_starts_when_assigned(self):
+        request_deadline = timezone.now() + timedelta(hours=48)
+        approval_request = self._submit(self.approvers[:3], deadline=request_deadline)
+        # الخطوة الثانية بمهلة نسبية (deadline_hours) والثالثة بمهلة الطلب المطلقة
+        steps = {step.step_order: step for step in approval_request.approval_steps.all()}
+        assigned_at = timezone.now() - timedelta(hours=30)
+        ApprovalStep.objects.filter(request=approval_request).update(assigned_at=assigned_at)
+        ApprovalStep.objects.filter(pk=steps[2].pk).update(deadline=assigned_at + timedelta(hours=24))
+
+        engine.approve(approval_request, self.approvers[0])
+        second = ApprovalStep.objects.get(pk=steps[2].pk)
+        self.assertAlmostEqual(second.deadline, second.assigned_at + timedelta(hours=24), delta=timedelta(seconds=1))
+
+        engine.approve(approval_request, self.approvers[1])
+        third = ApprovalStep.objects.get(pk=steps[3].pk)
+        self.assertTrue(third.is_current_step)
+        self.assertEqual(third.deadline, request_deadline)
+
+    def test_parallel_step_with_minimum_approvers(self):
+        workflow = ApprovalWorkflow.objects.create(
+            workflow_type='BUDGET_APPROVAL', name='موافقة متوازية',
+            requires_sequential_approval=False, minimum_approvers=2,
+        )
+        approval_request = self._submit(self.approvers[:3], workflow=workflow)
+        self.assertEqual(approval_request.approval_steps.filter(is_current_step=True).count(), 3)
+
+        engine.approve(approval_request, self.approvers[2])
+        self.assertEqual(approval_request.status, 'IN_PROGRESS')
+        engine.approve(approval_request, self.approvers[0])
+        self.assertEqual(approval_request.status, 'APPROVED')
+        skipped = ApprovalStep.objects.get(request=approval_request, approver=self.approvers[1])
+        self.assertEqual((skipped.action, skipped.is_completed, skipped.is_current_step), ('SKIP', True, False))
+
+    def test_auto_approve_threshold(self):
+        workflow = ApprovalWorkflow.objects.create(
+            workflow_type='BUDGET_APPROVAL', name='موافقة تلقائية', auto_approve_threshold=1000,
+        )
+        small = self._submit(self.approvers[:2], workflow=workflow, amount=1000)
+        self.assertEqual(small.status, 'APPROVED')
+        self.assertFalse(small.approval_steps.exists())
+
+        large = self._submit(self.approvers[:2], workflow=workflow, amount='1000.01')
+        self.assertEqual(large.status, 'PENDING')
+        self.assertEqual(large.approval_steps.count(), 2)
+
+    def test_rejection_closes_request(self):
+        approval_request = self._submit(self.approvers[:3])
+        engine.approve(approval_request, self.approvers[0])
+        engine.reject(approval_request, self.approvers[1], comments='غير مبرر')
+
+        approval_request.refresh_from_db()
+        self.assertEqual(approval_request.status, 'REJECTED')
+        self.assertIsNotNone(approval_request.completed_at)
+        steps = list(approval_request.approval_steps.order_by('step_order').values_list('action', 'is_current_step'))
+        self.assertEqual(steps, [('APPROVE', False), ('REJECT', False), (None, False)])
+        with self.assertRaises(engine.WorkflowError):
+            engine.approve(approval_request, self.approvers[2])
+
+    def test_delegated_step_is_approved_by_delegate(self):
+        approval_request = self._submit(self.approvers[:2])
+        engine.delegate(approval_request, self.approvers[0], self.approvers[5])
+        with self.assertRaises(engine.WorkflowError):
+            engine.delegate(approval_request, self.approvers[5], self.approvers[5])
+        engine.approve(approval_request, self.approvers[5])
+        step = ApprovalStep.objects.get(request=approval_request, step_order=1)
+        self.assertEqual((step.action, step.delegated_to), ('APPROVE', self.approvers[5]))
+
+    def test_template_steps_are_instantiated(self):
+        template = WorkflowTemplate.objects.create(
+            name='قالب المصروفات', workflow_type='BUDGET_APPROVAL', created_by=self.requester,
+            template_steps={'steps': [
+                {'approver': 'direct_manager', 'deadline_hours': 24},
+                {'approver': 'department_manager'},
+                {'employee_id': self.approvers[4].employee_id},
+                {'user_id': 999999, 'optional': True},
+            ]},
+            conditions={'min_amount': 100, 'departments': ['FIN']},
+        )
+        WorkflowTemplate.objects.create(
+            name='قالب آخر', workflow_type='BUDGET_APPROVAL', created_by=self.requester,
+            template_steps=[{'approver': 'direct_manager'}], conditions={'max_amount': 50},
+        )
+        approval_request = engine.submit_request(
+            self.workflow, self.requester, 'طلب', 'وصف', 'expense', 1, amount=500,
+        )
+        steps = list(approval_request.approval_steps.order_by('step_order'))
+        self.assertEqual(
+            [(step.step_order, step.approver) for step in steps],
+            [(1, self.approvers[0]), (2, self.approvers[1]), (3, self.approvers[4])],
+        )
+        self.assertIsNotNone(steps[0].deadline)
+        self.assertIsNone(steps[1].deadline)
+        self.assertEqual(engine.find_template(self.workflow, self.requester, 20).name, 'قالب آخر')
+
+        template.template_steps = {'steps': [{'user_id': 999999}]}
+        template.save()
+        with self.assertRaises(engine.WorkflowError):
+            engine.submit_request(self.workflow, self.requester, 'طلب', 'وصف', 'expense', 2, amount=500)
+        self.assertEqual(ApprovalRequest.objects.count(), 1)
+
+    def _approval_queries(self, chain_length):
+        approval_request = self._submit(self.approvers[:chain_length])
+        counts = []
+        for approver in self.approvers[:2]:
+            with CaptureQueriesContext(connection) as queries:
+                engine.approve(approval_request, approver)
+            counts.append(len(queries))
+        return counts
+
+    def test_approval_query_count_is_constant(self):
+        self.assertEqual(self._approval_queries(3), self._approval_queries(11))
+
+
+class DeadlineSchedulerTests(TestCase):
+    """مجدول المهل ينهي الطلبات المتأخرة ويصعد خطواتها ويرسل إشعاراتها دفعة واحدة"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='المالية', code='FIN')
+        position = Position.objects.create(title='موظف', level=1, department=department)
+        cls.system, cls.requester, cls.manager, cls.delegate, cls.delegating, cls.managed, cls.orphan = [
+            User.objects.create_user(
+                username=f'user{i}', password='pass', arabic_name=f'مستخدم {i}', is_superuser=(i == 0),
+                employee_id=f'400{i}', phone=f'40{i}', department=department, position=position,
+            )
+            for i in range(7)
+        ]
+        now = timezone.now()
+        # الموافق المفوض تفويضاً نشطاً يُصعد إلى من فوضه، وغيره إلى مديره المباشر
+        cls.delegating.delegate_to = cls.delegate
+        cls.delegating.delegation_start_date = now - timedelta(days=1)
+        cls.delegating.delegation_end_date = now + timedelta(days=30)
+        cls.delegating.direct_manager = cls.manager
+        cls.delegating.save()
+        cls.managed.direct_manager = cls.manager
+        cls.managed.save()
+        cls.workflow = ApprovalWorkflow.objects.create(
+            workflow_type='BUDGET_APPROVAL', name='موافقة مصروف', requires_sequential_approval=False,
+        )
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def _submit(self, approvers, **fields):
+        return engine.submit_request(
+            self.workflow, self.requester, 'طلب', 'وصف', 'expense', 1, approvers=approvers, **fields
+        )
+
+    def test_overdue_requests_expire(self):
+        overdue = self._submit([self.managed], deadline=self.now - timedelta(minutes=1))
+        pending = self._submit([self.managed], deadline=self.now + timedelta(days=1))
+
+        self.assertEqual(scheduler.process_due_items(now=self.now), {'expired': 1, 'escalated': 0})
+        overdue.refresh_from_db()
+        self.assertEqual((overdue.status, overdue.completed_at), ('EXPIRED', self.now))
+        self.assertFalse(overdue.approval_steps.filter(is_current_step=True).exists())
+        self.assertEqual(ApprovalRequest.objects.get(pk=pending.pk).status, 'PENDING')
+        self.assertEqual(MessageRecipient.objects.filter(recipient=self.requester).count(), 1)
+        self.assertEqual(scheduler.process_due_items(now=self.now), {'expired': 0, 'escalated': 0})
+
+    def test_overdue_steps_escalate_to_delegate_or_manager(self):
+        approval_request = self._submit([self.delegating, self.managed, self.orphan])
+        ApprovalStep.objects.update(deadline=self.now - timedelta(minutes=1))
+
+        with mock.patch.object(
+            scheduler, 'send_bulk_notifications', wraps=scheduler.send_bulk_notifications
+        ) as send:
+            self.assertEqual(scheduler.escalate_overdue_steps(now=self.now), 3)
+        # إشعارات كل الخطوات المصعدة في دفعة واحدة
+        send.assert_called_once()
+        self.assertEqual(len(send.call_args.args[0]), 2)
+
+        steps = {step.approver: step for step in approval_request.approval_steps.all()}
+        self.assertEqual(steps[self.delegating].delegated_to, self.delegate)
+        self.assertEqual(steps[self.managed].delegated_to, self.manager)
+        self.assertIsNone(steps[self.orphan].delegated_to)
+        # المهلة تُؤجل بعد التصعيد (وللخطوة التي لا جهة لتصعيدها) فلا تُصعد في كل دورة
+        new_deadline = self.now + scheduler.get_escalation_grace()
+        self.assertEqual({step.deadline for step in steps.values()}, {new_deadline})
+        self.assertEqual(scheduler.escalate_overdue_steps(now=self.now), 0)
+        self.assertEqual(MessageRecipient.objects.filter(recipient__in=[self.delegate, self.manager]).count(), 2)
+
+        # المفوض إليه يستطيع البت في الخطوة المصعدة
+        engine.approve(approval_request, self.delegate)
+        self.assertEqual(approval_request.status, 'APPROVED')
+
+    def test_command(self):
+        self._submit([self.managed], deadline=self.now - timedelta(minutes=1))
+        self._submit([self.managed])
+        ApprovalStep.objects.filter(request__deadline__isnull=True).update(deadline=self.now - timedelta(minutes=1))
+        out = StringIO()
+        call_command('process_approval_deadlines', stdout=out)
+        self.assertIn('تم إنهاء 1 طلب وتصعيد 1 خطوة', out.getvalue())
+
+
+class PendingApprovalsQueryBudgetTests(PerformanceTestCase):
+    """ميزانية الاستعلامات والزمن لصفحة الموافقات المعلقة"""
+    seed_options = {'messages': 1000}
+
+    def test_pending_approvals(self):
+        self.assertQueryBudget(reverse('workflows:pending'), max_queries=5)
@@ -0,0 +1,10 @@
+"""
+نسخ طلبات الموافقة
+تتغير مع كل حدث من أحداث سير العمل وتُستخدم في ETag واجهة حالة الخطوات
+"""
+REQUEST_VERSION_KEY = 'approval_request_version_{request_id}'
+
+
+def request_version_key(request_id):
+    """request_id هو المعرف الفريد (UUID) المستخدم في الروابط"""
+    return REQUEST_VERSION_KEY.format(request_id=request_id)
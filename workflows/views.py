@@ -6,17 +6,27 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db.models import Exists, F, OuterRef, Prefetch, Q
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
+from myproject.conditional import make_etag
+
+from . import engine
+from .engine import WorkflowError
 from .models import ApprovalWorkflow, ApprovalRequest, ApprovalStep, WorkflowTemplate
+from .versions import request_version_key
 
 @login_required
 def pending_approvals(request):
     """الموافقات المعلقة"""
     pending_requests = ApprovalRequest.objects.filter(
-        approval_steps__approver=request.user,
+        Q(approval_steps__approver=request.user) | Q(approval_steps__delegated_to=request.user),
         approval_steps__is_current_step=True,
         approval_steps__is_completed=False
-    ).distinct().select_related('requester', 'workflow')
+    ).distinct().select_related('requester__department', 'workflow')
     
     return render(request, 'workflows/pending.html', {
         'requests': pending_requests
@@ -25,13 +35,24 @@ def pending_approvals(request):
 @login_required
 def my_requests(request):
     """طلباتي"""
+    # الخطوات الحالية فقط مع الموافقين في استعلام واحد لكل الصفحة
+    current_steps = ApprovalStep.objects.filter(
+        is_current_step=True, is_completed=False
+    ).select_related('approver', 'delegated_to')
+    
     my_requests_list = ApprovalRequest.objects.filter(
         requester=request.user
-    ).select_related('workflow').prefetch_related('approval_steps').order_by('-created_at')
+    ).select_related('workflow').prefetch_related(
+        Prefetch('approval_steps', queryset=current_steps, to_attr='current_steps')
+    ).order_by('-created_at')
+    
+    paginator = Paginator(my_requests_list, 20)
+    page_number = request.GET.get('page')
+    my_requests_list = paginator.get_page(page_number)
     
     # Add current step to each request for easy access in template
     for req in my_requests_list:
-        req.current_step = req.approval_steps.filter(is_current_step=True).first()
+        req.current_step = req.current_steps[0] if req.current_steps else None
         
     return render(request, 'workflows/my_requests.html', {
         'my_requests': my_requests_list
@@ -40,13 +61,25 @@ def my_requests(request):
 @login_required
 def approval_history(request):
     """سجل الموافقات"""
+    my_steps = ApprovalStep.objects.filter(approver=request.user)
+    
     history = ApprovalRequest.objects.filter(
-        approval_steps__approver=request.user
-    ).distinct().select_related('requester', 'workflow').prefetch_related('approval_steps').order_by('-created_at')
+        Exists(my_steps.filter(request=OuterRef('pk')))
+    ).select_related('requester', 'workflow').prefetch_related(
+        Prefetch(
+            'approval_steps',
+            queryset=my_steps.order_by(F('responded_at').desc(nulls_last=True)),
+            to_attr='my_steps'
+        )
+    ).order_by('-created_at')
+    
+    paginator = Paginator(history, 20)
+    page_number = request.GET.get('page')
+    history = paginator.get_page(page_number)
 
     # تجهيز آخر خطوة للمستخدم في كل طلب
     for req in history:
-        req.my_step = req.approval_steps.filter(approver=request.user).order_by('-responded_at').first()
+        req.my_step = req.my_steps[0] if req.my_steps else None
 
     return render(request, 'workflows/history.html', {
         'requests': history
@@ -86,25 +119,11 @@ def approve_request(request, request_id):
     if request.method == 'POST':
         comments = request.POST.get('comments', '')
         
-        # Find current step for this user
-        current_step = ApprovalStep.objects.filter(
-            request=approval_request,
-            approver=request.user,
-            is_current_step=True,
-            is_completed=False
-        ).first()
-        
-        if current_step:
-            current_step.action = 'APPROVE'
-            current_step.comments = comments
-            current_step.responded_at = timezone.now()
-            current_step.is_completed = True
-            current_step.is_current_step = False
-            current_step.save()
-            
+        try:
+            engine.approve(approval_request, request.user, comments)
             messages.success(request, 'تم قبول الطلب بنجاح.')
-        else:
-            messages.error(request, 'لا يمكن معالجة هذا الطلب.')
+        except WorkflowError as e:
+            messages.error(request, str(e))
         
         return redirect('workflows:request_detail', request_id=request_id)
     
@@ -120,29 +139,11 @@ def reject_request(request, request_id):
     if request.method == 'POST':
         comments = request.POST.get('comments', '')
         
-        current_step = ApprovalStep.objects.filter(
-            request=approval_request,
-            approver=request.user,
-            is_current_step=True,
-            is_completed=False
-        ).first()
-        
-        if current_step:
-            current_step.action = 'REJECT'
-            current_step.comments = comments
-            current_step.responded_at = timezone.now()
-            current_step.is_completed = True
-            current_step.is_current_step = False
-            current_step.save()
-            
-            # Update request status
-            approval_request.status = 'REJECTED'
-            approval_request.completed_at = timezone.now()
-            approval_request.save()
-            
+        try:
+            engine.reject(approval_request, request.user, comments)
             messages.success(request, 'تم رفض الطلب.')
-        else:
-            messages.error(request, 'لا يمكن معالجة هذا الطلب.')
+        except WorkflowError as e:
+            messages.error(request, str(e))
         
         return redirect('workflows:request_detail', request_id=request_id)
     
@@ -156,8 +157,13 @@ def delegate_request(request, request_id):
     approval_request = get_object_or_404(ApprovalRequest, request_id=request_id)
     
     if request.method == 'POST':
-        # Handle delegation
-        messages.success(request, 'تم تفويض الطلب بنجاح.')
+        User = get_user_model()
+        delegate_to = User.objects.filter(id=request.POST.get('delegate_to') or None).first()
+        try:
+            engine.delegate(approval_request, request.user, delegate_to, request.POST.get('comments', ''))
+            messages.success(request, 'تم تفويض الطلب بنجاح.')
+        except WorkflowError as e:
+            messages.error(request, str(e))
         return redirect('workflows:request_detail', request_id=request_id)
     
     return render(request, 'workflows/delegate.html', {
@@ -174,11 +180,11 @@ def cancel_request(request, request_id):
         return redirect('workflows:my_requests')
     
     if request.method == 'POST':
-        approval_request.status = 'CANCELLED'
-        approval_request.completed_at = timezone.now()
-        approval_request.save()
-        
-        messages.success(request, 'تم إلغاء الطلب بنجاح.')
+        try:
+            engine.cancel(approval_request, request.user)
+            messages.success(request, 'تم إلغاء الطلب بنجاح.')
+        except WorkflowError as e:
+            messages.error(request, str(e))
         return redirect('workflows:my_requests')
     
     return render(request, 'workflows/cancel.html', {
@@ -311,17 +317,26 @@ def export_workflow_data(request):
     """تصدير بيانات سير العمل"""
     return HttpResponse('تصدير بيانات سير العمل')
 
+def _step_status_etag(request, request_id):
+    return make_etag(request, [request_version_key(request_id)])
+
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_step_status_etag)
 def step_status(request, request_id):
     """حالة خطوات الموافقة"""
     approval_request = get_object_or_404(ApprovalRequest, request_id=request_id)
-    steps = approval_request.approval_steps.all().order_by('step_order')
+    steps = approval_request.approval_steps.select_related(
+        'approver', 'delegated_to'
+    ).order_by('step_order')
     
     step_data = []
     for step in steps:
         step_data.append({
             'order': step.step_order,
             'approver': step.approver.arabic_name or step.approver.username,
+            'delegated_to': step.delegated_to.arabic_name if step.delegated_to else None,
             'action': step.action,
             'completed': step.is_completed,
             'current': step.is_current_step,
@@ -335,7 +350,13 @@ def step_status(request, request_id):
 def escalate_request(request, request_id):
     """تصعيد طلب"""
     if request.method == 'POST':
-        # Handle escalation
-        return JsonResponse({'success': True})
+        approval_request = get_object_or_404(ApprovalRequest, request_id=request_id)
+        if approval_request.requester != request.user and not request.user.is_staff:
+            return JsonResponse({'success': False, 'error': 'ليس لديك صلاحية لتصعيد هذا الطلب.'}, status=403)
+        try:
+            escalated = engine.escalate(approval_request, request.user, request.POST.get('reason', ''))
+        except WorkflowError as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+        return JsonResponse({'success': True, 'escalated_steps': [step.step_order for step in escalated]})
     
     return JsonResponse({'success': False})